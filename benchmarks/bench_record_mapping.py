@@ -0,0 +1,125 @@
+"""
+Benchmark: row -> Record mapping throughput of SqliteRecordRepository.
+
+Compares the previous implementation (select() rebuilt per call, keyword
+construction, RecordType(value) per row) with the cached statement + positional
+mapper, and with lazy RecordRow views.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_record_mapping [--rows 200000] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from sqlalchemy import select, and_, insert
+
+from ledger.models import Record, RecordType
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_schema import records
+from ledger.utils.db import init_db, get_session_factory
+
+
+def _seed(session, n: int) -> None:
+    start = date(2020, 1, 1)
+    cats = ["food", "transport", "rent", "salary", "shopping", "coffee"]
+    rows = [
+        {
+            "user_id": 1,
+            "rtype": "INCOME" if i % 10 == 0 else "EXPENSE",
+            "category": cats[i % len(cats)],
+            "amount": float(i % 500) + 0.5,
+            "occurred_on": start + timedelta(days=i % 1500),
+            "note": f"note {i % 97}",
+        }
+        for i in range(n)
+    ]
+    session.execute(insert(records), rows)
+    session.commit()
+
+
+def _legacy_list_by_period(session, user_id: int, start: date, end: date):
+    q = (
+        select(
+            records.c.record_id,
+            records.c.user_id,
+            records.c.rtype,
+            records.c.category,
+            records.c.amount,
+            records.c.occurred_on,
+            records.c.note,
+        )
+        .where(
+            and_(
+                records.c.user_id == user_id,
+                records.c.occurred_on >= start,
+                records.c.occurred_on < end,
+            )
+        )
+        .order_by(records.c.occurred_on.asc(), records.c.record_id.asc())
+    )
+    rows = session.execute(q).all()
+    return [
+        Record(
+            record_id=row.record_id,
+            user_id=row.user_id,
+            rtype=RecordType(row.rtype),
+            category=row.category,
+            amount=float(row.amount),
+            occurred_on=row.occurred_on,
+            note=row.note or "",
+        )
+        for row in rows
+    ]
+
+
+def _time(fn, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        count = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, count
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        init_db(db_url)
+        session = get_session_factory(db_url)()
+        _seed(session, args.rows)
+        repo = SqliteRecordRepository(session)
+        lo, hi = date(1900, 1, 1), date(3000, 1, 1)
+
+        cases = {
+            "legacy (rebuild + kwargs)": lambda: len(_legacy_list_by_period(session, 1, lo, hi)),
+            "cached stmt + positional": lambda: len(repo.list_by_period(1, lo, hi)),
+            "lazy RecordRow views": lambda: sum(1 for _ in repo.list_by_period(1, lo, hi, lazy=True)),
+        }
+        # 预热一次，排除首次编译/页缓存的影响
+        for fn in cases.values():
+            fn()
+
+        base = None
+        print(f"rows={args.rows} repeat={args.repeat} (best of)")
+        for name, fn in cases.items():
+            secs, n = _time(fn, args.repeat)
+            rate = n / secs
+            base = base or rate
+            print(f"  {name:<28} {rate:>12,.0f} obj/s  x{rate / base:.2f}")
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,33 @@
 """
 Ledger CLI with authentication.
 - 支持：register/login/logout/whoami/change-password
-- 记录：add/list/stats/import-csv/export-csv（需已登录）
-- 预算：budget set/list/progress（需已登录）
+- 记录：add/list/query/stats/import-csv/export-csv（需已登录）
+- 余额：balance --on / --start..--end --by；list --balance 累计余额列
+- 统计：stats --month/--year/--quarter/--last/--start..--end，--by day|week|month 时间序列，--json
+- 周期：recurring add/list/remove/run（日/周/月模板，run 按高水位批量生成到期记录；--all 全部用户）
+- 对账：reconcile --path 对账单.csv（按金额+日期容差+备注相似度归并匹配，输出已匹配/缺失/多余）
+- 排行：top records/categories/notes（最大单笔、支出最多的分类、按次数或金额的高频备注）
+- 分布：stats --quantiles 各分类单笔支出 p50/p90/p99，--histogram 对数分桶直方图（合并月度草图，不扫明细）
+- 标签：tag add/remove/list；query --tag/--without-tag；stats --by-tag
+- 预算：budget set/list/progress（需已登录）；周/月/季/年/自定义周期，progress --all-periods
+- 预测：budget forecast 月末支出预测；--all --out 报告文件：对所有用户批量找出可能超支的预算
 - 提醒：reminder set/list/emit（需已登录）
+- 分片：shard init/rebalance/report（目录库 + N 个分片文件）
+- 备份：db backup/restore（SQLite 在线备份 API）
+- 同步：sync export/apply/status（基于 change_log 的增量同步）
+- 批量：bulk recategorize/shift-dates/delete（按过滤条件，支持 --dry-run）
+- 规则：rule add/list/remove；import-csv --rules、bulk recategorize --rules 按规则自动归类
+- 异常：add / import-csv 写入时按分类在线统计（Welford）标出异常大额支出；anomaly stats/rebuild
+- 币种：add --currency、CSV 可选 currency 列；fx load/list 汇率表；stats --currency 按当日汇率换算汇总；
+  其余金额汇总（stats/balance/budget/top/shard report）默认按当日汇率折成本位币，单笔分布与异常统计只看本位币
 """
 
 from __future__ import annotations
 
 import argparse
+import json
 from pathlib import Path
-from datetime import date, datetime, time
+from datetime import date, datetime, time, timedelta
 from typing import Iterable, Tuple
 
 try:
@@ -18,16 +35,40 @@ try:
 except Exception:  # pragma: no cover
     plt = None
 
-from ..utils.db import init_db, get_session_factory
+from ..utils.db import init_db, get_session_factory, get_read_session_factory
 from ..repo.sqlite_user_repo import SqliteUserRepository
 from ..repo.sqlite_record_repo import SqliteRecordRepository
-from ..repo.sqlite_schema import budgets, reminders
-from ..models import Record, RecordType, User, Budget, Reminder
-from ..services.statistics_service import StatisticsService
+from ..repo.record_repo import RecordFilter
+from ..repo.record_query import RecordQuery, SORT_KEYS
+from ..repo.sqlite_schema import reminders
+from ..repo.sqlite_rule_repo import SqliteRuleRepository
+from ..repo.sqlite_budget_repo import SqliteBudgetRepository
+from ..repo.sqlite_recurring_repo import SqliteRecurringRepository
+from ..repo.sqlite_stats_repo import SqliteCategoryStatsRepository
+from ..repo.sqlite_fx_repo import SqliteFxRepository
+from ..models import BASE_CURRENCY, Record, RecordType, User, Budget, Reminder, CategoryRule, RecurringTemplate
+from ..models.recurring import FREQUENCIES
+from ..models.budget import BUDGET_PERIODS
 from ..services.record_service import RecordService
-from ..services.budget_service import BudgetService
+from ..services.import_service import ImportService, ImportInterrupted
+from ..repo.sqlite_import_repo import SqliteImportCheckpointRepository
+from ..services.anomaly_service import AnomalyDetector
+from ..services.budget_service import BudgetService, validate_budget
+from ..services.forecast_service import ForecastService
 from ..services.reminder_service import ReminderService
+from ..services.reconcile_service import reconcile
+from ..services.recurring_service import MaterializeResult, RecurringService, validate_template
+from ..services.statistics_service import StatisticsService
+from ..services.top_service import NOTE_RANKS, TopService
+from ..services.rule_service import RuleEngine, RuleReport, recategorize_by_rules, validate_rule
 from ..utils.auth import save_session, load_session, clear_session, SessionData
+from ..utils.sharding import get_router, init_shards, rebalance, reset_router_cache
+from ..utils.backup import backup_database, restore_database
+from ..utils.periods import BUCKETS, last_months, month_range, quarter_range, year_range
+from ..utils.sketch import QuantileSketch
+from ..utils.sync_io import save_batch, load_batch
+from ..utils.fx import load_rates_from_csv, normalize_currency
+from ..repo.sqlite_sync_repo import SqliteSyncRepository
 
 # csv io
 try:
@@ -46,6 +87,13 @@ def _parse_month(s: str) -> Tuple[int, int]:
         raise argparse.ArgumentTypeError("month must be YYYY-MM") from exc
 
 
+def _parse_day(s: str) -> date:
+    try:
+        return date.fromisoformat(s)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError("date must be YYYY-MM-DD") from exc
+
+
 def _ensure_reports_dir(path: Path) -> None:
     path.mkdir(parents=True, exist_ok=True)
 
@@ -56,6 +104,12 @@ def _get_session(db_url: str):
     return SessionFactory()
 
 
+def _get_read_session(db_url: str):
+    """Read-only session for list/stats/export/report commands."""
+    init_db(db_url=db_url)
+    return get_read_session_factory(db_url=db_url)()
+
+
 def _require_login(db_url: str) -> SessionData:
     sess = load_session()
     if not sess:
@@ -77,6 +131,20 @@ def _get_current_user(session, username: str) -> User:
     return user
 
 
+def _get_data_session(db_url: str, session, user: User, *, readonly: bool = False):
+    """Session holding the user's records/budgets/reminders.
+
+    Same as ``session`` unless the DB is a sharded directory, in which case
+    the router picks the user's shard.
+    """
+    router = get_router(db_url)
+    if router is None:
+        return session
+    if readonly:
+        return router.read_session_for(user.user_id)
+    return router.session_for(user.user_id)
+
+
 # ---------- auth commands ----------
 def cmd_register(args: argparse.Namespace) -> None:
     session = _get_session(args.db)
@@ -126,8 +194,13 @@ def cmd_add(args: argparse.Namespace) -> None:
     sess = _require_login(args.db)
     session = _get_session(args.db)
     user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user)
     repo = SqliteRecordRepository(session)
     svc = RecordService(repo)
+    try:
+        currency = normalize_currency(args.currency)
+    except ValueError as e:
+        raise SystemExit(str(e))
     r = Record(
         record_id=None,
         user_id=user.user_id,
@@ -136,12 +209,40 @@ def cmd_add(args: argparse.Namespace) -> None:
         amount=float(args.amount),
         occurred_on=date.fromisoformat(args.date),
         note=args.note or "",
+        currency=currency,
     )
+    try:
+        stats = SqliteCategoryStatsRepository(session).for_user(user.user_id)
+        detector = AnomalyDetector(stats, args.anomaly_threshold)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    flagged = detector.check(r)  # 与写入前的统计比较
     created = svc.create_record(r)
     print(
         f"added record #{created.record_id}: {created.rtype} {created.category} "
-        f"{created.amount} on {created.occurred_on.isoformat()}"
+        f"{created.amount}{_currency_suffix(created.currency)} on {created.occurred_on.isoformat()}"
     )
+    if flagged:
+        print(f"warning: unusual expense: {flagged.describe()}")
+
+
+def _fx(home):
+    """The global rate table; it lives in the directory DB, next to the users."""
+    return SqliteFxRepository(home).table()
+
+
+def _currency_suffix(currency: str) -> str:
+    return "" if currency == BASE_CURRENCY else f" {currency}"
+
+
+def _print_anomalies(anomalies, limit: int = 20) -> None:
+    if not anomalies:
+        return
+    print(f"flagged {len(anomalies)} unusual expenses:")
+    for a in anomalies[:limit]:
+        print(f"  {a.describe()}")
+    if len(anomalies) > limit:
+        print(f"  ... and {len(anomalies) - limit} more")
 
 
 def _iter_month_records(session, user: User, year: int, month: int) -> Iterable[Record]:
@@ -152,42 +253,259 @@ def _iter_month_records(session, user: User, year: int, month: int) -> Iterable[
 
 def cmd_list(args: argparse.Namespace) -> None:
     sess = _require_login(args.db)
-    session = _get_session(args.db)
-    user = _get_current_user(session, sess.user)
+    home = _get_read_session(args.db)
+    user = _get_current_user(home, sess.user)
+    session = _get_data_session(args.db, home, user, readonly=True)
     year, month = _parse_month(args.month)
     recs = list(_iter_month_records(session, user, year, month))
     if not recs:
         print("no records")
         return
+    # 累计余额从月初检查点起算，不重扫历史；余额按当日汇率折成本位币
+    running = None
+    if args.balance:
+        fx = _fx(home)
+        try:
+            running = SqliteRecordRepository(session).opening_balance(user.user_id, date(year, month, 1), fx=fx)
+            deltas = [
+                (r.amount if r.rtype == RecordType.INCOME else -r.amount) * fx.rate(r.currency, r.occurred_on)
+                for r in recs
+            ]
+        except ValueError as e:
+            raise SystemExit(str(e))
+    for i, r in enumerate(recs):
+        line = (
+            f"#{r.record_id}\t{r.occurred_on.isoformat()}\t{r.rtype}\t"
+            f"{r.category}\t{r.amount:.2f}{_currency_suffix(r.currency)}\t{r.note}"
+        )
+        if running is not None:
+            running += deltas[i]
+            line += f"\t{running:.2f}"
+        print(line)
+
+
+def cmd_balance(args: argparse.Namespace) -> None:
+    sess = _require_login(args.db)
+    home = _get_read_session(args.db)
+    user = _get_current_user(home, sess.user)
+    session = _get_data_session(args.db, home, user, readonly=True)
+    repo = SqliteRecordRepository(session)
+    fx = _fx(home)
+    if args.start is None:
+        day = args.on or date.today()
+        try:
+            balance = repo.balance_at(user.user_id, day, fx=fx)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f"balance for {user.name} at end of {day.isoformat()}: {balance:.2f}")
+        return
+    end = args.end or date.today() + timedelta(days=1)
+    if end <= args.start:
+        raise SystemExit("--end must be after --start")
+    try:
+        opening = repo.opening_balance(user.user_id, args.start, fx=fx)
+        series = repo.balance_series(user.user_id, args.start, end, args.by, fx=fx)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"opening balance {args.start.isoformat()}: {opening:.2f}")
+    for b, bal in series.items():
+        print(f"{b.isoformat()}\t{bal:.2f}")
+
+
+def cmd_query(args: argparse.Namespace) -> None:
+    sess = _require_login(args.db)
+    session = _get_read_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user, readonly=True)
+    try:
+        q = (
+            RecordQuery(user.user_id)
+            .between(args.start, args.end)
+            .of_type(RecordType(args.type) if args.type else None)
+            .in_categories(*(args.category or ()))
+            .amount_between(args.min, args.max)
+            .matching(args.keyword)
+            .tagged(*(args.tag or ()))
+            .not_tagged(*(args.without_tag or ()))
+            .order_by(args.sort)
+            .take(args.limit, args.offset)
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    repo = SqliteRecordRepository(session)
+    if args.explain:
+        for line in repo.explain(q):
+            print(line)
+        return
+    recs = repo.query(q, lazy=True)
+    n = 0
     for r in recs:
+        n += 1
         print(
             f"#{r.record_id}\t{r.occurred_on.isoformat()}\t{r.rtype}\t"
             f"{r.category}\t{r.amount:.2f}\t{r.note}"
         )
+    if not n:
+        print("no records")
+
+
+def _parse_quarter(s: str) -> Tuple[int, int]:
+    try:
+        year, q = s.upper().split("-Q")
+        return int(year), int(q)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError("quarter must be YYYY-Qn") from exc
+
+
+def _stats_range(args: argparse.Namespace) -> Tuple[date, date, str]:
+    """[start, end) and a label from --month/--year/--quarter/--last/--start."""
+    picked = [k for k in ("month", "year", "quarter", "last", "start") if getattr(args, k) is not None]
+    if len(picked) != 1:
+        raise SystemExit("pick exactly one of --month, --year, --quarter, --last or --start/--end")
+    try:
+        if args.month:
+            year, month = _parse_month(args.month)
+            return (*month_range(year, month), f"{year}-{month:02d}")
+        if args.year is not None:
+            return (*year_range(args.year), str(args.year))
+        if args.quarter:
+            year, q = args.quarter
+            return (*quarter_range(year, q), f"{year}-Q{q}")
+        if args.last is not None:
+            start, end = last_months(args.last, date.today())
+            return start, end, f"last {args.last} months"
+    except (ValueError, argparse.ArgumentTypeError) as e:
+        raise SystemExit(str(e))
+    end = args.end or date.today() + timedelta(days=1)
+    if end <= args.start:
+        raise SystemExit("--end must be after --start")
+    return args.start, end, f"{args.start.isoformat()}..{(end - timedelta(days=1)).isoformat()}"
+
+
+def _add_range_args(p: argparse.ArgumentParser) -> None:
+    """Options read by ``_stats_range``."""
+    p.add_argument("--month", help="YYYY-MM")
+    p.add_argument("--year", type=int, help="YYYY")
+    p.add_argument("--quarter", type=_parse_quarter, help="YYYY-Qn")
+    p.add_argument("--last", type=int, metavar="N", help="last N months including this one")
+    p.add_argument("--start", type=_parse_day, help="YYYY-MM-DD (inclusive)")
+    p.add_argument("--end", type=_parse_day, help="YYYY-MM-DD (exclusive, default: tomorrow)")
 
 
 def cmd_stats(args: argparse.Namespace) -> None:
     sess = _require_login(args.db)
-    session = _get_session(args.db)
-    user = _get_current_user(session, sess.user)
-    year, month = _parse_month(args.month)
-    recs = list(_iter_month_records(session, user, year, month))
-    svc = StatisticsService()
-    summary = svc.monthly_summary(recs)
-    by_cat = svc.by_category(recs)
-
-    print(f"Summary for {user.name} {year}-{month:02d}")
-    print(f"  income : {summary['income']:.2f}")
-    print(f"  expense: {summary['expense']:.2f}")
-    print(f"  balance: {summary['balance']:.2f}")
-    if by_cat:
-        print("  expense by category:")
-        for k, v in by_cat.items():
-            print(f"    {k}: {v:.2f}")
+    home = _get_read_session(args.db)
+    user = _get_current_user(home, sess.user)
+    session = _get_data_session(args.db, home, user, readonly=True)
+    start, end, label = _stats_range(args)
+    if args.histogram is not None and args.histogram < 1:
+        raise SystemExit("--histogram needs at least 1 bin")
+    repo = SqliteRecordRepository(session)
+    if args.currency:
+        if args.by_tag or args.quantiles or args.histogram is not None:
+            raise SystemExit("--currency cannot be combined with --by-tag, --quantiles or --histogram")
+        # 按 (类型, 分类, 币种, 日) 预聚合后整列换算；汇率表是全局的，放在目录库
+        try:
+            currency = normalize_currency(args.currency)
+            totals, cat_totals, raw_series = StatisticsService().converted(
+                repo.daily_by_currency(user.user_id, start, end),
+                _fx(home),
+                currency,
+                depth=args.depth,
+                parent=args.parent,
+                bucket=(start, end, args.by) if args.by else None,
+            )
+        except ValueError as e:
+            raise SystemExit(str(e))
+        label += f" in {currency}"
+    else:
+        # 直接在库里聚合：分类分组走整数 category_id，时间序列一条 GROUP BY，不取明细；
+        # 外币记录另查一次（部分索引），按当日汇率补差到本位币
+        fx = _fx(home)
+        try:
+            totals = repo.totals_by_type(user.user_id, start, end, fx=fx)
+            cat_totals = repo.totals_by_category(
+                user.user_id, start, end, depth=args.depth, parent=args.parent, fx=fx
+            )
+            raw_series = repo.series_by_type(user.user_id, start, end, args.by, fx=fx) if args.by else {}
+            tag_totals = repo.totals_by_tag(user.user_id, start, end, fx=fx) if args.by_tag else {}
+        except ValueError as e:
+            raise SystemExit(str(e))
+    income, expense = totals[RecordType.INCOME.value], totals[RecordType.EXPENSE.value]
+    summary = {"income": round(income, 2), "expense": round(expense, 2), "balance": round(income - expense, 2)}
+    by_cat = {k: round(v, 2) for k, v in sorted(cat_totals.items())}
+    by_tag = {k: round(v, 2) for k, v in sorted(tag_totals.items())} if args.by_tag else {}
+    series = StatisticsService().trend(raw_series) if args.by else []
+    sketches = (
+        repo.amount_sketches(user.user_id, start, end, depth=args.depth, parent=args.parent)
+        if args.quantiles or args.histogram
+        else {}
+    )
+    quantiles = StatisticsService().quantiles(sketches) if args.quantiles else {}
+    histogram = []
+    if args.histogram:
+        merged = QuantileSketch()
+        for sk in sketches.values():
+            merged.merge(sk)
+        histogram = merged.histogram(args.histogram)
+
+    if args.json:
+        doc = {
+            "user": user.name,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "summary": summary,
+            "expense_by_category": by_cat,
+        }
+        if args.currency:
+            doc["currency"] = currency
+        if args.by_tag:
+            doc["expense_by_tag"] = by_tag
+        if args.by:
+            doc["bucket"] = args.by
+            doc["series"] = [{**row, "bucket": row["bucket"].isoformat()} for row in series]
+        if args.quantiles:
+            doc["expense_quantiles"] = quantiles
+        if args.histogram:
+            doc["expense_histogram"] = [{"low": lo, "high": hi, "count": n} for lo, hi, n in histogram]
+        print(json.dumps(doc, ensure_ascii=False, indent=2))
+    else:
+        print(f"Summary for {user.name} {label}")
+        print(f"  income : {summary['income']:.2f}")
+        print(f"  expense: {summary['expense']:.2f}")
+        print(f"  balance: {summary['balance']:.2f}")
+        if by_cat:
+            print("  expense by category:")
+            for k, v in by_cat.items():
+                print(f"    {k}: {v:.2f}")
+        if by_tag:
+            print("  expense by tag:")
+            for k, v in by_tag.items():
+                print(f"    {k}: {v:.2f}")
+        if series:
+            print(f"  by {args.by}:")
+            print(f"    {args.by:<10}  {'income':>10}  {'expense':>10}  {'net':>10}  {'cumulative':>10}")
+            for row in series:
+                print(
+                    f"    {row['bucket'].isoformat():<10}  {row['income']:>10.2f}  {row['expense']:>10.2f}"
+                    f"  {row['net']:>10.2f}  {row['cumulative']:>10.2f}"
+                )
+        if quantiles:
+            keys = [k for k in next(iter(quantiles.values())) if k != "count"]
+            print("  expense size (within 1%):")
+            print(f"    {'category':<20}  {'count':>6}" + "".join(f"  {k:>9}" for k in keys))
+            for cat, row in quantiles.items():
+                name = "(all)" if cat == "*" else cat
+                print(f"    {name:<20}  {row['count']:>6}" + "".join(f"  {row[k]:>9.2f}" for k in keys))
+        if histogram:
+            print("  expense size histogram:")
+            for lo, hi, n in histogram:
+                print(f"    {lo:>10.2f} - {hi:<10.2f} {n}")
 
     if args.plot:
         reports_dir = Path(args.reports_dir or "reports")
         _ensure_reports_dir(reports_dir)
+        tag = label.replace(" ", "_").replace("..", "_")
         labels = list(by_cat.keys())
         values = list(by_cat.values())
         if values:
@@ -195,84 +513,264 @@ def cmd_stats(args: argparse.Namespace) -> None:
 
             plt.figure()
             plt.pie(values, labels=labels, autopct="%1.1f%%")  # 不显式设置颜色
-            out = reports_dir / f"expenses_by_category_{year}-{month:02d}.png"
-            plt.title(f"Expenses by Category {year}-{month:02d}")
+            out = reports_dir / f"expenses_by_category_{tag}.png"
+            plt.title(f"Expenses by Category {label}")
             plt.savefig(out, bbox_inches="tight")
             plt.close()
             print(f"saved plot: {out}")
+        if series:
+            import matplotlib.pyplot as plt
+
+            xs = [row["bucket"] for row in series]
+            plt.figure()
+            plt.plot(xs, [row["income"] for row in series], marker="o", label="income")
+            plt.plot(xs, [row["expense"] for row in series], marker="o", label="expense")
+            plt.legend()
+            plt.gcf().autofmt_xdate()
+            out = reports_dir / f"trend_by_{args.by}_{tag}.png"
+            plt.title(f"Income vs expense by {args.by}, {label}")
+            plt.savefig(out, bbox_inches="tight")
+            plt.close()
+            print(f"saved plot: {out}")
+
+
+# ---------- top-N (login required) ----------
+def _top_session(args: argparse.Namespace):
+    if args.limit < 1:
+        raise SystemExit("--limit must be >= 1")
+    sess = _require_login(args.db)
+    home = _get_read_session(args.db)
+    user = _get_current_user(home, sess.user)
+    session = _get_data_session(args.db, home, user, readonly=True)
+    start, end, label = _stats_range(args)
+    return user, TopService(SqliteRecordRepository(session), _fx(home)), start, end, label
+
+
+def cmd_top_records(args: argparse.Namespace) -> None:
+    user, svc, start, end, label = _top_session(args)
+    rtype = RecordType(args.type)
+    recs = svc.largest(user.user_id, start, end, args.limit, rtype)
+    print(f"Largest {rtype.value.lower()} records for {user.name} {label}")
+    for r in recs:
+        print(
+            f"#{r.record_id}\t{r.occurred_on.isoformat()}\t{r.category}\t"
+            f"{r.amount:.2f}{_currency_suffix(r.currency)}\t{r.note}"
+        )
+
+
+def cmd_top_categories(args: argparse.Namespace) -> None:
+    user, svc, start, end, label = _top_session(args)
+    try:
+        top = svc.top_categories(user.user_id, start, end, args.limit, depth=args.depth)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"Top expense categories for {user.name} {label}")
+    for cat, total in top:
+        print(f"  {cat}: {total:.2f}")
+
+
+def cmd_top_notes(args: argparse.Namespace) -> None:
+    user, svc, start, end, label = _top_session(args)
+    try:
+        ranks, exact = svc.top_notes(user.user_id, start, end, args.limit, by=args.by)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"Top notes by {args.by} for {user.name} {label}" + ("" if exact else " (approximate)"))
+    for r in ranks:
+        err = f"\t±{r.error:g}" if r.error else ""
+        print(f"  {r.note}\t{r.count}x\t{r.amount:.2f}{err}")
+
+
+# ---------- tags (login required) ----------
+def _tag_repo(args: argparse.Namespace, *, readonly: bool = False):
+    sess = _require_login(args.db)
+    session = _get_read_session(args.db) if readonly else _get_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user, readonly=readonly)
+    return SqliteRecordRepository(session), user
+
+
+def cmd_tag_add(args: argparse.Namespace) -> None:
+    repo, user = _tag_repo(args)
+    n = repo.tag(user.user_id, args.id, args.tag)
+    print(f"tagged: {n} new record/tag pairs")
+
+
+def cmd_tag_remove(args: argparse.Namespace) -> None:
+    repo, user = _tag_repo(args)
+    n = repo.untag(user.user_id, args.id, args.tag)
+    print(f"untagged: {n} record/tag pairs")
+
+
+def cmd_tag_list(args: argparse.Namespace) -> None:
+    repo, user = _tag_repo(args, readonly=True)
+    counts = repo.tag_counts(user.user_id)
+    if not counts:
+        print("no tags")
+        return
+    for name, n in counts.items():
+        print(f"{name}\t{n}")
 
 
 # ---------- budgets (login required) ----------
-def cmd_budget_set(args: argparse.Namespace) -> None:
-    from sqlalchemy import insert
+def _budget_label(b: Budget) -> str:
+    if b.period == "CUSTOM":
+        return f"CUSTOM {b.start.isoformat()}..{(b.end - timedelta(days=1)).isoformat()}"
+    return b.period
+
 
+def cmd_budget_set(args: argparse.Namespace) -> None:
     sess = _require_login(args.db)
     session = _get_session(args.db)
     user = _get_current_user(session, sess.user)
-    session.execute(
-        budgets.delete().where(
-            budgets.c.user_id == user.user_id, budgets.c.category == args.category
-        )
+    session = _get_data_session(args.db, session, user)
+    b = Budget(
+        None, user.user_id, args.category, float(args.limit), args.period.upper(), args.start, args.end
     )
-    session.execute(
-        insert(budgets).values(
-            user_id=user.user_id,
-            category=args.category,
-            monthly_limit=float(args.limit),
-        )
-    )
-    session.commit()
-    print(f"budget set: category={args.category} limit={float(args.limit):.2f}")
+    try:
+        validate_budget(b)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    SqliteBudgetRepository(session).set(b)
+    print(f"budget set: category={args.category} limit={float(args.limit):.2f} period={_budget_label(b)}")
 
 
 def cmd_budget_list(args: argparse.Namespace) -> None:
-    from sqlalchemy import select
-
     sess = _require_login(args.db)
-    session = _get_session(args.db)
+    session = _get_read_session(args.db)
     user = _get_current_user(session, sess.user)
-    rows = session.execute(
-        select(budgets.c.category, budgets.c.monthly_limit).where(
-            budgets.c.user_id == user.user_id
-        )
-    ).all()
+    session = _get_data_session(args.db, session, user, readonly=True)
+    rows = SqliteBudgetRepository(session).list_by_user(user.user_id)
     if not rows:
         print("no budgets")
         return
-    for row in rows:
-        print(f"{row.category}\t{row.monthly_limit:.2f}")
+    for b in rows:
+        print(f"{b.category}\t{b.monthly_limit:.2f}\t{_budget_label(b)}")
 
 
 def cmd_budget_progress(args: argparse.Namespace) -> None:
-    from sqlalchemy import select
-
     sess = _require_login(args.db)
-    session = _get_session(args.db)
-    user = _get_current_user(session, sess.user)
-    year, month = _parse_month(args.month)
+    home = _get_read_session(args.db)
+    user = _get_current_user(home, sess.user)
+    session = _get_data_session(args.db, home, user, readonly=True)
+    if not args.all_periods and not args.month:
+        raise SystemExit("pass --month YYYY-MM or --all-periods")
+    repo = SqliteBudgetRepository(session)
+    svc = BudgetService()
+    all_budgets = svc.select(repo.list_by_user(user.user_id), parent=args.parent, depth=args.depth)
+    if args.all_periods:
+        on = args.on or date.today()
+        windows = svc.windows(all_budgets, on)
+    else:
+        year, month = _parse_month(args.month)
+        all_budgets = [b for b in all_budgets if b.period == "MONTHLY"]
+        windows = {b.budget_id: month_range(year, month) for b in all_budgets}
+    if not windows:
+        print("no budgets")
+        return
+    # 进度只读 daily_spend 汇总表，每个不同的周期窗口一条聚合查询（外币部分按汇率补差）
+    try:
+        spent = repo.spent(user.user_id, windows, fx=_fx(home))
+    except ValueError as e:
+        raise SystemExit(str(e))
+    statuses = svc.statuses(all_budgets, windows, spent)
 
-    b_rows = session.execute(
-        select(budgets.c.category, budgets.c.monthly_limit).where(
-            budgets.c.user_id == user.user_id
+    if not args.all_periods:
+        print(f"Budget progress for {user.name} {year}-{month:02d}")
+        for st in sorted(statuses, key=lambda st: st.budget.category):
+            flag = " !!" if st.ratio >= 0.8 else ""  # 80% 预警
+            print(f"  {st.budget.category}: {st.ratio * 100.0:.1f}%{flag}")
+        return
+    print(f"Budget progress for {user.name} as of {on.isoformat()}")
+    order = {p: i for i, p in enumerate(BUDGET_PERIODS)}
+    for st in sorted(statuses, key=lambda st: (order[st.budget.period], st.budget.category, st.start)):
+        flag = " !!" if st.ratio >= 0.8 else ""
+        last = (st.end - timedelta(days=1)).isoformat()
+        print(
+            f"  [{st.budget.period} {st.start.isoformat()}..{last}] {st.budget.category}: "
+            f"{st.spent:.2f} / {st.budget.monthly_limit:.2f} ({st.ratio * 100.0:.1f}%){flag}"
         )
-    ).all()
-    if not b_rows:
-        print("no budgets")
+
+
+def _forecast_line(f) -> str:
+    flag = " !!" if f.over else ""
+    limit = f" / {f.limit:.2f}" if f.limit is not None else ""
+    return f"  {f.category}: spent {f.spent:.2f}, projected {f.projected:.2f}{limit}{flag}"
+
+
+def _print_forecast(f) -> None:
+    print(_forecast_line(f))
+
+
+def _skipped_line(skipped) -> str:
+    names = ", ".join(sorted(f"{b.category} ({b.period.lower()})" for b in skipped))
+    return f"skipped {len(skipped)} non-monthly budget(s), forecasts cover monthly budgets only: {names}"
+
+
+def cmd_budget_forecast(args: argparse.Namespace) -> None:
+    from sqlalchemy import select
+    from ..repo.sqlite_schema import users
+
+    on = args.on or date.today()
+    try:
+        svc = ForecastService(history_months=args.history)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if args.all:
+        # 夜间批处理：不需要登录，逐分片运行；各用户的明细只写进报告文件，不打印到终端
+        if not args.out:
+            raise SystemExit("--all writes a report file; pass --out PATH")
+        session = _get_read_session(args.db)
+        router = get_router(args.db)
+        fx = _fx(session)
+
+        def per_db(s, _sid=None):
+            skipped = len(svc.skipped(SqliteBudgetRepository(s).list_all()))
+            return svc.at_risk(s, on, fx), skipped
+
+        try:
+            parts = [per_db(session)] if router is None else router.fan_out(per_db, readonly=True).values()
+            flagged, skipped = {}, 0
+            for part, n in parts:
+                flagged.update(part)
+                skipped += n
+        except ValueError as e:
+            raise SystemExit(str(e))
+        names = dict(session.execute(select(users.c.user_id, users.c.name)).all())
+        lines = [f"Budgets at risk as of {on.isoformat()}: {len(flagged)} user(s)"]
+        if skipped:
+            lines.append(f"({skipped} non-monthly budget(s) not forecast)")
+        for uid in sorted(flagged):
+            lines.append(f"{names.get(uid, uid)}:")
+            lines.extend(_forecast_line(f) for f in flagged[uid])
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.touch(mode=0o600)
+        out.chmod(0o600)  # 已存在的旧报告也收紧权限
+        out.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        print(f"{len(flagged)} user(s) with budgets at risk; report written to {out}")
         return
 
-    recs = list(_iter_month_records(session, user, year, month))
-    b_objs = [
-        Budget(None, user.user_id, row.category, float(row.monthly_limit))
-        for row in b_rows
-    ]
-    svc = BudgetService()
-    prog = svc.progress(b_objs, recs)
-    print(f"Budget progress for {user.name} {year}-{month:02d}")
-    for cat in sorted(prog.keys()):
-        ratio = prog[cat]
-        pct = ratio * 100.0
-        flag = " !!" if ratio >= 0.8 else ""  # 80% 预警
-        print(f"  {cat}: {pct:.1f}%{flag}")
+    sess = _require_login(args.db)
+    home = _get_read_session(args.db)
+    user = _get_current_user(home, sess.user)
+    session = _get_data_session(args.db, home, user, readonly=True)
+    try:
+        per_cat, per_budget = svc.forecast_user(session, user.user_id, on, _fx(home))
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"Month-end forecast for {user.name} as of {on.isoformat()}")
+    if args.categories:
+        for f in sorted(per_cat, key=lambda f: f.category):
+            _print_forecast(f)
+        return
+    skipped = svc.skipped(SqliteBudgetRepository(session).list_by_user(user.user_id))
+    if not per_budget:
+        print("no monthly budgets")
+    for f in sorted(per_budget, key=lambda f: f.category):
+        _print_forecast(f)
+    if skipped:
+        print(_skipped_line(skipped))
 
 
 # ---------- reminders (login required) ----------
@@ -282,6 +780,7 @@ def cmd_reminder_set(args: argparse.Namespace) -> None:
     sess = _require_login(args.db)
     session = _get_session(args.db)
     user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user)
     at = time.fromisoformat(args.time)
     msg = args.message or "记账提醒"
     enabled = True if args.enabled else False if args.disable else True
@@ -298,8 +797,9 @@ def cmd_reminder_list(args: argparse.Namespace) -> None:
     from sqlalchemy import select
 
     sess = _require_login(args.db)
-    session = _get_session(args.db)
+    session = _get_read_session(args.db)
     user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user, readonly=True)
     rows = session.execute(
         select(
             reminders.c.reminder_id,
@@ -324,6 +824,7 @@ def cmd_reminder_emit(args: argparse.Namespace) -> None:
     sess = _require_login(args.db)
     session = _get_session(args.db)
     user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user)
     rows = session.execute(
         select(reminders.c.message, reminders.c.at, reminders.c.enabled).where(
             reminders.c.user_id == user.user_id
@@ -335,34 +836,294 @@ def cmd_reminder_emit(args: argparse.Namespace) -> None:
     svc.emit(r_objs)
 
 
+# ---------- category rules (login required) ----------
+def _describe_rule(r: CategoryRule) -> str:
+    what = []
+    if r.pattern is not None:
+        what.append(f"/{r.pattern}/" if r.kind == "regex" else repr(r.pattern))
+    if r.min_amount is not None or r.max_amount is not None:
+        lo = "" if r.min_amount is None else f"{r.min_amount:.2f}"
+        hi = "" if r.max_amount is None else f"{r.max_amount:.2f}"
+        what.append(f"amount [{lo}, {hi}]")
+    return f"rule #{r.rule_id} {' '.join(what)} -> {r.category}"
+
+
+def _rule_engine(session, user_id: int) -> RuleEngine:
+    rules = SqliteRuleRepository(session).list_by_user(user_id)
+    if not rules:
+        raise SystemExit("no category rules; add some with: rule add")
+    return RuleEngine(rules)
+
+
+def _print_rule_report(engine: RuleEngine, report: RuleReport) -> None:
+    for r in engine.rules:
+        if report.hits[r.rule_id]:
+            print(f"{_describe_rule(r)}: {report.hits[r.rule_id]} rows")
+    print(f"unmatched: {report.unmatched} rows")
+
+
+def cmd_rule_add(args: argparse.Namespace) -> None:
+    sess = _require_login(args.db)
+    session = _get_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user)
+    rule = CategoryRule(
+        rule_id=None,
+        user_id=user.user_id,
+        category=args.category,
+        pattern=args.regex if args.regex is not None else args.keyword,
+        kind="regex" if args.regex is not None else "keyword",
+        min_amount=args.min_amount,
+        max_amount=args.max_amount,
+        priority=args.priority,
+    )
+    try:
+        validate_rule(rule)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    rule = SqliteRuleRepository(session).add(rule)
+    print(f"added {_describe_rule(rule)}")
+
+
+def cmd_rule_list(args: argparse.Namespace) -> None:
+    sess = _require_login(args.db)
+    session = _get_read_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user, readonly=True)
+    rules = SqliteRuleRepository(session).list_by_user(user.user_id)
+    if not rules:
+        print("no rules")
+        return
+    for r in rules:
+        print(f"{_describe_rule(r)} (priority {r.priority})")
+
+
+def cmd_rule_remove(args: argparse.Namespace) -> None:
+    sess = _require_login(args.db)
+    session = _get_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user)
+    if not SqliteRuleRepository(session).remove(user.user_id, args.id):
+        raise SystemExit(f"rule #{args.id} not found")
+    print(f"removed rule #{args.id}")
+
+
+# ---------- anomaly statistics (login required) ----------
+def cmd_anomaly_stats(args: argparse.Namespace) -> None:
+    sess = _require_login(args.db)
+    session = _get_read_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user, readonly=True)
+    stats = SqliteCategoryStatsRepository(session).for_user(user.user_id)
+    if not stats:
+        print("no expenses")
+        return
+    for cat in sorted(stats):
+        st = stats[cat]
+        print(f"{cat}\tn={st.n}\tmean={st.mean:.2f}\tstd={st.std:.2f}")
+
+
+def cmd_anomaly_rebuild(args: argparse.Namespace) -> None:
+    sess = _require_login(args.db)
+    session = _get_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user)
+    n = SqliteCategoryStatsRepository(session).rebuild(user.user_id)
+    print(f"rebuilt statistics for {n} categories")
+
+
+# ---------- FX rates (shared by all users) ----------
+def cmd_fx_load(args: argparse.Namespace) -> None:
+    try:
+        rows = load_rates_from_csv(args.path)
+    except (FileNotFoundError, ValueError) as e:
+        raise SystemExit(str(e))
+    n = SqliteFxRepository(_get_session(args.db)).load(rows)
+    print(f"loaded {n} rates ({BASE_CURRENCY} per unit)")
+
+
+def cmd_fx_list(args: argparse.Namespace) -> None:
+    rows = SqliteFxRepository(_get_read_session(args.db)).summary()
+    if not rows:
+        print("no FX rates; run: fx load --path rates.csv")
+        return
+    for cur, n, first, last in rows:
+        print(f"{cur}\t{n} rates\t{first.isoformat()}..{last.isoformat()}")
+
+
+# ---------- recurring templates (login required) ----------
+def _describe_template(t: RecurringTemplate) -> str:
+    unit = {"DAILY": "day", "WEEKLY": "week", "MONTHLY": "month"}[t.freq]
+    every = f"every {t.every} {unit}s" if t.every > 1 else f"every {unit}"
+    until = f" until {t.end.isoformat()}" if t.end else ""
+    note = f" ({t.note})" if t.note else ""
+    return (
+        f"#{t.template_id} {t.rtype.value} {t.category} {t.amount:.2f}{note} {every} "
+        f"from {t.start.isoformat()}{until}"
+    )
+
+
+def cmd_recurring_add(args: argparse.Namespace) -> None:
+    sess = _require_login(args.db)
+    session = _get_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user)
+    tpl = RecurringTemplate(
+        template_id=None,
+        user_id=user.user_id,
+        rtype=RecordType(args.type),
+        category=args.category,
+        amount=float(args.amount),
+        freq=args.freq,
+        start=args.start,
+        end=args.end,
+        note=args.note or "",
+        every=args.every,
+    )
+    try:
+        validate_template(tpl)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    tpl = SqliteRecurringRepository(session).add(tpl)
+    print(f"added {_describe_template(tpl)}")
+
+
+def cmd_recurring_list(args: argparse.Namespace) -> None:
+    sess = _require_login(args.db)
+    session = _get_read_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user, readonly=True)
+    templates = SqliteRecurringRepository(session).list_by_user(user.user_id)
+    if not templates:
+        print("no recurring templates")
+        return
+    for t in templates:
+        done = t.end is not None and t.next_on > t.end
+        print(f"{_describe_template(t)}; " + ("finished" if done else f"next {t.next_on.isoformat()}"))
+
+
+def cmd_recurring_remove(args: argparse.Namespace) -> None:
+    sess = _require_login(args.db)
+    session = _get_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user)
+    if not SqliteRecurringRepository(session).remove(user.user_id, args.id):
+        raise SystemExit(f"recurring template #{args.id} not found")
+    print(f"removed recurring template #{args.id} (records already generated are kept)")
+
+
+def cmd_recurring_run(args: argparse.Namespace) -> None:
+    until = args.until or date.today()
+    if args.all:
+        # 定时任务：不需要登录，每个分片一趟
+        router = get_router(args.db)
+        if router is None:
+            res = RecurringService(_get_session(args.db)).materialize(until)
+        else:
+            res = MaterializeResult()
+            for part in router.fan_out(lambda s, _sid: RecurringService(s).materialize(until)).values():
+                res.templates += part.templates
+                res.generated += part.generated
+    else:
+        sess = _require_login(args.db)
+        session = _get_session(args.db)
+        user = _get_current_user(session, sess.user)
+        session = _get_data_session(args.db, session, user)
+        res = RecurringService(session).materialize(until, user.user_id)
+    print(f"generated {res.generated} records from {res.templates} templates through {until.isoformat()}")
+
+
 # ---------- CSV (login required) ----------
 def cmd_import_csv(args: argparse.Namespace) -> None:
     sess = _require_login(args.db)
     session = _get_session(args.db)
     user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user)
     repo = SqliteRecordRepository(session)
-    svc = RecordService(repo)
-    records = load_records_from_csv(args.path)
-    count = 0
-    for r in records:
-        r = Record(
-            None,
-            user.user_id,
-            r.rtype,
-            r.category,
-            float(r.amount),
-            r.occurred_on,
-            r.note or "",
+    engine = _rule_engine(session, user.user_id) if args.rules else None
+    stats = None if args.no_anomalies else SqliteCategoryStatsRepository(session)
+    try:
+        svc = ImportService(
+            repo, SqliteImportCheckpointRepository(session), chunk_size=args.batch_size, rules=engine,
+            stats=stats, anomaly_threshold=args.anomaly_threshold,
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    try:
+        res = svc.import_csv(
+            user.user_id, args.path, resume=args.resume, quarantine=args.quarantine
+        )
+    except ImportInterrupted as e:
+        raise SystemExit(
+            f"interrupted: {e.result.total} rows committed so far; "
+            f"rerun with --resume to continue"
         )
-        svc.create_record(r)
-        count += 1
-    print(f"imported {count} records for user {user.name}")
+    if res.already_done:
+        print(f"{args.path} already imported for user {user.name} (batch {res.batch})")
+        return
+    if res.resumed_at_row:
+        print(f"resumed at row {res.resumed_at_row}")
+    print(
+        f"imported {res.inserted} records for user {user.name} "
+        f"({res.duplicates} duplicates skipped, batch {res.batch})"
+    )
+    if res.rejected:
+        print(f"rejected {res.rejected} invalid rows -> {res.quarantine}")
+    if res.rules is not None:
+        _print_rule_report(engine, res.rules)
+    _print_anomalies(res.anomalies)
+
+
+def _line(r: Record) -> str:
+    ref = f"#{r.record_id} " if r.record_id else ""
+    return f"{ref}{r.occurred_on.isoformat()} {r.rtype.value} {r.category} {r.amount:.2f} {r.note}".rstrip()
+
+
+def cmd_reconcile(args: argparse.Namespace) -> None:
+    sess = _require_login(args.db)
+    session = _get_read_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user, readonly=True)
+    try:
+        statement = load_records_from_csv(args.path)
+    except (FileNotFoundError, ValueError) as e:
+        raise SystemExit(str(e))
+    if not statement:
+        raise SystemExit("statement is empty")
+    if args.tolerance < 0:
+        raise SystemExit("--tolerance must be >= 0")
+    tol = timedelta(days=args.tolerance)
+    start = min(r.occurred_on for r in statement) - tol
+    end = max(r.occurred_on for r in statement) + tol + timedelta(days=1)
+    ledger = SqliteRecordRepository(session).list_by_period(user.user_id, start, end)
+    try:
+        res = reconcile(statement, ledger, tolerance_days=args.tolerance, min_similarity=args.min_similarity)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(
+        f"Reconciled {len(statement)} statement lines against {user.name}'s records "
+        f"{(start + tol).isoformat()}..{(end - tol - timedelta(days=1)).isoformat()}: "
+        f"{len(res.matched)} matched, {len(res.missing)} missing, {len(res.extra)} extra"
+    )
+    if args.matched and res.matched:
+        print("matched:")
+        for m in res.matched:
+            print(f"  {_line(m.statement)} <-> #{m.record.record_id} ({m.days:+d}d, note {m.similarity:.2f})")
+    if res.missing:
+        print("missing from ledger:")
+        for r in sorted(res.missing, key=lambda r: r.occurred_on):
+            print(f"  {_line(r)}")
+    if res.extra:
+        print("not on statement:")
+        for r in sorted(res.extra, key=lambda r: (r.occurred_on, r.record_id)):
+            print(f"  {_line(r)}")
 
 
 def cmd_export_csv(args: argparse.Namespace) -> None:
     sess = _require_login(args.db)
-    session = _get_session(args.db)
+    session = _get_read_session(args.db)
     user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user, readonly=True)
     year, month = _parse_month(args.month) if args.month else (None, None)
     repo = SqliteRecordRepository(session)
     svc = RecordService(repo)
@@ -377,6 +1138,180 @@ def cmd_export_csv(args: argparse.Namespace) -> None:
     print(f"exported {len(recs)} records to {args.path}")
 
 
+# ---------- bulk operations (login required) ----------
+def _bulk_session(args: argparse.Namespace):
+    sess = _require_login(args.db)
+    session = _get_session(args.db)
+    user = _get_current_user(session, sess.user)
+    session = _get_data_session(args.db, session, user)
+    flt = RecordFilter(
+        user_id=user.user_id,
+        start=args.start,
+        end=args.end,
+        category=args.category,
+        keyword=args.keyword,
+        import_batch=args.batch,
+    )
+    return session, flt
+
+
+def _bulk_repo(args: argparse.Namespace) -> Tuple[SqliteRecordRepository, RecordFilter]:
+    session, flt = _bulk_session(args)
+    return SqliteRecordRepository(session), flt
+
+
+def _bulk_report(verb: str, n: int, dry_run: bool) -> None:
+    print(f"would {verb} {n} records (dry run)" if dry_run else f"{verb}: {n} records")
+
+
+def cmd_bulk_recategorize(args: argparse.Namespace) -> None:
+    session, flt = _bulk_session(args)
+    repo = SqliteRecordRepository(session)
+    if args.rules:
+        engine = _rule_engine(session, flt.user_id)
+        report = recategorize_by_rules(repo, flt, engine, dry_run=args.dry_run)
+        _bulk_report("recategorize", report.matched, args.dry_run)
+        _print_rule_report(engine, report)
+        return
+    n = repo.recategorize(flt, args.new_category, dry_run=args.dry_run)
+    _bulk_report("recategorize", n, args.dry_run)
+
+
+def cmd_bulk_shift_dates(args: argparse.Namespace) -> None:
+    repo, flt = _bulk_repo(args)
+    n = repo.shift_dates(flt, args.days, dry_run=args.dry_run)
+    _bulk_report("shift", n, args.dry_run)
+
+
+def cmd_bulk_delete(args: argparse.Namespace) -> None:
+    repo, flt = _bulk_repo(args)
+    try:
+        n = repo.delete_where(flt, dry_run=args.dry_run)
+    except ValueError as e:
+        raise SystemExit(f"{e}; pass at least one of --start/--end/--category/--keyword/--batch")
+    _bulk_report("delete", n, args.dry_run)
+
+
+# ---------- sharding ----------
+def cmd_shard_init(args: argparse.Namespace) -> None:
+    try:
+        router = init_shards(args.db, args.shards)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"sharding enabled: {len(router.shard_ids)} shards for {args.db}")
+
+
+def cmd_shard_rebalance(args: argparse.Namespace) -> None:
+    try:
+        res = rebalance(args.db, args.shards)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(
+        f"rebalanced to {res['shards']} shards: "
+        f"moved {res['moved_users']} users ({res['moved_rows']} rows)"
+    )
+
+
+def cmd_shard_report(args: argparse.Namespace) -> None:
+    from sqlalchemy import select
+    from ..repo.sqlite_schema import users
+
+    router = get_router(args.db)
+    if router is None:
+        raise SystemExit("sharding is not enabled; run: shard init --shards N")
+    year, month = _parse_month(args.month)
+    session = _get_read_session(args.db)
+    try:
+        totals = router.monthly_totals(year, month, _fx(session))
+    except ValueError as e:
+        raise SystemExit(str(e))
+    names = dict(session.execute(select(users.c.user_id, users.c.name)).all())
+    print(f"Batch report {year}-{month:02d} ({len(router.shard_ids)} shards)")
+    for uid in sorted(totals):
+        t = totals[uid]
+        print(
+            f"  {names.get(uid, uid)}\tshard={router.shard_for(uid)}\t"
+            f"income={t['INCOME']:.2f}\texpense={t['EXPENSE']:.2f}"
+        )
+
+
+# ---------- backup / restore ----------
+def _shard_backup_path(path: str, shard_id: int) -> str:
+    p = Path(path)
+    return str(p.with_name(f"shard{shard_id}-{p.name}"))
+
+
+def cmd_db_backup(args: argparse.Namespace) -> None:
+    init_db(db_url=args.db)
+    compress = True if args.compress else None
+    try:
+        res = backup_database(args.db, args.out, pages=args.pages, compress=compress, sleep=args.sleep)
+        print(f"backup written: {args.out} ({res['pages']} pages, {res['bytes']} bytes, {res['seconds']:.2f}s)")
+        router = get_router(args.db)
+        for sid in router.shard_ids if router else []:
+            out = _shard_backup_path(args.out, sid)
+            backup_database(router.shard_urls[sid], out, pages=args.pages, compress=compress, sleep=args.sleep)
+            print(f"backup written: {out}")
+    except (ValueError, FileNotFoundError, RuntimeError) as e:
+        raise SystemExit(str(e))
+
+
+def cmd_db_restore(args: argparse.Namespace) -> None:
+    try:
+        res = restore_database(args.db, args.src, pages=args.pages, sleep=args.sleep)
+        reset_router_cache(args.db)
+        router = get_router(args.db)
+        for sid in router.shard_ids if router else []:
+            restore_database(router.shard_urls[sid], _shard_backup_path(args.src, sid), pages=args.pages)
+    except (ValueError, FileNotFoundError, RuntimeError) as e:
+        raise SystemExit(str(e))
+    print(f"restored {args.db} from {args.src} ({res['pages']} pages); integrity ok")
+
+
+# ---------- incremental sync ----------
+def _require_unsharded(db_url: str) -> None:
+    # 各分片有自己的 change_log 和 seq，目录库里只有用户；同步只支持单库
+    if get_router(db_url) is not None:
+        raise SystemExit(
+            f"sync is not supported on a sharded ledger: {db_url} only holds users, "
+            "records live in the shard files"
+        )
+
+
+def cmd_sync_export(args: argparse.Namespace) -> None:
+    _require_unsharded(args.db)
+    session = _get_read_session(args.db)
+    batch = SqliteSyncRepository(session).export_since(args.since)
+    save_batch(args.out, batch)
+    print(
+        f"exported {len(batch['changes'])} changes (seq {batch['since']}..{batch['until']}) "
+        f"from node {batch['node']} to {args.out}"
+    )
+
+
+def cmd_sync_apply(args: argparse.Namespace) -> None:
+    _require_unsharded(args.db)
+    session = _get_session(args.db)
+    try:
+        batch = load_batch(args.path)
+        res = SqliteSyncRepository(session).apply(batch)
+    except (ValueError, FileNotFoundError) as e:
+        raise SystemExit(str(e))
+    print(
+        f"applied {res['applied']} changes from node {batch['node']} up to seq {batch['until']} "
+        f"(skipped {res['skipped']}, conflicts {res['conflicts']}, unknown user {res['unknown_user']})"
+    )
+
+
+def cmd_sync_status(args: argparse.Namespace) -> None:
+    _require_unsharded(args.db)
+    session = _get_read_session(args.db)
+    repo = SqliteSyncRepository(session)
+    print(f"node={repo.node_id()} latest_seq={repo.latest_seq()}")
+    for peer, seq in sorted(repo.peer_watermarks().items()):
+        print(f"  peer {peer}: applied up to seq {seq}")
+
+
 def cmd_init_db(args: argparse.Namespace) -> None:
     init_db(db_url=args.db)
     print(f"Initialized database at {args.db}")
@@ -431,40 +1366,175 @@ def main() -> None:
     p_add.add_argument("--amount", required=True, type=float)
     p_add.add_argument("--date", required=True, help="YYYY-MM-DD")
     p_add.add_argument("--note", default="")
+    p_add.add_argument("--currency", default=BASE_CURRENCY, help=f"ISO code (default {BASE_CURRENCY})")
+    p_add.add_argument(
+        "--anomaly-threshold", type=float, default=3.0, help="warn above mean + N std devs (default 3)"
+    )
     p_add.set_defaults(func=cmd_add)
 
     p_list = sub.add_parser("list", help="List records for a month", parents=[common])
     p_list.add_argument("--month", required=True, help="YYYY-MM")
+    p_list.add_argument("--balance", action="store_true", help="add a running balance column")
     p_list.set_defaults(func=cmd_list)
 
+    p_bal = sub.add_parser("balance", help="Balance at a date or over time", parents=[common])
+    p_bal.add_argument("--on", type=_parse_day, help="YYYY-MM-DD (default: today)")
+    p_bal.add_argument("--start", type=_parse_day, help="YYYY-MM-DD: show a balance series from here")
+    p_bal.add_argument("--end", type=_parse_day, help="YYYY-MM-DD (exclusive, default: tomorrow)")
+    p_bal.add_argument("--by", choices=BUCKETS, default="month", help="series bucket (default month)")
+    p_bal.set_defaults(func=cmd_balance)
+
+    p_query = sub.add_parser("query", help="Query records with combined filters", parents=[common])
+    p_query.add_argument("--start", type=_parse_day, help="YYYY-MM-DD (inclusive)")
+    p_query.add_argument("--end", type=_parse_day, help="YYYY-MM-DD (exclusive)")
+    p_query.add_argument("--type", choices=[e.name for e in RecordType])
+    p_query.add_argument("--category", action="append", help="repeatable: any of these categories")
+    p_query.add_argument("--min", type=float, help="minimum amount (inclusive)")
+    p_query.add_argument("--max", type=float, help="maximum amount (inclusive)")
+    p_query.add_argument("--keyword", help="substring of category or note")
+    p_query.add_argument(
+        "--sort", default="date", help=f"one of {', '.join(SORT_KEYS)}; prefix '-' for descending (--sort=-amount)"
+    )
+    p_query.add_argument("--limit", type=int)
+    p_query.add_argument("--offset", type=int, default=0)
+    p_query.add_argument("--tag", action="append", help="repeatable: must have all these tags")
+    p_query.add_argument("--without-tag", action="append", help="repeatable: must have none of these")
+    p_query.add_argument("--explain", action="store_true", help="print the SQLite query plan only")
+    p_query.set_defaults(func=cmd_query)
+
     p_stats = sub.add_parser(
-        "stats", help="Show monthly summary/plot", parents=[common]
+        "stats", help="Show summary / time series for a month or any range", parents=[common]
     )
-    p_stats.add_argument("--month", required=True, help="YYYY-MM")
+    _add_range_args(p_stats)
+    p_stats.add_argument("--by", choices=BUCKETS, help="also show a time series by day/week/month")
+    p_stats.add_argument("--json", action="store_true", help="print the result as JSON")
     p_stats.add_argument(
-        "--plot", action="store_true", help="Save a category pie chart to reports/"
+        "--plot", action="store_true", help="Save a category pie chart (and trend chart with --by) to reports/"
     )
     p_stats.add_argument(
         "--reports-dir", default="reports", help="Output folder for charts"
     )
+    p_stats.add_argument(
+        "--depth", type=int, help="roll subcategories up to this level (1 = top level)"
+    )
+    p_stats.add_argument("--parent", help="only this category subtree, e.g. Food")
+    p_stats.add_argument("--by-tag", action="store_true", help="also show expense per tag")
+    p_stats.add_argument(
+        "--quantiles", action="store_true", help=f"median/p90/p99 expense size per category ({BASE_CURRENCY} records only)"
+    )
+    p_stats.add_argument(
+        "--histogram", type=int, nargs="?", const=10, metavar="BINS", help=f"expense size histogram, {BASE_CURRENCY} records only (default 10 bins)"
+    )
+    p_stats.add_argument(
+        "--currency", help="convert every amount to this currency at its day's rate (see fx load)"
+    )
     p_stats.set_defaults(func=cmd_stats)
 
+    # recurring templates
+    p_recur = sub.add_parser("recurring", help="Recurring records (rent, salary, subscriptions)", parents=[common])
+    csub = p_recur.add_subparsers(dest="ccommand", required=True)
+
+    c_add = csub.add_parser("add", help="Add a recurring template", parents=[common])
+    c_add.add_argument("--type", required=True, choices=[e.name for e in RecordType])
+    c_add.add_argument("--category", required=True)
+    c_add.add_argument("--amount", required=True, type=float)
+    c_add.add_argument("--freq", required=True, type=str.upper, choices=FREQUENCIES)
+    c_add.add_argument("--every", type=int, default=1, help="repeat every N days/weeks/months (default 1)")
+    c_add.add_argument("--start", required=True, type=_parse_day, help="first occurrence YYYY-MM-DD")
+    c_add.add_argument("--end", type=_parse_day, help="last possible date YYYY-MM-DD (inclusive)")
+    c_add.add_argument("--note", default="")
+    c_add.set_defaults(func=cmd_recurring_add)
+
+    c_list = csub.add_parser("list", help="List recurring templates", parents=[common])
+    c_list.set_defaults(func=cmd_recurring_list)
+
+    c_rm = csub.add_parser("remove", help="Delete a recurring template", parents=[common])
+    c_rm.add_argument("--id", required=True, type=int)
+    c_rm.set_defaults(func=cmd_recurring_remove)
+
+    c_run = csub.add_parser("run", help="Generate every due occurrence", parents=[common])
+    c_run.add_argument("--until", type=_parse_day, help="generate through YYYY-MM-DD (default today)")
+    c_run.add_argument("--all", action="store_true", help="every user (scheduled job)")
+    c_run.set_defaults(func=cmd_recurring_run)
+
+    # reconciliation
+    p_rec = sub.add_parser("reconcile", help="Match a bank statement CSV against your records", parents=[common])
+    p_rec.add_argument("--path", required=True, help="statement CSV (same columns as import-csv)")
+    p_rec.add_argument("--tolerance", type=int, default=3, help="max days between statement and record date")
+    p_rec.add_argument(
+        "--min-similarity", type=float, default=0.0, help="required note similarity 0..1 (default 0: amount+date only)"
+    )
+    p_rec.add_argument("--matched", action="store_true", help="also list the matched pairs")
+    p_rec.set_defaults(func=cmd_reconcile)
+
+    # top-N
+    p_top = sub.add_parser("top", help="Largest records / categories / notes over a range", parents=[common])
+    osub = p_top.add_subparsers(dest="ocommand", required=True)
+    o_rec = osub.add_parser("records", help="Largest single records", parents=[common])
+    o_rec.add_argument("--type", default="EXPENSE", choices=[e.name for e in RecordType])
+    o_cat = osub.add_parser("categories", help="Categories with the most expense", parents=[common])
+    o_cat.add_argument("--depth", type=int, help="roll subcategories up to this level (1 = top level)")
+    o_note = osub.add_parser("notes", help="Most costly or most frequent notes (normalized)", parents=[common])
+    o_note.add_argument("--by", default="amount", choices=NOTE_RANKS)
+    for p, fn in ((o_rec, cmd_top_records), (o_cat, cmd_top_categories), (o_note, cmd_top_notes)):
+        _add_range_args(p)
+        p.add_argument("-n", "--limit", type=int, default=10, help="how many to show (default 10)")
+        p.set_defaults(func=fn)
+
+    # tags
+    p_tag = sub.add_parser("tag", help="Tag records", parents=[common])
+    tsub = p_tag.add_subparsers(dest="tcommand", required=True)
+
+    t_add = tsub.add_parser("add", help="Add tags to records", parents=[common])
+    t_add.add_argument("--id", required=True, type=int, action="append", help="record id (repeatable)")
+    t_add.add_argument("--tag", required=True, action="append", help="tag name (repeatable)")
+    t_add.set_defaults(func=cmd_tag_add)
+
+    t_rm = tsub.add_parser("remove", help="Remove tags from records", parents=[common])
+    t_rm.add_argument("--id", required=True, type=int, action="append", help="record id (repeatable)")
+    t_rm.add_argument("--tag", required=True, action="append", help="tag name (repeatable)")
+    t_rm.set_defaults(func=cmd_tag_remove)
+
+    t_list = tsub.add_parser("list", help="List tags with record counts", parents=[common])
+    t_list.set_defaults(func=cmd_tag_list)
+
     # budgets
     p_budget = sub.add_parser("budget", help="Manage budgets", parents=[common])
     bsub = p_budget.add_subparsers(dest="bcommand", required=True)
 
     b_set = bsub.add_parser("set", help="Set/update a budget", parents=[common])
     b_set.add_argument("--category", required=True)
-    b_set.add_argument("--limit", required=True, type=float)
+    b_set.add_argument("--limit", required=True, type=float, help="limit per period")
+    b_set.add_argument(
+        "--period", default="MONTHLY", type=str.upper, choices=BUDGET_PERIODS, help="default MONTHLY"
+    )
+    b_set.add_argument("--start", type=_parse_day, help="CUSTOM only: YYYY-MM-DD (inclusive)")
+    b_set.add_argument("--end", type=_parse_day, help="CUSTOM only: YYYY-MM-DD (exclusive)")
     b_set.set_defaults(func=cmd_budget_set)
 
     b_list = bsub.add_parser("list", help="List budgets", parents=[common])
     b_list.set_defaults(func=cmd_budget_list)
 
     b_prog = bsub.add_parser("progress", help="Show budget progress", parents=[common])
-    b_prog.add_argument("--month", required=True, help="YYYY-MM")
+    b_prog.add_argument("--month", help="YYYY-MM: monthly budgets for that month")
+    b_prog.add_argument(
+        "--all-periods", action="store_true", help="every budget in its current week/month/quarter/year"
+    )
+    b_prog.add_argument("--on", type=_parse_day, help="with --all-periods: evaluate as of YYYY-MM-DD")
+    b_prog.add_argument("--parent", help="only budgets in this category subtree")
+    b_prog.add_argument("--depth", type=int, help="only budgets down to this level")
     b_prog.set_defaults(func=cmd_budget_progress)
 
+    b_fc = bsub.add_parser("forecast", help="Project month-end spend for monthly budgets", parents=[common])
+    b_fc.add_argument("--on", type=_parse_day, help="forecast as of YYYY-MM-DD (default today)")
+    b_fc.add_argument("--history", type=int, default=6, help="past months used for the daily pattern")
+    b_fc.add_argument("--categories", action="store_true", help="per category instead of per budget")
+    b_fc.add_argument(
+        "--all", action="store_true", help="batch job: every user's budgets likely to be exceeded, written to --out"
+    )
+    b_fc.add_argument("--out", help="report file for --all (created owner-readable only)")
+    b_fc.set_defaults(func=cmd_budget_forecast)
+
     # reminders
     p_rem = sub.add_parser("reminder", help="Manage reminders", parents=[common])
     rsub = p_rem.add_subparsers(dest="rcommand", required=True)
@@ -483,11 +1553,61 @@ def main() -> None:
     r_emit = rsub.add_parser("emit", help="Emit enabled reminders", parents=[common])
     r_emit.set_defaults(func=cmd_reminder_emit)
 
+    # category rules
+    p_rule = sub.add_parser("rule", help="Auto-categorization rules", parents=[common])
+    usub = p_rule.add_subparsers(dest="ucommand", required=True)
+
+    u_add = usub.add_parser("add", help="Add a rule", parents=[common])
+    u_add.add_argument("--category", required=True)
+    u_pat = u_add.add_mutually_exclusive_group()
+    u_pat.add_argument("--keyword", help="case-insensitive substring of the note")
+    u_pat.add_argument("--regex", help="regular expression searched in the note")
+    u_add.add_argument("--min-amount", type=float)
+    u_add.add_argument("--max-amount", type=float)
+    u_add.add_argument("--priority", type=int, default=100, help="lower wins (default 100)")
+    u_add.set_defaults(func=cmd_rule_add)
+
+    u_list = usub.add_parser("list", help="List rules in evaluation order", parents=[common])
+    u_list.set_defaults(func=cmd_rule_list)
+
+    u_rm = usub.add_parser("remove", help="Delete a rule", parents=[common])
+    u_rm.add_argument("--id", required=True, type=int)
+    u_rm.set_defaults(func=cmd_rule_remove)
+
+    # anomaly statistics
+    p_anom = sub.add_parser("anomaly", help="Per-category expense statistics", parents=[common])
+    asub = p_anom.add_subparsers(dest="acommand", required=True)
+    a_stats = asub.add_parser("stats", help="Show count/mean/std per category", parents=[common])
+    a_stats.set_defaults(func=cmd_anomaly_stats)
+    a_reb = asub.add_parser("rebuild", help="Recompute the statistics from your records", parents=[common])
+    a_reb.set_defaults(func=cmd_anomaly_rebuild)
+
+    # FX rates
+    p_fx = sub.add_parser("fx", help="Exchange rates to the base currency", parents=[common])
+    fsub = p_fx.add_subparsers(dest="fcommand", required=True)
+    f_load = fsub.add_parser("load", help="Load day,currency,rate quotes from CSV", parents=[common])
+    f_load.add_argument("--path", required=True, help=f"CSV with day,currency,rate ({BASE_CURRENCY} per unit)")
+    f_load.set_defaults(func=cmd_fx_load)
+    f_list = fsub.add_parser("list", help="Show loaded currencies and date ranges", parents=[common])
+    f_list.set_defaults(func=cmd_fx_list)
+
     # CSV
     p_imp = sub.add_parser(
         "import-csv", help="Import records from CSV", parents=[common]
     )
     p_imp.add_argument("--path", required=True)
+    p_imp.add_argument(
+        "--resume", action="store_true", help="continue from the last checkpoint of this file"
+    )
+    p_imp.add_argument("--batch-size", type=int, default=5000, help="rows per committed batch")
+    p_imp.add_argument(
+        "--quarantine", default=None, help="CSV for rejected rows (default: <path>.quarantine.csv)"
+    )
+    p_imp.add_argument("--rules", action="store_true", help="categorize rows with your category rules")
+    p_imp.add_argument(
+        "--anomaly-threshold", type=float, default=3.0, help="flag expenses above mean + N std devs (default 3)"
+    )
+    p_imp.add_argument("--no-anomalies", action="store_true", help="skip the unusual-expense check")
     p_imp.set_defaults(func=cmd_import_csv)
 
     p_exp = sub.add_parser("export-csv", help="Export records to CSV", parents=[common])
@@ -495,6 +1615,84 @@ def main() -> None:
     p_exp.add_argument("--month", required=False, help="YYYY-MM (optional)")
     p_exp.set_defaults(func=cmd_export_csv)
 
+    # bulk operations
+    bulk_filters = argparse.ArgumentParser(add_help=False)
+    bulk_filters.add_argument("--start", type=_parse_day, help="YYYY-MM-DD (inclusive)")
+    bulk_filters.add_argument("--end", type=_parse_day, help="YYYY-MM-DD (exclusive)")
+    bulk_filters.add_argument("--category")
+    bulk_filters.add_argument("--keyword", help="substring of category or note")
+    bulk_filters.add_argument("--batch", help="import batch id")
+    bulk_filters.add_argument("--dry-run", action="store_true", help="only count matching records")
+
+    p_bulk = sub.add_parser("bulk", help="Bulk update/delete records by filter", parents=[common])
+    ksub = p_bulk.add_subparsers(dest="kcommand", required=True)
+
+    k_rec = ksub.add_parser(
+        "recategorize", help="Set the category of matching records", parents=[common, bulk_filters]
+    )
+    k_target = k_rec.add_mutually_exclusive_group(required=True)
+    k_target.add_argument("--new-category")
+    k_target.add_argument("--rules", action="store_true", help="use your category rules instead")
+    k_rec.set_defaults(func=cmd_bulk_recategorize)
+
+    k_shift = ksub.add_parser(
+        "shift-dates", help="Move matching records by N days", parents=[common, bulk_filters]
+    )
+    k_shift.add_argument("--days", required=True, type=int)
+    k_shift.set_defaults(func=cmd_bulk_shift_dates)
+
+    k_del = ksub.add_parser("delete", help="Delete matching records", parents=[common, bulk_filters])
+    k_del.set_defaults(func=cmd_bulk_delete)
+
+    # sharding
+    p_shard = sub.add_parser("shard", help="Per-user sharded storage", parents=[common])
+    ssub = p_shard.add_subparsers(dest="scommand", required=True)
+
+    s_init = ssub.add_parser("init", help="Enable sharding with N shard files", parents=[common])
+    s_init.add_argument("--shards", required=True, type=int)
+    s_init.set_defaults(func=cmd_shard_init)
+
+    s_reb = ssub.add_parser("rebalance", help="Change shard count and move users", parents=[common])
+    s_reb.add_argument("--shards", required=True, type=int)
+    s_reb.set_defaults(func=cmd_shard_rebalance)
+
+    s_rep = ssub.add_parser("report", help="Cross-shard monthly totals per user", parents=[common])
+    s_rep.add_argument("--month", required=True, help="YYYY-MM")
+    s_rep.set_defaults(func=cmd_shard_report)
+
+    # backup / restore
+    p_db = sub.add_parser("db", help="Online backup / restore", parents=[common])
+    dsub = p_db.add_subparsers(dest="dcommand", required=True)
+
+    d_bak = dsub.add_parser("backup", help="Copy the live DB with the SQLite backup API", parents=[common])
+    d_bak.add_argument("--out", required=True, help="backup file (.gz => compressed)")
+    d_bak.add_argument("--pages", type=int, default=256, help="pages copied per step")
+    d_bak.add_argument("--sleep", type=float, default=0.0, help="seconds to yield between steps")
+    d_bak.add_argument("--compress", action="store_true", help="gzip the backup")
+    d_bak.set_defaults(func=cmd_db_backup)
+
+    d_res = dsub.add_parser("restore", help="Restore a backup and verify integrity", parents=[common])
+    d_res.add_argument("--from", dest="src", required=True, help="backup file")
+    d_res.add_argument("--pages", type=int, default=256, help="pages copied per step")
+    d_res.add_argument("--sleep", type=float, default=0.0, help="seconds to yield between steps")
+    d_res.set_defaults(func=cmd_db_restore)
+
+    # incremental sync
+    p_sync = sub.add_parser("sync", help="Incremental sync between ledgers", parents=[common])
+    ysub = p_sync.add_subparsers(dest="ycommand", required=True)
+
+    y_exp = ysub.add_parser("export", help="Write changes after --since to a file", parents=[common])
+    y_exp.add_argument("--since", type=int, default=0, help="last sequence number already synced")
+    y_exp.add_argument("--out", required=True)
+    y_exp.set_defaults(func=cmd_sync_export)
+
+    y_app = ysub.add_parser("apply", help="Apply a change file from another ledger", parents=[common])
+    y_app.add_argument("--path", required=True)
+    y_app.set_defaults(func=cmd_sync_apply)
+
+    y_st = ysub.add_parser("status", help="Show node id and sync watermarks", parents=[common])
+    y_st.set_defaults(func=cmd_sync_status)
+
     args = parser.parse_args()
     args.func(args)
 
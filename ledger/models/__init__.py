@@ -1,7 +1,10 @@
 """Domain entities for the ledger application."""
 from .user import User
-from .record import Record, RecordType
+from .record import BASE_CURRENCY, Record, RecordType
 from .budget import Budget
 from .reminder import Reminder
+from .rule import CategoryRule
+from .category_stats import CategoryStats
+from .recurring import RecurringTemplate
 
-__all__ = ["User", "Record", "RecordType", "Budget", "Reminder"]
+__all__ = ["User", "Record", "RecordType", "BASE_CURRENCY", "Budget", "Reminder", "CategoryRule", "CategoryStats", "RecurringTemplate"]
@@ -2,6 +2,9 @@
 
 from __future__ import annotations
 from dataclasses import dataclass
+from datetime import date
+
+BUDGET_PERIODS = ("WEEKLY", "MONTHLY", "QUARTERLY", "YEARLY", "CUSTOM")
 
 
 @dataclass(slots=True)
@@ -9,5 +12,7 @@ class Budget:
     budget_id: int | None
     user_id: int
     category: str
-    monthly_limit: float
+    monthly_limit: float  # 每个周期的额度；字段名沿用按月预算时的旧名
     period: str = "MONTHLY"
+    start: date | None = None  # 仅 CUSTOM：[start, end)
+    end: date | None = None
@@ -0,0 +1,27 @@
+"""Running statistics of a category's expense amounts."""
+from __future__ import annotations
+from dataclasses import dataclass
+from math import sqrt
+
+
+@dataclass(slots=True)
+class CategoryStats:
+    """Welford accumulator: count, mean and sum of squared deviations."""
+
+    n: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    def observe(self, x: float) -> None:
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return sqrt(self.variance)
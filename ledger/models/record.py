@@ -2,6 +2,8 @@ from dataclasses import dataclass
 from enum import Enum
 from datetime import date
 
+BASE_CURRENCY = "CNY"  # 记账本位币：未标币种的金额、汇率表的报价币种
+
 
 class RecordType(str, Enum):
     INCOME = "INCOME"
@@ -17,3 +19,4 @@ class Record:
     amount: float
     occurred_on: date
     note: str = ""
+    currency: str = BASE_CURRENCY
@@ -0,0 +1,31 @@
+"""Recurring record template."""
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import date
+from .record import RecordType
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY")
+
+
+@dataclass(slots=True)
+class RecurringTemplate:
+    """A record repeated every ``every`` days/weeks/months from ``start``
+    until ``end`` (inclusive, open-ended when None).
+
+    ``next_on`` is the high-water mark: every occurrence before it has been
+    materialized. Monthly templates keep ``start``'s day of month and use
+    the month's last day when it is shorter.
+    """
+
+    template_id: int | None
+    user_id: int
+    rtype: RecordType
+    category: str
+    amount: float
+    freq: str
+    start: date
+    end: date | None = None
+    note: str = ""
+    every: int = 1
+    next_on: date | None = None  # None：从 start 开始
+    key: str | None = None  # 稳定标识（随模板搬迁），写入时生成
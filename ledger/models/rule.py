@@ -0,0 +1,24 @@
+"""Category rule entity."""
+from __future__ import annotations
+from dataclasses import dataclass
+
+RULE_KINDS = ("keyword", "regex")
+
+
+@dataclass(slots=True)
+class CategoryRule:
+    """Maps notes matching ``pattern`` (and amounts in range) to ``category``.
+
+    ``keyword`` is a case-insensitive substring, ``regex`` a Python regular
+    expression; a rule without a pattern matches on the amount range alone.
+    Lower ``priority`` wins when several rules match.
+    """
+
+    rule_id: int | None
+    user_id: int
+    category: str
+    pattern: str | None = None
+    kind: str = "keyword"
+    min_amount: float | None = None  # 闭区间
+    max_amount: float | None = None
+    priority: int = 100
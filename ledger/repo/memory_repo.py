@@ -0,0 +1,385 @@
+"""
+In-memory repositories (no SQLite).
+
+Same interfaces as the SQLite repositories, for tests and throw-away
+"what-if" simulations. Records are kept per user in date-sorted arrays so
+period queries are two bisects plus a slice; category and keyword (trigram)
+indexes back ``search``/``list_by_category``. ``InMemoryStore`` bundles all
+repositories and can snapshot them to a JSON file and load them back.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+from bisect import bisect_left
+from collections import defaultdict
+from dataclasses import replace
+from datetime import date, time, timedelta
+from pathlib import Path
+from typing import Iterable
+
+from .budget_repo import BudgetRepository
+from .record_repo import RecordRepository, RecordFilter
+from .reminder_repo import ReminderRepository
+from .user_repo import UserRepository
+from ..models import BASE_CURRENCY, Budget, Record, RecordType, Reminder, User
+from ..utils.auth import hash_password, verify_password
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class InMemoryRecordRepository(RecordRepository):
+    def __init__(self):
+        self._next_id = 1
+        self._by_id: dict[int, Record] = {}
+        # user_id -> 按 (日期序数, record_id) 排序的键数组，以及与之平行的记录数组
+        self._keys: dict[int, list[tuple[int, int]]] = defaultdict(list)
+        self._rows: dict[int, list[Record]] = defaultdict(list)
+        # user_id -> category -> {record_id}
+        self._by_category: dict[int, dict[str, set[int]]] = defaultdict(lambda: defaultdict(set))
+        # user_id -> trigram -> {record_id}（小写；category 与 note 共用）
+        self._by_trigram: dict[int, dict[str, set[int]]] = defaultdict(lambda: defaultdict(set))
+        # record_id -> 标签集合
+        self._tags: dict[int, set[str]] = {}
+
+    # ---- write ----
+    def add(self, record: Record) -> Record:
+        rid = record.record_id if record.record_id is not None else self._next_id
+        if rid in self._by_id:
+            raise ValueError(f"record {rid} already exists")
+        self._next_id = max(self._next_id, rid + 1)
+        rec = replace(record, record_id=rid, amount=float(record.amount), note=record.note or "")
+        self._by_id[rid] = rec
+
+        key = (rec.occurred_on.toordinal(), rid)
+        keys = self._keys[rec.user_id]
+        pos = bisect_left(keys, key)
+        keys.insert(pos, key)
+        self._rows[rec.user_id].insert(pos, rec)
+
+        self._by_category[rec.user_id][rec.category].add(rid)
+        grams = self._by_trigram[rec.user_id]
+        for g in _trigrams(rec.category.lower()) | _trigrams(rec.note.lower()):
+            grams[g].add(rid)
+        return rec
+
+    def remove(self, record_id: int) -> None:
+        rec = self._by_id.pop(record_id, None)
+        if rec is None:
+            return
+        keys = self._keys[rec.user_id]
+        pos = bisect_left(keys, (rec.occurred_on.toordinal(), record_id))
+        del keys[pos]
+        del self._rows[rec.user_id][pos]
+        self._by_category[rec.user_id][rec.category].discard(record_id)
+        grams = self._by_trigram[rec.user_id]
+        for g in _trigrams(rec.category.lower()) | _trigrams(rec.note.lower()):
+            grams[g].discard(record_id)
+        self._tags.pop(record_id, None)
+
+    # ---- tags ----
+    def tag(self, user_id: int, record_ids: Iterable[int], names: Iterable[str]) -> int:
+        names = {n.strip() for n in names if n.strip()}
+        added = 0
+        for rid in record_ids:
+            rec = self._by_id.get(rid)
+            if rec is None or rec.user_id != user_id:
+                continue
+            have = self._tags.setdefault(rid, set())
+            added += len(names - have)
+            have |= names
+        return added
+
+    def untag(self, user_id: int, record_ids: Iterable[int], names: Iterable[str]) -> int:
+        names = set(names)
+        removed = 0
+        for rid in record_ids:
+            have = self._tags.get(rid)
+            if have and self._by_id[rid].user_id == user_id:
+                removed += len(have & names)
+                have -= names
+        return removed
+
+    def tags_of(self, record_ids: Iterable[int]) -> dict[int, list[str]]:
+        return {rid: sorted(self._tags[rid]) for rid in record_ids if self._tags.get(rid)}
+
+    # ---- bulk：先选出命中行，再逐条 remove + add 以维护全部索引 ----
+    def _select(self, flt: RecordFilter) -> list[Record]:
+        if flt.import_batch is not None:
+            raise ValueError("import batches are not tracked by the in-memory backend")
+        pool = self.list_by_period(flt.user_id, flt.start or date.min, flt.end or date.max)
+        return [r for r in pool if flt.matches(r)]
+
+    def _replace_all(self, hits: list[Record], change) -> None:
+        for r in hits:
+            tags = self._tags.get(r.record_id)
+            self.remove(r.record_id)
+            self.add(change(r))
+            if tags:
+                self._tags[r.record_id] = tags
+
+    def _rewrite(self, flt: RecordFilter, change, dry_run: bool) -> int:
+        hits = self._select(flt)
+        if not dry_run:
+            self._replace_all(hits, change)
+        return len(hits)
+
+    def recategorize(self, flt: RecordFilter, new_category: str, *, dry_run: bool = False) -> int:
+        return self._rewrite(flt, lambda r: replace(r, category=new_category), dry_run)
+
+    def list_where(self, flt: RecordFilter) -> list[Record]:
+        return self._select(flt)
+
+    def set_categories(self, user_id: int, changes: dict[int, str]) -> int:
+        hits = [r for rid in changes if (r := self._by_id.get(rid)) is not None and r.user_id == user_id]
+        self._replace_all(hits, lambda r: replace(r, category=changes[r.record_id]))
+        return len(hits)
+
+    def shift_dates(self, flt: RecordFilter, days: int, *, dry_run: bool = False) -> int:
+        delta = timedelta(days=days)
+        return self._rewrite(flt, lambda r: replace(r, occurred_on=r.occurred_on + delta), dry_run)
+
+    def delete_where(self, flt: RecordFilter, *, dry_run: bool = False) -> int:
+        if flt.is_unbounded():
+            raise ValueError("refusing to delete without a filter")
+        hits = self._select(flt)
+        if not dry_run:
+            for r in hits:
+                self.remove(r.record_id)
+        return len(hits)
+
+    # ---- read ----
+    def get(self, record_id: int) -> Record | None:
+        return self._by_id.get(record_id)
+
+    def list(self) -> Iterable[Record]:
+        return sorted(self._by_id.values(), key=lambda r: r.record_id)
+
+    def list_by_period(self, user_id: int, start: date, end: date) -> Iterable[Record]:
+        keys = self._keys.get(user_id)
+        if not keys:
+            return []
+        lo = bisect_left(keys, (start.toordinal(), 0))
+        hi = bisect_left(keys, (end.toordinal(), 0))
+        return self._rows[user_id][lo:hi]
+
+    def list_by_category(self, user_id: int, category: str) -> Iterable[Record]:
+        ids = self._by_category.get(user_id, {}).get(category, ())
+        return sorted((self._by_id[i] for i in ids), key=lambda r: (r.occurred_on, r.record_id))
+
+    def search(self, user_id: int, keyword: str) -> Iterable[Record]:
+        # 与 SQLite LIKE '%kw%' 一致：子串匹配、忽略大小写
+        kw = keyword.lower()
+        grams = _trigrams(kw)
+        if grams:
+            index = self._by_trigram.get(user_id, {})
+            postings = sorted((index.get(g, set()) for g in grams), key=len)
+            candidates = set.intersection(*postings) if postings else set()
+            pool = (self._by_id[i] for i in candidates)
+        else:
+            pool = iter(self._rows.get(user_id, ()))
+        hits = [r for r in pool if kw in r.category.lower() or kw in r.note.lower()]
+        hits.sort(key=lambda r: (r.occurred_on, r.record_id), reverse=True)
+        return hits
+
+    # ---- snapshot ----
+    def _dump(self) -> list[dict]:
+        return [
+            {
+                "record_id": r.record_id,
+                "user_id": r.user_id,
+                "rtype": r.rtype.value,
+                "category": r.category,
+                "amount": r.amount,
+                "occurred_on": r.occurred_on.isoformat(),
+                "note": r.note,
+                "currency": r.currency,
+                "tags": sorted(self._tags.get(r.record_id, ())),
+            }
+            for r in self.list()
+        ]
+
+    def _load(self, rows: Iterable[dict]) -> None:
+        for row in rows:
+            self.add(
+                Record(
+                    row["record_id"],
+                    row["user_id"],
+                    RecordType(row["rtype"]),
+                    row["category"],
+                    float(row["amount"]),
+                    date.fromisoformat(row["occurred_on"]),
+                    row.get("note", ""),
+                    row.get("currency", BASE_CURRENCY),
+                )
+            )
+            if row.get("tags"):
+                self._tags[row["record_id"]] = set(row["tags"])
+
+
+class InMemoryUserRepository(UserRepository):
+    def __init__(self):
+        self._next_id = 1
+        self._by_name: dict[str, User] = {}
+        self._hashes: dict[str, str] = {}
+
+    def add(self, user: User) -> User:
+        return self._insert(user.name, user.email, hash_password(""), user.user_id)
+
+    def _insert(self, name: str, email: str | None, pwd_hash: str, user_id: int | None = None) -> User:
+        if name in self._by_name:
+            raise ValueError("username already exists")
+        uid = user_id if user_id is not None else self._next_id
+        self._next_id = max(self._next_id, uid + 1)
+        user = User(user_id=uid, name=name, email=email)
+        self._by_name[name] = user
+        self._hashes[name] = pwd_hash
+        return user
+
+    def get_by_name(self, name: str) -> User | None:
+        return self._by_name.get(name)
+
+    def register(self, name: str, password: str, email: str | None = None) -> User:
+        return self._insert(name, email, hash_password(password))
+
+    def verify_login(self, name: str, password: str) -> User:
+        user = self._by_name.get(name)
+        if not user:
+            raise ValueError("user not found")
+        if not verify_password(password, self._hashes[name]):
+            raise ValueError("invalid credentials")
+        return user
+
+    def _dump(self) -> list[dict]:
+        return [
+            {"user_id": u.user_id, "name": u.name, "email": u.email, "password_hash": self._hashes[u.name]}
+            for u in self._by_name.values()
+        ]
+
+    def _load(self, rows: Iterable[dict]) -> None:
+        for row in rows:
+            self._insert(row["name"], row.get("email"), row["password_hash"], row["user_id"])
+
+
+class InMemoryBudgetRepository(BudgetRepository):
+    def __init__(self):
+        self._next_id = 1
+        self._by_id: dict[int, Budget] = {}
+
+    def add(self, budget: Budget) -> Budget:
+        bid = budget.budget_id if budget.budget_id is not None else self._next_id
+        self._next_id = max(self._next_id, bid + 1)
+        b = replace(budget, budget_id=bid, monthly_limit=float(budget.monthly_limit))
+        self._by_id[bid] = b
+        return b
+
+    def list_by_user(self, user_id: int) -> Iterable[Budget]:
+        return sorted((b for b in self._by_id.values() if b.user_id == user_id), key=lambda b: b.category)
+
+    def get_by_category(self, user_id: int, category: str, period: str = "MONTHLY") -> Budget | None:
+        for b in self._by_id.values():
+            if b.user_id == user_id and b.category == category and b.period == period:
+                return b
+        return None
+
+    def update_limit(self, budget_id: int, monthly_limit: float) -> None:
+        b = self._by_id[budget_id]
+        self._by_id[budget_id] = replace(b, monthly_limit=float(monthly_limit))
+
+    def _dump(self) -> list[dict]:
+        return [
+            {"budget_id": b.budget_id, "user_id": b.user_id, "category": b.category,
+             "monthly_limit": b.monthly_limit, "period": b.period,
+             "start": b.start.isoformat() if b.start else None, "end": b.end.isoformat() if b.end else None}
+            for b in self._by_id.values()
+        ]
+
+    def _load(self, rows: Iterable[dict]) -> None:
+        for row in rows:
+            start, end = row.get("start"), row.get("end")
+            self.add(Budget(row["budget_id"], row["user_id"], row["category"],
+                            float(row["monthly_limit"]), row.get("period", "MONTHLY"),
+                            date.fromisoformat(start) if start else None,
+                            date.fromisoformat(end) if end else None))
+
+
+class InMemoryReminderRepository(ReminderRepository):
+    def __init__(self):
+        self._next_id = 1
+        self._by_id: dict[int, Reminder] = {}
+
+    def add(self, reminder: Reminder) -> Reminder:
+        rid = reminder.reminder_id if reminder.reminder_id is not None else self._next_id
+        self._next_id = max(self._next_id, rid + 1)
+        r = replace(reminder, reminder_id=rid)
+        self._by_id[rid] = r
+        return r
+
+    def list_enabled(self, user_id: int) -> Iterable[Reminder]:
+        return sorted(
+            (r for r in self._by_id.values() if r.user_id == user_id and r.enabled),
+            key=lambda r: r.at,
+        )
+
+    def _dump(self) -> list[dict]:
+        return [
+            {"reminder_id": r.reminder_id, "user_id": r.user_id, "message": r.message,
+             "at": r.at.isoformat(), "enabled": r.enabled}
+            for r in self._by_id.values()
+        ]
+
+    def _load(self, rows: Iterable[dict]) -> None:
+        for row in rows:
+            self.add(Reminder(row["reminder_id"], row["user_id"], row["message"],
+                              time.fromisoformat(row["at"]), bool(row.get("enabled", True))))
+
+
+class InMemoryStore:
+    """All in-memory repositories together, with JSON snapshot support."""
+
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self):
+        self.users = InMemoryUserRepository()
+        self.records = InMemoryRecordRepository()
+        self.budgets = InMemoryBudgetRepository()
+        self.reminders = InMemoryReminderRepository()
+
+    def save_snapshot(self, path: str) -> None:
+        """Write all data to ``path`` (gzip-compressed when it ends with .gz)."""
+        payload = {
+            "version": self.SNAPSHOT_VERSION,
+            "users": self.users._dump(),
+            "records": self.records._dump(),
+            "budgets": self.budgets._dump(),
+            "reminders": self.reminders._dump(),
+        }
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        if p.suffix == ".gz":
+            data = gzip.compress(data)
+        tmp = p.with_name(p.name + ".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(p)  # 原子替换，避免写一半的快照
+
+    @classmethod
+    def load_snapshot(cls, path: str) -> "InMemoryStore":
+        p = Path(path)
+        if not p.exists():
+            raise FileNotFoundError(f"snapshot not found: {path}")
+        data = p.read_bytes()
+        if p.suffix == ".gz":
+            data = gzip.decompress(data)
+        payload = json.loads(data.decode("utf-8"))
+        if payload.get("version") != cls.SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version: {payload.get('version')}")
+        store = cls()
+        store.users._load(payload["users"])
+        store.records._load(payload["records"])
+        store.budgets._load(payload["budgets"])
+        store.reminders._load(payload["reminders"])
+        return store
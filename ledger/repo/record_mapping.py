@@ -0,0 +1,64 @@
+"""Fast row -> Record mapping shared by the SQL record repositories.
+
+Rows are expected in the column order of ``RECORD_COLUMNS``:
+record_id, user_id, rtype, category, amount, occurred_on, note, currency.
+"""
+from __future__ import annotations
+from operator import itemgetter
+from typing import Iterable, Iterator
+from ..models import Record, RecordType
+
+# 枚举按值预先缓存，避免每行调用 RecordType(value)
+RTYPE_BY_VALUE: dict[str, RecordType] = {t.value: t for t in RecordType}
+
+
+def row_to_record(row) -> Record:
+    rid, uid, rtype, category, amount, occurred_on, note, currency = row
+    return Record(rid, uid, RTYPE_BY_VALUE[rtype], category, float(amount), occurred_on, note or "", currency)
+
+
+def rows_to_records(rows: Iterable) -> list[Record]:
+    """Positional construction in a single comprehension (hot path)."""
+    rt = RTYPE_BY_VALUE
+    make = Record
+    return [
+        make(rid, uid, rt[rtype], category, float(amount), occurred_on, note or "", currency)
+        for rid, uid, rtype, category, amount, occurred_on, note, currency in rows
+    ]
+
+
+class RecordRow(tuple):
+    """Lightweight read-only view over a raw row.
+
+    Exposes the same attributes as ``Record`` but converts nothing until an
+    attribute is read; call ``to_record()`` to materialize a dataclass.
+    """
+
+    __slots__ = ()
+
+    record_id = property(itemgetter(0))
+    user_id = property(itemgetter(1))
+    category = property(itemgetter(3))
+    occurred_on = property(itemgetter(5))
+    currency = property(itemgetter(7))
+
+    @property
+    def rtype(self) -> RecordType:
+        return RTYPE_BY_VALUE[self[2]]
+
+    @property
+    def amount(self) -> float:
+        return float(self[4])
+
+    @property
+    def note(self) -> str:
+        return self[6] or ""
+
+    def to_record(self) -> Record:
+        return row_to_record(self)
+
+
+def iter_row_views(rows: Iterable) -> Iterator[RecordRow]:
+    make = RecordRow
+    for row in rows:
+        yield make(row)
@@ -0,0 +1,130 @@
+"""Composable record query.
+
+``RecordQuery`` is an immutable description of a read; every builder method
+returns a new query::
+
+    q = (RecordQuery(uid)
+         .between(date(2025, 1, 1), date(2025, 4, 1))
+         .of_type(RecordType.EXPENSE)
+         .in_categories("Food", "Travel")
+         .amount_between(500, None)
+         .tagged("work").not_tagged("reimbursed")
+         .order_by("-amount")
+         .take(20))
+
+SQL repositories compile it into one parameterized SELECT (tag conditions
+are answered from tag bitmaps and applied on top); ``apply`` is the
+equivalent pure-Python evaluation used by other backends.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from datetime import date
+from typing import Iterable, Mapping, Collection
+from ..models import Record, RecordType
+
+# 排序键 -> Record 属性；前缀 '-' 表示降序，同值按 record_id 保持稳定
+SORT_KEYS = ("date", "amount", "category", "id")
+_SORT_ATTR = {"date": "occurred_on", "amount": "amount", "category": "category", "id": "record_id"}
+
+
+@dataclass(frozen=True, slots=True)
+class RecordQuery:
+    user_id: int
+    start: date | None = None  # [start, end)
+    end: date | None = None
+    rtype: RecordType | None = None
+    categories: tuple[str, ...] = ()
+    min_amount: float | None = None  # 闭区间
+    max_amount: float | None = None
+    keyword: str | None = None  # category/note 子串，忽略大小写
+    tags: tuple[str, ...] = ()  # 必须全部带有
+    without_tags: tuple[str, ...] = ()  # 一个都不能有
+    sort: str = "date"
+    limit: int | None = None
+    offset: int = 0
+
+    # ---- builder ----
+    def between(self, start: date | None, end: date | None) -> "RecordQuery":
+        return replace(self, start=start, end=end)
+
+    def of_type(self, rtype: RecordType | None) -> "RecordQuery":
+        return replace(self, rtype=rtype)
+
+    def in_categories(self, *categories: str) -> "RecordQuery":
+        return replace(self, categories=tuple(dict.fromkeys(categories)))
+
+    def amount_between(self, lo: float | None, hi: float | None) -> "RecordQuery":
+        if lo is not None and hi is not None and lo > hi:
+            raise ValueError("min amount is greater than max amount")
+        return replace(self, min_amount=lo, max_amount=hi)
+
+    def matching(self, keyword: str | None) -> "RecordQuery":
+        return replace(self, keyword=keyword or None)
+
+    def tagged(self, *tags: str) -> "RecordQuery":
+        return replace(self, tags=tuple(dict.fromkeys(tags)))
+
+    def not_tagged(self, *tags: str) -> "RecordQuery":
+        return replace(self, without_tags=tuple(dict.fromkeys(tags)))
+
+    @property
+    def has_tag_filter(self) -> bool:
+        return bool(self.tags or self.without_tags)
+
+    def order_by(self, key: str) -> "RecordQuery":
+        if key.lstrip("-") not in SORT_KEYS:
+            raise ValueError(f"unknown sort key {key!r}; expected one of {', '.join(SORT_KEYS)}")
+        return replace(self, sort=key)
+
+    def take(self, limit: int | None, offset: int = 0) -> "RecordQuery":
+        if (limit is not None and limit < 0) or offset < 0:
+            raise ValueError("limit/offset must be >= 0")
+        return replace(self, limit=limit, offset=offset)
+
+    @property
+    def sort_key(self) -> str:
+        return self.sort.lstrip("-")
+
+    @property
+    def descending(self) -> bool:
+        return self.sort.startswith("-")
+
+    # ---- pure-Python evaluation ----
+    def matches(self, r: Record, tags: Collection[str] = ()) -> bool:
+        """``tags`` are the record's tags (only consulted for tag filters)."""
+        if r.user_id != self.user_id:
+            return False
+        if self.start and r.occurred_on < self.start:
+            return False
+        if self.end and r.occurred_on >= self.end:
+            return False
+        if self.rtype is not None and r.rtype != self.rtype:
+            return False
+        if self.categories and r.category not in self.categories:
+            return False
+        if self.min_amount is not None and r.amount < self.min_amount:
+            return False
+        if self.max_amount is not None and r.amount > self.max_amount:
+            return False
+        if self.keyword is not None:
+            kw = self.keyword.lower()
+            if kw not in r.category.lower() and kw not in (r.note or "").lower():
+                return False
+        if self.tags and not all(t in tags for t in self.tags):
+            return False
+        if any(t in tags for t in self.without_tags):
+            return False
+        return True
+
+    def apply(
+        self, recs: Iterable[Record], tags_of: Mapping[int, Collection[str]] | None = None
+    ) -> list[Record]:
+        attr = _SORT_ATTR[self.sort_key]
+        tags_of = tags_of or {}
+        out = sorted(
+            (r for r in recs if self.matches(r, tags_of.get(r.record_id, ()))),
+            key=lambda r: (getattr(r, attr), r.record_id or 0),
+            reverse=self.descending,
+        )
+        stop = None if self.limit is None else self.offset + self.limit
+        return out[self.offset:stop]
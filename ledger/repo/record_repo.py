@@ -1,8 +1,50 @@
 """Record repository skeleton."""
 from __future__ import annotations
-from typing import Iterable
-from datetime import date
-from ..models import Record, RecordType
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Iterable, Dict
+from datetime import date, timedelta
+from ..models import BASE_CURRENCY, Record, RecordType
+from .record_query import RecordQuery
+from ..utils.category_path import group_level, is_under, rollup
+from ..utils.fx import FxTable
+from ..utils.periods import bucket_of, bucket_starts
+from ..utils.sketch import QuantileSketch
+
+
+def _in_base(r: Record, fx: FxTable | None) -> float:
+    """``r.amount`` at its day's rate; without ``fx`` a foreign record raises."""
+    return r.amount * (fx or FxTable()).rate(r.currency, r.occurred_on)
+
+
+@dataclass(slots=True)
+class RecordFilter:
+    """Selection for bulk operations; all set fields must match (AND)."""
+    user_id: int
+    start: date | None = None  # [start, end)
+    end: date | None = None
+    category: str | None = None
+    keyword: str | None = None  # 与 search 相同：category/note 子串，忽略大小写
+    import_batch: str | None = None
+
+    def is_unbounded(self) -> bool:
+        return not any((self.start, self.end, self.category, self.keyword, self.import_batch))
+
+    def matches(self, r: Record) -> bool:
+        if r.user_id != self.user_id:
+            return False
+        if self.start and r.occurred_on < self.start:
+            return False
+        if self.end and r.occurred_on >= self.end:
+            return False
+        if self.category is not None and r.category != self.category:
+            return False
+        if self.keyword is not None:
+            kw = self.keyword.lower()
+            if kw not in r.category.lower() and kw not in (r.note or "").lower():
+                return False
+        return True
+
 
 class RecordRepository:
     """In a real app, implement via SQLAlchemy; here we keep a stub API."""
@@ -14,3 +56,168 @@ class RecordRepository:
 
     def search(self, user_id: int, keyword: str) -> Iterable[Record]:
         raise NotImplementedError
+
+    def list_month(self, user_id: int, year: int, month: int) -> Iterable[Record]:
+        start = date(year, month, 1)
+        end = date(year + (month // 12), (month % 12) + 1, 1)
+        return self.list_by_period(user_id, start, end)
+
+    def query(self, q: RecordQuery) -> list[Record]:
+        """Evaluate a ``RecordQuery``; SQL backends compile it instead."""
+        recs = list(self.list_by_period(q.user_id, q.start or date.min, q.end or date.max))
+        tags_of = self.tags_of(r.record_id for r in recs) if q.has_tag_filter else None
+        return q.apply(recs, tags_of)
+
+    # ---- tags：返回新增/删除的 (记录, 标签) 对数 ----
+    def tag(self, user_id: int, record_ids: Iterable[int], names: Iterable[str]) -> int:
+        raise NotImplementedError
+
+    def untag(self, user_id: int, record_ids: Iterable[int], names: Iterable[str]) -> int:
+        raise NotImplementedError
+
+    def tags_of(self, record_ids: Iterable[int]) -> Dict[int, list[str]]:
+        raise NotImplementedError
+
+    # ---- bulk operations：返回受影响行数；dry_run 只计数 ----
+    def recategorize(self, flt: RecordFilter, new_category: str, *, dry_run: bool = False) -> int:
+        raise NotImplementedError
+
+    def shift_dates(self, flt: RecordFilter, days: int, *, dry_run: bool = False) -> int:
+        raise NotImplementedError
+
+    def delete_where(self, flt: RecordFilter, *, dry_run: bool = False) -> int:
+        raise NotImplementedError
+
+    def list_where(self, flt: RecordFilter) -> Iterable[Record]:
+        raise NotImplementedError
+
+    def set_categories(self, user_id: int, changes: Dict[int, str]) -> int:
+        """Apply ``{record_id: category}``; returns the number of records updated."""
+        raise NotImplementedError
+
+    # ---- aggregates：子类可用更快的实现覆盖；金额合计一律按当日汇率折成本位币 ----
+    def totals_by_type(
+        self, user_id: int, start: date, end: date, *, fx: FxTable | None = None
+    ) -> Dict[str, float]:
+        """{'INCOME': x, 'EXPENSE': y} over [start, end)."""
+        out = {t.value: 0.0 for t in RecordType}
+        for r in self.list_by_period(user_id, start, end):
+            out[r.rtype.value] += _in_base(r, fx)
+        return out
+
+    def series_by_type(
+        self, user_id: int, start: date, end: date, bucket: str = "month", *, fx: FxTable | None = None
+    ) -> Dict[date, Dict[str, float]]:
+        """{bucket start: {'INCOME': x, 'EXPENSE': y}} for every bucket of
+        [start, end), empty buckets included."""
+        out = {b: {t.value: 0.0 for t in RecordType} for b in bucket_starts(start, end, bucket)}
+        for r in self.list_by_period(user_id, start, end):
+            out[bucket_of(r.occurred_on, bucket)][r.rtype.value] += _in_base(r, fx)
+        return out
+
+    # ---- running balance：收入为正、支出为负的累计和 ----
+    def opening_balance(self, user_id: int, day: date, *, fx: FxTable | None = None) -> float:
+        """Balance of everything before ``day``."""
+        total = 0.0
+        for r in self.list_by_period(user_id, date.min, day):
+            amount = _in_base(r, fx)
+            total += amount if r.rtype == RecordType.INCOME else -amount
+        return round(total, 2)
+
+    def balance_at(self, user_id: int, day: date, *, fx: FxTable | None = None) -> float:
+        """Balance at the end of ``day``."""
+        return self.opening_balance(user_id, day + timedelta(days=1), fx=fx)
+
+    def balance_series(
+        self, user_id: int, start: date, end: date, bucket: str = "month", *, fx: FxTable | None = None
+    ) -> Dict[date, float]:
+        """{bucket start: balance at the end of that bucket} over [start, end)."""
+        running = self.opening_balance(user_id, start, fx=fx)
+        out = {}
+        for b, totals in self.series_by_type(user_id, start, end, bucket, fx=fx).items():
+            running += totals[RecordType.INCOME.value] - totals[RecordType.EXPENSE.value]
+            out[b] = round(running, 2)
+        return out
+
+    def totals_by_category(
+        self,
+        user_id: int,
+        start: date,
+        end: date,
+        rtype: RecordType = RecordType.EXPENSE,
+        *,
+        depth: int | None = None,
+        parent: str | None = None,
+        fx: FxTable | None = None,
+    ) -> Dict[str, float]:
+        """Totals per category; ``depth`` / ``parent`` roll subcategories up."""
+        level = group_level(depth, parent)
+        out: Dict[str, float] = defaultdict(float)
+        for r in self.list_by_period(user_id, start, end):
+            if r.rtype != rtype or (parent is not None and not is_under(r.category, parent)):
+                continue
+            out[r.category if level is None else rollup(r.category, level)] += _in_base(r, fx)
+        return dict(out)
+
+    def daily_by_currency(
+        self, user_id: int, start: date, end: date
+    ) -> list[tuple[str, str, str, date, float]]:
+        """(rtype, category, currency, day, total) for [start, end)."""
+        out: Dict[tuple, float] = defaultdict(float)
+        for r in self.list_by_period(user_id, start, end):
+            out[(r.rtype.value, r.category, r.currency, r.occurred_on)] += r.amount
+        return [(*k, v) for k, v in out.items()]
+
+    def note_amounts(
+        self,
+        user_id: int,
+        start: date,
+        end: date,
+        rtype: RecordType = RecordType.EXPENSE,
+        *,
+        fx: FxTable | None = None,
+    ) -> Iterable[tuple[str, float]]:
+        """(note, amount) of each record of ``rtype`` in [start, end)."""
+        return (
+            (r.note or "", _in_base(r, fx)) for r in self.list_by_period(user_id, start, end) if r.rtype == rtype
+        )
+
+    def amount_sketches(
+        self,
+        user_id: int,
+        start: date,
+        end: date,
+        *,
+        depth: int | None = None,
+        parent: str | None = None,
+    ) -> Dict[str, QuantileSketch]:
+        """Expense-size sketch per category over [start, end); ``depth`` /
+        ``parent`` merge subcategories up like ``totals_by_category``. Only
+        base-currency expenses are counted."""
+        level = group_level(depth, parent)
+        out: Dict[str, QuantileSketch] = defaultdict(QuantileSketch)
+        for r in self.list_by_period(user_id, start, end):
+            if r.rtype != RecordType.EXPENSE or r.currency != BASE_CURRENCY:
+                continue
+            if parent is not None and not is_under(r.category, parent):
+                continue
+            out[r.category if level is None else rollup(r.category, level)].add(r.amount)
+        return dict(out)
+
+    def totals_by_tag(
+        self,
+        user_id: int,
+        start: date,
+        end: date,
+        rtype: RecordType = RecordType.EXPENSE,
+        *,
+        fx: FxTable | None = None,
+    ) -> Dict[str, float]:
+        """Totals per tag; a record with several tags counts under each."""
+        recs = [r for r in self.list_by_period(user_id, start, end) if r.rtype == rtype]
+        out: Dict[str, float] = defaultdict(float)
+        tags_of = self.tags_of(r.record_id for r in recs)
+        for r in recs:
+            for t in tags_of.get(r.record_id, ()):
+                out[t] += _in_base(r, fx)
+        return dict(out)
@@ -1,39 +1,174 @@
 from __future__ import annotations
-from typing import Iterable
-from sqlalchemy import select, insert, update
+from datetime import date
+from typing import Dict, Iterable, Mapping
+from sqlalchemy import select, insert, update, delete, and_, func
 from sqlalchemy.orm import Session
-from .sqlite_schema import budgets
-from ..models import Budget
+from .sqlite_schema import budgets, categories, category_closure, daily_spend, records
+from .sqlite_category_repo import SqliteCategoryRepository
+from .sqlite_fx_repo import foreign_deltas
+from ..models import Budget, RecordType
+from ..utils.fx import FxTable
+
+_FROM = budgets.join(categories, categories.c.category_id == budgets.c.category_id)
+
+_COLUMNS = (
+    budgets.c.budget_id,
+    budgets.c.user_id,
+    categories.c.name.label("category"),
+    budgets.c.monthly_limit,
+    budgets.c.period,
+    budgets.c.start_on,
+    budgets.c.end_on,
+)
+
+
+def _to_budget(r) -> Budget:
+    return Budget(
+        budget_id=r.budget_id, user_id=r.user_id, category=r.category, monthly_limit=float(r.monthly_limit),
+        period=r.period, start=r.start_on, end=r.end_on,
+    )
+
 
 class SqliteBudgetRepository:
     def __init__(self, session: Session):
         self._session = session
+        self._categories = SqliteCategoryRepository(session)
 
     def add(self, budget: Budget) -> Budget:
         res = self._session.execute(insert(budgets).values(
             user_id=budget.user_id,
-            category=budget.category,
+            category_id=self._categories.resolve(budget.user_id, budget.category),
             monthly_limit=float(budget.monthly_limit),
             period=budget.period,
+            start_on=budget.start,
+            end_on=budget.end,
         ))
         pk = res.inserted_primary_key[0]
         self._session.commit()
-        return Budget(budget_id=int(pk), user_id=budget.user_id, category=budget.category, monthly_limit=float(budget.monthly_limit), period=budget.period)
+        return Budget(int(pk), budget.user_id, budget.category, float(budget.monthly_limit), budget.period, budget.start, budget.end)
+
+    def set(self, budget: Budget) -> Budget:
+        """Add or replace the budget for (category, period[, start])."""
+        cid = self._categories.resolve(budget.user_id, budget.category)
+        conds = [budgets.c.user_id == budget.user_id, budgets.c.category_id == cid, budgets.c.period == budget.period]
+        if budget.period == "CUSTOM":
+            conds.append(budgets.c.start_on == budget.start)
+        self._session.execute(delete(budgets).where(and_(*conds)))
+        return self.add(budget)
 
     def list_by_user(self, user_id: int):
-        rows = self._session.execute(select(
-            budgets.c.budget_id, budgets.c.user_id, budgets.c.category, budgets.c.monthly_limit, budgets.c.period
-        ).where(budgets.c.user_id == user_id).order_by(budgets.c.category.asc())).all()
-        return [Budget(budget_id=r.budget_id, user_id=r.user_id, category=r.category, monthly_limit=float(r.monthly_limit), period=r.period) for r in rows]
-
-    def get_by_category(self, user_id: int, category: str) -> Budget | None:
-        row = self._session.execute(select(
-            budgets.c.budget_id, budgets.c.user_id, budgets.c.category, budgets.c.monthly_limit, budgets.c.period
-        ).where((budgets.c.user_id == user_id) & (budgets.c.category == category))).first()
+        rows = self._session.execute(
+            select(*_COLUMNS).select_from(_FROM).where(budgets.c.user_id == user_id)
+            .order_by(categories.c.name.asc(), budgets.c.period.asc(), budgets.c.start_on.asc())
+        ).all()
+        return [_to_budget(r) for r in rows]
+
+    def list_all(self) -> list[Budget]:
+        """Every user's budgets (nightly batch jobs)."""
+        rows = self._session.execute(
+            select(*_COLUMNS).select_from(_FROM).order_by(budgets.c.user_id, categories.c.name)
+        ).all()
+        return [_to_budget(r) for r in rows]
+
+    def get_by_category(self, user_id: int, category: str, period: str = "MONTHLY") -> Budget | None:
+        row = self._session.execute(
+            select(*_COLUMNS).select_from(_FROM).where(
+                (budgets.c.user_id == user_id) & (categories.c.name == category) & (budgets.c.period == period)
+            )
+        ).first()
         if not row:
             return None
-        return Budget(budget_id=row.budget_id, user_id=row.user_id, category=row.category, monthly_limit=float(row.monthly_limit), period=row.period)
+        return _to_budget(row)
 
     def update_limit(self, budget_id: int, monthly_limit: float) -> None:
         self._session.execute(update(budgets).where(budgets.c.budget_id == budget_id).values(monthly_limit=float(monthly_limit)))
         self._session.commit()
+
+    def daily_totals(
+        self, start: date, last: date, *, user_id: int | None = None, fx: FxTable | None = None
+    ) -> list[tuple[int, str, date, float]]:
+        """(user_id, category, day, expense) rollup rows for days in [start, last].
+
+        ``daily_spend`` sums raw amounts; foreign-currency days get an extra
+        correction row, so summing the rows gives base-currency totals."""
+        conds = [daily_spend.c.day >= start, daily_spend.c.day <= last]
+        if user_id is not None:
+            conds.append(daily_spend.c.user_id == user_id)
+        rows = self._session.execute(
+            select(daily_spend.c.user_id, categories.c.name, daily_spend.c.day, daily_spend.c.total)
+            .join_from(daily_spend, categories, categories.c.category_id == daily_spend.c.category_id)
+            .where(and_(*conds))
+        )
+        out = [(uid, name, day, float(total)) for uid, name, day, total in rows]
+        conds = [
+            records.c.occurred_on >= start,
+            records.c.occurred_on <= last,
+            records.c.rtype == RecordType.EXPENSE.value,
+        ]
+        if user_id is not None:
+            conds.append(records.c.user_id == user_id)
+        out.extend(foreign_deltas(
+            self._session,
+            fx,
+            [records.c.user_id, categories.c.name],
+            conds,
+            records.join(categories, categories.c.category_id == records.c.category_id),
+        ))
+        return out
+
+    def spent(
+        self, user_id: int, windows: Mapping[int, tuple[date, date]], *, fx: FxTable | None = None
+    ) -> Dict[int, float]:
+        """{budget_id: expense in its window}, read from the ``daily_spend``
+        rollup through the category closure (subcategories count toward the
+        parent's budget). One grouped query per distinct window, plus a
+        base-currency correction over the window's foreign-currency records."""
+        by_window: Dict[tuple[date, date], list[int]] = {}
+        for bid, win in windows.items():
+            by_window.setdefault(win, []).append(bid)
+        out = {bid: 0.0 for bid in windows}
+        for (start, end), ids in by_window.items():
+            rows = self._session.execute(
+                select(budgets.c.budget_id, func.sum(daily_spend.c.total))
+                .select_from(
+                    budgets.join(category_closure, category_closure.c.ancestor_id == budgets.c.category_id).join(
+                        daily_spend,
+                        and_(
+                            daily_spend.c.user_id == budgets.c.user_id,
+                            daily_spend.c.category_id == category_closure.c.descendant_id,
+                        ),
+                    )
+                )
+                .where(
+                    and_(
+                        budgets.c.user_id == user_id,
+                        budgets.c.budget_id.in_(ids),
+                        daily_spend.c.day >= start,
+                        daily_spend.c.day < end,
+                    )
+                )
+                .group_by(budgets.c.budget_id)
+            )
+            for bid, total in rows:
+                out[bid] = float(total or 0.0)
+            covered = budgets.join(
+                category_closure, category_closure.c.ancestor_id == budgets.c.category_id
+            ).join(
+                records,
+                and_(records.c.user_id == budgets.c.user_id, records.c.category_id == category_closure.c.descendant_id),
+            )
+            for bid, _day, delta in foreign_deltas(
+                self._session,
+                fx,
+                [budgets.c.budget_id],
+                [
+                    budgets.c.user_id == user_id,
+                    budgets.c.budget_id.in_(ids),
+                    records.c.rtype == RecordType.EXPENSE.value,
+                    records.c.occurred_on >= start,
+                    records.c.occurred_on < end,
+                ],
+                covered,
+            ):
+                out[bid] += delta
+        return {bid: round(v, 2) for bid, v in out.items()}
@@ -0,0 +1,109 @@
+"""Per-user category dictionary (name <-> integer id)."""
+from __future__ import annotations
+from itertools import groupby
+from typing import Dict, Iterable
+from sqlalchemy import select, insert, and_, bindparam
+from sqlalchemy.orm import Session
+from .sqlite_schema import categories, category_closure
+from ..utils.category_path import ancestors, depth_of, parent_of
+
+_INSERT_OR_IGNORE = insert(categories).prefix_with("OR IGNORE")
+
+_IDS_BY_NAME = select(categories.c.name, categories.c.category_id).where(
+    and_(
+        categories.c.user_id == bindparam("user_id"),
+        categories.c.name.in_(bindparam("names", expanding=True)),
+    )
+)
+
+
+class SqliteCategoryRepository:
+    """Resolves category names through an in-process cache.
+
+    The cache lives as long as the repository (one CLI command / one import
+    run), so a bulk import looks each distinct name up once. Call
+    ``forget()`` after a rollback: ids created in the aborted transaction
+    are no longer valid.
+    """
+
+    def __init__(self, session: Session):
+        self._session = session
+        self._ids: Dict[tuple[int, str], int] = {}
+        self._names: Dict[int, str] = {}
+
+    def forget(self) -> None:
+        self._ids.clear()
+        self._names.clear()
+
+    def _remember(self, user_id: int, name: str, cid: int) -> None:
+        self._ids[(user_id, name)] = cid
+        self._names[cid] = name
+
+    def resolve_many(self, user_id: int, names: Iterable[str]) -> Dict[str, int]:
+        """{name: category_id}, creating missing categories (no commit).
+
+        Missing ancestors of ``a/b/c`` are created too, one level at a time so
+        every row is inserted with its parent id (the closure trigger needs it).
+        """
+        wanted = {n for n in names}
+        out = {n: self._ids[(user_id, n)] for n in wanted if (user_id, n) in self._ids}
+        missing = wanted - out.keys()
+        if missing:
+            todo = sorted({a for n in missing for a in ancestors(n)}, key=depth_of)
+            known = self._lookup(user_id, todo)
+            new = [n for n in todo if n not in known]
+            for level, group in groupby(new, key=depth_of):
+                group = list(group)
+                rows = [
+                    {"user_id": user_id, "name": n, "parent_id": known.get(parent_of(n)), "depth": level}
+                    for n in group
+                ]
+                self._session.execute(_INSERT_OR_IGNORE, rows)
+                known.update(self._lookup(user_id, group))
+            out.update({n: known[n] for n in missing})
+        return out
+
+    def _lookup(self, user_id: int, names: list[str]) -> Dict[str, int]:
+        found = {}
+        for name, cid in self._session.execute(_IDS_BY_NAME, {"user_id": user_id, "names": names}):
+            self._remember(user_id, name, cid)
+            found[name] = cid
+        return found
+
+    def resolve(self, user_id: int, name: str) -> int:
+        return self.resolve_many(user_id, (name,))[name]
+
+    def find(self, user_id: int, name: str) -> int | None:
+        """Id of an existing category, without creating it."""
+        cid = self._ids.get((user_id, name))
+        if cid is None:
+            cid = self._lookup(user_id, [name]).get(name)
+        return cid
+
+    def names(self, ids: Iterable[int]) -> Dict[int, str]:
+        """{category_id: name} for the given ids."""
+        ids = set(ids)
+        missing = [i for i in ids if i not in self._names]
+        if missing:
+            rows = self._session.execute(
+                select(categories.c.category_id, categories.c.user_id, categories.c.name).where(
+                    categories.c.category_id.in_(missing)
+                )
+            )
+            for cid, uid, name in rows:
+                self._remember(uid, name, cid)
+        return {i: self._names[i] for i in ids if i in self._names}
+
+    def subtree_ids(self, category_id: int):
+        """Sub-select of ``category_id`` and all its descendants."""
+        return select(category_closure.c.descendant_id).where(
+            category_closure.c.ancestor_id == category_id
+        )
+
+    def list_by_user(self, user_id: int) -> Dict[str, int]:
+        rows = self._session.execute(
+            select(categories.c.name, categories.c.category_id)
+            .where(categories.c.user_id == user_id)
+            .order_by(categories.c.name.asc())
+        )
+        return {name: cid for name, cid in rows}
@@ -0,0 +1,76 @@
+"""FX rates table plus a per-database in-process cache of the rate arrays."""
+from __future__ import annotations
+from datetime import date
+from typing import Iterable
+from sqlalchemy import select, insert, func, literal_column
+from sqlalchemy.orm import Session
+from .sqlite_schema import fx_rates, records
+from ..models import BASE_CURRENCY
+from ..utils.fx import FxTable
+
+# 数据库文件 -> 已排序的汇率数组；写入汇率时失效（读写两个引擎共用一项）
+_TABLE_CACHE: dict[str, FxTable] = {}
+
+_UPSERT = insert(fx_rates).prefix_with("OR REPLACE")
+
+# 写成字面量而不是绑定参数：SQLite 只有这样才能证明查询落在部分索引 ix_records_foreign 里
+FOREIGN = records.c.currency != literal_column(f"'{BASE_CURRENCY}'")
+
+
+def foreign_deltas(session: Session, fx: FxTable | None, keys, conds, from_=records) -> list[tuple]:
+    """``(*keys, day, delta)`` for foreign-currency records matching ``conds``.
+
+    SQL sums raw amounts regardless of currency; adding ``delta`` (converted
+    minus raw, at each day's rate) to the same grouping turns such a total
+    into the base currency. Only the few foreign rows are read. Without
+    ``fx`` any foreign record raises ``ValueError`` rather than being mixed in.
+    """
+    rows = session.execute(
+        select(*keys, records.c.currency, records.c.occurred_on, func.sum(records.c.amount))
+        .select_from(from_)
+        .where(FOREIGN, *conds)
+        .group_by(*keys, records.c.currency, records.c.occurred_on)
+    ).all()
+    if not rows:
+        return []
+    n = len(keys)
+    raw = [float(r[n + 2]) for r in rows]
+    base = (fx or FxTable()).convert(raw, [r[n] for r in rows], [r[n + 1].toordinal() for r in rows])
+    return [(*r[:n], r[n + 1], float(b - a)) for r, a, b in zip(rows, raw, base)]
+
+
+class SqliteFxRepository:
+    def __init__(self, session: Session):
+        self._session = session
+
+    def _key(self) -> str:
+        bind = self._session.get_bind()
+        path = (bind.url.database or "").removeprefix("file:")
+        return path if path and path != ":memory:" else f"memory:{id(bind)}"
+
+    def load(self, rows: Iterable[tuple[str, date, float]]) -> int:
+        """Insert or replace (currency, day, rate) quotes; returns the row count."""
+        params = [{"currency": c, "day": d, "rate": float(r)} for c, d, r in rows]
+        if params:
+            self._session.execute(_UPSERT, params)
+            self._session.commit()
+            _TABLE_CACHE.pop(self._key(), None)
+        return len(params)
+
+    def table(self) -> FxTable:
+        """All rates as an ``FxTable``; read from the database once per process."""
+        key = self._key()
+        if key not in _TABLE_CACHE:
+            _TABLE_CACHE[key] = FxTable(
+                self._session.execute(select(fx_rates.c.currency, fx_rates.c.day, fx_rates.c.rate))
+            )
+        return _TABLE_CACHE[key]
+
+    def summary(self) -> list[tuple[str, int, date, date]]:
+        """(currency, quotes, first day, last day) per currency."""
+        rows = self._session.execute(
+            select(fx_rates.c.currency, func.count(), func.min(fx_rates.c.day), func.max(fx_rates.c.day))
+            .group_by(fx_rates.c.currency)
+            .order_by(fx_rates.c.currency)
+        )
+        return [(c, int(n), first, last) for c, n, first, last in rows]
@@ -0,0 +1,112 @@
+# ledger/repo/sqlite_import_repo.py
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from sqlalchemy import select, delete, and_, text
+from sqlalchemy.orm import Session
+from .sqlite_schema import import_checkpoints, import_occurrences
+
+
+@dataclass(slots=True)
+class ImportCheckpoint:
+    file_key: str
+    user_id: int
+    path: str
+    batch: str
+    byte_offset: int = 0
+    rows_read: int = 0
+    rows_committed: int = 0
+    status: str = "running"
+    rows_rejected: int = 0
+
+
+class SqliteImportCheckpointRepository:
+    """Checkpoints must share the session used for the record inserts, so a
+    batch and its checkpoint commit (or roll back) together.
+
+    Alongside each checkpoint it keeps how often every base fingerprint has
+    been seen in the file so far, so a resumed import keeps numbering
+    repeated lines without re-reading the rows before the checkpoint.
+    """
+
+    def __init__(self, session: Session):
+        self._session = session
+
+    def get(self, file_key: str, user_id: int) -> ImportCheckpoint | None:
+        row = self._session.execute(
+            select(
+                import_checkpoints.c.file_key,
+                import_checkpoints.c.user_id,
+                import_checkpoints.c.path,
+                import_checkpoints.c.batch,
+                import_checkpoints.c.byte_offset,
+                import_checkpoints.c.rows_read,
+                import_checkpoints.c.rows_committed,
+                import_checkpoints.c.status,
+                import_checkpoints.c.rows_rejected,
+            ).where(
+                and_(
+                    import_checkpoints.c.file_key == file_key,
+                    import_checkpoints.c.user_id == user_id,
+                )
+            )
+        ).first()
+        return ImportCheckpoint(*row) if row else None
+
+    def occurrences(self, file_key: str, user_id: int) -> dict[str, int]:
+        return dict(
+            self._session.execute(
+                select(import_occurrences.c.fingerprint, import_occurrences.c.seen).where(
+                    and_(
+                        import_occurrences.c.file_key == file_key,
+                        import_occurrences.c.user_id == user_id,
+                    )
+                )
+            ).all()
+        )
+
+    def clear_occurrences(self, file_key: str, user_id: int) -> None:
+        """Drop the counters (uncommitted; goes out with the next ``save``)."""
+        self._session.execute(
+            delete(import_occurrences).where(
+                and_(import_occurrences.c.file_key == file_key, import_occurrences.c.user_id == user_id)
+            )
+        )
+
+    def save(
+        self, cp: ImportCheckpoint, occurrences: dict[str, int] | None = None, *, commit: bool = True
+    ) -> None:
+        """Upsert the checkpoint plus the given fingerprint counters."""
+        if occurrences:
+            self._session.execute(
+                text(
+                    "INSERT OR REPLACE INTO import_occurrences (file_key, user_id, fingerprint, seen) "
+                    "VALUES (:file_key, :user_id, :fingerprint, :seen)"
+                ),
+                [
+                    {"file_key": cp.file_key, "user_id": cp.user_id, "fingerprint": fp, "seen": n}
+                    for fp, n in occurrences.items()
+                ],
+            )
+        self._session.execute(
+            text(
+                "INSERT OR REPLACE INTO import_checkpoints "
+                "(file_key, user_id, path, batch, byte_offset, rows_read, rows_committed, rows_rejected, status, updated_at) "
+                "VALUES (:file_key, :user_id, :path, :batch, :byte_offset, :rows_read, :rows_committed, "
+                ":rows_rejected, :status, :updated_at)"
+            ),
+            {
+                "file_key": cp.file_key,
+                "user_id": cp.user_id,
+                "path": cp.path,
+                "batch": cp.batch,
+                "byte_offset": cp.byte_offset,
+                "rows_read": cp.rows_read,
+                "rows_committed": cp.rows_committed,
+                "rows_rejected": cp.rows_rejected,
+                "status": cp.status,
+                "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            },
+        )
+        if commit:
+            self._session.commit()
@@ -0,0 +1,424 @@
+"""
+Schema steps that ``metadata.create_all`` cannot express: columns/indexes
+added to tables that already exist, table rebuilds, triggers, the sync node
+id.
+
+``migrate(engine)`` is idempotent and is run by ``init_db`` after
+``create_all``; when nothing changed it only reads the schema catalog.
+"""
+
+from __future__ import annotations
+
+import uuid
+
+from sqlalchemy import Table
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+from .sqlite_schema import metadata, records, budgets, reminders, categories
+from ..models.record import BASE_CURRENCY
+from ..utils.category_path import depth_of, parent_of
+from ..utils.sketch import BUCKET_SQL
+
+# 这些表的每次 INSERT / UPDATE / DELETE 都写入 change_log
+SYNCED_TABLES: tuple[Table, ...] = (records, budgets, reminders)
+
+_NOW = "strftime('%Y-%m-%dT%H:%M:%fZ','now')"
+_ORIGIN = "COALESCE((SELECT origin FROM sync_apply), (SELECT value FROM sync_state WHERE key = 'node_id'))"
+_CHANGED_AT = f"COALESCE((SELECT changed_at FROM sync_apply), {_NOW})"
+
+
+def _pk(table: Table):
+    return next(iter(table.primary_key.columns))
+
+
+def _payload_sql(table: Table, alias: str) -> str:
+    pk = _pk(table)
+    pairs = ", ".join(f"'{c.name}', {alias}.{c.name}" for c in table.columns if c is not pk)
+    return f"json_object({pairs})"
+
+
+def _change_log_triggers(table: Table) -> dict[str, str]:
+    pk = _pk(table).name
+    out = {}
+    for op, event, alias in (("I", "INSERT", "NEW"), ("U", "UPDATE", "NEW"), ("D", "DELETE", "OLD")):
+        name = f"trg_{table.name}_changelog_{op.lower()}"
+        out[name] = (
+            f"CREATE TRIGGER {name} AFTER {event} ON {table.name} BEGIN "
+            f"INSERT INTO change_log (table_name, row_id, op, payload, changed_at, origin) "
+            f"VALUES ('{table.name}', {alias}.{pk}, '{op}', {_payload_sql(table, alias)}, "
+            f"{_CHANGED_AT}, {_ORIGIN}); END"
+        )
+    return out
+
+
+_CLOSURE_ROWS = (
+    "INSERT INTO category_closure (ancestor_id, descendant_id, depth) "
+    "SELECT ancestor_id, {id}, depth + 1 FROM category_closure WHERE descendant_id = {parent} "
+    "UNION ALL SELECT {id}, {id}, 0"
+)
+
+
+def _category_tree_triggers() -> dict[str, str]:
+    # 分类只增不改名：插入时继承父节点的全部祖先，删除时清掉相关闭包行
+    return {
+        "trg_categories_closure_i": (
+            "CREATE TRIGGER trg_categories_closure_i AFTER INSERT ON categories BEGIN "
+            + _CLOSURE_ROWS.format(id="NEW.category_id", parent="NEW.parent_id")
+            + "; END"
+        ),
+        "trg_categories_closure_d": (
+            "CREATE TRIGGER trg_categories_closure_d AFTER DELETE ON categories BEGIN "
+            "DELETE FROM category_closure WHERE descendant_id = OLD.category_id "
+            "OR ancestor_id = OLD.category_id; END"
+        ),
+    }
+
+
+def _record_tag_triggers() -> dict[str, str]:
+    # 删除记录（含批量删除、分片迁移）时顺带清理它的标签
+    return {
+        "trg_records_tags_d": (
+            "CREATE TRIGGER trg_records_tags_d AFTER DELETE ON records BEGIN "
+            "DELETE FROM record_tags WHERE record_id = OLD.record_id; END"
+        ),
+    }
+
+
+_SIGNED = "CASE {a}.rtype WHEN 'INCOME' THEN {a}.amount ELSE -{a}.amount END"
+
+# 先平移已有的后续检查点，再补上下个月初的检查点（最近的早先检查点 + 其后记录之和），
+# 顺序不能反：新建的检查点已经包含这条记录
+_BALANCE_ADD = (
+    "UPDATE balance_checkpoints SET opening = opening + " + _SIGNED.format(a="NEW")
+    + " WHERE user_id = NEW.user_id AND month > NEW.occurred_on; "
+    "INSERT INTO balance_checkpoints (user_id, month, opening) "
+    "SELECT NEW.user_id, nm.month, COALESCE(prev.opening, 0) + COALESCE(("
+    "SELECT SUM(" + _SIGNED.format(a="r") + ") FROM records r WHERE r.user_id = NEW.user_id "
+    "AND r.occurred_on >= COALESCE(prev.month, '0000-01-01') AND r.occurred_on < nm.month), 0) "
+    "FROM (SELECT date(NEW.occurred_on, 'start of month', '+1 month') AS month) nm "
+    "LEFT JOIN (SELECT month, opening FROM balance_checkpoints WHERE user_id = NEW.user_id "
+    "AND month < date(NEW.occurred_on, 'start of month', '+1 month') ORDER BY month DESC LIMIT 1) prev "
+    "WHERE NOT EXISTS (SELECT 1 FROM balance_checkpoints b WHERE b.user_id = NEW.user_id AND b.month = nm.month); "
+)
+_BALANCE_SUB = (
+    "UPDATE balance_checkpoints SET opening = opening - " + _SIGNED.format(a="OLD")
+    + " WHERE user_id = OLD.user_id AND month > OLD.occurred_on; "
+)
+
+
+_SPEND_ADD = (
+    "INSERT INTO daily_spend (user_id, category_id, day, total) "
+    "SELECT NEW.user_id, NEW.category_id, NEW.occurred_on, NEW.amount WHERE NEW.rtype = 'EXPENSE' "
+    "ON CONFLICT (user_id, category_id, day) DO UPDATE SET total = total + excluded.total; "
+)
+_SPEND_SUB = (
+    "UPDATE daily_spend SET total = total - OLD.amount WHERE OLD.rtype = 'EXPENSE' "
+    "AND user_id = OLD.user_id AND category_id = OLD.category_id AND day = OLD.occurred_on; "
+    "DELETE FROM daily_spend WHERE user_id = OLD.user_id AND category_id = OLD.category_id "
+    "AND day = OLD.occurred_on AND abs(total) < 0.005; "
+)
+
+
+def _daily_spend_triggers() -> dict[str, str]:
+    return {
+        "trg_records_spend_i": f"CREATE TRIGGER trg_records_spend_i AFTER INSERT ON records BEGIN {_SPEND_ADD}END",
+        "trg_records_spend_u": (
+            "CREATE TRIGGER trg_records_spend_u AFTER UPDATE OF user_id, rtype, category_id, amount, occurred_on "
+            f"ON records BEGIN {_SPEND_SUB}{_SPEND_ADD}END"
+        ),
+        "trg_records_spend_d": f"CREATE TRIGGER trg_records_spend_d AFTER DELETE ON records BEGIN {_SPEND_SUB}END",
+    }
+
+
+# 金额大小的统计（Welford、分桶草图）只收本位币支出：不同币种的金额不能放进同一个分布，
+# 事后也无法按汇率修正；金额合计类的汇总不受此限，读时按汇率补差
+_SIZED = "{a}.rtype = 'EXPENSE' AND {a}.currency = '" + BASE_CURRENCY + "'"
+
+# Welford：加入 x 时 mean += d / (n+1)，m2 += d² · n / (n+1)（d = x - mean，SET 里读到的都是旧值）；
+# 移除是它的逆运算。只剩一笔时直接删行，避免除以 0
+_STATS_ADD = (
+    "INSERT INTO category_stats (user_id, category_id, n, mean, m2) "
+    "SELECT NEW.user_id, NEW.category_id, 1, NEW.amount, 0 WHERE " + _SIZED.format(a="NEW") + " "
+    "ON CONFLICT (user_id, category_id) DO UPDATE SET n = n + 1, "
+    "mean = mean + (excluded.mean - mean) / (n + 1), "
+    "m2 = m2 + (excluded.mean - mean) * (excluded.mean - mean) * n / (n + 1); "
+)
+_STATS_SUB = (
+    "DELETE FROM category_stats WHERE " + _SIZED.format(a="OLD") + " "
+    "AND user_id = OLD.user_id AND category_id = OLD.category_id AND n <= 1; "
+    "UPDATE category_stats SET n = n - 1, "
+    "mean = (n * mean - OLD.amount) / (n - 1), "
+    "m2 = max(m2 - (OLD.amount - mean) * (OLD.amount - mean) * n / (n - 1), 0) "
+    "WHERE " + _SIZED.format(a="OLD") + " AND user_id = OLD.user_id AND category_id = OLD.category_id; "
+)
+
+
+def _category_stats_triggers() -> dict[str, str]:
+    return {
+        "trg_records_stats_i": f"CREATE TRIGGER trg_records_stats_i AFTER INSERT ON records BEGIN {_STATS_ADD}END",
+        "trg_records_stats_u": (
+            "CREATE TRIGGER trg_records_stats_u AFTER UPDATE OF user_id, rtype, category_id, amount, currency "
+            f"ON records BEGIN {_STATS_SUB}{_STATS_ADD}END"
+        ),
+        "trg_records_stats_d": f"CREATE TRIGGER trg_records_stats_d AFTER DELETE ON records BEGIN {_STATS_SUB}END",
+    }
+
+
+_SKETCH_ADD = (
+    "INSERT INTO amount_sketch (user_id, category_id, month, bucket, n) "
+    "SELECT NEW.user_id, NEW.category_id, date(NEW.occurred_on, 'start of month'), "
+    + BUCKET_SQL.format(x="NEW.amount") + ", 1 WHERE " + _SIZED.format(a="NEW") + " "
+    "ON CONFLICT (user_id, category_id, month, bucket) DO UPDATE SET n = n + 1; "
+)
+_SKETCH_SUB = (
+    "UPDATE amount_sketch SET n = n - 1 WHERE " + _SIZED.format(a="OLD") + " AND user_id = OLD.user_id "
+    "AND category_id = OLD.category_id AND month = date(OLD.occurred_on, 'start of month') "
+    "AND bucket = " + BUCKET_SQL.format(x="OLD.amount") + "; "
+    "DELETE FROM amount_sketch WHERE user_id = OLD.user_id AND category_id = OLD.category_id "
+    "AND month = date(OLD.occurred_on, 'start of month') AND n <= 0; "
+)
+
+
+def _amount_sketch_triggers() -> dict[str, str]:
+    return {
+        "trg_records_sketch_i": f"CREATE TRIGGER trg_records_sketch_i AFTER INSERT ON records BEGIN {_SKETCH_ADD}END",
+        "trg_records_sketch_u": (
+            "CREATE TRIGGER trg_records_sketch_u AFTER UPDATE OF user_id, rtype, category_id, amount, occurred_on, currency "
+            f"ON records BEGIN {_SKETCH_SUB}{_SKETCH_ADD}END"
+        ),
+        "trg_records_sketch_d": f"CREATE TRIGGER trg_records_sketch_d AFTER DELETE ON records BEGIN {_SKETCH_SUB}END",
+    }
+
+
+# 从历史重算：两遍（先均值，再离差平方和），数值上比 SUM(x²) - n·mean² 稳定
+CATEGORY_STATS_FROM_RECORDS = (
+    "INSERT INTO category_stats (user_id, category_id, n, mean, m2) "
+    "SELECT r.user_id, r.category_id, COUNT(*), a.mean, SUM((r.amount - a.mean) * (r.amount - a.mean)) "
+    "FROM records r JOIN (SELECT user_id, category_id, AVG(amount) AS mean FROM records "
+    "WHERE " + _SIZED.format(a="records") + " {where} GROUP BY user_id, category_id) a "
+    "ON a.user_id = r.user_id AND a.category_id = r.category_id "
+    "WHERE " + _SIZED.format(a="r") + " GROUP BY r.user_id, r.category_id"
+)
+
+
+def _balance_triggers() -> dict[str, str]:
+    # 余额只由 records 推出：批量操作、同步回放、分片迁移都经过这些触发器
+    return {
+        "trg_records_balance_i": f"CREATE TRIGGER trg_records_balance_i AFTER INSERT ON records BEGIN {_BALANCE_ADD}END",
+        "trg_records_balance_u": (
+            "CREATE TRIGGER trg_records_balance_u AFTER UPDATE OF user_id, rtype, amount, occurred_on "
+            f"ON records BEGIN {_BALANCE_SUB}{_BALANCE_ADD}END"
+        ),
+        "trg_records_balance_d": f"CREATE TRIGGER trg_records_balance_d AFTER DELETE ON records BEGIN {_BALANCE_SUB}END",
+    }
+
+
+def desired_triggers() -> dict[str, str]:
+    out: dict[str, str] = {}
+    for table in SYNCED_TABLES:
+        out.update(_change_log_triggers(table))
+    out.update(_category_tree_triggers())
+    out.update(_record_tag_triggers())
+    out.update(_balance_triggers())
+    out.update(_daily_spend_triggers())
+    out.update(_category_stats_triggers())
+    out.update(_amount_sketch_triggers())
+    return out
+
+
+def _missing_columns(conn) -> list[tuple[Table, object]]:
+    out = []
+    for table in metadata.sorted_tables:
+        have = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+        out.extend((table, col) for col in table.columns if col.name not in have)
+    return out
+
+
+def _columns(conn, name: str) -> list[str]:
+    return [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({name})")]
+
+
+def _rebuild(conn, table: Table, select_sql: str) -> None:
+    """Recreate ``table`` from the current schema, copying rows with
+    ``select_sql`` (which reads from ``<table>__old``)."""
+    old = f"{table.name}__old"
+    conn.exec_driver_sql(f"ALTER TABLE {table.name} RENAME TO {old}")
+    # 索引名全库唯一：先删旧表上的命名索引，create 时再按新定义建
+    for row in conn.exec_driver_sql(f"PRAGMA index_list({old})").all():
+        if row[3] == "c":
+            conn.exec_driver_sql(f"DROP INDEX {row[1]}")
+    table.create(conn)
+    conn.exec_driver_sql(select_sql)
+    conn.exec_driver_sql(f"DROP TABLE {old}")  # 旧表上的触发器随之删除，稍后按新列重建
+
+
+def _normalize_categories(engine: Engine) -> None:
+    """records/budgets.category (text) -> category_id + categories table."""
+    with engine.connect() as conn:
+        legacy = [t for t in (records, budgets) if "category" in _columns(conn, t.name)]
+    if not legacy:
+        return
+    with engine.begin() as conn:
+        for t in legacy:
+            conn.exec_driver_sql(
+                f"INSERT OR IGNORE INTO {categories.name} (user_id, name) "
+                f"SELECT DISTINCT user_id, category FROM {t.name}"
+            )
+        for t in legacy:
+            have = set(_columns(conn, t.name))
+            cols = [c.name for c in t.columns if c.name in have]
+            target = ", ".join(cols + ["category_id"])
+            picked = ", ".join([f"o.{c}" for c in cols] + ["c.category_id"])
+            _rebuild(
+                conn,
+                t,
+                f"INSERT INTO {t.name} ({target}) SELECT {picked} FROM {t.name}__old o "
+                f"JOIN {categories.name} c ON c.user_id = o.user_id AND c.name = o.category",
+            )
+
+
+def _ensure_category(conn, user_id: int, name: str) -> int:
+    row = conn.exec_driver_sql(
+        "SELECT category_id FROM categories WHERE user_id = ? AND name = ?", (user_id, name)
+    ).first()
+    if row:
+        return row[0]
+    parent = parent_of(name)
+    parent_id = _ensure_category(conn, user_id, parent) if parent else None
+    return conn.exec_driver_sql(
+        "INSERT INTO categories (user_id, name, parent_id, depth) VALUES (?, ?, ?, ?)",
+        (user_id, name, parent_id, depth_of(name)),
+    ).lastrowid
+
+
+def _backfill_category_tree(engine: Engine) -> None:
+    """Link categories created before the hierarchy existed."""
+    orphans_sql = (
+        "SELECT category_id, user_id, name FROM categories WHERE category_id NOT IN "
+        "(SELECT descendant_id FROM category_closure WHERE depth = 0)"
+    )
+    with engine.connect() as conn:
+        orphans = conn.exec_driver_sql(orphans_sql).all()
+    if not orphans:
+        return
+    with engine.begin() as conn:
+        # 浅的先处理，保证父节点在子节点之前进入闭包表
+        for cid, uid, name in sorted(orphans, key=lambda r: depth_of(r[2])):
+            parent = parent_of(name)
+            parent_id = _ensure_category(conn, uid, parent) if parent else None
+            conn.exec_driver_sql(
+                "UPDATE categories SET parent_id = ?, depth = ? WHERE category_id = ?",
+                (parent_id, depth_of(name), cid),
+            )
+            conn.exec_driver_sql(
+                _CLOSURE_ROWS.format(id=cid, parent=parent_id if parent_id is not None else "NULL")
+            )
+
+
+def _backfill_daily_spend(engine: Engine) -> None:
+    """Fill the rollup once for databases created before it existed."""
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("SELECT 1 FROM daily_spend LIMIT 1").first():
+            return
+        if not conn.exec_driver_sql("SELECT 1 FROM records WHERE rtype = 'EXPENSE' LIMIT 1").first():
+            return
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO daily_spend (user_id, category_id, day, total) "
+            "SELECT user_id, category_id, occurred_on, SUM(amount) FROM records "
+            "WHERE rtype = 'EXPENSE' GROUP BY user_id, category_id, occurred_on"
+        )
+
+
+def _backfill_category_stats(engine: Engine) -> None:
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("SELECT 1 FROM category_stats LIMIT 1").first():
+            return
+        if not conn.exec_driver_sql("SELECT 1 FROM records WHERE rtype = 'EXPENSE' LIMIT 1").first():
+            return
+    with engine.begin() as conn:
+        conn.exec_driver_sql(CATEGORY_STATS_FROM_RECORDS.format(where=""))
+
+
+def _backfill_amount_sketch(engine: Engine) -> None:
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("SELECT 1 FROM amount_sketch LIMIT 1").first():
+            return
+        if not conn.exec_driver_sql("SELECT 1 FROM records WHERE rtype = 'EXPENSE' LIMIT 1").first():
+            return
+    bucket = BUCKET_SQL.format(x="amount")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO amount_sketch (user_id, category_id, month, bucket, n) "
+            f"SELECT user_id, category_id, date(occurred_on, 'start of month'), {bucket}, COUNT(*) "
+            f"FROM records WHERE {_SIZED.format(a='records')} GROUP BY 1, 2, 3, 4"
+        )
+
+
+def _drop_foreign_sizes(engine: Engine, existing: dict, stale: dict) -> None:
+    """Old stats/sketch triggers also counted foreign-currency expenses:
+    empty both tables so the backfills recompute them base-only."""
+    upgraded = {*_category_stats_triggers(), *_amount_sketch_triggers()}
+    if not any(n in existing for n in upgraded & set(stale)):
+        return
+    with engine.connect() as conn:
+        if not conn.exec_driver_sql(
+            f"SELECT 1 FROM records WHERE rtype = 'EXPENSE' AND currency != '{BASE_CURRENCY}' LIMIT 1"
+        ).first():
+            return
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM category_stats")
+        conn.exec_driver_sql("DELETE FROM amount_sketch")
+
+
+def _backfill_template_keys(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "UPDATE recurring_templates SET template_key = lower(hex(randomblob(16))) WHERE template_key IS NULL"
+        )
+
+
+def migrate(engine: Engine) -> None:
+    if engine.dialect.name != "sqlite":
+        return
+    _normalize_categories(engine)
+    with engine.connect() as conn:
+        existing = dict(
+            conn.exec_driver_sql("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").all()
+        )
+        indexes = {r[0] for r in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        columns = _missing_columns(conn)
+        has_node = conn.exec_driver_sql(
+            "SELECT 1 FROM sync_state WHERE key = 'node_id'"
+        ).first()
+    wanted = desired_triggers()
+    stale = {n: sql for n, sql in wanted.items() if existing.get(n) != sql}
+    new_indexes = [i for t in metadata.sorted_tables for i in t.indexes if i.name not in indexes]
+    if stale or columns or new_indexes or not has_node:
+        _apply(engine, columns, new_indexes, stale, has_node)
+    _drop_foreign_sizes(engine, existing, stale)
+    _backfill_category_tree(engine)
+    _backfill_daily_spend(engine)
+    _backfill_category_stats(engine)
+    _backfill_amount_sketch(engine)
+    _backfill_template_keys(engine)
+
+
+def _apply(engine: Engine, columns, new_indexes, stale, has_node) -> None:
+    with engine.begin() as conn:
+        # 旧库补列：新增列必须可空或带 server_default
+        for table, col in columns:
+            ddl = CreateColumn(col).compile(dialect=engine.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+        for idx in new_indexes:
+            conn.execute(CreateIndex(idx, if_not_exists=True))
+        for name, sql in stale.items():
+            # 表结构变化后触发器的 payload 也要跟着重建
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+            conn.exec_driver_sql(sql)
+        if not has_node:
+            conn.exec_driver_sql(
+                "INSERT OR IGNORE INTO sync_state (key, value) VALUES ('node_id', ?)",
+                (uuid.uuid4().hex,),
+            )
@@ -1,27 +1,251 @@
 # ledger/repo/sqlite_record_repo.py
 from __future__ import annotations
-from typing import Iterable
+from collections import defaultdict
+from typing import Iterable, Dict, Sequence
 from datetime import date
 from calendar import monthrange
-from sqlalchemy import select, insert, and_, or_
+from itertools import islice
+from sqlalchemy import select, insert, update, delete, and_, or_, bindparam, func, case, cast, Date, Integer
 from sqlalchemy.orm import Session
-from .record_repo import RecordRepository
-from .sqlite_schema import records
-from ..models import Record, RecordType
+from .record_repo import RecordRepository, RecordFilter
+from .record_query import RecordQuery
+from .record_mapping import rows_to_records, iter_row_views
+from .sqlite_schema import records, categories, category_closure, balance_checkpoints, amount_sketch
+from ..utils.category_path import group_level, is_under, rollup
+from ..utils.periods import BUCKETS, add_months, bucket_starts, month_start
+from ..utils.sketch import QuantileSketch, bucket_of
+from .sqlite_category_repo import SqliteCategoryRepository
+from .sqlite_tag_repo import SqliteTagRepository
+from .sqlite_fx_repo import foreign_deltas
+from ..utils import bitmap, periods
+from ..utils.fx import FxTable
+from ..models import BASE_CURRENCY, Record, RecordType
+
+
+RECORD_COLUMNS = (
+    records.c.record_id,
+    records.c.user_id,
+    records.c.rtype,
+    categories.c.name.label("category"),
+    records.c.amount,
+    records.c.occurred_on,
+    records.c.note,
+    records.c.currency,
+)
+
+# 读路径统一 join 分类字典，把 category_id 还原成名称
+_FROM = records.join(categories, categories.c.category_id == records.c.category_id)
+
+# 热点查询只构建一次，调用时仅绑定参数（SQLAlchemy 会复用编译缓存）
+_PERIOD = and_(
+    records.c.user_id == bindparam("user_id"),
+    records.c.occurred_on >= bindparam("start"),
+    records.c.occurred_on < bindparam("end"),
+)
+
+_LIST_BY_PERIOD = (
+    select(*RECORD_COLUMNS)
+    .select_from(_FROM)
+    .where(_PERIOD)
+    .order_by(records.c.occurred_on.asc(), records.c.record_id.asc())
+)
+
+_SEARCH = (
+    select(*RECORD_COLUMNS)
+    .select_from(_FROM)
+    .where(
+        and_(
+            records.c.user_id == bindparam("user_id"),
+            or_(
+                categories.c.name.like(bindparam("like"), escape="\\"),
+                records.c.note.like(bindparam("like"), escape="\\"),
+            ),
+        )
+    )
+    .order_by(records.c.occurred_on.desc(), records.c.record_id.desc())
+)
+
+_LIST_BY_BATCH = (
+    select(*RECORD_COLUMNS)
+    .select_from(_FROM)
+    .where(
+        and_(
+            records.c.user_id == bindparam("user_id"),
+            records.c.import_batch == bindparam("import_batch"),
+        )
+    )
+    .order_by(records.c.record_id.asc())
+)
+
+_TOTALS_BY_TYPE = (
+    select(records.c.rtype, func.sum(records.c.amount))
+    .where(_PERIOD)
+    .group_by(records.c.rtype)
+)
+
+# 时间桶 = 桶内第一天：日 / 所在 ISO 周的周一 / 月初
+_WEEKDAY = (cast(func.strftime("%w", records.c.occurred_on), Integer) + 6) % 7
+_BUCKET_KEYS = {
+    "day": records.c.occurred_on,
+    "week": func.date(records.c.occurred_on, func.printf("-%d days", _WEEKDAY), type_=Date),
+    "month": func.date(records.c.occurred_on, "start of month", type_=Date),
+}
+_SERIES_BY_TYPE = {
+    name: select(key.label("bucket"), records.c.rtype, func.sum(records.c.amount))
+    .where(_PERIOD)
+    .group_by(key, records.c.rtype)
+    for name, key in _BUCKET_KEYS.items()
+}
+
+# 余额 = 最近的月初检查点 + 检查点之后到当天之前的记录（索引范围扫描）
+_LATEST_CHECKPOINT = (
+    select(balance_checkpoints.c.month, balance_checkpoints.c.opening)
+    .where(
+        and_(
+            balance_checkpoints.c.user_id == bindparam("user_id"),
+            balance_checkpoints.c.month <= bindparam("day"),
+        )
+    )
+    .order_by(balance_checkpoints.c.month.desc())
+    .limit(1)
+)
+_NET = select(
+    func.sum(
+        case((records.c.rtype == RecordType.INCOME.value, records.c.amount), else_=-records.c.amount)
+    )
+).where(_PERIOD)
+
+_TOTALS_BY_CATEGORY = (
+    select(records.c.category_id, func.sum(records.c.amount))
+    .where(and_(_PERIOD, records.c.rtype == bindparam("rtype")))
+    .group_by(records.c.category_id)
+)
+
+# 多币种统计：按 (类型, 分类, 币种, 日) 预聚合，换算在内存里按列完成
+_DAILY_BY_CURRENCY = (
+    select(records.c.rtype, records.c.category_id, records.c.currency, records.c.occurred_on, func.sum(records.c.amount))
+    .where(_PERIOD)
+    .group_by(records.c.rtype, records.c.category_id, records.c.currency, records.c.occurred_on)
+)
+
+# 金额分布只统计本位币支出，与 amount_sketch 触发器一致
+_EXPENSE_AMOUNTS = select(records.c.category_id, records.c.amount).where(
+    and_(_PERIOD, records.c.rtype == RecordType.EXPENSE.value, records.c.currency == BASE_CURRENCY)
+)
+_NOTE_AMOUNTS = select(records.c.note, records.c.amount, records.c.currency, records.c.occurred_on).where(
+    and_(_PERIOD, records.c.rtype == bindparam("rtype"))
+)
+_SKETCH_COUNTS = (
+    select(amount_sketch.c.category_id, amount_sketch.c.bucket, func.sum(amount_sketch.c.n))
+    .where(
+        and_(
+            amount_sketch.c.user_id == bindparam("user_id"),
+            amount_sketch.c.month >= bindparam("start"),
+            amount_sketch.c.month < bindparam("end"),
+        )
+    )
+    .group_by(amount_sketch.c.category_id, amount_sketch.c.bucket)
+)
+
+
+_SORT_COLUMNS = {
+    "date": records.c.occurred_on,
+    "amount": records.c.amount,
+    "category": categories.c.name,
+    "id": records.c.record_id,
+}
+
+
+def _like(keyword: str) -> str:
+    """``%keyword%`` with LIKE's own wildcards escaped (``ESCAPE '\\'``), so
+    ``50%`` is searched literally, as the in-memory backend does."""
+    return "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _category_ids(user_id: int, cond):
+    """Sub-select of the user's category ids matching ``cond``."""
+    return select(categories.c.category_id).where(and_(categories.c.user_id == user_id, cond))
+
+
+_ID_SLICE = 10000
+
+
+def _record_id_in(ids: Sequence[int]):
+    """``record_id IN (...)`` over ``_ID_SLICE``-sized slices of ``ids``.
+
+    The ids come from tag bitmaps (plain ints), so they are rendered inline
+    rather than bound: a tag can match more records than SQLite allows
+    bound variables.
+    """
+    return or_(
+        *(
+            records.c.record_id.in_(
+                bindparam(f"rid_{i}", list(ids[i:i + _ID_SLICE]), expanding=True, literal_execute=True)
+            )
+            for i in range(0, len(ids), _ID_SLICE)
+        )
+    )
+
+
+def compile_query(q: RecordQuery, record_ids: Sequence[int] | None = None):
+    """``RecordQuery`` -> one SELECT; every value is a bound parameter.
+
+    Conditions are emitted as plain range/IN/equality predicates on the
+    indexed columns so SQLite can pick ix_records_user_date or
+    ix_records_user_category_date; category names are turned into ids by a
+    sub-select on ux_categories_user_name. ``record_ids`` (the answer of
+    the tag conditions) narrows the SELECT to those primary keys.
+    """
+    conds = [records.c.user_id == q.user_id]
+    if record_ids is not None:
+        conds.append(_record_id_in(record_ids))
+    if q.start:
+        conds.append(records.c.occurred_on >= q.start)
+    if q.end:
+        conds.append(records.c.occurred_on < q.end)
+    if q.categories:
+        conds.append(records.c.category_id.in_(_category_ids(q.user_id, categories.c.name.in_(q.categories))))
+    if q.rtype is not None:
+        conds.append(records.c.rtype == q.rtype.value)
+    if q.min_amount is not None:
+        conds.append(records.c.amount >= q.min_amount)
+    if q.max_amount is not None:
+        conds.append(records.c.amount <= q.max_amount)
+    if q.keyword is not None:
+        like = _like(q.keyword)
+        conds.append(or_(categories.c.name.like(like, escape="\\"), records.c.note.like(like, escape="\\")))
+    col = _SORT_COLUMNS[q.sort_key]
+    if q.descending:
+        order = (col.desc(), records.c.record_id.desc())
+    else:
+        order = (col.asc(), records.c.record_id.asc())
+    stmt = select(*RECORD_COLUMNS).select_from(_FROM).where(and_(*conds)).order_by(*order)
+    if q.limit is not None:
+        stmt = stmt.limit(q.limit)
+    if q.offset:
+        stmt = stmt.offset(q.offset)
+    return stmt
+
+
+# 批量导入：指纹唯一索引冲突的行被直接忽略（集合式去重，无逐行查询）
+_INSERT_OR_IGNORE = insert(records).prefix_with("OR IGNORE")
 
 
 class SqliteRecordRepository(RecordRepository):
     def __init__(self, session: Session):
         self._session = session
+        self._categories = SqliteCategoryRepository(session)
+        self._tags = SqliteTagRepository(session)
 
     def add(self, record: Record) -> Record:
         stmt = insert(records).values(
             user_id=record.user_id,
             rtype=record.rtype.value,
-            category=record.category,
+            category_id=self._categories.resolve(record.user_id, record.category),
             amount=float(record.amount),
             occurred_on=record.occurred_on,
             note=record.note or "",
+            currency=record.currency,
         )
         res = self._session.execute(stmt)
         pk = res.inserted_primary_key[0]
@@ -34,75 +258,411 @@ class SqliteRecordRepository(RecordRepository):
             amount=float(record.amount),
             occurred_on=record.occurred_on,
             note=record.note or "",
+            currency=record.currency,
         )
 
-    def list_by_period(self, user_id: int, start: date, end: date) -> Iterable[Record]:
-        q = (
-            select(
-                records.c.record_id,
-                records.c.user_id,
-                records.c.rtype,
-                records.c.category,
-                records.c.amount,
-                records.c.occurred_on,
-                records.c.note,
-            )
-            .where(
-                and_(
-                    records.c.user_id == user_id,
-                    records.c.occurred_on >= start,
-                    records.c.occurred_on < end,
+    def add_many(
+        self,
+        recs: Sequence[Record],
+        *,
+        fingerprints: Sequence[str | None] | None = None,
+        import_batch: str | None = None,
+        commit: bool = True,
+    ) -> int:
+        """Bulk insert; rows whose fingerprint already exists are skipped.
+
+        Returns the number of rows actually inserted. ``commit=False`` leaves
+        the transaction open so the caller can commit it with other writes.
+        """
+        if not recs:
+            return 0
+        fps = fingerprints if fingerprints is not None else [None] * len(recs)
+        # 每个 (用户, 分类名) 只解析一次；缓存跨分块复用
+        ids: dict[int, dict[str, int]] = {}
+        for uid in {r.user_id for r in recs}:
+            ids[uid] = self._categories.resolve_many(uid, {r.category for r in recs if r.user_id == uid})
+        rows = [
+            {
+                "user_id": r.user_id,
+                "rtype": r.rtype.value,
+                "category_id": ids[r.user_id][r.category],
+                "amount": float(r.amount),
+                "occurred_on": r.occurred_on,
+                "note": r.note or "",
+                "currency": r.currency,
+                "fingerprint": fp,
+                "import_batch": import_batch,
+            }
+            for r, fp in zip(recs, fps)
+        ]
+        res = self._session.execute(_INSERT_OR_IGNORE, rows)
+        if commit:
+            self._session.commit()
+        return int(res.rowcount)
+
+    # ---- bulk operations：每个操作一条 UPDATE/DELETE；触发器在同一事务里维护 change_log ----
+    @staticmethod
+    def _where(flt: RecordFilter):
+        conds = [records.c.user_id == flt.user_id]
+        if flt.start:
+            conds.append(records.c.occurred_on >= flt.start)
+        if flt.end:
+            conds.append(records.c.occurred_on < flt.end)
+        # UPDATE / DELETE 不能 join，分类条件用子查询换成 category_id
+        if flt.category is not None:
+            conds.append(records.c.category_id.in_(_category_ids(flt.user_id, categories.c.name == flt.category)))
+        if flt.keyword is not None:
+            like = _like(flt.keyword)
+            conds.append(
+                or_(
+                    records.c.category_id.in_(
+                        _category_ids(flt.user_id, categories.c.name.like(like, escape="\\"))
+                    ),
+                    records.c.note.like(like, escape="\\"),
                 )
             )
+        if flt.import_batch is not None:
+            conds.append(records.c.import_batch == flt.import_batch)
+        return and_(*conds)
+
+    def count_where(self, flt: RecordFilter) -> int:
+        return int(
+            self._session.execute(
+                select(func.count()).select_from(records).where(self._where(flt))
+            ).scalar()
+        )
+
+    def _bulk(self, stmt, flt: RecordFilter, dry_run: bool) -> int:
+        if dry_run:
+            return self.count_where(flt)
+        res = self._session.execute(stmt)
+        self._session.commit()
+        return int(res.rowcount)
+
+    def recategorize(self, flt: RecordFilter, new_category: str, *, dry_run: bool = False) -> int:
+        if dry_run:
+            return self.count_where(flt)
+        cid = self._categories.resolve(flt.user_id, new_category)
+        stmt = update(records).where(self._where(flt)).values(category_id=cid)
+        return self._bulk(stmt, flt, dry_run)
+
+    def shift_dates(self, flt: RecordFilter, days: int, *, dry_run: bool = False) -> int:
+        stmt = (
+            update(records)
+            .where(self._where(flt))
+            .values(occurred_on=func.date(records.c.occurred_on, f"{int(days):+d} days"))
+        )
+        return self._bulk(stmt, flt, dry_run)
+
+    def delete_where(self, flt: RecordFilter, *, dry_run: bool = False) -> int:
+        if flt.is_unbounded():
+            raise ValueError("refusing to delete without a filter")
+        return self._bulk(delete(records).where(self._where(flt)), flt, dry_run)
+
+    def list_where(self, flt: RecordFilter) -> Iterable[Record]:
+        stmt = (
+            select(*RECORD_COLUMNS)
+            .select_from(_FROM)
+            .where(self._where(flt))
             .order_by(records.c.occurred_on.asc(), records.c.record_id.asc())
         )
-        rows = self._session.execute(q).all()
-        return [
-            Record(
-                record_id=row.record_id,
-                user_id=row.user_id,
-                rtype=RecordType(row.rtype),
-                category=row.category,
-                amount=float(row.amount),
-                occurred_on=row.occurred_on,
-                note=row.note or "",
-            )
-            for row in rows
-        ]
+        return rows_to_records(self._session.execute(stmt))
+
+    def set_categories(self, user_id: int, changes: Dict[int, str]) -> int:
+        """One UPDATE per target category (ids in slices below SQLite's
+        bound-parameter limit), all in a single transaction."""
+        by_cat: Dict[str, list[int]] = {}
+        for rid, name in changes.items():
+            by_cat.setdefault(name, []).append(rid)
+        ids = self._categories.resolve_many(user_id, by_cat)
+        n = 0
+        for name, rids in by_cat.items():
+            for i in range(0, len(rids), _ID_SLICE):
+                res = self._session.execute(
+                    update(records)
+                    .where(and_(records.c.user_id == user_id, records.c.record_id.in_(rids[i:i + _ID_SLICE])))
+                    .values(category_id=ids[name])
+                )
+                n += res.rowcount
+        self._session.commit()
+        return n
+
+    def rollback(self) -> None:
+        self._session.rollback()
+        self._categories.forget()
+        self._tags.forget()
+
+    def list_by_period(
+        self, user_id: int, start: date, end: date, *, lazy: bool = False
+    ) -> Iterable[Record]:
+        """Records in [start, end).
+
+        With ``lazy=True`` returns a generator of ``RecordRow`` views that
+        reads from the open cursor instead of building a list of Records.
+        """
+        result = self._session.execute(
+            _LIST_BY_PERIOD, {"user_id": user_id, "start": start, "end": end}
+        )
+        if lazy:
+            return iter_row_views(result)
+        return rows_to_records(result)
+
+    def search(self, user_id: int, keyword: str, *, lazy: bool = False) -> Iterable[Record]:
+        result = self._session.execute(
+            _SEARCH, {"user_id": user_id, "like": _like(keyword)}
+        )
+        if lazy:
+            return iter_row_views(result)
+        return rows_to_records(result)
+
+    def query(self, q: RecordQuery, *, lazy: bool = False) -> Iterable[Record]:
+        if q.has_tag_filter:
+            return self._tagged_query(q, lazy)
+        result = self._session.execute(compile_query(q))
+        if lazy:
+            return iter_row_views(result)
+        return rows_to_records(result)
+
+    def _tagged_query(self, q: RecordQuery, lazy: bool) -> Iterable[Record]:
+        # 标签条件先在位图上求交/差，解码一次成 id 列表并入 SQL；排序和分页仍由 SQL 完成
+        bm = self._tags.match(q.user_id, q.tags, q.without_tags, start=q.start, end=q.end)
+        if not bm:
+            return iter(()) if lazy else []
+        rows = self._session.execute(compile_query(q, bitmap.to_ids(bm)))
+        if lazy:
+            return iter_row_views(rows)
+        return rows_to_records(rows)
+
+    # ---- tags ----
+    def tag(self, user_id: int, record_ids: Iterable[int], names: Iterable[str]) -> int:
+        return self._tags.tag(user_id, record_ids, names)
+
+    def untag(self, user_id: int, record_ids: Iterable[int], names: Iterable[str]) -> int:
+        return self._tags.untag(user_id, record_ids, names)
+
+    def tags_of(self, record_ids: Iterable[int]) -> Dict[int, list[str]]:
+        return self._tags.tags_of(record_ids)
+
+    def tag_counts(self, user_id: int) -> Dict[str, int]:
+        return self._tags.counts(user_id)
+
+    def totals_by_tag(
+        self,
+        user_id: int,
+        start: date,
+        end: date,
+        rtype: RecordType = RecordType.EXPENSE,
+        *,
+        fx: FxTable | None = None,
+    ) -> Dict[str, float]:
+        return self._tags.totals_by_tag(user_id, start, end, rtype, fx=fx)
 
-    def search(self, user_id: int, keyword: str) -> Iterable[Record]:
-        like = f"%{keyword}%"
-        q = (
-            select(
-                records.c.record_id,
-                records.c.user_id,
-                records.c.rtype,
-                records.c.category,
-                records.c.amount,
-                records.c.occurred_on,
-                records.c.note,
+    def explain(self, q: RecordQuery) -> list[str]:
+        """SQLite's EXPLAIN QUERY PLAN for ``q``, one line per plan step."""
+        conn = self._session.connection()
+        compiled = compile_query(q).compile(
+            dialect=conn.dialect, compile_kwargs={"render_postcompile": True}
+        )
+        params = compiled.construct_params()
+        args = tuple(
+            v.isoformat() if isinstance(v, date) else v
+            for v in (params[k] for k in compiled.positiontup)
+        )
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled.string}", args).all()
+        depth = {0: 0}
+        out = []
+        for node, parent, _unused, detail in rows:
+            depth[node] = depth.get(parent, 0) + 1
+            out.append("  " * (depth[node] - 1) + detail)
+        return out
+
+    def _deltas(self, fx: FxTable | None, keys, user_id: int, start: date, end: date, *conds) -> list[tuple]:
+        """Base-currency corrections for the totals below (see ``foreign_deltas``)."""
+        return foreign_deltas(
+            self._session,
+            fx,
+            keys,
+            [records.c.user_id == user_id, records.c.occurred_on >= start, records.c.occurred_on < end, *conds],
+        )
+
+    def totals_by_type(
+        self, user_id: int, start: date, end: date, *, fx: FxTable | None = None
+    ) -> Dict[str, float]:
+        out = {t.value: 0.0 for t in RecordType}
+        params = {"user_id": user_id, "start": start, "end": end}
+        for rtype, total in self._session.execute(_TOTALS_BY_TYPE, params):
+            out[rtype] = float(total or 0.0)
+        for rtype, _day, delta in self._deltas(fx, [records.c.rtype], user_id, start, end):
+            out[rtype] += delta
+        return out
+
+    def series_by_type(
+        self, user_id: int, start: date, end: date, bucket: str = "month", *, fx: FxTable | None = None
+    ) -> Dict[date, Dict[str, float]]:
+        """One grouped query over the (user_id, occurred_on) index."""
+        if bucket not in BUCKETS:
+            raise ValueError(f"unknown bucket {bucket!r}; expected one of {', '.join(BUCKETS)}")
+        out = {b: {t.value: 0.0 for t in RecordType} for b in bucket_starts(start, end, bucket)}
+        params = {"user_id": user_id, "start": start, "end": end}
+        for b, rtype, total in self._session.execute(_SERIES_BY_TYPE[bucket], params):
+            out[b][rtype] = float(total or 0.0)
+        for rtype, day, delta in self._deltas(fx, [records.c.rtype], user_id, start, end):
+            out[periods.bucket_of(day, bucket)][rtype] += delta
+        return out
+
+    def opening_balance(self, user_id: int, day: date, *, fx: FxTable | None = None) -> float:
+        cp = self._session.execute(_LATEST_CHECKPOINT, {"user_id": user_id, "day": day}).first()
+        start, base = (cp.month, cp.opening) if cp else (date.min, 0.0)
+        tail = self._session.execute(_NET, {"user_id": user_id, "start": start, "end": day}).scalar()
+        # 检查点按原币累加；外币部分在整段历史上按汇率补差
+        for rtype, _day, delta in self._deltas(fx, [records.c.rtype], user_id, date.min, day):
+            base += delta if rtype == RecordType.INCOME.value else -delta
+        return round(base + float(tail or 0.0), 2)
+
+    def totals_by_category(
+        self,
+        user_id: int,
+        start: date,
+        end: date,
+        rtype: RecordType = RecordType.EXPENSE,
+        *,
+        depth: int | None = None,
+        parent: str | None = None,
+        fx: FxTable | None = None,
+    ) -> Dict[str, float]:
+        level = group_level(depth, parent)
+        deltas = self._deltas(fx, [records.c.category_id], user_id, start, end, records.c.rtype == rtype.value)
+        if level is not None:
+            out = self._rollup_totals(user_id, start, end, rtype, level, parent)
+        else:
+            params = {"user_id": user_id, "start": start, "end": end, "rtype": rtype.value}
+            # 分组在整数键上完成，名称只在结果上解析一次
+            totals = {cid: float(total or 0.0) for cid, total in self._session.execute(_TOTALS_BY_CATEGORY, params)}
+            names = self._categories.names(totals)
+            out = {names[cid]: total for cid, total in totals.items()}
+        names = self._categories.names(cid for cid, _, _ in deltas)
+        for cid, _day, delta in deltas:
+            name = names[cid]
+            if parent is not None and not is_under(name, parent):
+                continue
+            key = name if level is None else rollup(name, level)
+            out[key] = out.get(key, 0.0) + delta
+        return out
+
+    def daily_by_currency(
+        self, user_id: int, start: date, end: date
+    ) -> list[tuple[str, str, str, date, float]]:
+        """(rtype, category, currency, day, total) rows: one grouped query;
+        the caller converts each row at that day's rate."""
+        params = {"user_id": user_id, "start": start, "end": end}
+        rows = self._session.execute(_DAILY_BY_CURRENCY, params).all()
+        names = self._categories.names(cid for _, cid, _, _, _ in rows)
+        return [(rtype, names[cid], cur, day, float(total)) for rtype, cid, cur, day, total in rows]
+
+    def note_amounts(
+        self,
+        user_id: int,
+        start: date,
+        end: date,
+        rtype: RecordType = RecordType.EXPENSE,
+        *,
+        fx: FxTable | None = None,
+    ) -> Iterable[tuple[str, float]]:
+        """Streams (note, amount) pairs in the base currency; rows are fetched
+        in chunks, never all at once."""
+        fx = fx or FxTable()
+        params = {"user_id": user_id, "start": start, "end": end, "rtype": rtype.value}
+        result = self._session.execute(_NOTE_AMOUNTS.execution_options(yield_per=5000), params)
+        return ((note or "", float(amount) * fx.rate(cur, day)) for note, amount, cur, day in result)
+
+    def amount_sketches(
+        self,
+        user_id: int,
+        start: date,
+        end: date,
+        *,
+        depth: int | None = None,
+        parent: str | None = None,
+    ) -> Dict[str, QuantileSketch]:
+        """Whole months are merged from ``amount_sketch`` in one grouped
+        query; only partial months at either end of the range read records."""
+        first = start if start.day == 1 else add_months(start, 1)
+        last = month_start(end)
+        counts: Dict[int, Dict[int, int]] = defaultdict(dict)
+        if first < last:
+            for cid, b, n in self._session.execute(
+                _SKETCH_COUNTS, {"user_id": user_id, "start": first, "end": last}
+            ):
+                counts[cid][b] = int(n)
+            edges = [(start, first), (last, end)]
+        else:
+            edges = [(start, end)]
+        for a, b in edges:
+            if a >= b:
+                continue
+            for cid, amount in self._session.execute(_EXPENSE_AMOUNTS, {"user_id": user_id, "start": a, "end": b}):
+                k = bucket_of(amount)
+                counts[cid][k] = counts[cid].get(k, 0) + 1
+        names = self._categories.names(counts)
+        level = group_level(depth, parent)
+        out: Dict[str, QuantileSketch] = {}
+        for cid, c in counts.items():
+            name = names[cid]
+            if parent is not None and not is_under(name, parent):
+                continue
+            key = name if level is None else rollup(name, level)
+            out.setdefault(key, QuantileSketch()).merge(QuantileSketch(c))
+        return out
+
+    def _rollup_totals(
+        self, user_id: int, start: date, end: date, rtype: RecordType, level: int, parent: str | None
+    ) -> Dict[str, float]:
+        """One query over the closure table: each record is credited to its
+        ancestor at ``level`` (or to its own category when shallower)."""
+        own, anc = categories.alias("own"), categories.alias("anc")
+        conds = [
+            records.c.user_id == user_id,
+            records.c.occurred_on >= start,
+            records.c.occurred_on < end,
+            records.c.rtype == rtype.value,
+            anc.c.depth == func.min(own.c.depth, level),
+        ]
+        if parent is not None:
+            pid = self._categories.find(user_id, parent)
+            if pid is None:
+                return {}
+            conds.append(records.c.category_id.in_(self._categories.subtree_ids(pid)))
+        stmt = (
+            select(anc.c.name, func.sum(records.c.amount))
+            .select_from(
+                records.join(own, own.c.category_id == records.c.category_id)
+                .join(category_closure, category_closure.c.descendant_id == records.c.category_id)
+                .join(anc, anc.c.category_id == category_closure.c.ancestor_id)
             )
-            .where(
-                and_(
+            .where(and_(*conds))
+            .group_by(anc.c.category_id)
+        )
+        return {name: float(total or 0.0) for name, total in self._session.execute(stmt)}
+
+    def list_by_batch(self, user_id: int, import_batch: str) -> Iterable[Record]:
+        result = self._session.execute(
+            _LIST_BY_BATCH, {"user_id": user_id, "import_batch": import_batch}
+        )
+        return rows_to_records(result)
+
+    def fingerprints_in_batch(self, user_id: int, import_batch: str, fps: Sequence[str]) -> set[str]:
+        """Which of ``fps`` were inserted by ``import_batch`` (the rest were duplicates)."""
+        out: set[str] = set()
+        it = iter(fps)
+        while ids := list(islice(it, _ID_SLICE)):
+            out.update(self._session.execute(
+                select(records.c.fingerprint).where(
                     records.c.user_id == user_id,
-                    or_(records.c.category.like(like), records.c.note.like(like)),
+                    records.c.import_batch == import_batch,
+                    records.c.fingerprint.in_(ids),
                 )
-            )
-            .order_by(records.c.occurred_on.desc(), records.c.record_id.desc())
-        )
-        rows = self._session.execute(q).all()
-        return [
-            Record(
-                record_id=row.record_id,
-                user_id=row.user_id,
-                rtype=RecordType(row.rtype),
-                category=row.category,
-                amount=float(row.amount),
-                occurred_on=row.occurred_on,
-                note=row.note or "",
-            )
-            for row in rows
-        ]
+            ).scalars())
+        return out
 
     # 新增：测试会调用它
     def list_month(self, user_id: int, year: int, month: int) -> Iterable[Record]:
@@ -0,0 +1,75 @@
+"""Recurring record templates and their high-water marks."""
+from __future__ import annotations
+import uuid
+from datetime import date
+from typing import Mapping
+from sqlalchemy import select, insert, update, delete, and_, or_, bindparam
+from sqlalchemy.orm import Session
+from .sqlite_schema import recurring_templates as rt
+from ..models import RecordType, RecurringTemplate
+
+_COLUMNS = (
+    rt.c.template_id, rt.c.user_id, rt.c.rtype, rt.c.category, rt.c.amount, rt.c.freq,
+    rt.c.start_on, rt.c.end_on, rt.c.note, rt.c.every, rt.c.next_on, rt.c.template_key,
+)
+
+_ADVANCE = update(rt).where(rt.c.template_id == bindparam("tid")).values(next_on=bindparam("next_on"))
+
+
+def _to_template(r) -> RecurringTemplate:
+    return RecurringTemplate(
+        r.template_id, r.user_id, RecordType(r.rtype), r.category, float(r.amount), r.freq,
+        r.start_on, r.end_on, r.note, r.every, r.next_on, r.template_key,
+    )
+
+
+class SqliteRecurringRepository:
+    def __init__(self, session: Session):
+        self._session = session
+
+    def add(self, tpl: RecurringTemplate) -> RecurringTemplate:
+        next_on = tpl.next_on or tpl.start
+        key = tpl.key or uuid.uuid4().hex
+        res = self._session.execute(insert(rt).values(
+            user_id=tpl.user_id,
+            rtype=tpl.rtype.value,
+            category=tpl.category,
+            amount=float(tpl.amount),
+            note=tpl.note or "",
+            freq=tpl.freq,
+            every=tpl.every,
+            start_on=tpl.start,
+            end_on=tpl.end,
+            next_on=next_on,
+            template_key=key,
+        ))
+        self._session.commit()
+        return RecurringTemplate(
+            int(res.inserted_primary_key[0]), tpl.user_id, tpl.rtype, tpl.category, float(tpl.amount),
+            tpl.freq, tpl.start, tpl.end, tpl.note or "", tpl.every, next_on, key,
+        )
+
+    def list_by_user(self, user_id: int) -> list[RecurringTemplate]:
+        rows = self._session.execute(select(*_COLUMNS).where(rt.c.user_id == user_id).order_by(rt.c.template_id))
+        return [_to_template(r) for r in rows]
+
+    def remove(self, user_id: int, template_id: int) -> bool:
+        res = self._session.execute(
+            delete(rt).where(and_(rt.c.user_id == user_id, rt.c.template_id == template_id))
+        )
+        self._session.commit()
+        return res.rowcount > 0
+
+    def due(self, until: date, user_id: int | None = None) -> list[RecurringTemplate]:
+        """Templates with an occurrence on or before ``until`` still to generate."""
+        conds = [rt.c.next_on <= until, or_(rt.c.end_on.is_(None), rt.c.next_on <= rt.c.end_on)]
+        if user_id is not None:
+            conds.append(rt.c.user_id == user_id)
+        rows = self._session.execute(select(*_COLUMNS).where(and_(*conds)).order_by(rt.c.template_id))
+        return [_to_template(r) for r in rows]
+
+    def advance(self, marks: Mapping[int, date]) -> None:
+        """Move high-water marks; left uncommitted so the caller commits them
+        together with the generated records."""
+        if marks:
+            self._session.execute(_ADVANCE, [{"tid": tid, "next_on": d} for tid, d in marks.items()])
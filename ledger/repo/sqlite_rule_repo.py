@@ -0,0 +1,57 @@
+"""Per-user category rules."""
+from __future__ import annotations
+from typing import Iterable
+from sqlalchemy import select, insert, delete, and_
+from sqlalchemy.orm import Session
+from .sqlite_schema import category_rules
+from ..models import CategoryRule
+
+_COLUMNS = (
+    category_rules.c.rule_id,
+    category_rules.c.user_id,
+    category_rules.c.category,
+    category_rules.c.pattern,
+    category_rules.c.kind,
+    category_rules.c.min_amount,
+    category_rules.c.max_amount,
+    category_rules.c.priority,
+)
+
+
+class SqliteRuleRepository:
+    def __init__(self, session: Session):
+        self._session = session
+
+    def add(self, rule: CategoryRule) -> CategoryRule:
+        res = self._session.execute(insert(category_rules).values(
+            user_id=rule.user_id,
+            category=rule.category,
+            pattern=rule.pattern,
+            kind=rule.kind,
+            min_amount=rule.min_amount,
+            max_amount=rule.max_amount,
+            priority=rule.priority,
+        ))
+        self._session.commit()
+        return CategoryRule(
+            int(res.inserted_primary_key[0]), rule.user_id, rule.category, rule.pattern,
+            rule.kind, rule.min_amount, rule.max_amount, rule.priority,
+        )
+
+    def list_by_user(self, user_id: int) -> Iterable[CategoryRule]:
+        """Rules in evaluation order (priority, then creation order)."""
+        rows = self._session.execute(
+            select(*_COLUMNS)
+            .where(category_rules.c.user_id == user_id)
+            .order_by(category_rules.c.priority, category_rules.c.rule_id)
+        )
+        return [CategoryRule(*r) for r in rows]
+
+    def remove(self, user_id: int, rule_id: int) -> bool:
+        res = self._session.execute(
+            delete(category_rules).where(
+                and_(category_rules.c.user_id == user_id, category_rules.c.rule_id == rule_id)
+            )
+        )
+        self._session.commit()
+        return res.rowcount > 0
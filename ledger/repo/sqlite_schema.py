@@ -12,7 +12,10 @@ from sqlalchemy import (
     Time,
     Boolean,
     ForeignKey,
+    Index,
+    text,
 )
+from ..models.record import BASE_CURRENCY
 
 metadata = MetaData()
 
@@ -26,16 +29,72 @@ users = Table(
     Column("password_hash", String(128), nullable=False),  # ← 新增：存密码散列
 )
 
+# 分类字典：每个用户一份，records / budgets 只存整数 category_id
+categories = Table(
+    "categories",
+    metadata,
+    Column("category_id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False),
+    Column("name", String(100), nullable=False),  # 完整路径，如 Food/Groceries
+    Column("parent_id", Integer, ForeignKey("categories.category_id"), nullable=True),
+    Column("depth", Integer, nullable=False, server_default="1"),  # 顶层为 1
+    Index("ux_categories_user_name", "user_id", "name", unique=True),
+)
+
+# 闭包表：每个 (祖先, 后代) 一行（含自身，depth=0）；由 categories 上的触发器维护
+category_closure = Table(
+    "category_closure",
+    metadata,
+    Column("ancestor_id", Integer, ForeignKey("categories.category_id"), primary_key=True),
+    Column("descendant_id", Integer, ForeignKey("categories.category_id"), primary_key=True),
+    Column("depth", Integer, nullable=False),
+    Index("ix_category_closure_descendant", "descendant_id", "ancestor_id"),
+)
+
 records = Table(
     "records",
     metadata,
     Column("record_id", Integer, primary_key=True, autoincrement=True),
     Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False, index=True),
     Column("rtype", String(10), nullable=False),  # INCOME / EXPENSE
-    Column("category", String(100), nullable=False, index=True),
+    Column("category_id", Integer, ForeignKey("categories.category_id"), nullable=False),
     Column("amount", Float, nullable=False),
     Column("occurred_on", Date, nullable=False, index=True),
     Column("note", String(500), nullable=False, default=""),
+    Column("currency", String(3), nullable=False, server_default=BASE_CURRENCY),  # ISO 4217；旧库补列时即为本位币
+    # 导入去重：内容指纹（手工 add 的记录为 NULL），以及所属导入批次
+    Column("fingerprint", String(32), nullable=True),
+    Column("import_batch", String(32), nullable=True, index=True),
+    Index("ux_records_fingerprint", "fingerprint", unique=True),
+    # 组合索引：按用户 + 日期范围 / 用户 + 分类集合 的查询可直接走索引
+    Index("ix_records_user_date", "user_id", "occurred_on"),
+    Index("ix_records_user_category_date", "user_id", "category_id", "occurred_on"),
+    Index("ix_records_user_type_amount", "user_id", "rtype", "amount"),  # top-N：按金额倒序扫描，取够即停
+    # 外币记录通常很少：部分索引让“汇总后按汇率补差”只扫这些行
+    Index(
+        "ix_records_foreign",
+        "user_id",
+        "occurred_on",
+        sqlite_where=text(f"currency != '{BASE_CURRENCY}'"),
+    ),
+)
+
+# 标签：多对多。record_tags 主键 (tag_id, record_id) 即按标签排列的倒排表
+tags = Table(
+    "tags",
+    metadata,
+    Column("tag_id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False),
+    Column("name", String(50), nullable=False),
+    Index("ux_tags_user_name", "user_id", "name", unique=True),
+)
+
+record_tags = Table(
+    "record_tags",
+    metadata,
+    Column("tag_id", Integer, ForeignKey("tags.tag_id"), primary_key=True),
+    Column("record_id", Integer, ForeignKey("records.record_id"), primary_key=True),
+    Index("ix_record_tags_record", "record_id", "tag_id"),
 )
 
 budgets = Table(
@@ -43,8 +102,11 @@ budgets = Table(
     metadata,
     Column("budget_id", Integer, primary_key=True, autoincrement=True),
     Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False, index=True),
-    Column("category", String(100), nullable=False, index=True),
-    Column("monthly_limit", Float, nullable=False),
+    Column("category_id", Integer, ForeignKey("categories.category_id"), nullable=False, index=True),
+    Column("monthly_limit", Float, nullable=False),  # 每个周期的额度（列名沿用旧名）
+    Column("period", String(10), nullable=False, server_default="MONTHLY"),
+    Column("start_on", Date, nullable=True),  # 仅 CUSTOM：[start_on, end_on)
+    Column("end_on", Date, nullable=True),
 )
 
 reminders = Table(
@@ -56,3 +118,177 @@ reminders = Table(
     Column("at", Time, nullable=False),
     Column("enabled", Boolean, nullable=False, default=True),
 )
+
+# ---- 每日支出汇总：(用户, 分类, 日) -> 支出合计，由 records 上的触发器增量维护；预算进度只读它 ----
+daily_spend = Table(
+    "daily_spend",
+    metadata,
+    Column("user_id", Integer, ForeignKey("users.user_id"), primary_key=True),
+    Column("category_id", Integer, ForeignKey("categories.category_id"), primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("total", Float, nullable=False),
+)
+
+# ---- 分类支出的在线统计（Welford）：笔数、均值、离差平方和，由 records 上的触发器 O(1) 维护 ----
+category_stats = Table(
+    "category_stats",
+    metadata,
+    Column("user_id", Integer, ForeignKey("users.user_id"), primary_key=True),
+    Column("category_id", Integer, ForeignKey("categories.category_id"), primary_key=True),
+    Column("n", Integer, nullable=False),
+    Column("mean", Float, nullable=False),
+    Column("m2", Float, nullable=False),  # 方差 = m2 / (n - 1)
+)
+
+# ---- 支出金额分布草图：(用户, 分类, 月, 对数桶) -> 笔数，见 utils/sketch.py；由触发器维护，可按任意月份区间合并 ----
+amount_sketch = Table(
+    "amount_sketch",
+    metadata,
+    Column("user_id", Integer, ForeignKey("users.user_id"), primary_key=True),
+    Column("category_id", Integer, ForeignKey("categories.category_id"), primary_key=True),
+    Column("month", Date, primary_key=True),
+    Column("bucket", Integer, primary_key=True),
+    Column("n", Integer, nullable=False),
+)
+
+# ---- 余额检查点：每个月初之前的累计余额（收入 - 支出），由 records 上的触发器增量维护 ----
+balance_checkpoints = Table(
+    "balance_checkpoints",
+    metadata,
+    Column("user_id", Integer, ForeignKey("users.user_id"), primary_key=True),
+    Column("month", Date, primary_key=True),  # 月初；opening 不含当天及之后的记录
+    Column("opening", Float, nullable=False),
+)
+
+# ---- 分类规则：按备注/金额自动归类（分类按名称保存，应用时再解析成 id） ----
+category_rules = Table(
+    "category_rules",
+    metadata,
+    Column("rule_id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False, index=True),
+    Column("kind", String(10), nullable=False, server_default="keyword"),
+    Column("pattern", String(255), nullable=True),
+    Column("category", String(50), nullable=False),
+    Column("min_amount", Float, nullable=True),
+    Column("max_amount", Float, nullable=True),
+    Column("priority", Integer, nullable=False, server_default="100"),
+)
+
+# ---- 周期记账模板：next_on 是高水位，之前的日期都已生成记录（分类按名称保存，生成时再解析） ----
+recurring_templates = Table(
+    "recurring_templates",
+    metadata,
+    Column("template_id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), nullable=False, index=True),
+    Column("rtype", String(10), nullable=False),
+    Column("category", String(50), nullable=False),
+    Column("amount", Float, nullable=False),
+    Column("note", String(500), nullable=False, default=""),
+    Column("freq", String(10), nullable=False),  # DAILY / WEEKLY / MONTHLY
+    Column("every", Integer, nullable=False, server_default="1"),
+    Column("start_on", Date, nullable=False),
+    Column("end_on", Date, nullable=True),  # 含当天
+    Column("next_on", Date, nullable=False, index=True),
+    # 稳定标识：生成记录的指纹用它而不是 template_id（id 会被复用，分片搬迁后也会变）
+    Column("template_key", String(32), nullable=True),
+    Index("ux_recurring_templates_key", "template_key", unique=True),
+    sqlite_autoincrement=True,
+)
+
+# 汇率：1 单位 currency 在 day 当天折合多少本位币；全局共享，不按用户分片
+fx_rates = Table(
+    "fx_rates",
+    metadata,
+    Column("currency", String(3), primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("rate", Float, nullable=False),
+)
+
+# ---- 分片模式（仅目录库使用；普通库里这两张表为空） ----
+shards = Table(
+    "shards",
+    metadata,
+    Column("shard_id", Integer, primary_key=True, autoincrement=False),
+    Column("url", String(500), nullable=False, unique=True),
+)
+
+user_shards = Table(
+    "user_shards",
+    metadata,
+    Column("user_id", Integer, ForeignKey("users.user_id"), primary_key=True),
+    Column("shard_id", Integer, ForeignKey("shards.shard_id"), nullable=False, index=True),
+)
+
+# ---- 同步：变更日志（由触发器写入，见 sqlite_migrations） ----
+change_log = Table(
+    "change_log",
+    metadata,
+    Column("seq", Integer, primary_key=True, autoincrement=True),
+    Column("table_name", String(50), nullable=False),
+    Column("row_id", Integer, nullable=False),
+    Column("op", String(1), nullable=False),  # I / U / D
+    Column("payload", String, nullable=True),  # 行内容 JSON（删除时为删除前的行）
+    Column("changed_at", String(30), nullable=False),  # UTC, ISO-8601 毫秒
+    Column("origin", String(32), nullable=False),  # 产生该变更的节点
+    Index("ix_change_log_row", "table_name", "row_id"),
+    sqlite_autoincrement=True,  # seq 单调递增、永不复用
+)
+
+sync_state = Table(
+    "sync_state",
+    metadata,
+    Column("key", String(50), primary_key=True),
+    Column("value", String(255), nullable=False),
+)
+
+# 正在应用远端变更时写入一行，触发器据此记录远端的 origin / changed_at
+sync_apply = Table(
+    "sync_apply",
+    metadata,
+    Column("origin", String(32), nullable=False),
+    Column("changed_at", String(30), nullable=False),
+)
+
+# 远端行 (origin, origin_id) -> 本地行 id
+sync_map = Table(
+    "sync_map",
+    metadata,
+    Column("table_name", String(50), primary_key=True),
+    Column("origin", String(32), primary_key=True),
+    Column("origin_id", Integer, primary_key=True),
+    Column("local_id", Integer, nullable=False),
+    Index("ix_sync_map_local", "table_name", "local_id"),
+)
+
+sync_peers = Table(
+    "sync_peers",
+    metadata,
+    Column("peer_id", String(32), primary_key=True),
+    Column("last_seq", Integer, nullable=False, default=0),
+)
+
+# ---- 可续传导入：每提交一批写一次检查点 ----
+import_checkpoints = Table(
+    "import_checkpoints",
+    metadata,
+    Column("file_key", String(32), primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), primary_key=True),
+    Column("path", String(1000), nullable=False),
+    Column("batch", String(32), nullable=False),
+    Column("byte_offset", Integer, nullable=False),
+    Column("rows_read", Integer, nullable=False),
+    Column("rows_committed", Integer, nullable=False),
+    Column("rows_rejected", Integer, nullable=False, server_default="0"),
+    Column("status", String(10), nullable=False),  # running / done
+    Column("updated_at", String(30), nullable=False),
+)
+
+# 续传用：文件内每个基础指纹已出现的次数，与检查点同一事务写入；导入完成后删除
+import_occurrences = Table(
+    "import_occurrences",
+    metadata,
+    Column("file_key", String(32), primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.user_id"), primary_key=True),
+    Column("fingerprint", String(32), primary_key=True),
+    Column("seen", Integer, nullable=False),
+)
@@ -0,0 +1,38 @@
+"""Per-category expense statistics (maintained by triggers on records)."""
+from __future__ import annotations
+from typing import Dict
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.orm import Session
+from .sqlite_schema import categories, category_stats
+from .sqlite_migrations import CATEGORY_STATS_FROM_RECORDS
+from ..models import CategoryStats
+
+
+class SqliteCategoryStatsRepository:
+    def __init__(self, session: Session):
+        self._session = session
+
+    def for_user(self, user_id: int) -> Dict[str, CategoryStats]:
+        rows = self._session.execute(
+            select(categories.c.name, category_stats.c.n, category_stats.c.mean, category_stats.c.m2)
+            .join_from(category_stats, categories, categories.c.category_id == category_stats.c.category_id)
+            .where(category_stats.c.user_id == user_id)
+        )
+        return {name: CategoryStats(n, mean, m2) for name, n, mean, m2 in rows}
+
+    def rebuild(self, user_id: int | None = None) -> int:
+        """Recompute from the records (drops accumulated rounding drift);
+        returns the number of categories."""
+        if user_id is None:
+            self._session.execute(delete(category_stats))
+            self._session.execute(text(CATEGORY_STATS_FROM_RECORDS.format(where="")))
+        else:
+            self._session.execute(delete(category_stats).where(category_stats.c.user_id == user_id))
+            self._session.execute(
+                text(CATEGORY_STATS_FROM_RECORDS.format(where="AND user_id = :uid")), {"uid": user_id}
+            )
+        self._session.commit()
+        q = select(func.count()).select_from(category_stats)
+        if user_id is not None:
+            q = q.where(category_stats.c.user_id == user_id)
+        return int(self._session.execute(q).scalar())
@@ -0,0 +1,228 @@
+"""
+Change-log based incremental sync between two ledgers.
+
+Every insert / update / delete on the synced tables is appended to
+``change_log`` by triggers (see ``sqlite_migrations``). ``export_since``
+returns the delta after a sequence number; ``apply`` replays a delta from
+another node in one transaction.
+
+Row identity across nodes is ``(origin node, origin row id)``; rows created
+by a peer are mapped to local ids through ``sync_map``. Category ids are
+local too, so rows travel with the category *name* and are re-resolved on
+apply. Conflicts are
+resolved last-writer-wins on ``(changed_at, origin)``, which gives the same
+winner on both sides regardless of sync order.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict
+
+from sqlalchemy import select, insert, update, delete, func, text, and_
+from sqlalchemy.orm import Session
+
+from .sqlite_migrations import SYNCED_TABLES
+from .sqlite_schema import change_log, sync_state, sync_apply, sync_map, sync_peers, users, records, categories
+from .sqlite_category_repo import SqliteCategoryRepository
+
+_TABLES = {t.name: t for t in SYNCED_TABLES}
+
+
+def _export_row(payload: str | None, cat_names: Dict[int, str]) -> Dict[str, Any] | None:
+    if not payload:
+        return None
+    row = json.loads(payload)
+    if "category_id" in row:
+        row["category"] = cat_names.get(row.pop("category_id"))
+    return row
+
+
+class SqliteSyncRepository:
+    def __init__(self, session: Session):
+        self._session = session
+
+    def node_id(self) -> str:
+        return self._session.execute(
+            select(sync_state.c.value).where(sync_state.c.key == "node_id")
+        ).scalar_one()
+
+    def latest_seq(self) -> int:
+        return int(self._session.execute(select(func.max(change_log.c.seq))).scalar() or 0)
+
+    def peer_watermarks(self) -> Dict[str, int]:
+        return dict(self._session.execute(select(sync_peers.c.peer_id, sync_peers.c.last_seq)).all())
+
+    # ---- export ----
+    def export_since(self, since: int) -> Dict[str, Any]:
+        node = self.node_id()
+        q = (
+            select(
+                change_log.c.seq,
+                change_log.c.table_name,
+                change_log.c.row_id,
+                change_log.c.op,
+                change_log.c.payload,
+                change_log.c.changed_at,
+                change_log.c.origin,
+                sync_map.c.origin.label("row_origin"),
+                sync_map.c.origin_id,
+            )
+            .select_from(
+                change_log.outerjoin(
+                    sync_map,
+                    and_(
+                        sync_map.c.table_name == change_log.c.table_name,
+                        sync_map.c.local_id == change_log.c.row_id,
+                    ),
+                )
+            )
+            .where(change_log.c.seq > since)
+            .order_by(change_log.c.seq.asc())
+        )
+        cat_names = dict(self._session.execute(select(categories.c.category_id, categories.c.name)).all())
+        changes = [
+            {
+                "seq": r.seq,
+                "table": r.table_name,
+                "op": r.op,
+                "gid": [r.row_origin or node, r.origin_id if r.row_origin else r.row_id],
+                "changed_at": r.changed_at,
+                "origin": r.origin,
+                "row": _export_row(r.payload, cat_names),
+            }
+            for r in self._session.execute(q)
+        ]
+        names = dict(self._session.execute(select(users.c.user_id, users.c.name)).all())
+        return {
+            "node": node,
+            "since": since,
+            "until": changes[-1]["seq"] if changes else since,
+            "users": {str(k): v for k, v in names.items()},
+            "changes": changes,
+        }
+
+    # ---- apply ----
+    def _local_id(self, table: str, origin: str, origin_id: int, node: str) -> int | None:
+        if origin == node:
+            return origin_id
+        return self._session.execute(
+            select(sync_map.c.local_id).where(
+                and_(
+                    sync_map.c.table_name == table,
+                    sync_map.c.origin == origin,
+                    sync_map.c.origin_id == origin_id,
+                )
+            )
+        ).scalar()
+
+    def _row_exists(self, table: str, local_id: int) -> bool:
+        t = _TABLES[table]
+        pk = next(iter(t.primary_key.columns))
+        return self._session.execute(select(pk).where(pk == local_id)).first() is not None
+
+    def _latest_local_change(self, table: str, local_id: int):
+        return self._session.execute(
+            select(change_log.c.changed_at, change_log.c.origin)
+            .where(and_(change_log.c.table_name == table, change_log.c.row_id == local_id))
+            .order_by(change_log.c.seq.desc())
+            .limit(1)
+        ).first()
+
+    def _write_row(self, table: str, local_id: int | None, row: Dict[str, Any]) -> int:
+        t = _TABLES[table]
+        pk = next(iter(t.primary_key.columns))
+        # payload 是存储层原始值（日期/时间为文本），直接用 SQL 参数写回
+        cols = [c.name for c in t.columns if c is not pk and c.name in row]
+        params = {c: row[c] for c in cols}
+        if local_id is None:
+            sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join(':' + c for c in cols)})"
+            return int(self._session.execute(text(sql), params).lastrowid)
+        sets = ", ".join(f"{c} = :{c}" for c in cols)
+        self._session.execute(text(f"UPDATE {table} SET {sets} WHERE {pk.name} = :_pk"), {**params, "_pk": local_id})
+        return local_id
+
+    def apply(self, batch: Dict[str, Any]) -> Dict[str, int]:
+        """Apply a batch produced by ``export_since`` on another node."""
+        node = self.node_id()
+        peer = batch["node"]
+        if peer == node:
+            raise ValueError("refusing to apply a batch exported by this ledger")
+        last = self.peer_watermarks().get(peer, 0)
+        local_users = dict(self._session.execute(select(users.c.name, users.c.user_id)).all())
+        cats = SqliteCategoryRepository(self._session)
+        remote_users = {int(k): v for k, v in batch.get("users", {}).items()}
+
+        stats = {"applied": 0, "skipped": 0, "conflicts": 0, "unknown_user": 0}
+        self._session.execute(insert(sync_apply).values(origin=peer, changed_at=""))
+        try:
+            for ch in batch["changes"]:
+                if ch["seq"] <= last or ch["origin"] == node or ch["table"] not in _TABLES:
+                    stats["skipped"] += 1  # 已应用过 / 本机变更的回声
+                    continue
+                table, op = ch["table"], ch["op"]
+                g_origin, g_id = ch["gid"]
+                row = dict(ch["row"] or {})
+                if "user_id" in row:
+                    uid = local_users.get(remote_users.get(row["user_id"]))
+                    if uid is None:
+                        stats["unknown_user"] += 1
+                        continue
+                    row["user_id"] = uid
+                if row.get("category") is not None:
+                    row["category_id"] = cats.resolve(row["user_id"], row.pop("category"))
+
+                local_id = self._local_id(table, g_origin, g_id, node)
+                if local_id is not None and not self._row_exists(table, local_id):
+                    if op != "I":
+                        # 本地已删除：若本地删除更晚则保留删除
+                        mine = self._latest_local_change(table, local_id)
+                        if mine and (ch["changed_at"], ch["origin"]) <= (mine.changed_at, mine.origin):
+                            stats["conflicts"] += 1
+                            continue
+                    local_id = None
+                elif local_id is not None and op != "I":
+                    mine = self._latest_local_change(table, local_id)
+                    if mine and (ch["changed_at"], ch["origin"]) <= (mine.changed_at, mine.origin):
+                        stats["conflicts"] += 1  # 本地版本更新，远端变更落败
+                        continue
+
+                self._session.execute(
+                    update(sync_apply).values(origin=ch["origin"], changed_at=ch["changed_at"])
+                )
+                if op == "D":
+                    if local_id is not None:
+                        t = _TABLES[table]
+                        pk = next(iter(t.primary_key.columns))
+                        self._session.execute(delete(t).where(pk == local_id))
+                    stats["applied"] += 1
+                    continue
+                if local_id is None and row.get("fingerprint"):
+                    # 两端各自导入过同一份账单：按指纹认领已有行，而不是撞唯一索引
+                    local_id = self._session.execute(
+                        select(records.c.record_id).where(records.c.fingerprint == row["fingerprint"])
+                    ).scalar()
+                new_id = self._write_row(table, local_id, row)
+                if g_origin != node:
+                    self._session.execute(
+                        text(
+                            "INSERT OR REPLACE INTO sync_map (table_name, origin, origin_id, local_id) "
+                            "VALUES (:t, :o, :oid, :lid)"
+                        ),
+                        {"t": table, "o": g_origin, "oid": g_id, "lid": new_id},
+                    )
+                stats["applied"] += 1
+
+            self._session.execute(delete(sync_apply))
+            self._session.execute(
+                text(
+                    "INSERT INTO sync_peers (peer_id, last_seq) VALUES (:p, :s) "
+                    "ON CONFLICT(peer_id) DO UPDATE SET last_seq = max(last_seq, excluded.last_seq)"
+                ),
+                {"p": peer, "s": int(batch["until"])},
+            )
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
+        return stats
@@ -0,0 +1,186 @@
+"""Record tags: many-to-many, with bitmap posting lists for set queries.
+
+``record_tags`` is keyed ``(tag_id, record_id)``, so the postings of a tag
+are one index range scan. ``match`` loads the postings it needs as integer
+bitmaps and combines them in memory (AND / OR / AND NOT).
+"""
+from __future__ import annotations
+from datetime import date
+from typing import Dict, Iterable, Sequence
+from sqlalchemy import select, insert, delete, and_, bindparam, func, literal
+from sqlalchemy.orm import Session
+from .sqlite_schema import tags, record_tags, records
+from .sqlite_fx_repo import foreign_deltas
+from ..models import RecordType
+from ..utils import bitmap
+from ..utils.fx import FxTable
+
+_INSERT_TAG = insert(tags).prefix_with("OR IGNORE")
+
+_TAG_IDS = select(tags.c.name, tags.c.tag_id).where(
+    and_(tags.c.user_id == bindparam("user_id"), tags.c.name.in_(bindparam("names", expanding=True)))
+)
+
+
+class SqliteTagRepository:
+    def __init__(self, session: Session):
+        self._session = session
+        self._ids: Dict[tuple[int, str], int] = {}
+
+    def forget(self) -> None:
+        self._ids.clear()
+
+    def _lookup(self, user_id: int, names: Sequence[str]) -> Dict[str, int]:
+        out = {n: self._ids[(user_id, n)] for n in names if (user_id, n) in self._ids}
+        rest = [n for n in names if n not in out]
+        if rest:
+            for name, tid in self._session.execute(_TAG_IDS, {"user_id": user_id, "names": rest}):
+                self._ids[(user_id, name)] = tid
+                out[name] = tid
+        return out
+
+    def _resolve(self, user_id: int, names: Sequence[str]) -> Dict[str, int]:
+        found = self._lookup(user_id, names)
+        missing = [n for n in names if n not in found]
+        if missing:
+            self._session.execute(_INSERT_TAG, [{"user_id": user_id, "name": n} for n in missing])
+        return self._lookup(user_id, names)
+
+    # ---- write ----
+    def tag(self, user_id: int, record_ids: Iterable[int], names: Iterable[str], *, commit: bool = True) -> int:
+        """Attach tags to the user's records; returns new (record, tag) pairs."""
+        ids, names = list(record_ids), sorted({n.strip() for n in names if n.strip()})
+        if not ids or not names:
+            return 0
+        added = 0
+        for tid in self._resolve(user_id, names).values():
+            # 只给属于该用户的记录打标签
+            own = select(literal(tid), records.c.record_id).where(
+                and_(records.c.user_id == user_id, records.c.record_id.in_(ids))
+            )
+            res = self._session.execute(
+                insert(record_tags).prefix_with("OR IGNORE").from_select(["tag_id", "record_id"], own)
+            )
+            added += res.rowcount
+        if commit:
+            self._session.commit()
+        return added
+
+    def untag(self, user_id: int, record_ids: Iterable[int], names: Iterable[str]) -> int:
+        tids = list(self._lookup(user_id, sorted(set(names))).values())
+        if not tids:
+            return 0
+        res = self._session.execute(
+            delete(record_tags).where(
+                and_(record_tags.c.tag_id.in_(tids), record_tags.c.record_id.in_(list(record_ids)))
+            )
+        )
+        self._session.commit()
+        return res.rowcount
+
+    # ---- read ----
+    def tags_of(self, record_ids: Iterable[int]) -> Dict[int, list[str]]:
+        rows = self._session.execute(
+            select(record_tags.c.record_id, tags.c.name)
+            .join_from(record_tags, tags, tags.c.tag_id == record_tags.c.tag_id)
+            .where(record_tags.c.record_id.in_(list(record_ids)))
+            .order_by(record_tags.c.record_id, tags.c.name)
+        )
+        out: Dict[int, list[str]] = {}
+        for rid, name in rows:
+            out.setdefault(rid, []).append(name)
+        return out
+
+    def counts(self, user_id: int) -> Dict[str, int]:
+        rows = self._session.execute(
+            select(tags.c.name, func.count(record_tags.c.record_id))
+            .join_from(tags, record_tags, record_tags.c.tag_id == tags.c.tag_id, isouter=True)
+            .where(tags.c.user_id == user_id)
+            .group_by(tags.c.tag_id)
+            .order_by(tags.c.name)
+        )
+        return {name: int(n) for name, n in rows}
+
+    def postings(self, user_id: int, names: Iterable[str]) -> Dict[str, int]:
+        """{tag: bitmap of record ids}; unknown tags map to an empty bitmap."""
+        names = sorted(set(names))
+        ids = self._lookup(user_id, names)
+        by_tid: Dict[int, list[int]] = {tid: [] for tid in ids.values()}
+        if by_tid:
+            for tid, rid in self._session.execute(
+                select(record_tags.c.tag_id, record_tags.c.record_id).where(
+                    record_tags.c.tag_id.in_(list(by_tid))
+                )
+            ):
+                by_tid[tid].append(rid)
+        return {n: bitmap.from_ids(by_tid[ids[n]]) if n in ids else 0 for n in names}
+
+    def period_bitmap(self, user_id: int, start: date | None, end: date | None) -> int:
+        conds = [records.c.user_id == user_id]
+        if start:
+            conds.append(records.c.occurred_on >= start)
+        if end:
+            conds.append(records.c.occurred_on < end)
+        # (user_id, occurred_on) 索引覆盖，record_id 就是 rowid，不回表
+        rids = self._session.execute(select(records.c.record_id).where(and_(*conds))).scalars()
+        return bitmap.from_ids(rids)
+
+    def match(
+        self,
+        user_id: int,
+        all_of: Iterable[str] = (),
+        none_of: Iterable[str] = (),
+        any_of: Iterable[str] = (),
+        start: date | None = None,
+        end: date | None = None,
+    ) -> int:
+        """Bitmap of the user's records having every tag in ``all_of``, at
+        least one of ``any_of`` (if given) and none of ``none_of``."""
+        all_of, none_of, any_of = list(all_of), list(none_of), list(any_of)
+        post = self.postings(user_id, all_of + none_of + any_of)
+        bm = None
+        for t in all_of:
+            bm = post[t] if bm is None else bm & post[t]
+        if any_of:
+            union = 0
+            for t in any_of:
+                union |= post[t]
+            bm = union if bm is None else bm & union
+        if bm is None or start or end:
+            # 没有正向条件（或有时间范围）时才需要用户/期间的全集
+            period = self.period_bitmap(user_id, start, end)
+            bm = period if bm is None else bm & period
+        for t in none_of:
+            bm &= ~post[t]
+        return bm
+
+    def totals_by_tag(
+        self,
+        user_id: int,
+        start: date,
+        end: date,
+        rtype: RecordType = RecordType.EXPENSE,
+        *,
+        fx: FxTable | None = None,
+    ) -> Dict[str, float]:
+        """Totals per tag over [start, end) in the base currency; a record
+        counts once per tag."""
+        joined = record_tags.join(records, records.c.record_id == record_tags.c.record_id).join(
+            tags, tags.c.tag_id == record_tags.c.tag_id
+        )
+        conds = [
+            records.c.user_id == user_id,
+            records.c.occurred_on >= start,
+            records.c.occurred_on < end,
+            records.c.rtype == rtype.value,
+        ]
+        rows = self._session.execute(
+            select(tags.c.name, func.sum(records.c.amount))
+            .select_from(joined)
+            .where(and_(*conds))
+            .group_by(record_tags.c.tag_id)
+        )
+        out = {name: float(total or 0.0) for name, total in rows}
+        for name, _day, delta in foreign_deltas(self._session, fx, [tags.c.name], conds, joined):
+            out[name] += delta
+        return out
@@ -8,3 +8,9 @@ class UserRepository:
 
     def get_by_name(self, name: str) -> User | None:
         raise NotImplementedError
+
+    def register(self, name: str, password: str, email: str | None = None) -> User:
+        raise NotImplementedError
+
+    def verify_login(self, name: str, password: str) -> User:
+        raise NotImplementedError
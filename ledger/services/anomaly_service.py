@@ -0,0 +1,61 @@
+"""Flag unusually large expenses as they are recorded.
+
+Each category keeps a Welford accumulator (``category_stats``). A new
+expense is an outlier when it lies more than ``threshold`` standard
+deviations above its category's mean, once the category has at least
+``min_count`` expenses. The deviation is measured against at least 10% of
+the mean, so a category with near-constant amounts (rent) is not flagged
+for a few cents. Only base-currency expenses are checked: amounts in
+different currencies do not share a distribution.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Iterable, Mapping
+from ..models import BASE_CURRENCY, CategoryStats, Record, RecordType
+
+
+@dataclass(slots=True)
+class Anomaly:
+    record: Record
+    mean: float
+    std: float  # 判定时使用的（带下限的）标准差
+    n: int
+
+    @property
+    def zscore(self) -> float:
+        return (self.record.amount - self.mean) / self.std
+
+    def describe(self) -> str:
+        r = self.record
+        return (
+            f"{r.occurred_on.isoformat()} {r.category} {r.amount:.2f} "
+            f"(mean {self.mean:.2f} over {self.n}, z={self.zscore:.1f})"
+        )
+
+
+class AnomalyDetector:
+    """Checks records in arrival order; each checked expense then joins its
+    category's statistics, so later rows of the same batch see it."""
+
+    def __init__(self, stats: Mapping[str, CategoryStats], threshold: float = 3.0, min_count: int = 5):
+        if threshold <= 0:
+            raise ValueError("threshold must be positive")
+        # 复制一份：本批次内的更新不影响调用方
+        self._stats = {c: CategoryStats(s.n, s.mean, s.m2) for c, s in stats.items()}
+        self.threshold = threshold
+        self.min_count = min_count
+
+    def check(self, rec: Record) -> Anomaly | None:
+        if rec.rtype != RecordType.EXPENSE or rec.currency != BASE_CURRENCY:
+            return None
+        st = self._stats.setdefault(rec.category, CategoryStats())
+        out = None
+        if st.n >= self.min_count:
+            std = max(st.std, 0.1 * abs(st.mean), 0.01)
+            if rec.amount - st.mean > self.threshold * std:
+                out = Anomaly(rec, st.mean, std, st.n)
+        st.observe(rec.amount)
+        return out
+
+    def scan(self, recs: Iterable[Record]) -> list[Anomaly]:
+        return [a for a in map(self.check, recs) if a is not None]
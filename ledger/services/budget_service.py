@@ -1,16 +1,103 @@
 from __future__ import annotations
-from typing import Iterable, Dict
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, Dict, Mapping
 from ..models import Budget, Record, RecordType
+from ..models.budget import BUDGET_PERIODS
+from ..utils.category_path import ancestors, depth_of, is_under
+from ..utils.fx import FxTable
+from ..utils.periods import period_window
+
+
+@dataclass(slots=True)
+class BudgetStatus:
+    budget: Budget
+    start: date  # [start, end)
+    end: date
+    spent: float
+
+    @property
+    def ratio(self) -> float:
+        limit = float(self.budget.monthly_limit)
+        return 0.0 if limit <= 0 else round(self.spent / limit, 4)
+
+
+def validate_budget(b: Budget) -> None:
+    if b.period not in BUDGET_PERIODS:
+        raise ValueError(f"unknown budget period {b.period!r}; expected one of {', '.join(BUDGET_PERIODS)}")
+    if b.period == "CUSTOM":
+        if b.start is None or b.end is None:
+            raise ValueError("a CUSTOM budget needs a start and an end date")
+        if b.end <= b.start:
+            raise ValueError("budget end must be after its start")
+    elif b.start is not None or b.end is not None:
+        raise ValueError("only CUSTOM budgets take start/end dates")
+    if b.monthly_limit < 0:
+        raise ValueError("budget limit must be >= 0")
 
 
 class BudgetService:
+    @staticmethod
+    def select(
+        budgets: Iterable[Budget], parent: str | None = None, depth: int | None = None
+    ) -> list[Budget]:
+        return [
+            b
+            for b in budgets
+            if (parent is None or is_under(b.category, parent))
+            and (depth is None or depth_of(b.category) <= depth)
+        ]
+
+    @staticmethod
+    def windows(budgets: Iterable[Budget], on: date) -> Dict[int, tuple[date, date]]:
+        """{budget_id: current window} as of ``on``; CUSTOM budgets are
+        included only while ``on`` falls inside their range."""
+        out = {}
+        for b in budgets:
+            if b.period == "CUSTOM":
+                if b.start <= on < b.end:
+                    out[b.budget_id] = (b.start, b.end)
+            else:
+                out[b.budget_id] = period_window(b.period, on)
+        return out
+
+    @staticmethod
+    def statuses(
+        budgets: Iterable[Budget], windows: Mapping[int, tuple[date, date]], spent: Mapping[int, float]
+    ) -> list[BudgetStatus]:
+        """Join budgets with their windows and spending (e.g. from
+        ``SqliteBudgetRepository.spent``); budgets without a window are skipped."""
+        return [
+            BudgetStatus(b, *windows[b.budget_id], spent.get(b.budget_id, 0.0))
+            for b in budgets
+            if b.budget_id in windows
+        ]
+
     def progress(
-        self, budgets: Iterable[Budget], records: Iterable[Record]
+        self,
+        budgets: Iterable[Budget],
+        records: Iterable[Record],
+        parent: str | None = None,
+        depth: int | None = None,
+        fx: FxTable | None = None,
     ) -> Dict[str, float]:
+        """Spent / limit per budget.
+
+        A budget on a parent category (``Food``) also counts spending in its
+        subcategories (``Food/Groceries``). ``parent`` / ``depth`` limit which
+        budgets are reported. Foreign-currency expenses are converted with
+        ``fx`` at their day's rate.
+        """
+        fx = fx or FxTable()
+        budgets = self.select(budgets, parent, depth)
         spent = {b.category: 0.0 for b in budgets}
         for r in records:
-            if r.rtype == RecordType.EXPENSE and r.category in spent:
-                spent[r.category] += float(r.amount)
+            if r.rtype != RecordType.EXPENSE:
+                continue
+            amount = float(r.amount) * fx.rate(r.currency, r.occurred_on)
+            for cat in ancestors(r.category):
+                if cat in spent:
+                    spent[cat] += amount
         return {
             b.category: (
                 0.0
@@ -25,6 +112,7 @@ class BudgetService:
         budgets: Iterable[Budget],
         records: Iterable[Record],
         warn_ratio: float = 0.8,
+        fx: FxTable | None = None,
     ) -> Dict[str, bool]:
-        prog = self.progress(budgets, records)
+        prog = self.progress(budgets, records, fx=fx)
         return {cat: (ratio >= warn_ratio) for cat, ratio in prog.items()}
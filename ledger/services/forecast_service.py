@@ -0,0 +1,154 @@
+"""Month-end spend forecasts per category, vectorized with NumPy.
+
+For a day ``d`` of the current month the projection is
+
+    spent so far + average daily rate after day d in past months * days left
+
+The past-month rate is taken from the same part of the month (spending
+after day ``d``), so a rent that is always paid on the 28th is expected
+even when nothing has been spent yet. Categories without any history fall
+back to the current pace (spent / d * days in month).
+
+All of a user's categories are projected in one pass over a
+(category, month, day) cube built from the ``daily_spend`` rollup.
+"""
+from __future__ import annotations
+from calendar import monthrange
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, Sequence
+import numpy as np
+from sqlalchemy.orm import Session
+from ..models import Budget
+from ..repo.sqlite_budget_repo import SqliteBudgetRepository
+from ..utils.category_path import is_under
+from ..utils.fx import FxTable
+from ..utils.periods import add_months
+
+
+@dataclass(slots=True)
+class CategoryForecast:
+    category: str
+    spent: float
+    projected: float
+    limit: float | None = None
+
+    @property
+    def over(self) -> bool:
+        return self.limit is not None and self.projected > self.limit
+
+
+def _month_lengths(first: date, n: int) -> np.ndarray:
+    return np.array([monthrange(m.year, m.month)[1] for m in (add_months(first, k) for k in range(n))])
+
+
+class ForecastService:
+    def __init__(self, history_months: int = 6):
+        if history_months < 1:
+            raise ValueError("history_months must be >= 1")
+        self.history_months = history_months
+
+    def window(self, on: date) -> tuple[date, date]:
+        """Rollup rows to load for a forecast as of ``on``: [start, on]."""
+        return add_months(on, -self.history_months), on
+
+    def project(
+        self, rows: Iterable[tuple[str, date, float]], on: date
+    ) -> tuple[list[str], np.ndarray, np.ndarray]:
+        """``rows`` are (category, day, expense) for one user; returns
+        ``(categories, spent, projected)`` with aligned arrays."""
+        k = self.history_months
+        first = add_months(on, -k)
+        names: Dict[str, int] = {}
+        ci, mi, di, amt = [], [], [], []
+        for cat, day, total in rows:
+            if day > on or day < first:
+                continue
+            ci.append(names.setdefault(cat, len(names)))
+            mi.append((day.year - first.year) * 12 + day.month - first.month)
+            di.append(day.day - 1)
+            amt.append(total)
+        n = len(names)
+        cube = np.zeros((n, k + 1, 31))
+        if n:
+            np.add.at(cube, (np.array(ci), np.array(mi), np.array(di)), np.array(amt, dtype=float))
+
+        d, dim = on.day, monthrange(on.year, on.month)[1]
+        spent = cube[:, k, :d].sum(axis=1)
+        hist = cube[:, :k, :]
+        lens = _month_lengths(first, k)
+        days = np.arange(31)
+        # 过去每个月“第 d 天之后”的日均支出；月份比 d 短时退回整月日均
+        tail = (days[None, :] >= d) & (days[None, :] < lens[:, None])
+        full = days[None, :] < lens[:, None]
+        mask = np.where(tail.any(axis=1)[:, None], tail, full)
+        rates = (hist * mask[None, :, :]).sum(axis=2) / mask.sum(axis=1)[None, :]
+        # 只用用户开始记账之后的月份，避免把“还没有数据”当成 0 支出
+        seen = hist.sum(axis=(0, 2)) > 0
+        active = np.cumsum(seen) > 0
+        if active.any():
+            remaining = rates[:, active].mean(axis=1) * (dim - d)
+            has_history = hist[:, active, :].sum(axis=(1, 2)) > 0
+        else:
+            remaining = np.zeros(n)
+            has_history = np.zeros(n, dtype=bool)
+        pace = spent / d * dim
+        projected = np.where(has_history, spent + remaining, pace)
+        cats = sorted(names, key=names.get)
+        return cats, spent.round(2), projected.round(2)
+
+    @staticmethod
+    def skipped(budgets: Iterable[Budget]) -> list[Budget]:
+        """Budgets a month-end forecast does not cover (any period but MONTHLY);
+        callers report them instead of dropping them silently."""
+        return [b for b in budgets if b.period != "MONTHLY"]
+
+    @staticmethod
+    def for_budgets(
+        budgets: Sequence[Budget], categories: Sequence[str], spent: np.ndarray, projected: np.ndarray
+    ) -> list[CategoryForecast]:
+        """Roll category forecasts up to monthly budgets (a budget on ``Food``
+        covers ``Food/*``) with one matrix product; see ``skipped`` for the rest."""
+        monthly = [b for b in budgets if b.period == "MONTHLY"]
+        if not monthly:
+            return []
+        member = np.array(
+            [[is_under(c, b.category) for c in categories] for b in monthly], dtype=float
+        ).reshape(len(monthly), len(categories))
+        sums = member @ np.vstack([spent, projected]).T if len(categories) else np.zeros((len(monthly), 2))
+        return [
+            CategoryForecast(b.category, round(float(s), 2), round(float(p), 2), float(b.monthly_limit))
+            for b, (s, p) in zip(monthly, sums)
+        ]
+
+    def forecast_user(
+        self, session: Session, user_id: int, on: date, fx: FxTable | None = None
+    ) -> tuple[list[CategoryForecast], list[CategoryForecast]]:
+        """(per-category forecasts, per-budget forecasts) for one user, in
+        the base currency."""
+        repo = SqliteBudgetRepository(session)
+        start, _ = self.window(on)
+        rows = [(cat, day, total) for _, cat, day, total in repo.daily_totals(start, on, user_id=user_id, fx=fx)]
+        cats, spent, projected = self.project(rows, on)
+        per_cat = [CategoryForecast(c, float(s), float(p)) for c, s, p in zip(cats, spent, projected)]
+        return per_cat, self.for_budgets(repo.list_by_user(user_id), cats, spent, projected)
+
+    def at_risk(self, session: Session, on: date, fx: FxTable | None = None) -> Dict[int, list[CategoryForecast]]:
+        """Nightly batch: budgets projected to be exceeded, for every user in
+        the database. Three queries in total, then one NumPy pass per user."""
+        repo = SqliteBudgetRepository(session)
+        start, _ = self.window(on)
+        by_user: Dict[int, list] = defaultdict(list)
+        for uid, cat, day, total in repo.daily_totals(start, on, fx=fx):
+            by_user[uid].append((cat, day, total))
+        budgets_by_user: Dict[int, list[Budget]] = defaultdict(list)
+        for b in repo.list_all():
+            budgets_by_user[b.user_id].append(b)
+        out = {}
+        for uid, budgets in budgets_by_user.items():
+            cats, spent, projected = self.project(by_user.get(uid, ()), on)
+            flagged = [f for f in self.for_budgets(budgets, cats, spent, projected) if f.over]
+            if flagged:
+                out[uid] = flagged
+        return out
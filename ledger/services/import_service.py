@@ -0,0 +1,185 @@
+"""Import service: idempotent, resumable bulk import of records."""
+from __future__ import annotations
+import uuid
+from pathlib import Path
+from dataclasses import dataclass, field, replace
+from itertools import islice
+from typing import Iterable
+from ..models import Record
+from ..repo.sqlite_import_repo import ImportCheckpoint, SqliteImportCheckpointRepository
+from ..repo.sqlite_record_repo import SqliteRecordRepository
+from ..repo.sqlite_stats_repo import SqliteCategoryStatsRepository
+from ..utils.csv_io import append_quarantine, file_fingerprint, frame_to_records, iter_csv_chunks
+from ..utils.fingerprint import fingerprint_all
+from .anomaly_service import Anomaly, AnomalyDetector
+from .record_service import RecordService
+from .rule_service import RuleEngine, RuleReport
+
+
+@dataclass(slots=True)
+class ImportResult:
+    batch: str
+    total: int = 0
+    inserted: int = 0
+    resumed_at_row: int = 0  # >0：从该数据行继续（之前的行已在上次运行中提交）
+    complete: bool = False
+    rejected: int = 0
+    already_done: bool = False  # 续传时发现该文件早已导入完成，本次什么也没做
+    quarantine: str | None = None
+    rules: RuleReport | None = None  # 本次运行中各规则命中的行数
+    anomalies: list[Anomaly] = field(default_factory=list)  # 本次运行新插入的异常支出
+
+    @property
+    def duplicates(self) -> int:
+        return self.total - self.inserted - self.rejected
+
+
+class ImportInterrupted(Exception):
+    """Raised on Ctrl-C; ``result`` holds what was committed so far."""
+
+    def __init__(self, result: ImportResult):
+        super().__init__(f"import interrupted after {result.total} rows")
+        self.result = result
+
+
+class ImportService:
+    """Fingerprints each row and bulk-inserts with INSERT OR IGNORE.
+
+    Re-importing the same file (or an overlapping statement) only adds rows
+    whose fingerprint is not stored yet. ``import_csv`` additionally commits
+    a checkpoint with every batch so an interrupted run can be resumed.
+
+    With a ``rules`` engine each row's category is replaced by its matching
+    rule's. Fingerprints are taken from the row as it appears in the file,
+    so re-importing after the rules changed still skips known rows.
+
+    With ``stats`` every inserted expense is checked against its category's
+    running statistics as of the batch it arrives in; outliers are collected
+    in ``ImportResult.anomalies``. Skipped duplicates are never reported.
+    """
+
+    def __init__(
+        self,
+        repo: SqliteRecordRepository,
+        checkpoints: SqliteImportCheckpointRepository | None = None,
+        chunk_size: int = 5000,
+        rules: RuleEngine | None = None,
+        stats: SqliteCategoryStatsRepository | None = None,
+        anomaly_threshold: float = 3.0,
+    ):
+        self._repo = repo
+        self._records = RecordService(repo)
+        self._checkpoints = checkpoints
+        self._chunk_size = chunk_size
+        self._rules = rules
+        if anomaly_threshold <= 0:
+            raise ValueError("anomaly threshold must be positive")
+        self._stats = stats
+        self._threshold = anomaly_threshold
+
+    def _categorize(self, recs: list[Record], result: ImportResult) -> list[Record]:
+        if self._rules is None:
+            return recs
+        recs, report = self._rules.apply(recs)
+        if result.rules is None:
+            result.rules = RuleReport()
+        result.rules.add(report)
+        return recs
+
+    def _scan(self, user_id: int, recs: list[Record], fps: list[str]) -> list[tuple[Anomaly, str]]:
+        if self._stats is None:
+            return []
+        # 每批重新读取统计：上一批插入的行已由触发器计入
+        detector = AnomalyDetector(self._stats.for_user(user_id), self._threshold)
+        return [(a, fp) for a, fp in zip(map(detector.check, recs), fps) if a is not None]
+
+    def _flag(self, result: ImportResult, user_id: int, pending, all_new: bool) -> None:
+        if pending and not all_new:
+            new = self._repo.fingerprints_in_batch(user_id, result.batch, [fp for _, fp in pending])
+            pending = [p for p in pending if p[1] in new]
+        result.anomalies.extend(a for a, _ in pending)
+
+    @staticmethod
+    def _rebind(recs: Iterable[Record], user_id: int) -> list[Record]:
+        return [replace(r, record_id=None, user_id=user_id, note=r.note or "") for r in recs]
+
+    def import_records(self, user_id: int, recs: Iterable[Record]) -> ImportResult:
+        result = ImportResult(batch=uuid.uuid4().hex[:12])
+        seen: dict[str, int] = {}
+        it = iter(recs)
+        while chunk := self._rebind(islice(it, self._chunk_size), user_id):
+            fps = list(fingerprint_all(chunk, seen))
+            chunk = self._categorize(chunk, result)
+            pending = self._scan(user_id, chunk, fps)
+            inserted = self._records.create_many(chunk, fps, result.batch)
+            self._flag(result, user_id, pending, inserted == len(chunk))
+            result.inserted += inserted
+            result.total += len(chunk)
+        result.complete = True
+        return result
+
+    def import_csv(
+        self, user_id: int, path: str, *, resume: bool = False, quarantine: str | None = None
+    ) -> ImportResult:
+        """Stream ``path`` in batches; each batch commits with its checkpoint.
+
+        Every chunk is validated as a whole; bad rows are appended to
+        ``quarantine`` (default ``<path>.quarantine.csv``) with row numbers
+        and reasons instead of aborting the import.
+
+        With ``resume=True`` reading continues at the byte offset of the last
+        checkpoint for this file/user instead of from the top of the file.
+        """
+        quarantine = quarantine or f"{path}.quarantine.csv"
+        if self._checkpoints is None:
+            raise ValueError("import_csv requires a checkpoint repository")
+        key = file_fingerprint(path)
+        cp = self._checkpoints.get(key, user_id) if resume else None
+        if cp and cp.status == "done":
+            return ImportResult(cp.batch, complete=True, already_done=True)
+
+        if cp:
+            # 重复行的序号要接着上次数：计数随检查点入库，不必从头重读文件
+            seen = self._checkpoints.occurrences(key, user_id)
+            result = ImportResult(
+                cp.batch, cp.rows_read, cp.rows_committed, cp.rows_read + 1, rejected=cp.rows_rejected
+            )
+        else:
+            cp = ImportCheckpoint(key, user_id, str(path), uuid.uuid4().hex[:12])
+            result = ImportResult(cp.batch)
+            seen = {}
+            self._checkpoints.clear_occurrences(key, user_id)  # 上一轮未完成导入留下的计数
+            Path(quarantine).unlink(missing_ok=True)  # 新的一轮导入，旧隔离文件作废
+
+        try:
+            for chunk in iter_csv_chunks(path, self._chunk_size, cp.byte_offset, cp.rows_read + 1):
+                good, bad = RecordService.validate_batch(chunk.frame, chunk.first_row)
+                recs = self._rebind(frame_to_records(good), user_id)
+                changed: set[str] = set()
+                fps = list(fingerprint_all(recs, seen, changed))
+                recs = self._categorize(recs, result)
+                pending = self._scan(user_id, recs, fps)
+                inserted = self._records.create_many(recs, fps, cp.batch, commit=False, validate=False)
+                self._flag(result, user_id, pending, inserted == len(recs))
+                cp.byte_offset = chunk.end_offset
+                cp.rows_read += len(chunk.frame)
+                cp.rows_committed += inserted
+                cp.rows_rejected += len(bad)
+                self._checkpoints.save(cp, {fp: seen[fp] for fp in changed})  # 与本批记录同一事务提交
+                if len(bad):
+                    # 先提交再写隔离文件：断点续传时不会重复写同一批坏行
+                    append_quarantine(quarantine, bad)
+                result.total, result.inserted, result.rejected = cp.rows_read, cp.rows_committed, cp.rows_rejected
+        except KeyboardInterrupt:
+            self._repo.rollback()
+            raise ImportInterrupted(result) from None
+        except Exception:
+            self._repo.rollback()
+            raise
+        cp.status = "done"
+        self._checkpoints.clear_occurrences(key, user_id)
+        self._checkpoints.save(cp)
+        result.complete = True
+        if result.rejected:
+            result.quarantine = quarantine
+        return result
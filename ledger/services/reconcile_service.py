@@ -0,0 +1,113 @@
+"""Match bank-statement lines against ledger records.
+
+Both sides are sorted by (type, currency, amount in cents, date) and walked
+together.
+Within one amount, each statement line is paired with an unused ledger
+record whose date is inside ``± tolerance_days``. When several records
+qualify, the one with the most similar note wins, then the closest date.
+Sorting dominates the cost, so the whole match is O(n log n).
+
+The ledger may be loaded with a ``± tolerance_days`` margin around the
+statement so edge lines can still match; unmatched records in that margin
+belong to the neighbouring statements and are not reported as extra.
+"""
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from itertools import groupby
+from typing import Iterable
+from ..models import Record
+from .top_service import normalize_note
+
+
+@dataclass(slots=True)
+class Match:
+    statement: Record
+    record: Record
+    days: int  # record 日期 - 对账单日期
+    similarity: float  # 备注相似度 0..1
+
+
+@dataclass(slots=True)
+class ReconcileResult:
+    matched: list[Match] = field(default_factory=list)
+    missing: list[Record] = field(default_factory=list)  # 对账单有、账本没有
+    extra: list[Record] = field(default_factory=list)  # 账本有、对账单没有（仅对账单日期范围内）
+
+
+def note_similarity(a: str, b: str) -> float:
+    a, b = normalize_note(a or ""), normalize_note(b or "")
+    if not a and not b:
+        return 1.0
+    return round(SequenceMatcher(None, a, b).ratio(), 3)
+
+
+def _key(r: Record) -> tuple[str, str, int]:
+    return r.rtype.value, r.currency, round(r.amount * 100)
+
+
+def _order(r: Record):
+    return (*_key(r), r.occurred_on, r.record_id or 0)
+
+
+def _match_group(stmt: list[Record], ledger: list[Record], tol: int, min_sim: float, out: ReconcileResult) -> None:
+    """Both lists share one (type, currency, amount) and are sorted by date."""
+    window: deque[Record] = deque()  # 日期落在当前对账单行容差内、尚未配对的账本记录
+    j = 0
+    for s in stmt:
+        while window and (s.occurred_on - window[0].occurred_on).days > tol:
+            out.extra.append(window.popleft())
+        while j < len(ledger) and (ledger[j].occurred_on - s.occurred_on).days <= tol:
+            if (s.occurred_on - ledger[j].occurred_on).days > tol:
+                out.extra.append(ledger[j])
+            else:
+                window.append(ledger[j])
+            j += 1
+        best, best_rank = None, None
+        for r in window:
+            sim = note_similarity(s.note, r.note)
+            if sim < min_sim:
+                continue
+            rank = (sim, -abs((r.occurred_on - s.occurred_on).days))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = r, rank
+        if best is None:
+            out.missing.append(s)
+            continue
+        window.remove(best)
+        out.matched.append(Match(s, best, (best.occurred_on - s.occurred_on).days, best_rank[0]))
+    out.extra.extend(window)
+    out.extra.extend(ledger[j:])
+
+
+def reconcile(
+    statement: Iterable[Record], ledger: Iterable[Record], *, tolerance_days: int = 3, min_similarity: float = 0.0
+) -> ReconcileResult:
+    if tolerance_days < 0:
+        raise ValueError("tolerance must be >= 0 days")
+    if not 0.0 <= min_similarity <= 1.0:
+        raise ValueError("similarity must be between 0 and 1")
+    stmt = sorted(statement, key=_order)
+    led = sorted(ledger, key=_order)
+    out = ReconcileResult()
+    stmt_groups = groupby(stmt, key=_key)
+    led_groups = groupby(led, key=_key)
+    s_next = next(stmt_groups, None)
+    l_next = next(led_groups, None)
+    # 归并两个按金额分组的有序序列
+    while s_next or l_next:
+        if l_next is None or (s_next and s_next[0] < l_next[0]):
+            out.missing.extend(s_next[1])
+            s_next = next(stmt_groups, None)
+        elif s_next is None or l_next[0] < s_next[0]:
+            out.extra.extend(l_next[1])
+            l_next = next(led_groups, None)
+        else:
+            _match_group(list(s_next[1]), list(l_next[1]), tolerance_days, min_similarity, out)
+            s_next, l_next = next(stmt_groups, None), next(led_groups, None)
+    if stmt:
+        first = min(s.occurred_on for s in stmt)
+        last = max(s.occurred_on for s in stmt)
+        out.extra = [r for r in out.extra if first <= r.occurred_on <= last]
+    return out
@@ -1,10 +1,17 @@
 """Record service: validation and orchestration."""
 from __future__ import annotations
+import math
 from dataclasses import asdict
 from datetime import date
-from typing import Iterable
-from ..models import Record, RecordType
+from typing import Iterable, Sequence
+import numpy as np
+import pandas as pd
+from ..models import BASE_CURRENCY, Record, RecordType
 from ..repo.record_repo import RecordRepository
+from ..utils.fx import normalize_currency
+
+REQUIRED_COLUMNS = ("rtype", "category", "amount", "occurred_on")
+_RTYPE_VALUES = [t.value for t in RecordType]
 
 class RecordService:
     def __init__(self, repo: RecordRepository):
@@ -14,13 +21,85 @@ class RecordService:
         self._validate(rec)
         return self._repo.add(rec)
 
+    def create_many(
+        self,
+        recs: Sequence[Record],
+        fingerprints: Sequence[str] | None = None,
+        import_batch: str | None = None,
+        commit: bool = True,
+        validate: bool = True,
+    ) -> int:
+        """Validate and bulk-insert; returns how many rows were new.
+
+        Pass ``validate=False`` for rows that already went through
+        ``validate_batch``.
+        """
+        if validate:
+            for rec in recs:
+                self._validate(rec)
+        return self._repo.add_many(
+            recs, fingerprints=fingerprints, import_batch=import_batch, commit=commit
+        )
+
     def list_month(self, user_id: int, year: int, month: int) -> Iterable[Record]:
         start = date(year, month, 1)
         end = date(year + (month // 12), ((month % 12) + 1), 1)
         return self._repo.list_by_period(user_id, start, end)
 
+    @staticmethod
+    def validate_batch(frame: pd.DataFrame, first_row: int = 1) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """Check a whole CSV chunk at once (same rules as ``_validate`` plus
+        type and date parsing).
+
+        Returns ``(good, bad)``: ``good`` has normalized rtype/amount/date
+        columns; ``bad`` is the original rows with ``row`` (data row number,
+        header excluded) and ``reason`` columns in front.
+        """
+        missing = [c for c in REQUIRED_COLUMNS if c not in frame.columns]
+        if missing:
+            raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+        amount = pd.to_numeric(frame["amount"], errors="coerce")
+        rtype = frame["rtype"].astype("string").str.strip().str.upper()
+        category = frame["category"].astype("string").str.strip()
+        occurred = pd.to_datetime(frame["occurred_on"], errors="coerce", format="mixed")
+
+        checks = [
+            (amount.isna(), "amount is not a number"),
+            # inf 会污染 Welford 统计和对数分桶草图
+            (amount.notna() & ~np.isfinite(amount), "amount must be finite"),
+            (amount <= 0, "amount must be positive"),
+            (category.isna() | (category == ""), "category required"),
+            (~rtype.isin(_RTYPE_VALUES).fillna(False), "invalid rtype"),
+            (occurred.isna(), "unparseable date"),
+        ]
+        columns = {"rtype": rtype, "category": category, "amount": amount, "occurred_on": occurred}
+        if "currency" in frame.columns:  # 可选列：空值即本位币
+            currency = frame["currency"].astype("string").str.strip().str.upper().fillna(BASE_CURRENCY)
+            checks.append((~currency.str.fullmatch(r"[A-Z]{3}").fillna(False), "invalid currency"))
+            columns["currency"] = currency
+        bad_mask = checks[0][0].copy()
+        for mask, _ in checks[1:]:
+            bad_mask |= mask.fillna(False).astype(bool)
+
+        good = frame.assign(**columns)
+        if not bad_mask.any():  # 干净数据：不拼接错误原因
+            return good, frame.iloc[0:0]
+
+        reasons = pd.Series("", index=frame.index)
+        for mask, msg in checks:
+            hit = mask.fillna(False).astype(bool)
+            reasons = reasons.mask(hit, reasons + msg + "; ")
+        bad = frame[bad_mask].copy()
+        bad.insert(0, "reason", reasons[bad_mask].str.rstrip("; "))
+        bad.insert(0, "row", (frame.index[bad_mask] - frame.index[0] + first_row).astype(int))
+        return good[~bad_mask], bad
+
     def _validate(self, rec: Record) -> None:
+        if not math.isfinite(rec.amount):
+            raise ValueError("amount must be finite")
         if rec.amount <= 0:
             raise ValueError("amount must be positive")
         if not rec.category:
             raise ValueError("category required")
+        if rec.currency != BASE_CURRENCY and normalize_currency(rec.currency) != rec.currency:
+            raise ValueError(f"currency must be upper case: {rec.currency.strip().upper()}")
@@ -0,0 +1,102 @@
+"""Recurring templates: validation, occurrence dates, materialization.
+
+``materialize`` is one pass over every due template (of one user or of the
+whole database): a single query for the due templates, one bulk insert of
+all generated records and one batched update of the high-water marks, in
+one transaction. Generated rows carry a fingerprint per (user, template
+key, date), so even a rerun from an old mark inserts nothing twice.
+"""
+from __future__ import annotations
+from calendar import monthrange
+from dataclasses import dataclass
+from datetime import date, timedelta
+from sqlalchemy.orm import Session
+from ..models import Record, RecurringTemplate
+from ..models.recurring import FREQUENCIES
+from ..repo.sqlite_record_repo import SqliteRecordRepository
+from ..repo.sqlite_recurring_repo import SqliteRecurringRepository
+from ..utils.fingerprint import occurrence_fingerprint
+from ..utils.periods import add_months
+
+RECURRING_BATCH = "recurring"  # 生成记录的 import_batch，可用 bulk delete --batch 撤销
+
+
+def validate_template(tpl: RecurringTemplate) -> None:
+    if tpl.freq not in FREQUENCIES:
+        raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+    if tpl.every < 1:
+        raise ValueError("interval must be >= 1")
+    if tpl.amount <= 0:
+        raise ValueError("amount must be positive")
+    if not tpl.category:
+        raise ValueError("category required")
+    if tpl.end is not None and tpl.end < tpl.start:
+        raise ValueError("end date is before the start date")
+
+
+def occurrence(tpl: RecurringTemplate, k: int) -> date:
+    """The ``k``-th occurrence (0 = ``start``)."""
+    if tpl.freq == "DAILY":
+        return tpl.start + timedelta(days=k * tpl.every)
+    if tpl.freq == "WEEKLY":
+        return tpl.start + timedelta(weeks=k * tpl.every)
+    m = add_months(tpl.start, k * tpl.every)
+    return m.replace(day=min(tpl.start.day, monthrange(m.year, m.month)[1]))
+
+
+def _index_of(tpl: RecurringTemplate, d: date) -> int:
+    """Index of the first occurrence on or after ``d``."""
+    if d <= tpl.start:
+        return 0
+    if tpl.freq == "MONTHLY":
+        k = ((d.year - tpl.start.year) * 12 + d.month - tpl.start.month) // tpl.every
+    else:
+        step = tpl.every * (7 if tpl.freq == "WEEKLY" else 1)
+        k = (d - tpl.start).days // step
+    while occurrence(tpl, k) < d:
+        k += 1
+    return k
+
+
+def occurrences(tpl: RecurringTemplate, until: date) -> tuple[list[date], date]:
+    """Dates from the high-water mark through ``until`` (and ``end``), plus
+    the new mark: the first occurrence not generated."""
+    last = until if tpl.end is None else min(until, tpl.end)
+    k = _index_of(tpl, tpl.next_on or tpl.start)
+    out = []
+    while (d := occurrence(tpl, k)) <= last:
+        out.append(d)
+        k += 1
+    return out, d
+
+
+@dataclass(slots=True)
+class MaterializeResult:
+    templates: int = 0
+    generated: int = 0  # 实际插入的记录数
+
+
+class RecurringService:
+    def __init__(self, session: Session):
+        self._session = session
+        self._templates = SqliteRecurringRepository(session)
+        self._records = SqliteRecordRepository(session)
+
+    def materialize(self, until: date, user_id: int | None = None) -> MaterializeResult:
+        """Generate every occurrence up to ``until`` (inclusive); all users
+        when ``user_id`` is None."""
+        recs: list[Record] = []
+        fps: list[str] = []
+        marks: dict[int, date] = {}
+        for tpl in self._templates.due(until, user_id):
+            days, marks[tpl.template_id] = occurrences(tpl, until)
+            recs.extend(Record(None, tpl.user_id, tpl.rtype, tpl.category, tpl.amount, d, tpl.note) for d in days)
+            fps.extend(occurrence_fingerprint(tpl.user_id, tpl.key, d) for d in days)
+        try:
+            inserted = self._records.add_many(recs, fingerprints=fps, import_batch=RECURRING_BATCH, commit=False)
+            self._templates.advance(marks)
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
+        return MaterializeResult(len(marks), inserted)
@@ -0,0 +1,187 @@
+"""Category rules engine: note keywords / regexes / amount ranges -> category.
+
+All keyword rules are compiled into one regular expression shaped like a
+trie (``coffee(?: shop)?|co(?:la|ke)``), wrapped in a lookahead so a
+single left-to-right scan reports every keyword occurrence, overlapping
+ones included. Regex rules are tried one by one, but only while they can
+still beat the best keyword hit, so the common case is one scan per row.
+"""
+from __future__ import annotations
+import re
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from typing import Iterable, Sequence
+from ..models import CategoryRule, Record
+from ..models.rule import RULE_KINDS
+from ..repo.record_repo import RecordFilter, RecordRepository
+
+
+def validate_rule(rule: CategoryRule) -> None:
+    if rule.kind not in RULE_KINDS:
+        raise ValueError(f"unknown rule kind {rule.kind!r}; expected one of {', '.join(RULE_KINDS)}")
+    if not (rule.category or "").strip():
+        raise ValueError("rule category is required")
+    if rule.pattern is None and rule.min_amount is None and rule.max_amount is None:
+        raise ValueError("rule needs a pattern or an amount range")
+    if rule.pattern is not None and not rule.pattern.strip():
+        raise ValueError("rule pattern is empty")
+    if rule.min_amount is not None and rule.max_amount is not None and rule.min_amount > rule.max_amount:
+        raise ValueError("min amount is greater than max amount")
+    if rule.kind == "regex" and rule.pattern is not None:
+        try:
+            re.compile(rule.pattern)
+        except re.error as e:
+            raise ValueError(f"invalid regex {rule.pattern!r}: {e}") from None
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """One alternation for ``words`` with shared prefixes factored out."""
+    trie: dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str | None:
+        if list(node) == [""]:
+            return None
+        alts, chars = [], []
+        for ch in sorted(k for k in node if k):
+            sub = emit(node[ch])
+            if sub is None:
+                chars.append(re.escape(ch))
+            else:
+                alts.append(re.escape(ch) + sub)
+        if chars:
+            alts.append(chars[0] if len(chars) == 1 else "[" + "".join(chars) + "]")
+        out = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if "" in node:
+            out = "(?:" + out + ")?"  # 贪婪：同一位置取最长的关键字
+        return out
+
+    return emit(trie) or ""
+
+
+@dataclass(slots=True)
+class RuleReport:
+    """Rows seen, rows each rule assigned (by rule id) and rows left alone."""
+
+    total: int = 0
+    hits: Counter = field(default_factory=Counter)
+
+    @property
+    def matched(self) -> int:
+        return sum(self.hits.values())
+
+    @property
+    def unmatched(self) -> int:
+        return self.total - self.matched
+
+    def add(self, other: "RuleReport") -> None:
+        self.total += other.total
+        self.hits.update(other.hits)
+
+
+class RuleEngine:
+    """First matching rule wins, in (priority, rule id) order."""
+
+    def __init__(self, rules: Iterable[CategoryRule]):
+        rules = list(rules)
+        for r in rules:
+            validate_rule(r)
+        self.rules: list[CategoryRule] = sorted(rules, key=lambda r: (r.priority, r.rule_id or 0))
+        keywords: dict[str, list[int]] = {}
+        self._scanners: list[tuple[int, re.Pattern | None]] = []  # regex 规则与纯金额规则
+        for i, r in enumerate(self.rules):
+            if r.kind == "keyword" and r.pattern is not None:
+                keywords.setdefault(r.pattern.strip().lower(), []).append(i)
+            else:
+                rx = re.compile(r.pattern, re.IGNORECASE) if r.pattern is not None else None
+                self._scanners.append((i, rx))
+        # 扫描只报告每个位置上最长的关键字，被它包含的关键字在这里一并算作命中。
+        # 以 casefold 为键：IGNORECASE 命中的原文（如 "SHOP" 对 "ſhop"）.lower() 后未必等于关键字
+        self._keywords_by_id = keywords
+        self._contains: dict[str, list[int]] = {}
+        for kw in keywords:
+            ids = {i for other, idx in keywords.items() if other in kw for i in idx}
+            key = kw.casefold()
+            self._contains[key] = sorted(ids.union(self._contains.get(key, ())))
+        self._keywords = (
+            re.compile("(?=(" + _trie_regex(keywords) + "))", re.IGNORECASE) if keywords else None
+        )
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _contained(self, found: str) -> list[int]:
+        """Rules of every keyword inside the matched text ``found``."""
+        key = found.casefold()
+        ids = self._contains.get(key)
+        if ids is None:
+            # 逐字符大小写折叠与 casefold 不一致的少见情况：直接按忽略大小写的包含关系判定
+            ids = sorted(
+                i
+                for kw, idx in self._keywords_by_id.items()
+                if re.search(re.escape(kw), found, re.IGNORECASE)
+                for i in idx
+            )
+            self._contains[key] = ids
+        return ids
+
+    def _in_range(self, i: int, amount: float) -> bool:
+        r = self.rules[i]
+        return (r.min_amount is None or amount >= r.min_amount) and (
+            r.max_amount is None or amount <= r.max_amount
+        )
+
+    def match(self, note: str | None, amount: float) -> CategoryRule | None:
+        text = note or ""
+        best = None
+        if self._keywords is not None:
+            hits = {i for m in self._keywords.finditer(text) for i in self._contained(m.group(1))}
+            best = min((i for i in hits if self._in_range(i, amount)), default=None)
+        for i, rx in self._scanners:
+            if best is not None and i > best:
+                break
+            if self._in_range(i, amount) and (rx is None or rx.search(text)):
+                best = i
+                break
+        return None if best is None else self.rules[best]
+
+    def classify(
+        self, notes: Sequence[str | None], amounts: Sequence[float]
+    ) -> tuple[list[CategoryRule | None], RuleReport]:
+        report = RuleReport(total=len(notes))
+        out = []
+        for note, amount in zip(notes, amounts):
+            rule = self.match(note, amount)
+            if rule is not None:
+                report.hits[rule.rule_id] += 1
+            out.append(rule)
+        return out, report
+
+    def apply(self, recs: Sequence[Record]) -> tuple[list[Record], RuleReport]:
+        """Records with the category of their matching rule (others unchanged)."""
+        rules, report = self.classify([r.note for r in recs], [r.amount for r in recs])
+        return [r if rule is None else replace(r, category=rule.category) for r, rule in zip(recs, rules)], report
+
+
+def recategorize_by_rules(
+    repo: RecordRepository, flt: RecordFilter, engine: RuleEngine, *, dry_run: bool = False
+) -> RuleReport:
+    """Run the rules over the records matching ``flt``.
+
+    Only records whose category actually changes are written; ``hits`` counts
+    every record a rule matched.
+    """
+    recs = list(repo.list_where(flt))
+    rules, report = engine.classify([r.note for r in recs], [r.amount for r in recs])
+    changes = {
+        r.record_id: rule.category
+        for r, rule in zip(recs, rules)
+        if rule is not None and rule.category != r.category
+    }
+    if changes and not dry_run:
+        repo.set_categories(flt.user_id, changes)
+    return report
@@ -1,8 +1,16 @@
 """Statistics service: aggregations for dashboard and charts."""
 from __future__ import annotations
 from collections import defaultdict
-from typing import Iterable, Dict
+from datetime import date
+from typing import Iterable, Dict, Mapping, Sequence
+import numpy as np
 from ..models import Record, RecordType
+from ..utils.category_path import group_level, is_under, rollup
+from ..utils.fx import FxTable
+from ..utils.periods import bucket_of, bucket_starts
+from ..utils.sketch import QuantileSketch
+
+QUANTILES = (0.5, 0.9, 0.99)
 
 class StatisticsService:
     def monthly_summary(self, records: Iterable[Record]) -> Dict[str, float]:
@@ -16,9 +24,119 @@ class StatisticsService:
                 expense += r.amount
         return {"income": round(income, 2), "expense": round(expense, 2), "balance": round(income - expense, 2)}
 
-    def by_category(self, records: Iterable[Record]) -> Dict[str, float]:
+    def by_category(
+        self,
+        records: Iterable[Record],
+        depth: int | None = None,
+        parent: str | None = None,
+    ) -> Dict[str, float]:
+        """Expense per category.
+
+        ``depth`` rolls subcategories up to that level (1 = top level);
+        ``parent`` keeps only that subtree, grouped one level below it.
+        """
+        level = group_level(depth, parent)
+        buckets: Dict[str, float] = defaultdict(float)
+        for r in records:
+            if r.rtype != RecordType.EXPENSE:
+                continue
+            if parent is not None and not is_under(r.category, parent):
+                continue
+            buckets[r.category if level is None else rollup(r.category, level)] += r.amount
+        return {k: round(v, 2) for k, v in buckets.items()}
+
+    def by_tag(
+        self, records: Iterable[Record], tags_of: Mapping[int, Iterable[str]]
+    ) -> Dict[str, float]:
+        """Expense per tag; ``tags_of`` maps record_id -> tags (e.g. from
+        ``repo.tags_of``). A record with several tags counts under each."""
         buckets: Dict[str, float] = defaultdict(float)
         for r in records:
-            if r.rtype == RecordType.EXPENSE:
-                buckets[r.category] += r.amount
+            if r.rtype != RecordType.EXPENSE:
+                continue
+            for t in tags_of.get(r.record_id, ()):
+                buckets[t] += r.amount
         return {k: round(v, 2) for k, v in buckets.items()}
+
+    def trend(self, series: Mapping[date, Mapping[str, float]]) -> list[Dict]:
+        """Rows of ``{bucket, income, expense, net, cumulative}`` from
+        ``repo.series_by_type``; ``cumulative`` is the running net within the range."""
+        rows, running = [], 0.0
+        for bucket, totals in sorted(series.items()):
+            income = totals.get(RecordType.INCOME.value, 0.0)
+            expense = totals.get(RecordType.EXPENSE.value, 0.0)
+            running += income - expense
+            rows.append({
+                "bucket": bucket,
+                "income": round(income, 2),
+                "expense": round(expense, 2),
+                "net": round(income - expense, 2),
+                "cumulative": round(running, 2),
+            })
+        return rows
+
+    def quantiles(
+        self, sketches: Mapping[str, QuantileSketch], qs: Iterable[float] = QUANTILES
+    ) -> Dict[str, Dict[str, float]]:
+        """``{category: {'count': n, 'p50': x, ...}}`` from ``repo.amount_sketches``,
+        plus ``'*'`` for all categories merged. Values are within 1% of exact."""
+        qs = list(qs)
+        keys = [f"p{q * 100:g}" for q in qs]
+        total = QuantileSketch()
+        out = {}
+        for cat, sk in sorted(sketches.items()):
+            total.merge(sk)
+            out[cat] = {"count": sk.count, **dict(zip(keys, sk.quantiles(qs)))}
+        if out:
+            out["*"] = {"count": total.count, **dict(zip(keys, total.quantiles(qs)))}
+        return out
+
+    def converted(
+        self,
+        rows: Sequence[tuple[str, str, str, date, float]],
+        fx: FxTable,
+        to: str,
+        *,
+        depth: int | None = None,
+        parent: str | None = None,
+        bucket: tuple[date, date, str] | None = None,
+    ) -> tuple[Dict[str, float], Dict[str, float], Dict[date, Dict[str, float]]]:
+        """Totals in currency ``to`` from ``repo.daily_by_currency`` rows.
+
+        Every row is converted at its own day's rate in one vectorized pass,
+        then summed with ``bincount``. Returns ``(totals by type, expense by
+        category, series)`` shaped like ``totals_by_type`` /
+        ``totals_by_category`` / ``series_by_type``; ``bucket`` is
+        ``(start, end, name)`` and leaves the series empty when omitted.
+        """
+        types = [t.value for t in RecordType]
+        if rows:
+            rtypes, cats, curs, days, amts = zip(*rows)
+        else:
+            rtypes, cats, curs, days, amts = (), (), (), (), ()
+        values = fx.convert(amts, curs, [d.toordinal() for d in days], to)
+        ti = np.array([types.index(t) for t in rtypes], dtype=np.int64)
+        by_type = np.bincount(ti, weights=values, minlength=len(types))
+        totals = {t: float(v) for t, v in zip(types, by_type)}
+
+        level = group_level(depth, parent)
+        keys: Dict[str, int] = {}
+        ci = np.array([
+            -1 if rt != RecordType.EXPENSE.value or (parent is not None and not is_under(c, parent))
+            else keys.setdefault(c if level is None else rollup(c, level), len(keys))
+            for rt, c in zip(rtypes, cats)
+        ], dtype=np.int64)
+        keep = ci >= 0
+        sums = np.bincount(ci[keep], weights=values[keep], minlength=len(keys))
+        by_cat = {k: float(sums[i]) for k, i in keys.items()}
+
+        series: Dict[date, Dict[str, float]] = {}
+        if bucket is not None:
+            start, end, name = bucket
+            starts = bucket_starts(start, end, name)
+            pos = {b: i for i, b in enumerate(starts)}
+            bi = np.array([pos[bucket_of(d, name)] for d in days], dtype=np.int64)
+            grid = np.bincount(bi * len(types) + ti, weights=values, minlength=len(starts) * len(types))
+            grid = grid.reshape(len(starts), len(types))
+            series = {b: dict(zip(types, map(float, grid[i]))) for i, b in enumerate(starts)}
+        return totals, by_cat, series
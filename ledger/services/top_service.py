@@ -0,0 +1,86 @@
+"""Top-N queries: largest records, top categories, heavy-hitter notes.
+
+Nothing here sorts a full result. The largest records come from an indexed
+``ORDER BY amount DESC LIMIT n``. Categories are ranked with a heap over the
+per-category totals. Notes are streamed through a bounded ``SpaceSaving``
+table.
+"""
+from __future__ import annotations
+import heapq
+import re
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, Mapping
+from ..models import Record, RecordType
+from ..repo.record_query import RecordQuery
+from ..utils.fx import FxTable
+from ..utils.topk import SpaceSaving
+
+NOTE_RANKS = ("amount", "count")
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize_note(note: str) -> str:
+    """Merchant-style key: lower case, tokens with digits (card numbers,
+    order ids, dates) and punctuation dropped. ``"UBER *TRIP 8J2K"`` and
+    ``"Uber trip"`` both become ``"uber trip"``."""
+    return " ".join(t for t in _NON_WORD.sub(" ", note.lower()).split() if not any(c.isdigit() for c in t))
+
+
+@dataclass(slots=True)
+class NoteRank:
+    note: str
+    count: int
+    amount: float
+    error: float = 0.0  # >0：近似值，按排名依据最多高估这么多
+
+
+class TopService:
+    def __init__(self, repo, fx: FxTable | None = None):
+        self._repo = repo
+        self._fx = fx
+
+    def largest(
+        self, user_id: int, start: date, end: date, n: int, rtype: RecordType = RecordType.EXPENSE
+    ) -> list[Record]:
+        """Ranked on the stored amounts (index order), whatever their currency."""
+        return list(self._repo.query(
+            RecordQuery(user_id).between(start, end).of_type(rtype).order_by("-amount").take(n)
+        ))
+
+    def top_categories(
+        self, user_id: int, start: date, end: date, n: int, *, depth: int | None = None
+    ) -> list[tuple[str, float]]:
+        return self.rank_categories(self._repo.totals_by_category(user_id, start, end, depth=depth, fx=self._fx), n)
+
+    def top_notes(
+        self, user_id: int, start: date, end: date, n: int, by: str = "amount"
+    ) -> tuple[list[NoteRank], bool]:
+        return self.rank_notes(self._repo.note_amounts(user_id, start, end, fx=self._fx), n, by)
+
+    @staticmethod
+    def rank_categories(totals: Mapping[str, float], n: int) -> list[tuple[str, float]]:
+        return heapq.nlargest(n, totals.items(), key=lambda kv: (kv[1], kv[0]))
+
+    @staticmethod
+    def rank_notes(
+        pairs: Iterable[tuple[str, float]], n: int, by: str = "amount", capacity: int | None = None
+    ) -> tuple[list[NoteRank], bool]:
+        """Heaviest normalized notes by total ``amount`` or by ``count``;
+        returns ``(ranks, exact)``. Memory is bounded by ``capacity``
+        (default ``max(100 * n, 10000)`` distinct notes)."""
+        if by not in NOTE_RANKS:
+            raise ValueError(f"unknown ranking {by!r}; expected one of {', '.join(NOTE_RANKS)}")
+        ss = SpaceSaving(capacity or max(100 * n, 10000))
+        for note, amount in pairs:
+            key = normalize_note(note)
+            if key:
+                ss.add(key, amount if by == "amount" else 1.0, amount)
+        ranks = []
+        for key, t in ss.top(n):
+            # 被淘汰过的键：排名依据用含误差的上界，另一项用进表后的累计（下界）
+            count = int(t.weight) if by == "count" else t.count
+            amount = t.weight if by == "amount" else t.amount
+            ranks.append(NoteRank(key, count, round(amount, 2), round(t.error, 2)))
+        return ranks, ss.exact
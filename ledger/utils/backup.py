@@ -0,0 +1,143 @@
+"""
+Online backup / restore built on SQLite's backup API.
+
+Pages are copied ``pages`` at a time; between steps the source lock is
+released (optionally sleeping), so writers on a live ledger keep going and
+any page they change is re-copied by SQLite. Unlike ``export-csv`` this keeps
+every table (users, budgets, reminders, ...).
+"""
+
+from __future__ import annotations
+
+import gzip
+import shutil
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from .db import sqlite_path
+
+ProgressFn = Callable[[int, int, int], None]  # (status, remaining, total)
+
+
+def _require_path(db_url: str) -> str:
+    path = sqlite_path(db_url)
+    if path is None:
+        raise ValueError("backup/restore requires a file-based sqlite:/// URL")
+    return path
+
+
+def _is_gzip(path: Path) -> bool:
+    with path.open("rb") as f:
+        return f.read(2) == b"\x1f\x8b"
+
+
+def integrity_check(path: str) -> str:
+    """Run PRAGMA integrity_check; returns 'ok' or the first problem found."""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _copy(src_path: str, dst_path: str, pages: int, sleep: float, progress: Optional[ProgressFn]) -> int:
+    if pages < 1:
+        raise ValueError("pages must be >= 1")
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(dst_path)
+    total = 0
+
+    def _cb(status: int, remaining: int, count: int) -> None:
+        nonlocal total
+        total = count
+        if progress:
+            progress(status, remaining, count)
+
+    try:
+        src.backup(dst, pages=pages, progress=_cb, sleep=sleep)
+    finally:
+        dst.close()
+        src.close()
+    return total
+
+
+def backup_database(
+    db_url: str,
+    dest: str,
+    *,
+    pages: int = 256,
+    compress: bool | None = None,
+    sleep: float = 0.0,
+    progress: Optional[ProgressFn] = None,
+) -> Dict[str, float]:
+    """Copy the live database at ``db_url`` to ``dest``.
+
+    ``compress=None`` gzips when ``dest`` ends with ``.gz``.
+    """
+    src_path = _require_path(db_url)
+    if not Path(src_path).exists():
+        raise FileNotFoundError(f"database not found: {src_path}")
+    out = Path(dest)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if compress is None:
+        compress = out.suffix == ".gz"
+
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=out.parent) as tmp:
+        snap = Path(tmp) / "snapshot.db"
+        copied = _copy(src_path, str(snap), pages, sleep, progress)
+        status = integrity_check(str(snap))
+        if status != "ok":
+            raise RuntimeError(f"backup failed integrity check: {status}")
+        part = out.with_name(out.name + ".part")
+        if compress:
+            with snap.open("rb") as fin, gzip.open(part, "wb", compresslevel=6) as fout:
+                shutil.copyfileobj(fin, fout, length=1 << 20)
+        else:
+            shutil.copyfile(snap, part)
+        part.replace(out)
+    return {"pages": copied, "bytes": out.stat().st_size, "seconds": time.perf_counter() - t0}
+
+
+def restore_database(
+    db_url: str,
+    src: str,
+    *,
+    pages: int = 256,
+    sleep: float = 0.0,
+    progress: Optional[ProgressFn] = None,
+) -> Dict[str, float]:
+    """Restore ``src`` (plain or gzip backup) into the database at ``db_url``.
+
+    The backup is verified before anything is overwritten, and the restored
+    database is verified again afterwards.
+    """
+    dst_path = _require_path(db_url)
+    backup = Path(src)
+    if not backup.exists():
+        raise FileNotFoundError(f"backup not found: {src}")
+    Path(dst_path).parent.mkdir(parents=True, exist_ok=True)
+
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = Path(tmp) / "restore.db"
+        if _is_gzip(backup):
+            with gzip.open(backup, "rb") as fin, plain.open("wb") as fout:
+                shutil.copyfileobj(fin, fout, length=1 << 20)
+        else:
+            shutil.copyfile(backup, plain)
+        try:
+            status = integrity_check(str(plain))
+        except sqlite3.DatabaseError as exc:
+            raise RuntimeError(f"not a valid backup: {exc}") from exc
+        if status != "ok":
+            raise RuntimeError(f"backup file is corrupt: {status}")
+        copied = _copy(str(plain), dst_path, pages, sleep, progress)
+
+    status = integrity_check(dst_path)
+    if status != "ok":
+        raise RuntimeError(f"restored database failed integrity check: {status}")
+    return {"pages": copied, "seconds": time.perf_counter() - t0}
@@ -0,0 +1,29 @@
+"""Record-id bitmaps as Python ints (bit ``i`` set <=> id ``i`` present).
+
+Intersections / differences are plain ``&`` / ``& ~`` on arbitrary-size
+ints; numpy is only used to pack and unpack id arrays quickly.
+"""
+from __future__ import annotations
+from typing import Iterable
+import numpy as np
+
+
+def from_ids(ids: Iterable[int]) -> int:
+    arr = np.fromiter(ids, dtype=np.int64)
+    if not arr.size:
+        return 0
+    bits = np.zeros(int(arr.max()) + 1, dtype=np.uint8)
+    bits[arr] = 1
+    return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+
+
+def to_ids(bm: int) -> list[int]:
+    """Set bits in ascending order."""
+    if bm <= 0:
+        return []
+    raw = np.frombuffer(bm.to_bytes((bm.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(raw, bitorder="little")).tolist()
+
+
+def count(bm: int) -> int:
+    return bm.bit_count()
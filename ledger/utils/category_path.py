@@ -0,0 +1,40 @@
+"""Hierarchical category names: ``"Food/Groceries"`` is a child of ``"Food"``.
+
+Depth counts path segments, so top-level categories have depth 1.
+"""
+from __future__ import annotations
+
+SEP = "/"
+
+
+def depth_of(name: str) -> int:
+    return name.count(SEP) + 1
+
+
+def parent_of(name: str) -> str | None:
+    return name.rsplit(SEP, 1)[0] if SEP in name else None
+
+
+def ancestors(name: str) -> list[str]:
+    """Self and all ancestors, root first: ``a/b/c`` -> ``[a, a/b, a/b/c]``."""
+    parts = name.split(SEP)
+    return [SEP.join(parts[: i + 1]) for i in range(len(parts))]
+
+
+def is_under(name: str, parent: str) -> bool:
+    """True for ``parent`` itself and anything below it."""
+    return name == parent or name.startswith(parent + SEP)
+
+
+def rollup(name: str, depth: int) -> str:
+    """Ancestor of ``name`` at ``depth`` (``name`` itself if it is shallower)."""
+    if depth < 1:
+        raise ValueError("depth must be >= 1")
+    return SEP.join(name.split(SEP)[:depth])
+
+
+def group_level(depth: int | None, parent: str | None) -> int | None:
+    """Level to group at: ``depth`` if given, else one below ``parent``."""
+    if parent is not None:
+        return max(depth or depth_of(parent) + 1, depth_of(parent))
+    return depth
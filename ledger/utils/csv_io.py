@@ -1,51 +1,141 @@
 """CSV I/O helpers for Record objects."""
 
 from __future__ import annotations
+import io
 import pandas as pd
-from typing import Iterable
+from dataclasses import dataclass
+from hashlib import blake2b
+from typing import Iterable, Iterator
 from pathlib import Path
-from ..models import Record, RecordType
+from ..models import BASE_CURRENCY, Record, RecordType
+from .fx import normalize_currency
+
+_DTYPES = {"rtype": str, "category": str, "note": str, "currency": str}
+_RTYPES = {t.value: t for t in RecordType}
+
+
+def frame_to_records(df: pd.DataFrame) -> list[Record]:
+    """Convert a parsed CSV frame to Records column-wise (no iterrows)."""
+    rtypes = df["rtype"].map(_RTYPES)
+    bad = rtypes.isna()
+    if bad.any():
+        row = df[bad].iloc[0]
+        raise ValueError(f"Invalid record type in row: {row.to_dict()}")
+    n = len(df)
+    # 这两列只作参考（导入时 user_id 会被改写、record_id 丢弃）：空值或非数字不应让整批失败
+    ids = (
+        [None if pd.isna(v) else int(v) for v in pd.to_numeric(df["record_id"], errors="coerce")]
+        if "record_id" in df
+        else [None] * n
+    )
+    users = (
+        pd.to_numeric(df["user_id"], errors="coerce").fillna(0).astype(int).tolist()
+        if "user_id" in df
+        else [0] * n
+    )
+    dates = pd.to_datetime(df["occurred_on"]).dt.date.tolist()
+    notes = df["note"].fillna("").astype(str).tolist() if "note" in df else [""] * n
+    # 币种列可选；每种写法只校验一次
+    if "currency" in df:
+        raw = df["currency"].fillna(BASE_CURRENCY).astype(str)
+        codes = {c: normalize_currency(c) for c in raw.unique()}
+        currencies = raw.map(codes).tolist()
+    else:
+        currencies = [BASE_CURRENCY] * n
+    return [
+        Record(rid, uid, rt, str(cat), float(amt), d, note, cur)
+        for rid, uid, rt, cat, amt, d, note, cur in zip(
+            ids, users, rtypes.tolist(), df["category"].tolist(),
+            df["amount"].astype(float).tolist(), dates, notes, currencies,
+        )
+    ]
 
 
 def load_records_from_csv(path: str) -> list[Record]:
     """
     Load records from a CSV file into a list of Record objects.
     Expected columns:
-        record_id (optional), user_id, rtype, category, amount, occurred_on, note
+        record_id (optional), user_id, rtype, category, amount, occurred_on, note,
+        currency (optional, defaults to the base currency)
     """
     p = Path(path)
     if not p.exists():
         raise FileNotFoundError(f"CSV file not found: {path}")
 
-    df = pd.read_csv(p, dtype={"rtype": str, "category": str, "note": str})
-    records: list[Record] = []
-
-    for _, row in df.iterrows():
-        try:
-            rtype = (
-                RecordType(row["rtype"])
-                if not isinstance(row["rtype"], RecordType)
-                else row["rtype"]
-            )
-        except Exception:
-            raise ValueError(f"Invalid record type in row: {row.to_dict()}")
-
-        record = Record(
-            record_id=(
-                int(row["record_id"])
-                if "record_id" in row and not pd.isna(row["record_id"])
-                else None
-            ),
-            user_id=int(row["user_id"]),
-            rtype=rtype,
-            category=str(row["category"]),
-            amount=float(row["amount"]),
-            occurred_on=pd.to_datetime(row["occurred_on"]).date(),
-            note=str(row.get("note", "")) if "note" in row else "",
-        )
-        records.append(record)
+    df = pd.read_csv(p, dtype=_DTYPES)
+    return frame_to_records(df)
+
 
-    return records
+# ---- 流式分块读取（支持从字节偏移处续读） ----
+@dataclass(slots=True)
+class CsvChunk:
+    frame: pd.DataFrame
+    first_row: int  # 本块第一行的数据行号（从 1 开始，不含表头）
+    end_offset: int  # 本块结束处的字节偏移，可作为续读起点
+
+
+def file_fingerprint(path: str, sample: int = 1 << 20) -> str:
+    """Identity of a file: size + first/last ``sample`` bytes.
+
+    Cheap enough for multi-GB files (reads at most 2 * sample bytes).
+    """
+    p = Path(path)
+    size = p.stat().st_size
+    h = blake2b(str(size).encode(), digest_size=16)
+    with p.open("rb") as f:
+        h.update(f.read(sample))
+        if size > sample:
+            f.seek(max(sample, size - sample))
+            h.update(f.read(sample))
+    return h.hexdigest()
+
+
+def iter_csv_chunks(
+    path: str, chunk_rows: int = 5000, start_offset: int = 0, start_row: int = 1
+) -> Iterator[CsvChunk]:
+    """Yield parsed chunks of ``chunk_rows`` data rows.
+
+    Chunks are cut only at line ends outside quoted fields, so ``end_offset``
+    of any chunk is a safe place to resume with ``start_offset``.
+    """
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"CSV file not found: {path}")
+    with p.open("rb") as f:
+        header = f.readline()
+        if start_offset:
+            f.seek(start_offset)
+        row = start_row
+        buf: list[bytes] = []
+        rows_in_buf = 0
+        in_quotes = False
+        while True:
+            line = f.readline()
+            if line:
+                buf.append(line)
+                if line.count(b'"') % 2:
+                    in_quotes = not in_quotes
+                if not in_quotes:
+                    rows_in_buf += 1
+            at_eof = not line
+            if buf and (at_eof or (not in_quotes and rows_in_buf >= chunk_rows)):
+                data = b"".join(buf)
+                if data.strip():
+                    frame = pd.read_csv(io.BytesIO(header + data), dtype=_DTYPES)
+                    yield CsvChunk(frame=frame, first_row=row, end_offset=f.tell())
+                    row += len(frame)
+                buf = []
+                rows_in_buf = 0
+            if at_eof:
+                return
+
+
+def append_quarantine(path: str, bad: pd.DataFrame) -> None:
+    """Append rejected rows (with row/reason columns) to a quarantine CSV."""
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    new_file = not p.exists() or p.stat().st_size == 0
+    bad.to_csv(p, mode="a", header=new_file, index=False, encoding="utf-8")
 
 
 def save_records_to_csv(path: str, records: Iterable[Record]) -> None:
@@ -66,6 +156,7 @@ def save_records_to_csv(path: str, records: Iterable[Record]) -> None:
                 "amount": float(r.amount),
                 "occurred_on": r.occurred_on.isoformat(),
                 "note": r.note or "",
+                "currency": r.currency,
             }
         )
     df = pd.DataFrame(rows)
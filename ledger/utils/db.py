@@ -1,21 +1,53 @@
 # ledger/utils/db.py
 """Engine / SessionFactory per-URL cache + init helpers."""
 from __future__ import annotations
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from ..repo.sqlite_schema import (
     metadata,
 )  # 如果你用 ORM，请改成 from ..utils.schema import Base
+from ..repo.sqlite_migrations import migrate
+from .sketch import register_math_functions
 
 # 关键：按 db_url 维度缓存，而不是单例
 _ENGINE_CACHE: dict[str, object] = {}
 _SESSION_FACTORY_CACHE: dict[str, object] = {}
+# 只读（分析）引擎单独缓存，与写引擎互不共享连接
+_READ_ENGINE_CACHE: dict[str, object] = {}
+_READ_SESSION_FACTORY_CACHE: dict[str, object] = {}
+
+
+def sqlite_path(db_url: str) -> str | None:
+    """File path of a sqlite URL, or None for in-memory / non-sqlite URLs."""
+    url = make_url(db_url)
+    if not url.drivername.startswith("sqlite"):
+        return None
+    if not url.database or url.database == ":memory:":
+        return None
+    return url.database
+
+
+def _math_functions(dbapi_conn, _record) -> None:
+    # records 上的金额草图触发器用到 ln/ceil：SQLite 未编译数学函数时用 Python 版本补上
+    register_math_functions(dbapi_conn)
+
+
+def _enable_wal(dbapi_conn, _record) -> None:
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.close()
 
 
 def get_engine(db_url: str = "sqlite:///./ledger.db"):
     engine = _ENGINE_CACHE.get(db_url)
     if engine is None:
         engine = create_engine(db_url, echo=False, future=True)
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", _math_functions)
+        if sqlite_path(db_url):
+            # WAL：读者看到一致快照，写者不会被长查询阻塞
+            event.listen(engine, "connect", _enable_wal)
         _ENGINE_CACHE[db_url] = engine
     return engine
 
@@ -29,12 +61,60 @@ def get_session_factory(db_url: str = "sqlite:///./ledger.db"):
     return fac
 
 
+def _readonly_connect(dbapi_conn, _record) -> None:
+    # 交给下面的 begin 钩子显式 BEGIN，整个 Session 读同一个 WAL 快照
+    dbapi_conn.isolation_level = None
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA query_only=1")
+    cur.close()
+
+
+def _readonly_begin(conn) -> None:
+    conn.exec_driver_sql("BEGIN")
+
+
+def get_read_engine(db_url: str = "sqlite:///./ledger.db"):
+    """Read-only engine for analytics (``mode=ro`` + ``query_only``).
+
+    Falls back to the writer engine for in-memory or non-sqlite URLs, where
+    a second connection would not see the same data.
+    """
+    path = sqlite_path(db_url)
+    if path is None:
+        return get_engine(db_url)
+    engine = _READ_ENGINE_CACHE.get(db_url)
+    if engine is None:
+        get_engine(db_url)  # 确保文件已按 WAL 模式打开过
+        ro_url = make_url(db_url).set(
+            database=f"file:{path}", query={"mode": "ro", "uri": "true"}
+        )
+        engine = create_engine(ro_url, echo=False, future=True)
+        event.listen(engine, "connect", _math_functions)
+        event.listen(engine, "connect", _readonly_connect)
+        event.listen(engine, "begin", _readonly_begin)
+        _READ_ENGINE_CACHE[db_url] = engine
+    return engine
+
+
+def get_read_session_factory(db_url: str = "sqlite:///./ledger.db"):
+    if sqlite_path(db_url) is None:
+        return get_session_factory(db_url)
+    fac = _READ_SESSION_FACTORY_CACHE.get(db_url)
+    if fac is None:
+        fac = sessionmaker(bind=get_read_engine(db_url), autoflush=False, autocommit=False, future=True)
+        _READ_SESSION_FACTORY_CACHE[db_url] = fac
+    return fac
+
+
 def init_db(db_url: str = "sqlite:///./ledger.db") -> None:
     engine = get_engine(db_url)
     metadata.create_all(engine)  # ORM 版用：Base.metadata.create_all(engine)
+    migrate(engine)
 
 
 # 可选：测试时重置缓存
 def reset_db_cache() -> None:
     _ENGINE_CACHE.clear()
     _SESSION_FACTORY_CACHE.clear()
+    _READ_ENGINE_CACHE.clear()
+    _READ_SESSION_FACTORY_CACHE.clear()
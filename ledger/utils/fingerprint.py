@@ -0,0 +1,63 @@
+"""Content fingerprints for import de-duplication."""
+
+from __future__ import annotations
+
+import re
+from hashlib import blake2b
+from typing import Iterable, Iterator
+
+from ..models import BASE_CURRENCY, Record
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_note(note: str | None) -> str:
+    return _SPACES.sub(" ", (note or "").strip().lower())
+
+
+def record_fingerprint(rec: Record, occurrence: int = 0) -> str:
+    """Fingerprint of (user, date, amount, type, category, normalized note).
+
+    Foreign-currency records also hash their currency; base-currency keys
+    are unchanged so fingerprints stored before currencies existed still
+    match on re-import.
+
+    ``occurrence`` distinguishes genuinely repeated lines inside one file
+    (two identical coffees on the same day): the k-th copy gets k.
+    """
+    rtype = rec.rtype.value if hasattr(rec.rtype, "value") else str(rec.rtype)
+    key = (
+        f"{rec.user_id}|{rec.occurred_on.isoformat()}|{float(rec.amount):.2f}|"
+        f"{rtype}|{rec.category.strip()}|{normalize_note(rec.note)}|{occurrence}"
+    )
+    if rec.currency != BASE_CURRENCY:
+        key += f"|{rec.currency}"
+    return blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def fingerprint_all(
+    records: Iterable[Record], seen: dict[str, int] | None = None, changed: set[str] | None = None
+) -> Iterator[str]:
+    """Fingerprints for a stream of records, numbering repeats in order.
+
+    Pass the same ``seen`` dict across chunks of one file to keep the
+    occurrence numbering stable; ``changed`` collects the base fingerprints
+    whose count moved, so only those need persisting.
+    """
+    seen = {} if seen is None else seen
+    for rec in records:
+        base = record_fingerprint(rec)
+        k = seen.get(base, 0)
+        seen[base] = k + 1
+        if changed is not None:
+            changed.add(base)
+        yield base if k == 0 else record_fingerprint(rec, k)
+
+
+def occurrence_fingerprint(user_id: int, template_key: str, day) -> str:
+    """Fingerprint of a recurring template's occurrence on ``day``; a second
+    run over the same dates inserts nothing. ``template_key`` is the
+    template's stored key, not its id: ids are reused after a delete and
+    change when the user moves to another shard."""
+    key = f"recurring|{user_id}|{template_key}|{day.isoformat()}"
+    return blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
@@ -0,0 +1,109 @@
+"""Currency codes and an in-memory FX-rate table.
+
+A rate is the value of one unit of a currency in the base currency on a
+given day (``BASE_CURRENCY`` itself is always 1). Rates are kept as one
+date-sorted array per currency, so the rate in force on a day -- the
+latest quote on or before it -- is a bisect, and a whole column of
+(currency, day) pairs converts with one ``searchsorted`` per currency.
+"""
+from __future__ import annotations
+import re
+from bisect import bisect_right
+from datetime import date
+from pathlib import Path
+from typing import Iterable, Sequence
+import numpy as np
+import pandas as pd
+from ..models import BASE_CURRENCY
+
+_CODE = re.compile(r"[A-Z]{3}")
+
+
+def normalize_currency(code: str) -> str:
+    """``" usd"`` -> ``"USD"``; anything but three letters is rejected."""
+    c = (code or "").strip().upper()
+    if not _CODE.fullmatch(c):
+        raise ValueError(f"invalid currency code {code!r}; expected three letters like USD")
+    return c
+
+
+def load_rates_from_csv(path: str) -> list[tuple[str, date, float]]:
+    """Read ``day,currency,rate`` rows (rate = base-currency value of one unit)."""
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"CSV file not found: {path}")
+    df = pd.read_csv(p, dtype={"currency": str})
+    missing = [c for c in ("day", "currency", "rate") if c not in df.columns]
+    if missing:
+        raise ValueError(f"rates CSV is missing required columns: {', '.join(missing)}")
+    rates = pd.to_numeric(df["rate"], errors="coerce")
+    days = pd.to_datetime(df["day"], errors="coerce", format="mixed")
+    bad = rates.isna() | (rates <= 0) | days.isna()
+    if bad.any():
+        raise ValueError(f"invalid rate in row {int(bad.to_numpy().argmax()) + 1}: {df[bad].iloc[0].to_dict()}")
+    codes = {c: normalize_currency(c) for c in df["currency"].astype(str).unique()}
+    return list(zip(df["currency"].astype(str).map(codes), days.dt.date, rates.astype(float)))
+
+
+class FxTable:
+    __slots__ = ("_days", "_rates")
+
+    def __init__(self, rows: Iterable[tuple[str, date, float]] = ()):
+        by_cur: dict[str, list[tuple[int, float]]] = {}
+        for cur, day, rate in rows:
+            by_cur.setdefault(cur, []).append((day.toordinal(), float(rate)))
+        self._days: dict[str, np.ndarray] = {}
+        self._rates: dict[str, np.ndarray] = {}
+        for cur, pts in by_cur.items():
+            pts.sort()
+            self._days[cur] = np.array([d for d, _ in pts], dtype=np.int64)
+            self._rates[cur] = np.array([r for _, r in pts])
+
+    @property
+    def currencies(self) -> list[str]:
+        return sorted(self._days)
+
+    def __len__(self) -> int:
+        return sum(len(d) for d in self._days.values())
+
+    def _series(self, currency: str) -> tuple[np.ndarray, np.ndarray]:
+        if currency not in self._days:
+            raise ValueError(f"no FX rates for {currency}")
+        return self._days[currency], self._rates[currency]
+
+    def rate(self, currency: str, day: date) -> float:
+        """Base-currency value of one unit of ``currency`` on ``day``."""
+        if currency == BASE_CURRENCY:
+            return 1.0
+        days, rates = self._series(currency)
+        i = bisect_right(days, day.toordinal()) - 1
+        if i < 0:
+            raise ValueError(f"no {currency} rate on or before {day.isoformat()}")
+        return float(rates[i])
+
+    def rates(self, currency: str, days: np.ndarray) -> np.ndarray:
+        """Vectorized ``rate`` for an array of day ordinals."""
+        if currency == BASE_CURRENCY:
+            return np.ones(len(days))
+        known, rates = self._series(currency)
+        idx = np.searchsorted(known, days, side="right") - 1
+        if len(idx) and idx.min() < 0:
+            first = date.fromordinal(int(days[idx < 0].min()))
+            raise ValueError(f"no {currency} rate on or before {first.isoformat()}")
+        return rates[idx]
+
+    def convert(
+        self, amounts: Sequence[float], currencies: Sequence[str], days: Sequence[int], to: str = BASE_CURRENCY
+    ) -> np.ndarray:
+        """Amounts in their own currencies on their own days (ordinals) -> ``to``."""
+        amounts = np.asarray(amounts, dtype=float)
+        cur = np.asarray(currencies, dtype=object)
+        days = np.asarray(days, dtype=np.int64)
+        factor = np.empty(len(amounts))
+        # 每种币种一次 searchsorted，不逐行查表
+        for c in set(cur.tolist()):
+            mask = cur == c
+            factor[mask] = self.rates(c, days[mask])
+        if to != BASE_CURRENCY:
+            factor /= self.rates(to, days)
+        return amounts * factor
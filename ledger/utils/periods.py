@@ -0,0 +1,78 @@
+"""Date ranges and time buckets for statistics.
+
+Ranges are half-open ``[start, end)`` like everywhere else in the ledger.
+A bucket is identified by its first day: the day itself, the Monday of its
+ISO week, or the first of its month.
+"""
+from __future__ import annotations
+from datetime import date, timedelta
+
+BUCKETS = ("day", "week", "month")
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def add_months(d: date, n: int) -> date:
+    """First of the month ``n`` months after ``d``'s month."""
+    m = d.year * 12 + d.month - 1 + n
+    return date(m // 12, m % 12 + 1, 1)
+
+
+def month_range(year: int, month: int) -> tuple[date, date]:
+    start = date(year, month, 1)
+    return start, add_months(start, 1)
+
+
+def quarter_range(year: int, quarter: int) -> tuple[date, date]:
+    if not 1 <= quarter <= 4:
+        raise ValueError("quarter must be 1-4")
+    start = date(year, 3 * quarter - 2, 1)
+    return start, add_months(start, 3)
+
+
+def year_range(year: int) -> tuple[date, date]:
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def last_months(n: int, today: date) -> tuple[date, date]:
+    """The ``n`` calendar months ending with the current one."""
+    if n < 1:
+        raise ValueError("number of months must be >= 1")
+    end = add_months(today, 1)
+    return add_months(end, -n), end
+
+
+def bucket_of(d: date, bucket: str) -> date:
+    if bucket == "day":
+        return d
+    if bucket == "week":
+        return d - timedelta(days=d.weekday())
+    if bucket == "month":
+        return month_start(d)
+    raise ValueError(f"unknown bucket {bucket!r}; expected one of {', '.join(BUCKETS)}")
+
+
+def bucket_starts(start: date, end: date, bucket: str) -> list[date]:
+    """Every bucket overlapping ``[start, end)``, in order (gaps included)."""
+    out = []
+    b = bucket_of(start, bucket)
+    while b < end:
+        out.append(b)
+        b = add_months(b, 1) if bucket == "month" else b + timedelta(days=1 if bucket == "day" else 7)
+    return out
+
+
+def period_window(period: str, on: date) -> tuple[date, date]:
+    """The WEEKLY / MONTHLY / QUARTERLY / YEARLY period containing ``on``."""
+    if period == "WEEKLY":
+        start = bucket_of(on, "week")
+        return start, start + timedelta(days=7)
+    if period == "MONTHLY":
+        return month_range(on.year, on.month)
+    if period == "QUARTERLY":
+        return quarter_range(on.year, (on.month - 1) // 3 + 1)
+    if period == "YEARLY":
+        return year_range(on.year)
+    raise ValueError(f"no calendar window for period {period!r}")
@@ -0,0 +1,282 @@
+"""
+Optional per-user sharded storage.
+
+The ``--db`` URL becomes a small *directory* database that keeps users/auth
+plus the shard map (``shards`` / ``user_shards``). Each user's records,
+budgets and reminders live in one of N shard files next to it::
+
+    sqlite:///./ledger.db  ->  ./ledger.shard0.db, ./ledger.shard1.db, ...
+
+Users are placed with jump consistent hashing, so growing from N to N+1
+shards only moves ~1/(N+1) of the users. The placement is persisted in
+``user_shards`` so a rebalance can move users one at a time.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, TypeVar
+
+from sqlalchemy import select, insert, delete, update, func, and_
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from .db import init_db, get_session_factory, get_read_session_factory
+from .fx import FxTable
+from ..repo.sqlite_schema import (
+    shards, user_shards, records, budgets, reminders, category_rules, recurring_templates, categories, tags,
+    record_tags, balance_checkpoints, daily_spend, category_stats, amount_sketch,
+)
+from ..repo.sqlite_category_repo import SqliteCategoryRepository
+from ..repo.sqlite_tag_repo import SqliteTagRepository
+from ..repo.sqlite_fx_repo import foreign_deltas
+
+T = TypeVar("T")
+
+# 按目录库 URL 缓存路由器；未启用分片的库缓存为 None
+_ROUTER_CACHE: dict[str, "ShardRouter | None"] = {}
+
+# 随用户迁移的表（目录库里的 users 不动）；字典表（categories / tags）最后删，
+# 搬迁时按名称重映射 id；record_tags 随记录删除由触发器清理，按新 record_id 重建；
+# 派生表（余额检查点、每日支出汇总、分类统计、金额草图）由目标分片插入记录时的触发器重新生成，只删不搬
+_USER_TABLES = (
+    records, budgets, reminders, category_rules, recurring_templates, balance_checkpoints, daily_spend,
+    category_stats, amount_sketch, categories, tags,
+)
+_DICT_TABLES = (categories, tags)
+_DERIVED_TABLES = (balance_checkpoints, daily_spend, category_stats, amount_sketch)
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach, 2014)."""
+    b, j = -1, 0
+    key &= 0xFFFFFFFFFFFFFFFF
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def shard_url(directory_url: str, shard_id: int) -> str:
+    url = make_url(directory_url)
+    if not url.drivername.startswith("sqlite") or not url.database or url.database == ":memory:":
+        raise ValueError("sharding requires a file-based sqlite:/// URL")
+    p = Path(url.database)
+    return str(url.set(database=str(p.with_name(f"{p.stem}.shard{shard_id}{p.suffix}"))))
+
+
+class ShardRouter:
+    """Maps user_id -> shard and hands out per-shard sessions."""
+
+    def __init__(self, directory_url: str, shard_urls: Dict[int, str]):
+        self.directory_url = directory_url
+        self._urls = dict(shard_urls)
+        # 路由层自己持有每个分片的 sessionmaker，避免多线程并发时重复建 engine
+        self._factories = {sid: get_session_factory(u) for sid, u in self._urls.items()}
+        self._read_factories = {sid: get_read_session_factory(u) for sid, u in self._urls.items()}
+        self._placement: dict[int, int] = {}
+
+    @property
+    def shard_ids(self) -> list[int]:
+        return sorted(self._urls)
+
+    @property
+    def shard_urls(self) -> Dict[int, str]:
+        return dict(self._urls)
+
+    def _directory(self) -> Session:
+        return get_session_factory(self.directory_url)()
+
+    def shard_for(self, user_id: int) -> int:
+        sid = self._placement.get(user_id)
+        if sid is not None:
+            return sid
+        with self._directory() as s:
+            sid = s.execute(
+                select(user_shards.c.shard_id).where(user_shards.c.user_id == user_id)
+            ).scalar()
+            if sid is None:
+                sid = jump_hash(user_id, len(self._urls))
+                s.execute(insert(user_shards).values(user_id=user_id, shard_id=sid))
+                s.commit()
+        self._placement[user_id] = sid
+        return sid
+
+    def url_for(self, user_id: int) -> str:
+        return self._urls[self.shard_for(user_id)]
+
+    def session_for(self, user_id: int) -> Session:
+        return self._factories[self.shard_for(user_id)]()
+
+    def read_session_for(self, user_id: int) -> Session:
+        return self._read_factories[self.shard_for(user_id)]()
+
+    def fan_out(
+        self,
+        fn: Callable[[Session, int], T],
+        max_workers: int | None = None,
+        *,
+        readonly: bool = False,
+    ) -> Dict[int, T]:
+        """Run ``fn(session, shard_id)`` on every shard in parallel."""
+        factories = self._read_factories if readonly else self._factories
+
+        def run(sid: int) -> T:
+            with factories[sid]() as s:
+                return fn(s, sid)
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(self._urls)) as ex:
+            futures = {sid: ex.submit(run, sid) for sid in self.shard_ids}
+            return {sid: f.result() for sid, f in futures.items()}
+
+    def monthly_totals(
+        self, year: int, month: int, fx: FxTable | None = None
+    ) -> Dict[int, Dict[str, float]]:
+        """Cross-shard batch report in the base currency:
+        {user_id: {'INCOME': x, 'EXPENSE': y}}."""
+        start = date(year, month, 1)
+        end = date(year + (month // 12), (month % 12) + 1, 1)
+        period = [records.c.occurred_on >= start, records.c.occurred_on < end]
+
+        def per_shard(s: Session, _sid: int):
+            totals = s.execute(
+                select(records.c.user_id, records.c.rtype, func.sum(records.c.amount))
+                .where(and_(*period))
+                .group_by(records.c.user_id, records.c.rtype)
+            ).all()
+            return totals, foreign_deltas(s, fx, [records.c.user_id, records.c.rtype], period)
+
+        out: Dict[int, Dict[str, float]] = {}
+        for totals, deltas in self.fan_out(per_shard, readonly=True).values():
+            for uid, rtype, total in totals:
+                out.setdefault(uid, {"INCOME": 0.0, "EXPENSE": 0.0})[rtype] = float(total or 0.0)
+            for uid, rtype, _day, delta in deltas:
+                out[uid][rtype] += delta
+        return out
+
+
+def _load_shard_urls(directory_url: str) -> Dict[int, str]:
+    with get_session_factory(directory_url)() as s:
+        return {sid: url for sid, url in s.execute(select(shards.c.shard_id, shards.c.url))}
+
+
+def get_router(directory_url: str) -> ShardRouter | None:
+    """Router for a directory DB, or None when sharding is not enabled."""
+    if directory_url not in _ROUTER_CACHE:
+        urls = _load_shard_urls(directory_url)
+        _ROUTER_CACHE[directory_url] = ShardRouter(directory_url, urls) if urls else None
+    return _ROUTER_CACHE[directory_url]
+
+
+def reset_router_cache(directory_url: str | None = None) -> None:
+    if directory_url is None:
+        _ROUTER_CACHE.clear()
+    else:
+        _ROUTER_CACHE.pop(directory_url, None)
+
+
+def init_shards(directory_url: str, n_shards: int) -> ShardRouter:
+    """Enable sharding on ``directory_url`` with ``n_shards`` shard files."""
+    if n_shards < 1:
+        raise ValueError("n_shards must be >= 1")
+    init_db(directory_url)
+    if _load_shard_urls(directory_url):
+        raise ValueError("sharding already enabled; use rebalance to change the shard count")
+    _write_shard_rows(directory_url, range(n_shards))
+    _ROUTER_CACHE.pop(directory_url, None)
+    return get_router(directory_url)
+
+
+def _write_shard_rows(directory_url: str, shard_ids) -> None:
+    with get_session_factory(directory_url)() as s:
+        for sid in shard_ids:
+            url = shard_url(directory_url, sid)
+            init_db(url)
+            s.execute(insert(shards).values(shard_id=sid, url=url))
+        s.commit()
+
+
+def _move_user(user_id: int, src_url: str, dst_url: str) -> int:
+    moved = 0
+    with get_session_factory(src_url)() as src, get_session_factory(dst_url)() as dst:
+        # 目标分片上该用户的残留数据只可能来自中断的上次迁移，先清掉保证可重入
+        for table in _USER_TABLES:
+            dst.execute(delete(table).where(table.c.user_id == user_id))
+        src_names = dict(
+            src.execute(
+                select(categories.c.category_id, categories.c.name).where(categories.c.user_id == user_id)
+            ).all()
+        )
+        dst_ids = SqliteCategoryRepository(dst).resolve_many(user_id, src_names.values())
+        remap = {cid: dst_ids[name] for cid, name in src_names.items()}
+        new_rid: dict[int, int] = {}
+        for table in _USER_TABLES:
+            if table in _DICT_TABLES or table in _DERIVED_TABLES:
+                continue
+            pk = next(iter(table.primary_key.columns))
+            cols = [c for c in table.columns if c is not pk]
+            rows = [dict(r) for r in src.execute(select(pk, *cols).where(table.c.user_id == user_id)).mappings()]
+            old_ids = [r.pop(pk.name) for r in rows]
+            for r in rows:
+                if "category_id" in r:
+                    r["category_id"] = remap[r["category_id"]]
+            if rows and table is records:
+                # 目标分片重新分配 record_id，按参数顺序取回以便重映射标签
+                ins = insert(records).returning(records.c.record_id, sort_by_parameter_order=True)
+                new_rid = dict(zip(old_ids, dst.execute(ins, rows).scalars().all()))
+            elif rows:
+                dst.execute(insert(table), rows)
+            moved += len(rows)
+        postings = src.execute(
+            select(tags.c.name, record_tags.c.record_id)
+            .join_from(record_tags, tags, tags.c.tag_id == record_tags.c.tag_id)
+            .where(tags.c.user_id == user_id)
+        ).all()
+        by_tag: dict[str, list[int]] = {}
+        for name, rid in postings:
+            by_tag.setdefault(name, []).append(new_rid[rid])
+        dst_tags = SqliteTagRepository(dst)
+        for name, rids in by_tag.items():
+            dst_tags.tag(user_id, rids, [name], commit=False)
+        dst.commit()
+    return moved
+
+
+def rebalance(directory_url: str, n_shards: int) -> Dict[str, int]:
+    """Change the shard count and move users whose placement changes.
+
+    Each user is copied to the new shard, the directory pointer is switched,
+    then the source rows are deleted, so readers never see a user missing.
+    """
+    if n_shards < 1:
+        raise ValueError("n_shards must be >= 1")
+    old = _load_shard_urls(directory_url)
+    if not old:
+        raise ValueError("sharding is not enabled; run shard init first")
+    _write_shard_rows(directory_url, [sid for sid in range(n_shards) if sid not in old])
+    urls = _load_shard_urls(directory_url)
+
+    moved_users = moved_rows = 0
+    with get_session_factory(directory_url)() as d:
+        placement = d.execute(select(user_shards.c.user_id, user_shards.c.shard_id)).all()
+        for uid, sid in placement:
+            target = jump_hash(uid, n_shards)
+            if target == sid:
+                continue
+            moved_rows += _move_user(uid, urls[sid], urls[target])
+            d.execute(update(user_shards).where(user_shards.c.user_id == uid).values(shard_id=target))
+            d.commit()
+            with get_session_factory(urls[sid])() as src:
+                for table in _USER_TABLES:
+                    src.execute(delete(table).where(table.c.user_id == uid))
+                src.commit()
+            moved_users += 1
+        # 缩容：多余分片已清空，从目录中移除（文件保留，便于人工核对）
+        d.execute(delete(shards).where(shards.c.shard_id >= n_shards))
+        d.commit()
+
+    _ROUTER_CACHE.pop(directory_url, None)
+    return {"shards": n_shards, "moved_users": moved_users, "moved_rows": moved_rows}
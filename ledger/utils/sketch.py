@@ -0,0 +1,118 @@
+"""Mergeable quantile sketch for expense amounts (DDSketch-style).
+
+An amount ``x`` is counted in log bucket ``ceil(ln x / ln GAMMA)``; every
+value in a bucket is within ``ALPHA`` (1%) relative error of the bucket's
+representative value, so any quantile read from the sketch is too.
+
+Sketches merge by adding counts per bucket and lose counts by subtracting
+them, which is what lets triggers keep the per-(user, category, month)
+``amount_sketch`` table current under deletes and updates. The SQL
+expression for the bucket is ``BUCKET_SQL`` and must stay in step with
+``bucket_of``. It uses SQLite's ``ln``/``ceil``, which only exist when
+SQLite was built with math functions; ``register_math_functions`` installs
+Python versions on connections that lack them.
+"""
+from __future__ import annotations
+import math
+from typing import Iterable, Mapping, Sequence
+
+ALPHA = 0.01
+GAMMA = (1 + ALPHA) / (1 - ALPHA)
+LN_GAMMA = math.log(GAMMA)
+MIN_AMOUNT = 0.01  # 更小的金额并入这个桶
+
+BUCKET_SQL = f"CAST(ceil(ln(max({{x}}, {MIN_AMOUNT!r})) / {LN_GAMMA!r}) AS INTEGER)"
+
+
+def _ln(x):
+    return math.log(x) if x is not None and x > 0 else None
+
+
+def _ceil(x):
+    if x is None or isinstance(x, int):
+        return x
+    return float(math.ceil(x))
+
+
+def register_math_functions(dbapi_conn, force: bool = False) -> None:
+    """Give a sqlite3 connection ``ln``/``ceil`` when SQLite lacks them
+    (``force`` replaces the built-ins, for tests)."""
+    if not force:
+        try:
+            dbapi_conn.execute("SELECT ln(1), ceil(1.5)")
+            return
+        except Exception:
+            pass
+    dbapi_conn.create_function("ln", 1, _ln, deterministic=True)
+    dbapi_conn.create_function("ceil", 1, _ceil, deterministic=True)
+
+
+def bucket_of(x: float) -> int:
+    return math.ceil(math.log(max(x, MIN_AMOUNT)) / LN_GAMMA)
+
+
+def bucket_value(i: int) -> float:
+    """Representative of bucket ``i`` (covers ``(GAMMA**(i-1), GAMMA**i]``)."""
+    return 2 * GAMMA ** i / (GAMMA + 1)
+
+
+class QuantileSketch:
+    __slots__ = ("counts",)
+
+    def __init__(self, counts: Mapping[int, int] | None = None):
+        self.counts: dict[int, int] = {i: n for i, n in (counts or {}).items() if n}
+
+    def add(self, x: float, n: int = 1) -> None:
+        i = bucket_of(x)
+        self.counts[i] = self.counts.get(i, 0) + n
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        for i, n in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + n
+        return self
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts.values())
+
+    def quantiles(self, qs: Sequence[float]) -> list[float | None]:
+        """Values at each quantile in ``qs`` (0..1); None for an empty sketch."""
+        total = self.count
+        if not total:
+            return [None] * len(qs)
+        order = sorted(range(len(qs)), key=lambda k: qs[k])
+        out: list[float | None] = [None] * len(qs)
+        buckets = iter(sorted(self.counts.items()))
+        i, seen = next(buckets)
+        for k in order:
+            if not 0.0 <= qs[k] <= 1.0:
+                raise ValueError("quantiles must be between 0 and 1")
+            rank = qs[k] * (total - 1)
+            while seen <= rank:
+                j, n = next(buckets)
+                i, seen = j, seen + n
+            out[k] = round(bucket_value(i), 2)
+        return out
+
+    def quantile(self, q: float) -> float | None:
+        return self.quantiles([q])[0]
+
+    def histogram(self, bins: int = 10) -> list[tuple[float, float, int]]:
+        """``(low, high, count)`` over log-spaced bins spanning the data."""
+        if not self.counts:
+            return []
+        lo_i, hi_i = min(self.counts), max(self.counts)
+        lo, hi = GAMMA ** (lo_i - 1), GAMMA ** hi_i
+        edges = [lo * (hi / lo) ** (k / bins) for k in range(bins + 1)]
+        out = [0] * bins
+        width = (hi_i - lo_i + 1) / bins  # 每个直方图柱覆盖的桶数
+        for i, n in self.counts.items():
+            out[min(int((i - lo_i) / width), bins - 1)] += n
+        return [(round(edges[k], 2), round(edges[k + 1], 2), out[k]) for k in range(bins)]
+
+
+def sketch_of(amounts: Iterable[float]) -> QuantileSketch:
+    sk = QuantileSketch()
+    for x in amounts:
+        sk.add(x)
+    return sk
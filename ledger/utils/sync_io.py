@@ -0,0 +1,41 @@
+"""JSON-lines I/O for sync change batches.
+
+Line 1 is a header (node, since, until, users); each further line is one
+change, so large deltas can be written and read without building a single
+huge JSON document.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+FORMAT = "ledger-changes"
+VERSION = 1
+
+
+def save_batch(path: str, batch: Dict[str, Any]) -> None:
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    header = {k: v for k, v in batch.items() if k != "changes"}
+    header.update(format=FORMAT, version=VERSION, count=len(batch["changes"]))
+    with p.open("w", encoding="utf-8") as f:
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        for ch in batch["changes"]:
+            f.write(json.dumps(ch, ensure_ascii=False) + "\n")
+
+
+def load_batch(path: str) -> Dict[str, Any]:
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"change file not found: {path}")
+    with p.open("r", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("format") != FORMAT or header.get("version") != VERSION:
+            raise ValueError(f"not a {FORMAT} v{VERSION} file: {path}")
+        changes = [json.loads(line) for line in f if line.strip()]
+    if len(changes) != header.get("count"):
+        raise ValueError(f"truncated change file: expected {header.get('count')} changes, got {len(changes)}")
+    header["changes"] = changes
+    return header
@@ -0,0 +1,66 @@
+"""Bounded-memory selection: heavy hitters over a stream.
+
+``SpaceSaving`` keeps at most ``capacity`` keys. When a new key arrives and
+the table is full, the key with the smallest weight is evicted and the
+newcomer inherits that weight as its error bound. Every key whose true
+weight exceeds ``total / capacity`` is guaranteed to be kept, and kept
+weights overestimate by at most ``error``. When nothing was ever evicted
+the result is exact.
+"""
+from __future__ import annotations
+import heapq
+from dataclasses import dataclass
+from typing import Hashable
+
+
+@dataclass(slots=True)
+class Tally:
+    weight: float = 0.0  # 排名依据（可能高估，最多 error）
+    error: float = 0.0
+    count: int = 0  # 进入表之后累计的笔数与金额（被淘汰过则偏小）
+    amount: float = 0.0
+
+
+class SpaceSaving:
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = capacity
+        self.evictions = 0
+        self._items: dict[Hashable, Tally] = {}
+        self._heap: list[tuple[float, int, Hashable]] = []  # 惰性最小堆：过期条目在弹出时丢弃
+        self._seq = 0
+
+    def _push(self, key: Hashable, weight: float) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, (weight, self._seq, key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(c.weight, i, k) for i, (k, c) in enumerate(self._items.items())]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> Hashable:
+        while True:
+            weight, _, key = heapq.heappop(self._heap)
+            c = self._items.get(key)
+            if c is not None and c.weight == weight:
+                return key
+
+    def add(self, key: Hashable, weight: float = 1.0, amount: float = 0.0) -> None:
+        c = self._items.get(key)
+        if c is None:
+            floor = 0.0
+            if len(self._items) >= self.capacity:
+                floor = self._items.pop(self._pop_min()).weight
+                self.evictions += 1
+            c = self._items[key] = Tally(floor, floor)
+        c.weight += weight
+        c.count += 1
+        c.amount += amount
+        self._push(key, c.weight)
+
+    @property
+    def exact(self) -> bool:
+        return self.evictions == 0
+
+    def top(self, n: int) -> list[tuple[Hashable, Tally]]:
+        return heapq.nlargest(n, self._items.items(), key=lambda kv: kv[1].weight)
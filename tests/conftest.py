@@ -0,0 +1,16 @@
+import sys
+
+import pytest
+
+from ledger.api import cli
+
+
+@pytest.fixture
+def run_cli(monkeypatch):
+    """Call the CLI as ``prog <argv...>``."""
+
+    def run(*argv):
+        monkeypatch.setattr(sys, "argv", ["prog", *argv])
+        cli.main()
+
+    return run
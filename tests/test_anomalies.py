@@ -0,0 +1,133 @@
+import random
+import statistics
+import uuid
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import delete
+
+from ledger.models import CategoryStats, Record, RecordType
+from ledger.repo.record_repo import RecordFilter
+from ledger.repo.sqlite_import_repo import SqliteImportCheckpointRepository
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_schema import category_stats
+from ledger.repo.sqlite_stats_repo import SqliteCategoryStatsRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.anomaly_service import AnomalyDetector
+from ledger.services.import_service import ImportService
+from ledger.utils.db import init_db, get_session_factory
+
+
+def _repo(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/an_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("al", "pw").user_id
+    return db_url, SqliteRecordRepository(s), uid
+
+
+def _exp(uid, cat, amt, d=date(2025, 1, 1), note=""):
+    return Record(None, uid, RecordType.EXPENSE, cat, amt, d, note)
+
+
+def test_triggers_keep_welford_stats_in_sync(tmp_path):
+    db_url, repo, uid = _repo(tmp_path)
+    rnd = random.Random(3)
+    recs = [
+        Record(None, uid, rnd.choice(list(RecordType)), rnd.choice("abc"), round(rnd.uniform(1, 500), 2),
+               date(2024, 1, 1) + timedelta(days=rnd.randint(0, 300)), "")
+        for _ in range(500)
+    ]
+    repo.add_many(recs[:400])
+    for r in recs[400:]:
+        repo.add(r)
+    repo.recategorize(RecordFilter(uid, category="b"), "c")
+    repo.delete_where(RecordFilter(uid, start=date(2024, 5, 1), end=date(2024, 7, 1)))
+    repo.shift_dates(RecordFilter(uid, category="a"), 10)  # 日期变化不影响统计
+
+    stats = SqliteCategoryStatsRepository(repo._session)
+    live = stats.for_user(uid)
+    amounts = {}
+    for r in repo.list_by_period(uid, date.min, date.max):
+        if r.rtype == RecordType.EXPENSE:
+            amounts.setdefault(r.category, []).append(r.amount)
+    assert set(live) == set(amounts)
+    for cat, xs in amounts.items():
+        st = live[cat]
+        assert st.n == len(xs)
+        assert st.mean == pytest.approx(statistics.fmean(xs))
+        assert st.std == pytest.approx(statistics.stdev(xs))
+
+    assert stats.rebuild(uid) == len(amounts)
+    for cat, st in stats.for_user(uid).items():
+        assert (st.n, st.mean, st.std) == pytest.approx((live[cat].n, live[cat].mean, live[cat].std))
+
+    # 旧库升级：统计表为空时由迁移回填
+    repo._session.execute(delete(category_stats))
+    repo._session.commit()
+    init_db(db_url)
+    assert stats.for_user(uid).keys() == amounts.keys()
+
+
+def test_detector_flags_large_expenses_in_arrival_order():
+    det = AnomalyDetector({"food": CategoryStats()}, threshold=3.0, min_count=5)
+    assert det.scan([_exp(1, "food", x) for x in (10, 12, 11, 9, 10)]) == []  # 样本不足时不判定
+    flagged = det.scan([_exp(1, "food", 300), _exp(1, "food", 11), _exp(1, "food", 320)])
+    assert [a.record.amount for a in flagged] == [300]  # 300 已计入统计，320 不再离群
+    assert det.check(Record(None, 1, RecordType.INCOME, "food", 1e6, date(2025, 1, 1), "")) is None
+
+    # 金额几乎不变的分类：按均值 10% 的下限计算离散度
+    rent = {"rent": CategoryStats(12, 1000.0, 0.0)}
+    assert AnomalyDetector(rent).check(_exp(1, "rent", 1250)) is None
+    assert AnomalyDetector(rent).check(_exp(1, "rent", 1400)).zscore == pytest.approx(4.0)
+    assert rent["rent"].n == 12  # 检测器不改调用方的统计
+    with pytest.raises(ValueError):
+        AnomalyDetector({}, threshold=0)
+
+
+def test_import_flags_new_rows_only(tmp_path):
+    _, repo, uid = _repo(tmp_path)
+    repo.add_many([_exp(uid, "food", 10.0 + i % 3, date(2025, 1, 1) + timedelta(days=i)) for i in range(20)])
+    svc = ImportService(repo, SqliteImportCheckpointRepository(repo._session), chunk_size=2,
+                        stats=SqliteCategoryStatsRepository(repo._session))
+    path = tmp_path / "in.csv"
+    path.write_text(
+        "record_id,user_id,rtype,category,amount,occurred_on,note\n"
+        ",1,EXPENSE,food,11.0,2025-02-01,lunch\n"
+        ",1,EXPENSE,food,250.0,2025-02-02,party\n"
+        ",1,EXPENSE,travel,900.0,2025-02-03,flight\n"
+        ",1,INCOME,salary,5000.0,2025-02-01,\n"
+    )
+    res = svc.import_csv(uid, str(path))
+    assert [a.record.note for a in res.anomalies] == ["party"]
+    assert "food 250.00 (mean 10.95 over 21" in res.anomalies[0].describe()
+
+    # 重新导入：全部是重复行，不再报告
+    path2 = tmp_path / "again.csv"
+    path2.write_text(path.read_text())
+    assert svc.import_csv(uid, str(path2)).anomalies == []
+
+
+def test_cli_add_warns_and_stats(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "ed", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "ed", "--password", "pw")
+    for amt in ("20", "22", "18", "21", "19"):
+        run_cli("add", "--db", db_url, "--type", "EXPENSE", "--category", "food", "--amount", amt, "--date", "2025-01-02")
+    assert "warning" not in capsys.readouterr().out
+    run_cli("add", "--db", db_url, "--type", "EXPENSE", "--category", "food", "--amount", "95", "--date", "2025-01-03")
+    assert "warning: unusual expense: 2025-01-03 food 95.00 (mean 20.00 over 5" in capsys.readouterr().out
+    run_cli("add", "--db", db_url, "--type", "EXPENSE", "--category", "food", "--amount", "95", "--date", "2025-01-03",
+        "--anomaly-threshold", "50")
+    assert "warning" not in capsys.readouterr().out
+
+    run_cli("anomaly", "stats", "--db", db_url)
+    assert "food\tn=7\tmean=41.43" in capsys.readouterr().out
+    run_cli("anomaly", "rebuild", "--db", db_url)
+    assert "rebuilt statistics for 1 categories" in capsys.readouterr().out
+
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv", "--no-anomalies")
+    assert "flagged" not in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv", "--anomaly-threshold", "-1")
@@ -0,0 +1,84 @@
+import random
+import uuid
+from datetime import date, timedelta
+
+from sqlalchemy import delete, select
+
+from ledger.models import Record, RecordType
+from ledger.repo.memory_repo import InMemoryRecordRepository
+from ledger.repo.record_repo import RecordFilter
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_schema import balance_checkpoints
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.utils.db import init_db, get_session_factory
+
+
+def _repo(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/bal_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("bea", "pw").user_id
+    return SqliteRecordRepository(s), uid
+
+
+def test_checkpoints_follow_every_write(tmp_path):
+    repo, uid = _repo(tmp_path)
+    rnd = random.Random(7)
+    recs = [
+        Record(None, uid, rnd.choice(list(RecordType)), rnd.choice("abc"), float(rnd.randint(1, 300)),
+               date(2024, 1, 1) + timedelta(days=rnd.randint(0, 500)), "")
+        for _ in range(400)
+    ]
+    repo.add_many(recs[:300])
+    for r in recs[300:]:  # 逐条写入，含大量补录的旧日期
+        repo.add(r)
+    repo.shift_dates(RecordFilter(uid, category="a"), 40)
+    repo.recategorize(RecordFilter(uid, category="b"), "z")
+    repo.delete_where(RecordFilter(uid, start=date(2024, 6, 1), end=date(2024, 8, 15)))
+
+    months = repo._session.execute(
+        select(balance_checkpoints.c.month).where(balance_checkpoints.c.user_id == uid)
+    ).scalars().all()
+    assert months and all(m.day == 1 for m in months)
+
+    mem = InMemoryRecordRepository()
+    for r in repo.list_by_period(uid, date.min, date.max):
+        mem.add(r)
+    for d in [date(2023, 12, 31), date(2024, 3, 1), date(2024, 7, 4), date(2025, 2, 28), date(2026, 1, 1)]:
+        assert abs(repo.opening_balance(uid, d) - mem.opening_balance(uid, d)) < 0.01
+        assert abs(repo.balance_at(uid, d) - mem.balance_at(uid, d)) < 0.01
+    assert repo.balance_series(uid, date(2024, 2, 10), date(2024, 12, 1)) == mem.balance_series(
+        uid, date(2024, 2, 10), date(2024, 12, 1)
+    )
+
+
+def test_missing_checkpoints_are_rebuilt_lazily(tmp_path):
+    # 升级前的库：有记录、没有检查点
+    repo, uid = _repo(tmp_path)
+    repo.add(Record(None, uid, RecordType.INCOME, "salary", 1000.0, date(2025, 1, 5), ""))
+    repo.add(Record(None, uid, RecordType.EXPENSE, "rent", 400.0, date(2025, 2, 1), ""))
+    repo._session.execute(delete(balance_checkpoints))
+    repo._session.commit()
+    assert repo.balance_at(uid, date(2025, 2, 1)) == 600.0
+    repo.add(Record(None, uid, RecordType.EXPENSE, "food", 50.0, date(2025, 3, 3), ""))
+    assert repo.opening_balance(uid, date(2025, 4, 1)) == 550.0
+    assert repo.opening_balance(uid, date(2025, 3, 3)) == 600.0
+
+
+def test_cli_balance(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "bo", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "bo", "--password", "pw")
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    capsys.readouterr()
+
+    run_cli("list", "--db", db_url, "--month", "2025-01", "--balance")
+    lines = capsys.readouterr().out.strip().splitlines()
+    assert lines[0].endswith("\t5000.00") and lines[-1].endswith("\t5562.50")
+
+    run_cli("balance", "--db", db_url, "--on", "2025-01-02")
+    assert "at end of 2025-01-02: 4974.50" in capsys.readouterr().out
+    run_cli("balance", "--db", db_url, "--start", "2024-12-01", "--end", "2025-03-01")
+    out = capsys.readouterr().out
+    assert "opening balance 2024-12-01: 0.00" in out and "2025-02-01\t5562.50" in out
@@ -0,0 +1,117 @@
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from ledger.models import Budget, Record, RecordType
+from ledger.repo.record_repo import RecordFilter
+from ledger.repo.sqlite_budget_repo import SqliteBudgetRepository
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_schema import daily_spend
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.budget_service import BudgetService, validate_budget
+from ledger.utils.db import init_db, get_session_factory
+from ledger.utils.periods import period_window
+
+
+def _setup(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/bud_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("bo", "pw").user_id
+    repo = SqliteRecordRepository(s)
+    for cat, amt, d in [
+        ("Food", 10.0, date(2025, 1, 6)),
+        ("Food/Groceries", 30.0, date(2025, 1, 8)),
+        ("Food/Groceries", 5.0, date(2025, 1, 13)),
+        ("Rent", 900.0, date(2025, 2, 1)),
+        ("Food", 20.0, date(2025, 3, 30)),
+    ]:
+        repo.add(Record(None, uid, RecordType.EXPENSE, cat, amt, d, ""))
+    repo.add(Record(None, uid, RecordType.INCOME, "Food", 999.0, date(2025, 1, 7), "refund"))
+    return db_url, s, uid, repo
+
+
+def test_period_window():
+    assert period_window("WEEKLY", date(2025, 1, 8)) == (date(2025, 1, 6), date(2025, 1, 13))
+    assert period_window("QUARTERLY", date(2025, 5, 1)) == (date(2025, 4, 1), date(2025, 7, 1))
+    with pytest.raises(ValueError):
+        period_window("CUSTOM", date(2025, 5, 1))
+    with pytest.raises(ValueError):
+        validate_budget(Budget(None, 1, "Food", 10.0, "CUSTOM", date(2025, 1, 2)))
+    with pytest.raises(ValueError):
+        validate_budget(Budget(None, 1, "Food", 10.0, "DAILY"))
+
+
+def test_spent_from_rollup_matches_records(tmp_path):
+    db_url, s, uid, repo = _setup(tmp_path)
+    budgets = SqliteBudgetRepository(s)
+    for b in [
+        Budget(None, uid, "Food", 50.0, "WEEKLY"),
+        Budget(None, uid, "Food", 200.0, "QUARTERLY"),
+        Budget(None, uid, "Food/Groceries", 40.0, "MONTHLY"),
+        Budget(None, uid, "Rent", 1000.0, "CUSTOM", date(2025, 1, 15), date(2025, 2, 15)),
+    ]:
+        budgets.set(b)
+    budgets.set(Budget(None, uid, "Food", 60.0, "WEEKLY"))  # 同一分类+周期：替换
+    rows = budgets.list_by_user(uid)
+    assert len(rows) == 4
+
+    svc = BudgetService()
+    on = date(2025, 1, 9)
+    windows = svc.windows(rows, on)
+    statuses = {(st.budget.category, st.budget.period): st for st in svc.statuses(rows, windows, budgets.spent(uid, windows))}
+    assert statuses[("Food", "WEEKLY")].spent == 40.0 and statuses[("Food", "WEEKLY")].budget.monthly_limit == 60.0
+    assert statuses[("Food", "QUARTERLY")].spent == 65.0
+    assert statuses[("Food/Groceries", "MONTHLY")].ratio == round(35.0 / 40.0, 4)
+    assert ("Rent", "CUSTOM") not in statuses  # 1 月 9 日不在自定义区间内
+    # 与逐条记录计算的结果一致
+    recs = repo.list_by_period(uid, date(2025, 1, 1), date(2025, 2, 1))
+    monthly = [b for b in rows if b.period == "MONTHLY"]
+    assert svc.progress(monthly, recs) == {"Food/Groceries": statuses[("Food/Groceries", "MONTHLY")].ratio}
+
+    # 汇总表随批量改动同步
+    repo.recategorize(RecordFilter(uid, category="Food"), "Rent")
+    repo.shift_dates(RecordFilter(uid, category="Food/Groceries"), 31)
+    repo.delete_where(RecordFilter(uid, start=date(2025, 3, 1)))
+    windows = {b.budget_id: (date(2025, 1, 1), date(2026, 1, 1)) for b in rows}
+    spent = {b.category: v for b in rows for bid, v in budgets.spent(uid, windows).items() if bid == b.budget_id}
+    assert spent == {"Food": 35.0, "Food/Groceries": 35.0, "Rent": 910.0}
+
+    # 旧库升级：汇总表为空时由迁移一次性回填
+    s.execute(delete(daily_spend))
+    s.commit()
+    init_db(db_url)
+    assert s.execute(select(func.sum(daily_spend.c.total))).scalar() == 945.0
+
+
+def test_cli_budget_periods(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "cy", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "cy", "--password", "pw")
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    run_cli("budget", "set", "--db", db_url, "--category", "food", "--limit", "20", "--period", "weekly")
+    run_cli("budget", "set", "--db", db_url, "--category", "shopping", "--limit", "1000", "--period", "yearly")
+    run_cli("budget", "set", "--db", db_url, "--category", "transport", "--limit", "100", "--period", "custom",
+        "--start", "2025-01-01", "--end", "2025-02-01")
+    run_cli("budget", "set", "--db", db_url, "--category", "food", "--limit", "100")
+    with pytest.raises(SystemExit):
+        run_cli("budget", "set", "--db", db_url, "--category", "food", "--limit", "1", "--period", "custom")
+    capsys.readouterr()
+
+    run_cli("budget", "list", "--db", db_url)
+    out = capsys.readouterr().out
+    assert "transport\t100.00\tCUSTOM 2025-01-01..2025-01-31" in out and "food\t20.00\tWEEKLY" in out
+
+    run_cli("budget", "progress", "--db", db_url, "--all-periods", "--on", "2025-01-03")
+    out = capsys.readouterr().out
+    assert "[WEEKLY 2024-12-30..2025-01-05] food: 25.50 / 20.00 (127.5%) !!" in out
+    assert "[MONTHLY 2025-01-01..2025-01-31] food: 25.50 / 100.00 (25.5%)" in out
+    assert "[YEARLY 2025-01-01..2025-12-31] shopping: 200.00 / 1000.00 (20.0%)" in out
+    assert "transport: 12.00 / 100.00" in out
+
+    run_cli("budget", "progress", "--db", db_url, "--month", "2025-01")
+    out = capsys.readouterr().out
+    assert "  food: 25.5%" in out and "shopping" not in out
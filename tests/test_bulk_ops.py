@@ -0,0 +1,80 @@
+import uuid
+from datetime import date
+
+import pytest
+
+from ledger.models import Record, RecordType
+from ledger.repo.memory_repo import InMemoryRecordRepository
+from ledger.repo.record_repo import RecordFilter
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_sync_repo import SqliteSyncRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.utils.db import init_db, get_session_factory
+
+
+def _seed(repo, uid):
+    for cat, amt, d, note in [
+        ("food", 10.0, date(2025, 3, 1), "lunch"),
+        ("food", 12.0, date(2025, 3, 20), "Coffee beans"),
+        ("misc", 5.0, date(2025, 3, 30), "coffee"),
+        ("food", 8.0, date(2025, 4, 2), "dinner"),
+    ]:
+        repo.add(Record(None, uid, RecordType.EXPENSE, cat, amt, d, note))
+
+
+def _sqlite_repo(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/bulk_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("kim", "pw").user_id
+    return SqliteRecordRepository(s), uid
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_bulk_ops_match_filter(tmp_path, backend):
+    repo, uid = _sqlite_repo(tmp_path) if backend == "sqlite" else (InMemoryRecordRepository(), 1)
+    _seed(repo, uid)
+    march = RecordFilter(uid, start=date(2025, 3, 1), end=date(2025, 4, 1))
+
+    assert repo.recategorize(RecordFilter(uid, keyword="coffee"), "cafe", dry_run=True) == 2
+    assert [r.category for r in repo.list_month(uid, 2025, 3)] == ["food", "food", "misc"]
+    assert repo.recategorize(RecordFilter(uid, keyword="coffee"), "cafe") == 2
+    assert [r.category for r in repo.list_month(uid, 2025, 3)] == ["food", "cafe", "cafe"]
+
+    assert repo.shift_dates(RecordFilter(uid, category="cafe"), 3) == 2
+    assert [r.occurred_on for r in repo.list_month(uid, 2025, 3)] == [date(2025, 3, 1), date(2025, 3, 23)]
+    assert [r.occurred_on for r in repo.list_month(uid, 2025, 4)] == [date(2025, 4, 2), date(2025, 4, 2)]
+
+    with pytest.raises(ValueError):
+        repo.delete_where(RecordFilter(uid))
+    assert repo.delete_where(march) == 2
+    assert repo.list_month(uid, 2025, 3) == []
+    assert len(repo.list_month(uid, 2025, 4)) == 2
+    if backend == "memory":  # 内存后端不记录导入批次：报错，而不是假装 0 行
+        with pytest.raises(ValueError, match="not tracked"):
+            repo.delete_where(RecordFilter(uid, import_batch="abc"))
+
+
+def test_bulk_update_is_in_change_log(tmp_path):
+    repo, uid = _sqlite_repo(tmp_path)
+    _seed(repo, uid)
+    sync = SqliteSyncRepository(repo._session)
+    before = sync.latest_seq()
+    repo.recategorize(RecordFilter(uid, category="food"), "meals")
+    ops = [c["op"] for c in sync.export_since(before)["changes"]]
+    assert ops == ["U", "U", "U"]
+
+
+def test_cli_bulk(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "kim", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "kim", "--password", "pw")
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    capsys.readouterr()
+    run_cli("bulk", "delete", "--db", db_url, "--start", "1900-01-01", "--dry-run")
+    assert "would delete 5 records" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        run_cli("bulk", "delete", "--db", db_url)
+    run_cli("bulk", "delete", "--db", db_url, "--start", "1900-01-01")
+    assert "delete: 5 records" in capsys.readouterr().out
@@ -0,0 +1,70 @@
+import sqlite3
+import uuid
+from datetime import date
+
+from sqlalchemy import select
+
+from ledger.models import Record, RecordType
+from ledger.repo.record_query import RecordQuery
+from ledger.repo.sqlite_category_repo import SqliteCategoryRepository
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_schema import categories, change_log
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.utils.db import init_db, get_session_factory
+
+# 规范化之前的表结构（分类是每行一份的文本）
+LEGACY_SCHEMA = """
+CREATE TABLE users (user_id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL UNIQUE,
+                    email VARCHAR(255), password_hash VARCHAR(128) NOT NULL);
+CREATE TABLE records (record_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, rtype VARCHAR(10) NOT NULL,
+                      category VARCHAR(100) NOT NULL, amount FLOAT NOT NULL, occurred_on DATE NOT NULL,
+                      note VARCHAR(500) NOT NULL);
+CREATE INDEX ix_records_category ON records (category);
+CREATE TABLE budgets (budget_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL,
+                      category VARCHAR(100) NOT NULL, monthly_limit FLOAT NOT NULL);
+INSERT INTO users VALUES (1, 'ann', NULL, 'x'), (2, 'bob', NULL, 'x');
+INSERT INTO records VALUES (7, 1, 'EXPENSE', 'food', 10, '2025-01-02', 'a'),
+                           (8, 1, 'EXPENSE', 'food', 5, '2025-01-03', ''),
+                           (9, 2, 'EXPENSE', 'food', 3, '2025-01-03', ''),
+                           (10, 1, 'INCOME', 'salary', 100, '2025-01-01', '');
+INSERT INTO budgets VALUES (1, 1, 'food', 50);
+"""
+
+
+def test_legacy_db_is_normalized(tmp_path):
+    path = tmp_path / f"legacy_{uuid.uuid4().hex}.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    db_url = f"sqlite:///{path}"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+
+    cats = s.execute(select(categories.c.user_id, categories.c.name)).all()
+    assert sorted(cats) == [(1, "food"), (1, "salary"), (2, "food")]
+    repo = SqliteRecordRepository(s)
+    got = [(r.record_id, r.category, r.amount) for r in repo.list_month(1, 2025, 1)]
+    assert got == [(10, "salary", 100.0), (7, "food", 10.0), (8, "food", 5.0)]
+    assert repo.totals_by_category(1, date(2025, 1, 1), date(2025, 2, 1)) == {"food": 15.0}
+    # 迁移后的写入照常进入 change_log
+    repo.add(Record(None, 1, RecordType.EXPENSE, "food", 1.0, date(2025, 1, 9)))
+    logged = s.execute(select(change_log.c.row_id).where(change_log.c.table_name == "records")).scalars().all()
+    assert logged == [11]
+    init_db(db_url)  # 再次迁移是空操作
+
+
+def test_names_resolved_once_per_import(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/cat_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("ann", "pw").user_id
+    repo = SqliteRecordRepository(s)
+    recs = [Record(None, uid, RecordType.EXPENSE, c, 1.0, date(2025, 1, 1)) for c in ["a", "b", "a"] * 50]
+    assert repo.add_many(recs) == 150
+    ids = SqliteCategoryRepository(s).list_by_user(uid)
+    assert sorted(ids) == ["a", "b"]
+    # 回滚后缓存失效，不会引用被回滚掉的 id
+    repo.add_many([Record(None, uid, RecordType.EXPENSE, "c", 1.0, date(2025, 1, 1))], commit=False)
+    repo.rollback()
+    repo.add_many([Record(None, uid, RecordType.EXPENSE, "c", 2.0, date(2025, 1, 1))])
+    assert [r.amount for r in repo.query(RecordQuery(uid).in_categories("c"))] == [2.0]
+    assert sorted(SqliteCategoryRepository(s).list_by_user(uid)) == ["a", "b", "c"]
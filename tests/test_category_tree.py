@@ -0,0 +1,84 @@
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import delete, select
+
+from ledger.models import Budget, Record, RecordType
+from ledger.repo.memory_repo import InMemoryRecordRepository
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_schema import categories, category_closure
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.budget_service import BudgetService
+from ledger.services.statistics_service import StatisticsService
+from ledger.utils.db import init_db, get_session_factory
+
+JAN = (date(2025, 1, 1), date(2025, 2, 1))
+SPEND = [
+    ("Food", 5.0),
+    ("Food/Groceries", 40.0),
+    ("Food/Restaurants", 30.0),
+    ("Food/Restaurants/Fast", 10.0),
+    ("Rent", 900.0),
+]
+
+
+def _recs(uid):
+    return [Record(None, uid, RecordType.EXPENSE, c, a, date(2025, 1, 10)) for c, a in SPEND]
+
+
+def _sqlite(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/tree_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    return db_url, s, SqliteUserRepository(s).register("ann", "pw").user_id
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_subtree_rollups(tmp_path, backend):
+    if backend == "sqlite":
+        _, s, uid = _sqlite(tmp_path)
+        repo = SqliteRecordRepository(s)
+    else:
+        repo, uid = InMemoryRecordRepository(), 1
+    repo.add_many(_recs(uid)) if backend == "sqlite" else [repo.add(r) for r in _recs(uid)]
+
+    assert repo.totals_by_category(uid, *JAN, depth=1) == {"Food": 85.0, "Rent": 900.0}
+    assert repo.totals_by_category(uid, *JAN, parent="Food") == {
+        "Food": 5.0, "Food/Groceries": 40.0, "Food/Restaurants": 40.0
+    }
+    assert repo.totals_by_category(uid, *JAN, parent="Food/Restaurants", depth=3) == {
+        "Food/Restaurants": 30.0, "Food/Restaurants/Fast": 10.0
+    }
+    assert repo.totals_by_category(uid, *JAN, parent="Nope") == {}
+    assert repo.totals_by_category(uid, *JAN)["Food/Restaurants"] == 30.0
+
+
+def test_services_roll_up():
+    recs = _recs(1)
+    stats = StatisticsService()
+    assert stats.by_category(recs, depth=1) == {"Food": 85.0, "Rent": 900.0}
+    assert stats.by_category(recs, parent="Food/Restaurants") == {
+        "Food/Restaurants": 30.0, "Food/Restaurants/Fast": 10.0
+    }
+    budgets = [Budget(None, 1, "Food", 100.0), Budget(None, 1, "Food/Restaurants", 50.0), Budget(None, 1, "Rent", 1000.0)]
+    svc = BudgetService()
+    assert svc.progress(budgets, recs) == {"Food": 0.85, "Food/Restaurants": 0.8, "Rent": 0.9}
+    assert svc.progress(budgets, recs, parent="Food") == {"Food": 0.85, "Food/Restaurants": 0.8}
+    assert svc.progress(budgets, recs, depth=1) == {"Food": 0.85, "Rent": 0.9}
+
+
+def test_closure_backfilled_for_existing_categories(tmp_path):
+    db_url, s, uid = _sqlite(tmp_path)
+    SqliteRecordRepository(s).add_many(_recs(uid))
+    # 模拟层级功能上线前的库：分类只有扁平的名字，父分类 Travel 也不存在
+    s.execute(categories.insert().values(user_id=uid, name="Travel/Flights"))
+    s.execute(delete(category_closure))
+    s.execute(categories.update().values(parent_id=None, depth=1))
+    s.commit()
+    init_db(db_url)
+    depths = dict(s.execute(select(categories.c.name, categories.c.depth)).all())
+    assert depths["Food/Restaurants/Fast"] == 3 and depths["Travel"] == 1
+    repo = SqliteRecordRepository(s)
+    assert repo.totals_by_category(uid, *JAN, depth=1) == {"Food": 85.0, "Rent": 900.0}
+    assert repo.totals_by_category(uid, *JAN, depth=2)["Food/Restaurants"] == 40.0
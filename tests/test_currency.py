@@ -0,0 +1,221 @@
+import json
+import uuid
+from datetime import date
+from hashlib import blake2b
+
+import pandas as pd
+import pytest
+
+from ledger.models import BASE_CURRENCY, Budget, Record, RecordType
+from ledger.repo.memory_repo import InMemoryRecordRepository
+from ledger.repo.sqlite_budget_repo import SqliteBudgetRepository
+from ledger.repo.sqlite_fx_repo import SqliteFxRepository
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_stats_repo import SqliteCategoryStatsRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.budget_service import BudgetService
+from ledger.services.record_service import RecordService
+from ledger.services.statistics_service import StatisticsService
+from ledger.utils.db import init_db, get_session_factory
+from ledger.utils.fingerprint import record_fingerprint
+from ledger.utils.fx import FxTable, load_rates_from_csv, normalize_currency
+
+RATES = [
+    ("USD", date(2025, 1, 1), 7.0),
+    ("USD", date(2025, 1, 15), 7.5),
+    ("EUR", date(2025, 1, 1), 8.0),
+]
+
+
+def test_rate_lookup_is_latest_quote_on_or_before():
+    fx = FxTable(reversed(RATES))  # 输入顺序无关
+    assert fx.currencies == ["EUR", "USD"] and len(fx) == 3
+    assert fx.rate("USD", date(2025, 1, 14)) == 7.0
+    assert fx.rate("USD", date(2025, 1, 15)) == 7.5
+    assert fx.rate("USD", date(2026, 1, 1)) == 7.5
+    assert fx.rate(BASE_CURRENCY, date(1999, 1, 1)) == 1.0
+    with pytest.raises(ValueError, match="on or before 2024-12-31"):
+        fx.rate("USD", date(2024, 12, 31))
+    with pytest.raises(ValueError, match="no FX rates for GBP"):
+        fx.rate("GBP", date(2025, 1, 5))
+
+    days = [date(2025, 1, d) for d in (3, 15, 20, 3)]
+    curs = ["USD", "USD", "EUR", BASE_CURRENCY]
+    got = fx.convert([1.0, 2.0, 3.0, 4.0], curs, [d.toordinal() for d in days])
+    assert got.tolist() == [fx.rate(c, d) * a for c, d, a in zip(curs, days, [1.0, 2.0, 3.0, 4.0])]
+    assert fx.convert([16.0], ["EUR"], [days[0].toordinal()], "USD").tolist() == [16.0 * 8.0 / 7.0]
+
+
+def test_currency_codes_and_rates_csv(tmp_path):
+    assert normalize_currency(" usd") == "USD"
+    with pytest.raises(ValueError):
+        normalize_currency("US")
+    p = tmp_path / "rates.csv"
+    p.write_text("day,currency,rate\n2025-01-01,usd,7.1\n2025-01-02,EUR,7.9\n")
+    assert load_rates_from_csv(str(p)) == [("USD", date(2025, 1, 1), 7.1), ("EUR", date(2025, 1, 2), 7.9)]
+    p.write_text("day,currency,rate\n2025-01-01,USD,-1\n")
+    with pytest.raises(ValueError, match="row 1"):
+        load_rates_from_csv(str(p))
+
+
+def test_fingerprint_and_batch_validation():
+    rec = Record(None, 1, RecordType.EXPENSE, "Food", 10.0, date(2025, 1, 2), "lunch")
+    usd = Record(None, 1, RecordType.EXPENSE, "Food", 10.0, date(2025, 1, 2), "lunch", "USD")
+    # 本位币记录的指纹与加币种之前一致（旧库重导仍能去重），外币记录另算
+    old_key = "1|2025-01-02|10.00|EXPENSE|Food|lunch|0"
+    assert record_fingerprint(rec) == blake2b(old_key.encode("utf-8"), digest_size=16).hexdigest()
+    assert record_fingerprint(rec) != record_fingerprint(usd)
+
+    frame = pd.DataFrame({
+        "rtype": ["EXPENSE"] * 3,
+        "category": ["Food"] * 3,
+        "amount": [1.0, 2.0, 3.0],
+        "occurred_on": ["2025-01-02"] * 3,
+        "currency": [" usd", None, "dollars"],
+    })
+    good, bad = RecordService.validate_batch(frame)
+    assert good["currency"].tolist() == ["USD", BASE_CURRENCY]
+    assert bad["reason"].tolist() == ["invalid currency"]
+
+
+def test_converted_totals_match_per_row(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/fx_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("fx", "pw").user_id
+    repo = SqliteRecordRepository(s)
+    recs = [
+        Record(None, uid, RecordType.EXPENSE, "Food/Cafe", 10.0, date(2025, 1, 3), "", "USD"),
+        Record(None, uid, RecordType.EXPENSE, "Food/Cafe", 10.0, date(2025, 1, 3), "", "USD"),
+        Record(None, uid, RecordType.EXPENSE, "Food/Groceries", 70.0, date(2025, 1, 16), ""),
+        Record(None, uid, RecordType.EXPENSE, "Travel", 100.0, date(2025, 1, 20), "", "EUR"),
+        Record(None, uid, RecordType.INCOME, "Salary", 1000.0, date(2025, 1, 15), "", "USD"),
+    ]
+    repo.add_many(recs)
+    assert [r.currency for r in repo.list_by_period(uid, date(2025, 1, 1), date(2025, 2, 1))] == [
+        "USD", "USD", "USD", BASE_CURRENCY, "EUR",
+    ]
+    fxr = SqliteFxRepository(s)
+    assert fxr.load(RATES) == 3
+    fx = fxr.table()
+    assert fxr.table() is fx  # 缓存命中
+    rows = repo.daily_by_currency(uid, date(2025, 1, 1), date(2025, 2, 1))
+    assert len(rows) == 4  # 同日同币种的两笔合成一行
+
+    svc = StatisticsService()
+    week = (date(2025, 1, 1), date(2025, 1, 27), "week")
+    totals, by_cat, series = svc.converted(rows, fx, BASE_CURRENCY, depth=1, bucket=week)
+    # 1/3 的美元按 7.0、1/15 的收入按 7.5、欧元按 8.0
+    assert totals == {"INCOME": pytest.approx(7500.0), "EXPENSE": pytest.approx(140.0 + 70.0 + 800.0)}
+    assert by_cat == {"Food": pytest.approx(210.0), "Travel": pytest.approx(800.0)}
+    assert series[date(2025, 1, 13)] == {"INCOME": pytest.approx(7500.0), "EXPENSE": pytest.approx(70.0)}
+    assert list(series) == [date(2024, 12, 30), date(2025, 1, 6), date(2025, 1, 13), date(2025, 1, 20)]
+
+    totals, by_cat, _ = svc.converted(rows, fx, "USD", parent="Food")
+    assert by_cat == {"Food/Cafe": pytest.approx(20.0), "Food/Groceries": pytest.approx(70.0 / 7.5)}
+    assert totals["INCOME"] == pytest.approx(1000.0)
+
+    fxr.load([("USD", date(2025, 1, 15), 7.2)])  # 改汇率后缓存失效
+    assert fxr.table() is not fx and fxr.table().rate("USD", date(2025, 1, 20)) == 7.2
+
+
+def test_default_aggregates_convert_to_base(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/mix_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("mix", "pw").user_id
+    recs = [
+        Record(None, uid, RecordType.INCOME, "Salary", 1000.0, date(2025, 1, 2), ""),
+        Record(None, uid, RecordType.EXPENSE, "Food", 30.0, date(2025, 1, 3), ""),
+        Record(None, uid, RecordType.EXPENSE, "Food/Cafe", 10.0, date(2025, 1, 5), "", "USD"),
+        Record(None, uid, RecordType.EXPENSE, "Food/Cafe", 10.0, date(2025, 1, 20), "", "USD"),
+        Record(None, uid, RecordType.INCOME, "Salary", 100.0, date(2025, 1, 20), "", "USD"),
+    ]
+    repo = SqliteRecordRepository(s)
+    repo.add_many(recs)
+    mem = InMemoryRecordRepository()
+    for r in recs:
+        mem.add(r)
+    fx = FxTable(RATES)
+    jan = (date(2025, 1, 1), date(2025, 2, 1))
+    # 10 USD 按 7.0，1/20 的 10 USD 与 100 USD 收入按 7.5
+    expense, income = 30.0 + 70.0 + 75.0, 1000.0 + 750.0
+    for r in (repo, mem):
+        assert r.totals_by_type(uid, *jan, fx=fx) == {"INCOME": pytest.approx(income), "EXPENSE": pytest.approx(expense)}
+        assert r.totals_by_category(uid, *jan, depth=1, fx=fx) == {"Food": pytest.approx(expense)}
+        assert r.balance_at(uid, date(2025, 1, 31), fx=fx) == round(income - expense, 2)
+        assert r.balance_series(uid, *jan, "week", fx=fx)[date(2025, 1, 20)] == round(income - expense, 2)
+        with pytest.raises(ValueError, match="no FX rates for USD"):
+            r.balance_at(uid, date(2025, 1, 31))  # 没有汇率时拒绝，而不是把美元当人民币相加
+
+    budgets = SqliteBudgetRepository(s)
+    food = budgets.add(Budget(None, uid, "Food", 200.0))
+    assert budgets.spent(uid, {food.budget_id: jan}, fx=fx) == {food.budget_id: round(expense, 2)}
+    assert BudgetService().progress([food], recs, fx=fx) == {"Food": round(expense / 200.0, 4)}
+
+    # 单笔金额的分布只收本位币支出
+    stats = SqliteCategoryStatsRepository(s).for_user(uid)
+    assert {c: st.n for c, st in stats.items()} == {"Food": 1}
+    assert {c: sk.count for c, sk in repo.amount_sketches(uid, *jan).items()} == {"Food": 1}
+
+
+def test_cli_currency(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    rates = tmp_path / "rates.csv"
+    rates.write_text("day,currency,rate\n2025-01-01,USD,7.0\n2025-01-15,USD,7.5\n")
+    run_cli("register", "--db", db_url, "--username", "cy", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "cy", "--password", "pw")
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    run_cli("add", "--db", db_url, "--type", "EXPENSE", "--category", "travel", "--amount", "20",
+        "--date", "2025-01-20", "--currency", "usd")
+    assert "travel 20.0 USD on 2025-01-20" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        run_cli("add", "--db", db_url, "--type", "EXPENSE", "--category", "x", "--amount", "1",
+            "--date", "2025-01-20", "--currency", "dollar")
+    with pytest.raises(SystemExit, match="no FX rates for USD"):
+        run_cli("stats", "--db", db_url, "--month", "2025-01", "--currency", BASE_CURRENCY)
+
+    run_cli("fx", "load", "--db", db_url, "--path", str(rates))
+    run_cli("fx", "list", "--db", db_url)
+    assert "USD\t2 rates\t2025-01-01..2025-01-15" in capsys.readouterr().out
+    run_cli("list", "--db", db_url, "--month", "2025-01")
+    assert "travel\t20.00 USD\t" in capsys.readouterr().out
+
+    run_cli("stats", "--db", db_url, "--month", "2025-01", "--currency", BASE_CURRENCY)
+    out = capsys.readouterr().out
+    assert f"in {BASE_CURRENCY}" in out and "travel: 150.00" in out and "food: 25.50" in out
+    run_cli("stats", "--db", db_url, "--month", "2025-01", "--currency", "USD", "--json", "--by", "month")
+    doc = json.loads(capsys.readouterr().out)
+    assert doc["currency"] == "USD" and doc["expense_by_category"]["travel"] == 20.0
+    assert doc["summary"]["income"] == round(5000.0 / 7.0 + 800.0 / 7.5, 2)  # 各按当日汇率
+    assert doc["series"][0]["income"] == doc["summary"]["income"]
+    with pytest.raises(SystemExit):
+        run_cli("stats", "--db", db_url, "--month", "2025-01", "--currency", "USD", "--quantiles")
+
+
+def test_cli_balance_and_budget_progress_in_base(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/mixcli_{uuid.uuid4().hex}.db"
+    rates = tmp_path / "rates.csv"
+    rates.write_text("day,currency,rate\n2025-01-01,USD,7.0\n")
+    run_cli("register", "--db", db_url, "--username", "mx", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "mx", "--password", "pw")
+    run_cli("add", "--db", db_url, "--type", "INCOME", "--category", "salary", "--amount", "1000", "--date", "2025-01-02")
+    run_cli("add", "--db", db_url, "--type", "EXPENSE", "--category", "food", "--amount", "50", "--date", "2025-01-03")
+    run_cli("add", "--db", db_url, "--type", "EXPENSE", "--category", "food", "--amount", "10",
+        "--date", "2025-01-04", "--currency", "USD")
+    run_cli("budget", "set", "--db", db_url, "--category", "food", "--limit", "200")
+    capsys.readouterr()
+    with pytest.raises(SystemExit, match="no FX rates for USD"):
+        run_cli("balance", "--db", db_url, "--on", "2025-01-31")
+
+    run_cli("fx", "load", "--db", db_url, "--path", str(rates))
+    capsys.readouterr()
+    run_cli("balance", "--db", db_url, "--on", "2025-01-31")
+    assert "at end of 2025-01-31: 880.00" in capsys.readouterr().out  # 1000 - 50 - 10 × 7
+    run_cli("list", "--db", db_url, "--month", "2025-01", "--balance")
+    assert capsys.readouterr().out.splitlines()[-1].endswith("10.00 USD\t\t880.00")
+    run_cli("budget", "progress", "--db", db_url, "--month", "2025-01")
+    assert "food: 60.0%" in capsys.readouterr().out  # (50 + 70) / 200
+    run_cli("stats", "--db", db_url, "--month", "2025-01")
+    assert "food: 120.00" in capsys.readouterr().out
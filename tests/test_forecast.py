@@ -0,0 +1,115 @@
+import uuid
+from datetime import date
+
+import pytest
+
+from ledger.models import Budget, Record, RecordType
+from ledger.repo.sqlite_budget_repo import SqliteBudgetRepository
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.forecast_service import ForecastService
+from ledger.utils.db import init_db, get_session_factory
+
+
+def _history():
+    rows = []
+    for m in (10, 11, 12):
+        rows.append(("Rent", date(2024, m, 28), 1000.0))
+        rows += [("Food/Groceries", date(2024, m, d), 10.0) for d in range(1, 29)]
+    rows += [("Food/Groceries", date(2025, 1, d), 20.0) for d in range(1, 11)]
+    rows.append(("Food/Cafe", date(2025, 1, 5), 50.0))
+    return rows
+
+
+def test_project_uses_past_tail_and_pace():
+    svc = ForecastService(history_months=3)
+    cats, spent, projected = svc.project(_history(), date(2025, 1, 10))
+    got = dict(zip(cats, zip(spent, projected)))
+    # 房租月底才付：目前为 0，但历史上第 10 天之后每月都有 1000
+    # 第 10 天之后的天数：10 月 21、11 月 20、12 月 21；本月剩余 21 天
+    tail = (21, 20, 21)
+    assert got["Rent"][0] == 0.0
+    assert got["Rent"][1] == round(sum(1000.0 / t for t in tail) / 3 * 21, 2)
+    rate = sum(180.0 / t for t in tail) / 3  # 每月 11..28 日共 18 天 * 10
+    assert got["Food/Groceries"] == (200.0, round(200.0 + rate * 21, 2))
+    # 新分类没有历史：按当前速度外推
+    assert got["Food/Cafe"] == (50.0, 155.0)
+
+
+def test_history_before_first_record_is_ignored():
+    rows = [("Food", date(2024, 12, d), 10.0) for d in range(1, 32)] + [("Food", date(2025, 1, 1), 10.0)]
+    cats, spent, projected = ForecastService(history_months=6).project(rows, date(2025, 1, 1))
+    assert cats == ["Food"] and projected[0] == 310.0  # 只用 12 月，而不是 6 个月平均
+
+
+def test_for_budgets_and_at_risk(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/fc_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    users = SqliteUserRepository(s)
+    a = users.register("ana", "pw").user_id
+    b = users.register("ben", "pw").user_id
+    repo = SqliteRecordRepository(s)
+    for uid in (a, b):
+        repo.add_many([
+            Record(None, uid, RecordType.EXPENSE, cat, amt, day, "") for cat, day, amt in _history()
+        ])
+    repo.add(Record(None, a, RecordType.INCOME, "Food", 999.0, date(2025, 1, 3), "refund"))
+    budgets = SqliteBudgetRepository(s)
+    budgets.set(Budget(None, a, "Food", 400.0))
+    budgets.set(Budget(None, a, "Rent", 2000.0))
+    budgets.set(Budget(None, a, "Food", 50.0, "WEEKLY"))  # 只预测月度预算
+    budgets.set(Budget(None, b, "Food", 1000.0))
+
+    svc = ForecastService(history_months=3)
+    on = date(2025, 1, 10)
+    per_cat, per_budget = svc.forecast_user(s, a, on)
+    assert {f.category for f in per_cat} == {"Rent", "Food/Groceries", "Food/Cafe"}
+    food = next(f for f in per_budget if f.category == "Food")
+    parts = [f for f in per_cat if f.category.startswith("Food/")]
+    assert food.spent == 250.0 and food.projected == pytest.approx(sum(f.projected for f in parts), abs=0.01)
+    assert food.over and not next(f for f in per_budget if f.category == "Rent").over
+    assert len(per_budget) == 2
+    assert [(b.category, b.period) for b in svc.skipped(budgets.list_by_user(a))] == [("Food", "WEEKLY")]
+
+    flagged = svc.at_risk(s, on)
+    assert list(flagged) == [a] and [f.category for f in flagged[a]] == ["Food"]
+
+
+def test_cli_budget_forecast(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "cy", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "cy", "--password", "pw")
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    run_cli("budget", "set", "--db", db_url, "--category", "shopping", "--limit", "300")
+    run_cli("budget", "set", "--db", db_url, "--category", "food", "--limit", "100")
+    capsys.readouterr()
+
+    run_cli("budget", "forecast", "--db", db_url, "--on", "2025-01-10")
+    out = capsys.readouterr().out
+    assert "shopping: spent 200.00, projected 620.00 / 300.00 !!" in out
+    assert "food: spent 25.50, projected 79.05 / 100.00\n" in out
+    assert "skipped" not in out
+
+    run_cli("budget", "set", "--db", db_url, "--category", "food", "--limit", "30", "--period", "weekly")
+    capsys.readouterr()
+    run_cli("budget", "forecast", "--db", db_url, "--on", "2025-01-10")
+    assert "skipped 1 non-monthly budget(s), forecasts cover monthly budgets only: food (weekly)" in capsys.readouterr().out
+
+    run_cli("budget", "forecast", "--db", db_url, "--on", "2025-01-10", "--categories")
+    assert "transport: spent 12.00, projected 37.20\n" in capsys.readouterr().out
+
+    with pytest.raises(SystemExit):  # 所有用户的明细只能写进报告文件
+        run_cli("budget", "forecast", "--db", db_url, "--on", "2025-01-10", "--all")
+    report = tmp_path / "reports" / "at_risk.txt"
+    run_cli("budget", "forecast", "--db", db_url, "--on", "2025-01-10", "--all", "--out", str(report))
+    out = capsys.readouterr().out
+    assert "1 user(s)" in out and "cy" not in out and "shopping" not in out
+    text = report.read_text(encoding="utf-8")
+    assert "cy:" in text and "shopping: spent 200.00" in text and "food" not in text
+    assert "(1 non-monthly budget(s) not forecast)" in text
+    assert report.stat().st_mode & 0o077 == 0
+
+    with pytest.raises(SystemExit):
+        run_cli("budget", "forecast", "--db", db_url, "--history", "0")
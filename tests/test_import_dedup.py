@@ -0,0 +1,53 @@
+import uuid
+from datetime import date
+
+from ledger.models import Record, RecordType
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.import_service import ImportService
+from ledger.utils.db import init_db, get_session_factory
+from ledger.utils.fingerprint import record_fingerprint
+
+
+def test_fingerprint_normalizes_note():
+    a = Record(None, 1, RecordType.EXPENSE, "food", 12.0, date(2025, 1, 1), "  Coffee   Shop ")
+    b = Record(None, 1, RecordType.EXPENSE, "food", 12.00, date(2025, 1, 1), "coffee shop")
+    assert record_fingerprint(a) == record_fingerprint(b)
+    assert record_fingerprint(a) != record_fingerprint(a, 1)
+
+
+def test_reimport_skips_duplicates_but_keeps_repeated_lines(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/imp_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("ivy", "pw").user_id
+    repo = SqliteRecordRepository(s)
+    svc = ImportService(repo, chunk_size=2)
+    coffee = Record(None, 0, RecordType.EXPENSE, "coffee", 3.5, date(2025, 1, 4), "latte")
+    stmt = [
+        coffee,
+        coffee,  # 同一天两杯咖啡：不是重复
+        Record(None, 0, RecordType.EXPENSE, "food", 20.0, date(2025, 1, 5), "lunch"),
+    ]
+
+    first = svc.import_records(uid, stmt)
+    assert (first.total, first.inserted, first.duplicates) == (3, 3, 0)
+    again = svc.import_records(uid, stmt)
+    assert (again.inserted, again.duplicates) == (0, 3)
+
+    # 重叠的新账单只补新增行
+    more = svc.import_records(uid, stmt + [Record(None, 0, RecordType.INCOME, "salary", 100.0, date(2025, 1, 31))])
+    assert (more.inserted, more.duplicates) == (1, 3)
+    assert len(repo.list_month(uid, 2025, 1)) == 4
+
+
+def test_cli_import_twice(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "ivy", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "ivy", "--password", "pw")
+    capsys.readouterr()
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    assert "imported 5 records" in capsys.readouterr().out
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    assert "imported 0 records for user ivy (5 duplicates skipped" in capsys.readouterr().out
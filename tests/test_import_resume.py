@@ -0,0 +1,115 @@
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+from ledger.repo.sqlite_import_repo import SqliteImportCheckpointRepository
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.import_service import ImportService, ImportInterrupted
+from ledger.utils import csv_io
+from ledger.utils.db import init_db, get_session_factory
+
+
+def _write_csv(path, n):
+    lines = ["record_id,user_id,rtype,category,amount,occurred_on,note"]
+    for i in range(n):
+        d = date(2025, 1, 1) + timedelta(days=i % 28)
+        note = '"multi\nline"' if i == 3 else "same"  # 引号内换行不能被切开
+        lines.append(f",1,EXPENSE,food,{1 + i % 5}.0,{d.isoformat()},{note}")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_resume_counts_repeats_skipped_as_duplicates(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path}/res_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("rex", "pw").user_id
+    repo = SqliteRecordRepository(s)
+    svc = ImportService(repo, SqliteImportCheckpointRepository(s), chunk_size=2)
+    head = "record_id,user_id,rtype,category,amount,occurred_on,note\n"
+    coffee = ",1,EXPENSE,food,3.0,2025-01-02,coffee\n"
+    old = tmp_path / "old.csv"
+    old.write_text(head + coffee)
+    svc.import_csv(uid, str(old))
+    p = tmp_path / "new.csv"
+    p.write_text(head + coffee + ",1,EXPENSE,food,9.0,2025-01-02,x\n" + coffee)
+
+    real = csv_io.frame_to_records
+    calls = {"n": 0}
+
+    def flaky(frame):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise KeyboardInterrupt
+        return real(frame)
+
+    monkeypatch.setattr("ledger.services.import_service.frame_to_records", flaky)
+    with pytest.raises(ImportInterrupted):
+        svc.import_csv(uid, str(p))
+    monkeypatch.setattr("ledger.services.import_service.frame_to_records", real)
+    offsets = []
+    real_chunks = csv_io.iter_csv_chunks
+
+    def spy(path, chunk_rows, start_offset=0, start_row=1):
+        offsets.append(start_offset)
+        return real_chunks(path, chunk_rows, start_offset, start_row)
+
+    monkeypatch.setattr("ledger.services.import_service.iter_csv_chunks", spy)
+    svc.import_csv(uid, str(p), resume=True)
+    # 第一杯咖啡在第一块里被当作重复跳过，但续传时第二杯仍是“第 2 次出现”
+    notes = [r.note for r in repo.list_by_period(uid, date(2025, 1, 1), date(2025, 2, 1))]
+    assert sorted(notes) == ["coffee", "coffee", "x"]
+    # 计数来自检查点表：续传只从断点读一次，完成后计数清掉
+    assert len(offsets) == 1 and offsets[0] > 0
+    cps = SqliteImportCheckpointRepository(s)
+    assert cps.occurrences(csv_io.file_fingerprint(str(p)), uid) == {}
+
+
+def test_chunks_resume_from_offset(tmp_path):
+    p = tmp_path / "s.csv"
+    _write_csv(p, 10)
+    chunks = list(csv_io.iter_csv_chunks(str(p), chunk_rows=4))
+    assert [len(c.frame) for c in chunks] == [4, 4, 2]
+    assert chunks[0].frame["note"].iloc[3] == "multi\nline"
+    rest = list(csv_io.iter_csv_chunks(str(p), 4, chunks[0].end_offset, start_row=5))
+    assert [c.first_row for c in rest] == [5, 9]
+    assert rest[0].frame.equals(chunks[1].frame)
+
+
+def test_interrupted_import_resumes_without_duplicates(tmp_path, monkeypatch):
+    db_url = f"sqlite:///{tmp_path}/res_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("rex", "pw").user_id
+    p = tmp_path / "big.csv"
+    _write_csv(p, 100)
+
+    repo = SqliteRecordRepository(s)
+    svc = ImportService(repo, SqliteImportCheckpointRepository(s), chunk_size=30)
+
+    real = csv_io.frame_to_records
+    calls = {"n": 0}
+
+    def flaky(frame):
+        calls["n"] += 1
+        if calls["n"] == 3:
+            raise KeyboardInterrupt
+        return real(frame)
+
+    monkeypatch.setattr("ledger.services.import_service.frame_to_records", flaky)
+    with pytest.raises(ImportInterrupted) as exc:
+        svc.import_csv(uid, str(p))
+    assert exc.value.result.total == 60
+    monkeypatch.setattr("ledger.services.import_service.frame_to_records", real)
+
+    res = svc.import_csv(uid, str(p), resume=True)
+    assert res.resumed_at_row == 61 and res.complete
+    # 重复行序号跨断点延续：100 行全部入库，且不重复
+    assert (res.total, res.inserted) == (100, 100)
+    assert len(repo.list_by_period(uid, date(2000, 1, 1), date(2100, 1, 1))) == 100
+
+    again = svc.import_csv(uid, str(p), resume=True)
+    assert again.already_done and (again.total, again.inserted) == (0, 0)
+    fresh = svc.import_csv(uid, str(p))
+    assert (fresh.inserted, fresh.duplicates) == (0, 100)
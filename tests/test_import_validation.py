@@ -0,0 +1,78 @@
+import csv
+import uuid
+
+import pandas as pd
+
+from ledger.repo.sqlite_import_repo import SqliteImportCheckpointRepository
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.import_service import ImportService
+from ledger.services.record_service import RecordService
+from ledger.utils.csv_io import frame_to_records
+from ledger.utils.db import init_db, get_session_factory
+
+
+def test_validate_batch_clean_and_dirty():
+    clean = pd.DataFrame(
+        {"rtype": ["EXPENSE"], "category": ["food"], "amount": [1.0], "occurred_on": ["2025-01-01"]}
+    )
+    good, bad = RecordService.validate_batch(clean)
+    assert len(good) == 1 and bad.empty
+
+    dirty = pd.DataFrame(
+        {
+            "rtype": ["EXPENSE", "REFUND", "income", "EXPENSE", "EXPENSE"],
+            "category": ["food", "x", None, "food", "food"],
+            "amount": ["0", "5", "7", "inf", "nan"],
+            "occurred_on": ["2025-01-01", "2025-01-02", "soon", "2025-01-03", "2025-01-03"],
+        }
+    )
+    good, bad = RecordService.validate_batch(dirty, first_row=7)
+    assert good.empty
+    assert bad["row"].tolist() == [7, 8, 9, 10, 11]
+    assert bad["reason"].tolist() == [
+        "amount must be positive",
+        "invalid rtype",
+        "category required; unparseable date",
+        "amount must be finite",
+        "amount is not a number",
+    ]
+
+
+def test_import_quarantines_bad_rows(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/val_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("val", "pw").user_id
+    src = tmp_path / "bank.csv"
+    src.write_text(
+        "user_id,rtype,category,amount,occurred_on,note\n"
+        "1,EXPENSE,food,12.5,2025-01-02,lunch\n"
+        "1,TRANSFER,food,3,2025-01-02,bad type\n"
+        "1,EXPENSE,,4,2025-01-03,no category\n"
+        "1,INCOME,salary,100,2025-01-31,pay\n"
+        ",EXPENSE,food,5,2025-02-01,no user id\n",
+        encoding="utf-8",
+    )
+    svc = ImportService(SqliteRecordRepository(s), SqliteImportCheckpointRepository(s), chunk_size=2)
+    res = svc.import_csv(uid, str(src))
+    assert (res.total, res.inserted, res.rejected, res.duplicates) == (5, 3, 2, 0)
+
+    with open(res.quarantine, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [(r["row"], r["reason"]) for r in rows] == [("2", "invalid rtype"), ("3", "category required")]
+    assert rows[0]["note"] == "bad type"
+
+
+def test_frame_to_records_tolerates_reference_columns():
+    frame = pd.DataFrame({
+        "record_id": ["7", "abc", None],
+        "user_id": [2, None, "x"],
+        "rtype": ["EXPENSE"] * 3,
+        "category": ["food"] * 3,
+        "amount": [1.0, 2.0, 3.0],
+        "occurred_on": ["2025-01-02"] * 3,
+    })
+    recs = frame_to_records(frame)
+    assert [r.record_id for r in recs] == [7, None, None]
+    assert [r.user_id for r in recs] == [2, 0, 0]
@@ -0,0 +1,54 @@
+from datetime import date
+import pytest
+
+from ledger.models import Record, RecordType, Budget
+from ledger.repo.memory_repo import InMemoryStore
+from ledger.services.record_service import RecordService
+
+
+def _seed(store: InMemoryStore) -> int:
+    uid = store.users.register("alice", "123456").user_id
+    svc = RecordService(store.records)
+    svc.create_record(Record(None, uid, RecordType.EXPENSE, "food", 30.0, date(2025, 1, 20), "Noodles"))
+    svc.create_record(Record(None, uid, RecordType.INCOME, "salary", 1000.0, date(2025, 1, 1), "monthly"))
+    svc.create_record(Record(None, uid, RecordType.EXPENSE, "food", 12.5, date(2025, 2, 3), "noodle soup"))
+    svc.create_record(Record(None, uid, RecordType.EXPENSE, "transport", 4.0, date(2025, 1, 5), "bus"))
+    return uid
+
+
+def test_period_search_and_aggregates():
+    store = InMemoryStore()
+    uid = _seed(store)
+    recs = store.records
+
+    jan = list(recs.list_month(uid, 2025, 1))
+    assert [r.occurred_on.day for r in jan] == [1, 5, 20]
+    assert [r.note for r in recs.search(uid, "NOODLE")] == ["noodle soup", "Noodles"]
+    assert [r.category for r in recs.search(uid, "bu")] == ["transport"]
+    assert len(list(recs.list_by_category(uid, "food"))) == 2
+
+    assert recs.totals_by_type(uid, date(2025, 1, 1), date(2025, 2, 1)) == {"INCOME": 1000.0, "EXPENSE": 34.0}
+    assert recs.totals_by_category(uid, date(2025, 1, 1), date(2025, 3, 1)) == {"food": 42.5, "transport": 4.0}
+
+    first = jan[0]
+    recs.remove(first.record_id)
+    assert recs.get(first.record_id) is None
+    assert len(list(recs.list_month(uid, 2025, 1))) == 2
+
+
+def test_snapshot_roundtrip(tmp_path):
+    store = InMemoryStore()
+    uid = _seed(store)
+    store.budgets.add(Budget(None, uid, "food", 100.0))
+    path = tmp_path / "snap.json.gz"
+    store.save_snapshot(str(path))
+
+    loaded = InMemoryStore.load_snapshot(str(path))
+    assert loaded.users.verify_login("alice", "123456").user_id == uid
+    with pytest.raises(ValueError):
+        loaded.users.verify_login("alice", "wrong")
+    assert list(loaded.records.list()) == list(store.records.list())
+    assert loaded.budgets.get_by_category(uid, "food").monthly_limit == 100.0
+    # 新记录不会与快照里的 id 冲突
+    new = loaded.records.add(Record(None, uid, RecordType.EXPENSE, "food", 1.0, date(2025, 3, 1)))
+    assert new.record_id == 5
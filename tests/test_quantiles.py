@@ -0,0 +1,120 @@
+import json
+import random
+import statistics
+import uuid
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from ledger.models import Record, RecordType
+from ledger.repo.memory_repo import InMemoryRecordRepository
+from ledger.repo.record_repo import RecordFilter
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_schema import amount_sketch
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.statistics_service import StatisticsService
+from ledger.utils import db, sketch
+from ledger.utils.db import init_db, get_session_factory
+from ledger.utils.sketch import BUCKET_SQL, QuantileSketch, bucket_of, sketch_of
+
+
+def test_sketch_quantiles_within_one_percent_and_merge():
+    rnd = random.Random(5)
+    xs = [round(rnd.lognormvariate(3, 1.2), 2) for _ in range(20000)]
+    a, b = sketch_of(xs[:7000]), sketch_of(xs[7000:])
+    merged = QuantileSketch().merge(a).merge(b)
+    assert merged.counts == sketch_of(xs).counts
+    ys = sorted(xs)
+    for q, got in zip((0.5, 0.9, 0.99), merged.quantiles([0.5, 0.9, 0.99])):
+        exact = ys[int(q * (len(ys) - 1))]
+        assert abs(got - exact) <= 0.011 * exact + 0.01
+    assert QuantileSketch().quantile(0.5) is None
+    hist = merged.histogram(8)
+    assert len(hist) == 8 and sum(n for *_, n in hist) == len(xs)
+    assert hist[0][0] <= min(xs) and hist[-1][1] >= max(xs)
+    with pytest.raises(ValueError):
+        merged.quantile(1.5)
+
+
+def test_sketch_table_follows_writes_and_partial_months(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/q_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("qi", "pw").user_id
+    repo = SqliteRecordRepository(s)
+    rnd = random.Random(9)
+    recs = [
+        Record(None, uid, rnd.choice([RecordType.EXPENSE] * 4 + [RecordType.INCOME]),
+               rnd.choice(["Food/Cafe", "Food/Groceries", "Rent"]), round(rnd.uniform(1, 800), 2),
+               date(2024, 1, 1) + timedelta(days=rnd.randint(0, 365)), "")
+        for _ in range(600)
+    ]
+    repo.add_many(recs[:500])
+    for r in recs[500:]:
+        repo.add(r)
+    repo.shift_dates(RecordFilter(uid, category="Rent"), 17)
+    repo.recategorize(RecordFilter(uid, category="Food/Cafe", start=date(2024, 6, 1)), "Rent")
+    repo.delete_where(RecordFilter(uid, start=date(2024, 3, 10), end=date(2024, 4, 20)))
+
+    mem = InMemoryRecordRepository()
+    for r in repo.list_by_period(uid, date.min, date.max):
+        mem.add(r)
+    for start, end, kw in [
+        (date(2024, 1, 1), date(2025, 2, 1), {}),
+        (date(2024, 2, 14), date(2024, 9, 3), {}),  # 两端是不完整的月
+        (date(2024, 5, 5), date(2024, 5, 20), {}),
+        (date(2024, 1, 1), date(2025, 1, 1), {"depth": 1}),
+        (date(2024, 1, 1), date(2025, 1, 1), {"parent": "Food"}),
+    ]:
+        got = repo.amount_sketches(uid, start, end, **kw)
+        want = mem.amount_sketches(uid, start, end, **kw)
+        assert {k: v.counts for k, v in got.items()} == {k: v.counts for k, v in want.items()}
+
+    rows = StatisticsService().quantiles(repo.amount_sketches(uid, date(2024, 1, 1), date(2025, 2, 1)))
+    amounts = [r.amount for r in mem.list_by_period(uid, date.min, date.max) if r.rtype == RecordType.EXPENSE]
+    assert rows["*"]["count"] == len(amounts)
+    assert rows["*"]["p50"] == pytest.approx(statistics.median_low(sorted(amounts)), rel=0.011)
+
+    # 旧库升级：草图表为空时由迁移回填
+    before = s.execute(select(func.sum(amount_sketch.c.n))).scalar()
+    s.execute(delete(amount_sketch))
+    s.commit()
+    init_db(db_url)
+    assert s.execute(select(func.sum(amount_sketch.c.n))).scalar() == before == len(amounts)
+
+
+def test_python_math_fallbacks_keep_triggers_working(tmp_path, monkeypatch):
+    # 模拟 SQLite 没有编译数学函数：强制用 Python 版 ln/ceil
+    monkeypatch.setattr(db, "register_math_functions", lambda c: sketch.register_math_functions(c, force=True))
+    db_url = f"sqlite:///{tmp_path}/nomath_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    conn = s.connection().connection.dbapi_connection
+    for x in (0.0, 0.004, 1.0, 12.34, 999.99):
+        assert conn.execute(f"SELECT {BUCKET_SQL.format(x='?')}", (x,)).fetchone()[0] == bucket_of(x)
+    uid = SqliteUserRepository(s).register("nm", "pw").user_id
+    SqliteRecordRepository(s).add(Record(None, uid, RecordType.EXPENSE, "food", 12.34, date(2025, 1, 2)))
+    assert s.execute(select(amount_sketch.c.bucket)).scalar() == bucket_of(12.34)
+
+
+def test_cli_stats_quantiles(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "qu", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "qu", "--password", "pw")
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    capsys.readouterr()
+
+    run_cli("stats", "--db", db_url, "--month", "2025-01", "--quantiles", "--histogram", "3")
+    out = capsys.readouterr().out
+    assert "expense size (within 1%):" in out
+    assert "(all)" in out and "food" in out and "salary" not in out.split("expense size")[1]
+    assert "expense size histogram:" in out
+
+    run_cli("stats", "--db", db_url, "--month", "2025-01", "--quantiles", "--json")
+    doc = json.loads(capsys.readouterr().out)
+    assert doc["expense_quantiles"]["*"]["count"] == 3
+    assert doc["expense_quantiles"]["shopping"]["p50"] == pytest.approx(200.0, rel=0.01)
+    with pytest.raises(SystemExit):
+        run_cli("stats", "--db", db_url, "--month", "2025-01", "--histogram", "0")
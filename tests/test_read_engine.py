@@ -0,0 +1,39 @@
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from ledger.models import Record, RecordType
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.utils.db import init_db, get_session_factory, get_read_session_factory, get_engine, get_read_engine
+
+
+def test_read_session_is_readonly_snapshot(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/ro_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    writer = get_session_factory(db_url)()
+    uid = SqliteUserRepository(writer).register("reader", "pw").user_id
+    wrepo = SqliteRecordRepository(writer)
+    wrepo.add(Record(None, uid, RecordType.EXPENSE, "food", 1.0, date(2025, 1, 1)))
+
+    reader = get_read_session_factory(db_url)()
+    rrepo = SqliteRecordRepository(reader)
+    assert len(rrepo.list_month(uid, 2025, 1)) == 1
+
+    # 读事务打开期间写者不被阻塞；读者仍看到自己的快照
+    wrepo.add(Record(None, uid, RecordType.EXPENSE, "food", 2.0, date(2025, 1, 2)))
+    assert len(rrepo.list_month(uid, 2025, 1)) == 1
+    reader.close()
+    with get_read_session_factory(db_url)() as fresh:
+        assert len(SqliteRecordRepository(fresh).list_month(uid, 2025, 1)) == 2
+
+    with get_read_session_factory(db_url)() as ro:
+        with pytest.raises(OperationalError):
+            ro.execute(text("DELETE FROM records"))
+
+
+def test_memory_url_falls_back_to_writer_engine():
+    assert get_read_engine("sqlite://") is get_engine("sqlite://")
@@ -0,0 +1,91 @@
+import random
+import uuid
+from dataclasses import replace
+from datetime import date, timedelta
+
+import pytest
+
+from ledger.models import Record, RecordType
+from ledger.services.reconcile_service import note_similarity, reconcile
+
+E, I = RecordType.EXPENSE, RecordType.INCOME
+
+
+def _r(rid, amount, day, note="", rtype=E):
+    return Record(rid, 1, rtype, "misc", amount, date(2025, 3, day), note)
+
+
+def test_reconcile_pairs_by_amount_date_and_note():
+    ledger = [
+        _r(1, 12.5, 3, "coffee"),
+        _r(2, 40.0, 5, "Uber trip"),
+        _r(3, 40.0, 6, "groceries"),
+        _r(4, 99.99, 1, "gym"),
+        _r(5, 5000.0, 1, "salary", I),
+        _r(6, 7.0, 20, "snack"),
+    ]
+    statement = [
+        _r(None, 12.5, 4, "STARBUCKS 0042"),
+        _r(None, 40.0, 6, "UBER *TRIP 8J2K"),  # 两条 40.00 都在容差内：备注更像的 #2
+        _r(None, 99.99, 9, "GYM"),  # 超出 3 天容差
+        _r(None, 5000.0, 1, "salary", E),  # 类型不同
+        _r(None, 7.0, 18, "snack"),
+    ]
+    res = reconcile(statement, ledger, tolerance_days=3)
+    pairs = {m.record.record_id: m for m in res.matched}
+    assert set(pairs) == {1, 2, 6}
+    assert pairs[2].similarity == 1.0 and pairs[2].days == -1 and pairs[6].days == 2
+    assert sorted(r.amount for r in res.missing) == [99.99, 5000.0]
+    assert sorted(r.record_id for r in res.extra) == [3, 4, 5]
+    # 对账单最后一天（3 月 18 日）之后未配对的记录属于下一期对账单，不算多余
+    res = reconcile(statement, ledger + [_r(7, 3.0, 17, "late"), _r(8, 3.0, 21, "next period")], tolerance_days=3)
+    assert sorted(r.record_id for r in res.extra) == [3, 4, 5, 7]
+
+    strict = reconcile(statement, ledger, tolerance_days=3, min_similarity=0.5)
+    assert {m.record.record_id for m in strict.matched} == {2, 6}
+    usd = reconcile([replace(statement[0], currency="USD")], ledger, tolerance_days=3)
+    assert not usd.matched and len(usd.missing) == 1  # 同为 12.50，但币种不同
+    with pytest.raises(ValueError):
+        reconcile(statement, ledger, tolerance_days=-1)
+    assert note_similarity("", "") == 1.0 and note_similarity("abc", "") == 0.0
+
+
+def test_reconcile_random_statement():
+    rnd = random.Random(8)
+    ledger = [
+        Record(i, 1, E, "misc", float(rnd.choice([9.99, 20.0, 45.5, rnd.randint(1, 500)])),
+               date(2025, 1, 1) + timedelta(days=rnd.randint(0, 90)), f"shop {i % 7}")
+        for i in range(1, 2001)
+    ]
+    kept = rnd.sample(ledger, 1500)
+    statement = [replace(r, record_id=None, occurred_on=r.occurred_on + timedelta(days=rnd.randint(-2, 2))) for r in kept]
+    statement += [Record(None, 1, E, "misc", 10000.0 + k, date(2025, 2, 1), "new") for k in range(30)]
+    res = reconcile(statement, ledger, tolerance_days=2)
+    assert len(res.matched) == 1500 and len(res.missing) == 30 and len(res.extra) == 500
+    for m in res.matched:
+        assert m.record.amount == m.statement.amount and abs(m.days) <= 2
+    assert len({m.record.record_id for m in res.matched}) == 1500
+
+
+def test_cli_reconcile(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "rc", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "rc", "--password", "pw")
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    stmt = tmp_path / "bank.csv"
+    stmt.write_text(
+        "record_id,user_id,rtype,category,amount,occurred_on,note\n"
+        ",1,EXPENSE,bank,25.5,2025-01-03,LUNCH 123\n"
+        ",1,EXPENSE,bank,200.0,2025-01-10,CLOTHES\n"
+        ",1,EXPENSE,bank,64.0,2025-01-04,pharmacy\n"
+    )
+    capsys.readouterr()
+    run_cli("reconcile", "--db", db_url, "--path", str(stmt), "--tolerance", "1", "--matched")
+    out = capsys.readouterr().out
+    assert "2 matched, 1 missing, 1 extra" in out
+    assert "2025-01-03 EXPENSE bank 25.50 LUNCH 123 <-> #1 (-1d, note 1.00)" in out
+    assert "missing from ledger:\n  2025-01-04 EXPENSE bank 64.00 pharmacy" in out
+    assert "not on statement:\n  #2 2025-01-03 EXPENSE transport 12.00 bus" in out
+    with pytest.raises(SystemExit):
+        run_cli("reconcile", "--db", db_url, "--path", str(tmp_path / "nope.csv"))
@@ -0,0 +1,95 @@
+import uuid
+from datetime import date
+
+import pytest
+
+from ledger.models import Record, RecordType
+from ledger.repo.memory_repo import InMemoryRecordRepository
+from ledger.repo.record_query import RecordQuery
+from ledger.repo.record_repo import RecordFilter
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.utils.db import init_db, get_session_factory
+
+ROWS = [
+    (RecordType.EXPENSE, "Food", 620.0, date(2025, 1, 3), "banquet"),
+    (RecordType.EXPENSE, "Travel", 900.0, date(2025, 2, 14), "flights"),
+    (RecordType.EXPENSE, "Travel", 120.0, date(2025, 3, 1), "taxi"),
+    (RecordType.EXPENSE, "Rent", 1500.0, date(2025, 3, 1), ""),
+    (RecordType.INCOME, "Food", 700.0, date(2025, 3, 5), "refund"),
+    (RecordType.EXPENSE, "Food", 800.0, date(2025, 4, 2), "banquet"),
+]
+
+
+def _sqlite_repo(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/q_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    return SqliteRecordRepository(s), SqliteUserRepository(s).register("lee", "pw").user_id
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_query_combines_filters(tmp_path, backend):
+    repo, uid = _sqlite_repo(tmp_path) if backend == "sqlite" else (InMemoryRecordRepository(), 1)
+    for rtype, cat, amt, d, note in ROWS:
+        repo.add(Record(None, uid, rtype, cat, amt, d, note))
+
+    q = (
+        RecordQuery(uid)
+        .between(date(2025, 1, 1), date(2025, 4, 1))
+        .of_type(RecordType.EXPENSE)
+        .in_categories("Food", "Travel")
+        .amount_between(500, None)
+        .order_by("-amount")
+    )
+    assert [(r.category, r.amount) for r in repo.query(q)] == [("Travel", 900.0), ("Food", 620.0)]
+    assert [r.amount for r in repo.query(q.take(1, offset=1))] == [620.0]
+    assert [r.note for r in repo.query(RecordQuery(uid).matching("BANQ").order_by("date"))] == [
+        "banquet", "banquet"
+    ]
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_keyword_wildcards_are_literal(tmp_path, backend):
+    repo, uid = _sqlite_repo(tmp_path) if backend == "sqlite" else (InMemoryRecordRepository(), 1)
+    for note in ("50% off", "500 off", "a_b", "axb", "c:\\tmp"):
+        repo.add(Record(None, uid, RecordType.EXPENSE, "Misc", 1.0, date(2025, 1, 1), note))
+    # LIKE 的 % 和 _ 按字面匹配，两种后端结果一致
+    assert [r.note for r in repo.query(RecordQuery(uid).matching("50%"))] == ["50% off"]
+    assert [r.note for r in repo.query(RecordQuery(uid).matching("A_B"))] == ["a_b"]
+    assert [r.note for r in repo.search(uid, "a_b")] == ["a_b"]
+    assert [r.note for r in repo.search(uid, ":\\")] == ["c:\\tmp"]
+    assert len(repo.list_where(RecordFilter(uid, keyword="0%"))) == 1
+
+
+def test_query_rejects_bad_input():
+    with pytest.raises(ValueError):
+        RecordQuery(1).order_by("price")
+    with pytest.raises(ValueError):
+        RecordQuery(1).amount_between(10, 1)
+
+
+def test_explain_uses_composite_indexes(tmp_path):
+    repo, uid = _sqlite_repo(tmp_path)
+    by_date = RecordQuery(uid).between(date(2025, 1, 1), date(2025, 2, 1))
+    assert "USING INDEX ix_records_user_date" in " ".join(repo.explain(by_date))
+    # 两个组合索引都以 user_id 开头，具体选哪个由 SQLite 的代价估计决定
+    by_cat = by_date.in_categories("Food", "Travel").order_by("-amount")
+    plan = " ".join(repo.explain(by_cat))
+    assert "USING INDEX ix_records_user_" in plan and "SCAN records" not in plan
+
+
+def test_cli_query(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "lee", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "lee", "--password", "pw")
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    capsys.readouterr()
+    run_cli("query", "--db", db_url, "--type", "EXPENSE", "--sort=-amount", "--limit", "2")
+    lines = capsys.readouterr().out.strip().splitlines()
+    assert len(lines) == 2
+    amounts = [float(l.split("\t")[4]) for l in lines]
+    assert amounts == sorted(amounts, reverse=True)
+    run_cli("query", "--db", db_url, "--start", "2025-01-01", "--explain")
+    assert "USING INDEX" in capsys.readouterr().out
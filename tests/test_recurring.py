@@ -0,0 +1,114 @@
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import update
+
+from ledger.models import RecordType, RecurringTemplate
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_recurring_repo import SqliteRecurringRepository
+from ledger.repo.sqlite_schema import recurring_templates
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.recurring_service import RecurringService, occurrences, validate_template
+from ledger.utils.db import init_db, get_session_factory
+
+
+def _tpl(freq, start, end=None, every=1, uid=1, **kw):
+    return RecurringTemplate(None, uid, RecordType.EXPENSE, kw.pop("category", "rent"), kw.pop("amount", 900.0),
+                             freq, start, end, every=every, **kw)
+
+
+def test_occurrence_dates():
+    days, nxt = occurrences(_tpl("MONTHLY", date(2025, 1, 31)), date(2025, 5, 1))
+    assert days == [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)]
+    assert nxt == date(2025, 5, 31)
+    days, nxt = occurrences(_tpl("WEEKLY", date(2025, 1, 6), every=2, next_on=date(2025, 1, 20)), date(2025, 2, 17))
+    assert days == [date(2025, 1, 20), date(2025, 2, 3), date(2025, 2, 17)] and nxt == date(2025, 3, 3)
+    days, nxt = occurrences(_tpl("DAILY", date(2025, 1, 1), end=date(2025, 1, 3)), date(2025, 12, 31))
+    assert len(days) == 3 and nxt == date(2025, 1, 4)
+    days, _ = occurrences(_tpl("MONTHLY", date(2024, 11, 15), every=3), date(2025, 6, 1))
+    assert days == [date(2024, 11, 15), date(2025, 2, 15), date(2025, 5, 15)]
+    for bad in (_tpl("YEARLY", date(2025, 1, 1)), _tpl("DAILY", date(2025, 1, 2), end=date(2025, 1, 1)),
+                _tpl("DAILY", date(2025, 1, 1), every=0), _tpl("DAILY", date(2025, 1, 1), amount=0)):
+        with pytest.raises(ValueError):
+            validate_template(bad)
+
+
+def test_materialize_all_users_idempotently(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/rec_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    users = SqliteUserRepository(s)
+    a, b = users.register("ann", "pw").user_id, users.register("bob", "pw").user_id
+    tpls = SqliteRecurringRepository(s)
+    rent = tpls.add(_tpl("MONTHLY", date(2025, 1, 1), uid=a))
+    tpls.add(_tpl("WEEKLY", date(2025, 1, 3), end=date(2025, 1, 24), uid=a, category="gym", amount=10.0))
+    tpls.add(_tpl("DAILY", date(2025, 3, 1), uid=b, category="coffee", amount=3.5, note="latte"))
+
+    svc = RecurringService(s)
+    res = svc.materialize(date(2025, 3, 2))
+    assert (res.templates, res.generated) == (3, 3 + 4 + 2)
+    assert svc.materialize(date(2025, 3, 2)).generated == 0  # 高水位之后才有新日期
+    res = svc.materialize(date(2025, 3, 5), user_id=b)
+    assert (res.templates, res.generated) == (1, 3)
+
+    repo = SqliteRecordRepository(s)
+    assert [r.occurred_on.month for r in repo.list_by_period(a, date(2025, 1, 1), date(2025, 4, 1)) if r.category == "rent"] == [1, 2, 3]
+    coffee = repo.list_by_period(b, date(2025, 1, 1), date(2026, 1, 1))
+    assert len(coffee) == 5 and {r.note for r in coffee} == {"latte"}
+    listed = {t.category: t for t in tpls.list_by_user(a)}
+    assert listed["rent"].next_on == date(2025, 4, 1) and listed["gym"].next_on == date(2025, 1, 31)
+
+    # 高水位被回拨（例如从旧备份恢复模板表）也不会重复生成：每个 (模板, 日期) 有唯一指纹
+    s.execute(update(recurring_templates).where(recurring_templates.c.template_id == rent.template_id)
+              .values(next_on=date(2025, 1, 1)))
+    s.commit()
+    assert svc.materialize(date(2025, 4, 1), user_id=a).generated == 1  # 只有 4 月 1 日是新的
+    assert tpls.remove(a, rent.template_id) and not tpls.remove(b, rent.template_id)
+
+
+def test_removed_template_does_not_shadow_a_new_one(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/rec_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    users = SqliteUserRepository(s)
+    a, b = users.register("ann", "pw").user_id, users.register("bob", "pw").user_id
+    tpls = SqliteRecurringRepository(s)
+    svc = RecurringService(s)
+    old = tpls.add(_tpl("DAILY", date(2025, 1, 1), uid=a))
+    assert svc.materialize(date(2025, 1, 3)).generated == 3
+    assert tpls.remove(a, old.template_id)
+
+    # id 不复用；即便复用，指纹也按 (用户, 模板 key, 日期) 区分
+    new = tpls.add(_tpl("DAILY", date(2025, 1, 1), uid=b))
+    assert new.template_id != old.template_id and new.key != old.key
+    assert svc.materialize(date(2025, 1, 3)).generated == 3
+    assert len(SqliteRecordRepository(s).list_by_period(b, date(2025, 1, 1), date(2025, 2, 1))) == 3
+
+
+def test_cli_recurring(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "rx", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "rx", "--password", "pw")
+    run_cli("recurring", "add", "--db", db_url, "--type", "INCOME", "--category", "salary", "--amount", "5000",
+        "--freq", "monthly", "--start", "2025-01-25", "--note", "payroll")
+    run_cli("recurring", "add", "--db", db_url, "--type", "EXPENSE", "--category", "music", "--amount", "9.99",
+        "--freq", "weekly", "--every", "2", "--start", "2025-01-01", "--end", "2025-02-28")
+    assert "added #1 INCOME salary 5000.00 (payroll) every month from 2025-01-25" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        run_cli("recurring", "add", "--db", db_url, "--type", "EXPENSE", "--category", "x", "--amount", "1",
+            "--freq", "daily", "--start", "2025-01-02", "--end", "2025-01-01")
+
+    run_cli("recurring", "run", "--db", db_url, "--until", "2025-03-31")
+    assert "generated 8 records from 2 templates through 2025-03-31" in capsys.readouterr().out
+    run_cli("recurring", "run", "--db", db_url, "--until", "2025-04-30", "--all")
+    assert "generated 1 records from 1 templates" in capsys.readouterr().out
+    run_cli("recurring", "list", "--db", db_url)
+    out = capsys.readouterr().out
+    assert "every 2 weeks from 2025-01-01 until 2025-02-28; finished" in out and "next 2025-05-25" in out
+    run_cli("balance", "--db", db_url, "--on", "2025-04-30")
+    assert "at end of 2025-04-30: 19950.05" in capsys.readouterr().out  # 4 次工资 - 5 次订阅
+    run_cli("recurring", "remove", "--db", db_url, "--id", "1")
+    with pytest.raises(SystemExit):
+        run_cli("recurring", "remove", "--db", db_url, "--id", "1")
@@ -0,0 +1,164 @@
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+from ledger.models import CategoryRule, Record, RecordType
+from ledger.repo.memory_repo import InMemoryRecordRepository
+from ledger.repo.record_repo import RecordFilter
+from ledger.repo.sqlite_import_repo import SqliteImportCheckpointRepository
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_rule_repo import SqliteRuleRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.import_service import ImportService, ImportInterrupted
+from ledger.services.rule_service import RuleEngine, recategorize_by_rules, validate_rule
+from ledger.utils import csv_io
+from ledger.utils.db import init_db, get_session_factory
+
+
+def _rules(uid=1):
+    return [
+        CategoryRule(1, uid, "Food/Coffee", "coffee", priority=50),
+        CategoryRule(2, uid, "Food/Cafe", "coffee shop", priority=10),
+        CategoryRule(3, uid, "Transport", r"\buber\b|\btaxi\b", kind="regex"),
+        CategoryRule(4, uid, "Big", None, min_amount=1000),
+        CategoryRule(5, uid, "Food/Coffee/Cheap", "coffee", max_amount=3, priority=5),
+    ]
+
+
+def test_engine_priority_overlap_and_ranges():
+    eng = RuleEngine(_rules())
+    cat = lambda note, amt=10.0: (r.category if (r := eng.match(note, amt)) else None)
+    assert cat("COFFEE beans") == "Food/Coffee"
+    # 较长关键字包含较短的：两个都命中，按优先级取
+    assert cat("the coffee shop") == "Food/Cafe"
+    assert cat("coffee", 2.0) == "Food/Coffee/Cheap"
+    assert cat("Uber to airport") == "Transport"
+    assert cat("uberx") is None
+    assert cat("rent", 1500.0) == "Big"
+    assert cat("coffee", 1500.0) == "Food/Coffee"  # 关键字规则优先级更高
+    assert cat(None) is None
+
+    rules, report = eng.classify(["coffee", "taxi", "rent", "x"], [4.0, 12.0, 2000.0, 1.0])
+    assert [r.rule_id if r else None for r in rules] == [1, 3, 4, None]
+    assert report.hits == {1: 1, 3: 1, 4: 1} and report.unmatched == 1
+
+
+def test_keywords_match_across_case_folding():
+    eng = RuleEngine([
+        CategoryRule(1, 1, "Shop", "ſhop"),  # 长 s：.lower() 不变，casefold 为 "shop"
+        CategoryRule(2, 1, "Street", "straße", priority=50),
+        CategoryRule(3, 1, "Kelvin", "\u212a", priority=60),  # 开尔文符号 K
+    ])
+    cat = lambda note: (r.category if (r := eng.match(note, 1.0)) else None)
+    assert cat("SHOP") == "Shop" and cat("the ſhop") == "Shop"
+    assert cat("STRAẞE 5") == "Street"
+    assert cat("k") == "Kelvin"
+
+
+def test_validate_rule():
+    with pytest.raises(ValueError):
+        validate_rule(CategoryRule(None, 1, "X", "(", kind="regex"))
+    with pytest.raises(ValueError):
+        validate_rule(CategoryRule(None, 1, "X"))
+    with pytest.raises(ValueError):
+        validate_rule(CategoryRule(None, 1, "X", "a", kind="glob"))
+    with pytest.raises(ValueError):
+        RuleEngine([CategoryRule(None, 1, "X", None, min_amount=5, max_amount=1)])
+
+
+def _session(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/rules_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("ria", "pw").user_id
+    return s, uid
+
+
+def _write_csv(path, n):
+    lines = ["record_id,user_id,rtype,category,amount,occurred_on,note"]
+    for i in range(n):
+        d = date(2025, 1, 1) + timedelta(days=i % 3)
+        lines.append(f",1,EXPENSE,misc,4.0,{d.isoformat()},{'coffee' if i % 2 else 'taxi'}")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_import_with_rules_resumes_and_dedups(tmp_path, monkeypatch):
+    s, uid = _session(tmp_path)
+    p = tmp_path / "stmt.csv"
+    _write_csv(p, 40)
+    repo = SqliteRecordRepository(s)
+    engine = RuleEngine([r for r in _rules(uid) if r.rule_id in (1, 3)])
+    svc = ImportService(repo, SqliteImportCheckpointRepository(s), chunk_size=15, rules=engine)
+
+    real, calls = csv_io.frame_to_records, {"n": 0}
+
+    def flaky(frame):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise KeyboardInterrupt
+        return real(frame)
+
+    monkeypatch.setattr("ledger.services.import_service.frame_to_records", flaky)
+    with pytest.raises(ImportInterrupted):
+        svc.import_csv(uid, str(p))
+    monkeypatch.setattr("ledger.services.import_service.frame_to_records", real)
+
+    res = svc.import_csv(uid, str(p), resume=True)
+    assert res.complete and res.inserted == 40
+    # 只统计本次运行（第 16-40 行）
+    assert res.rules.hits == {1: 13, 3: 12} and res.rules.unmatched == 0
+    cats = repo.totals_by_category(uid, date(2025, 1, 1), date(2025, 2, 1))
+    assert cats == {"Food/Coffee": 80.0, "Transport": 80.0}
+
+    # 换了规则再导入同一文件：指纹取自原始行，全部识别为重复
+    again = ImportService(repo, SqliteImportCheckpointRepository(s), rules=RuleEngine(_rules(uid)))
+    assert again.import_csv(uid, str(p)).inserted == 0
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_recategorize_by_rules(tmp_path, backend):
+    if backend == "sqlite":
+        s, uid = _session(tmp_path)
+        repo = SqliteRecordRepository(s)
+    else:
+        repo, uid = InMemoryRecordRepository(), 1
+    for note, amt in [("coffee shop", 5.0), ("Taxi home", 20.0), ("rent", 1200.0), ("misc", 1.0)]:
+        repo.add(Record(None, uid, RecordType.EXPENSE, "inbox", amt, date(2025, 3, 1), note))
+    repo.add(Record(None, uid, RecordType.EXPENSE, "inbox", 9.0, date(2025, 4, 1), "taxi"))
+    engine = RuleEngine(_rules(uid))
+    flt = RecordFilter(uid, start=date(2025, 3, 1), end=date(2025, 4, 1))
+
+    report = recategorize_by_rules(repo, flt, engine, dry_run=True)
+    assert report.hits == {2: 1, 3: 1, 4: 1} and report.unmatched == 1
+    assert {r.category for r in repo.list_where(flt)} == {"inbox"}
+
+    recategorize_by_rules(repo, flt, engine)
+    after = {r.note: r.category for r in repo.list_where(RecordFilter(uid))}
+    assert after == {"coffee shop": "Food/Cafe", "Taxi home": "Transport", "rent": "Big", "misc": "inbox", "taxi": "inbox"}
+
+
+def test_rule_repo_and_cli(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "kai", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "kai", "--password", "pw")
+    with pytest.raises(SystemExit):
+        run_cli("rule", "add", "--db", db_url, "--category", "X", "--regex", "(")
+    run_cli("rule", "add", "--db", db_url, "--category", "Sorted", "--min-amount", "0")
+    run_cli("rule", "add", "--db", db_url, "--category", "Gone", "--keyword", "zzz")
+    run_cli("rule", "remove", "--db", db_url, "--id", "2")
+    run_cli("rule", "list", "--db", db_url)
+    out = capsys.readouterr().out
+    assert "rule #1 amount [0.00, ] -> Sorted (priority 100)" in out and "Gone (priority" not in out
+
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv", "--rules")
+    out = capsys.readouterr().out
+    assert "rule #1 amount [0.00, ] -> Sorted: 5 rows" in out and "unmatched: 0 rows" in out
+    run_cli("bulk", "recategorize", "--db", db_url, "--rules", "--dry-run")
+    assert "would recategorize 5 records" in capsys.readouterr().out
+
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).get_by_name("kai").user_id
+    assert [r.rule_id for r in SqliteRuleRepository(s).list_by_user(uid)] == [1]
+    assert set(SqliteRecordRepository(s).totals_by_category(uid, date(1900, 1, 1), date(3000, 1, 1))) == {"Sorted"}
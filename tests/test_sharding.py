@@ -0,0 +1,69 @@
+import uuid
+from datetime import date
+
+from sqlalchemy import select, func
+
+from ledger.models import Record, RecordType
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_schema import records
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.utils.db import get_session_factory
+from ledger.utils.sharding import init_shards, rebalance, get_router, jump_hash
+
+
+def test_jump_hash_moves_few_keys():
+    before = [jump_hash(k, 4) for k in range(1000)]
+    after = [jump_hash(k, 5) for k in range(1000)]
+    moved = sum(1 for a, b in zip(before, after) if a != b)
+    assert all(0 <= b < 5 for b in after)
+    assert moved < 300  # 理论约 1/5
+
+
+def test_router_fan_out_and_rebalance(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/dir_{uuid.uuid4().hex}.db"
+    router = init_shards(db_url, 2)
+    directory = get_session_factory(db_url)()
+    urepo = SqliteUserRepository(directory)
+    uids = [urepo.register(f"u{i}", "pw").user_id for i in range(6)]
+
+    for uid in uids:
+        with router.session_for(uid) as s:
+            repo = SqliteRecordRepository(s)
+            rec = repo.add(Record(None, uid, RecordType.EXPENSE, "food/lunch", 10.0 * uid, date(2025, 1, 3)))
+            repo.tag(uid, [rec.record_id], [f"t{uid}"])
+
+    totals = router.monthly_totals(2025, 1)
+    assert {uid: t["EXPENSE"] for uid, t in totals.items()} == {uid: 10.0 * uid for uid in uids}
+
+    res = rebalance(db_url, 3)
+    assert res["shards"] == 3
+    router = get_router(db_url)
+    for uid in uids:
+        assert router.shard_for(uid) == jump_hash(uid, 3)
+        with router.session_for(uid) as s:
+            repo = SqliteRecordRepository(s)
+            (rec,) = repo.list_month(uid, 2025, 1)
+            # 分类与标签按名称重映射到目标分片
+            assert rec.category == "food/lunch"
+            assert repo.tags_of([rec.record_id]) == {rec.record_id: [f"t{uid}"]}
+            assert repo.totals_by_category(uid, date(2025, 1, 1), date(2025, 2, 1), depth=1) == {"food": 10.0 * uid}
+    # 每条记录只存在于一个分片
+    counts = router.fan_out(lambda s, _sid: s.execute(select(func.count()).select_from(records)).scalar())
+    assert sum(counts.values()) == len(uids)
+
+
+def test_cli_routes_records_to_shard(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+    run_cli("shard", "init", "--db", db_url, "--shards", "2")
+    run_cli("register", "--db", db_url, "--username", "sam", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "sam", "--password", "pw")
+    run_cli("add", "--db", db_url, "--type", "EXPENSE", "--category", "food",
+        "--amount", "12", "--date", "2025-01-02")
+    capsys.readouterr()
+
+    with get_session_factory(db_url)() as directory:
+        assert directory.execute(select(func.count()).select_from(records)).scalar() == 0
+
+    run_cli("shard", "report", "--db", db_url, "--month", "2025-01")
+    out = capsys.readouterr().out
+    assert "sam" in out and "expense=12.00" in out
@@ -45,3 +45,21 @@ def test_add_and_query_records(tmp_path):
     cats = {(r.category, r.rtype.name) for r in recs}
     assert ("salary", "INCOME") in cats
     assert ("food", "EXPENSE") in cats
+
+
+def test_search_and_lazy_row_views(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/m2_{uuid.uuid4().hex}.db"
+    session = make_session(db_url)
+    user = SqliteUserRepository(session).register("lazy", "123456")
+    rrepo = SqliteRecordRepository(session)
+    rrepo.add(Record(None, user.user_id, RecordType.EXPENSE, "food", 12.0, date(2025, 2, 1), "noodles"))
+    rrepo.add(Record(None, user.user_id, RecordType.EXPENSE, "transport", 3.0, date(2025, 2, 3), "bus"))
+
+    found = list(rrepo.search(user.user_id, "nood"))
+    assert [r.category for r in found] == ["food"]
+    assert found[0].rtype is RecordType.EXPENSE
+
+    views = list(rrepo.list_by_period(user.user_id, date(2025, 2, 1), date(2025, 3, 1), lazy=True))
+    assert [v.category for v in views] == ["food", "transport"]
+    assert views[1].rtype is RecordType.EXPENSE and views[1].amount == 3.0
+    assert views[0].to_record() == rrepo.list_month(user.user_id, 2025, 2)[0]
@@ -0,0 +1,69 @@
+import json
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+from ledger.models import Record, RecordType
+from ledger.repo.memory_repo import InMemoryRecordRepository
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.statistics_service import StatisticsService
+from ledger.utils import periods
+from ledger.utils.db import init_db, get_session_factory
+
+
+def test_periods():
+    assert periods.quarter_range(2025, 4) == (date(2025, 10, 1), date(2026, 1, 1))
+    assert periods.last_months(3, date(2025, 2, 14)) == (date(2024, 12, 1), date(2025, 3, 1))
+    assert periods.bucket_of(date(2025, 1, 1), "week") == date(2024, 12, 30)
+    assert periods.bucket_starts(date(2025, 1, 15), date(2025, 3, 2), "month") == [
+        date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)
+    ]
+    with pytest.raises(ValueError):
+        periods.bucket_of(date(2025, 1, 1), "hour")
+
+
+def test_series_by_type_backends_agree(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/series_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("sia", "pw").user_id
+    sql, mem = SqliteRecordRepository(s), InMemoryRecordRepository()
+    for i in range(120):
+        rtype = RecordType.INCOME if i % 7 == 0 else RecordType.EXPENSE
+        r = Record(None, uid, rtype, "x", float(i + 1), date(2024, 12, 25) + timedelta(days=i), "")
+        sql.add(r)
+        mem.add(r)
+    for bucket in periods.BUCKETS:
+        got = sql.series_by_type(uid, date(2025, 1, 1), date(2025, 4, 1), bucket)
+        assert got == mem.series_by_type(uid, date(2025, 1, 1), date(2025, 4, 1), bucket)
+    months = sql.series_by_type(uid, date(2024, 11, 1), date(2025, 5, 1), "month")
+    assert list(months)[0] == date(2024, 11, 1) and months[date(2024, 11, 1)]["EXPENSE"] == 0.0
+
+    rows = StatisticsService().trend(months)
+    assert rows[-1]["cumulative"] == round(sum(r["net"] for r in rows), 2)
+
+
+def test_cli_stats_ranges(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "ray", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "ray", "--password", "pw")
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    capsys.readouterr()
+
+    run_cli("stats", "--db", db_url, "--year", "2025", "--by", "month", "--json")
+    doc = json.loads(capsys.readouterr().out)
+    assert doc["summary"] == {"income": 5800.0, "expense": 237.5, "balance": 5562.5}
+    assert len(doc["series"]) == 12 and doc["series"][0]["bucket"] == "2025-01-01"
+    assert doc["series"][1]["cumulative"] == 5562.5
+
+    run_cli("stats", "--db", db_url, "--quarter", "2025-Q1", "--by", "week")
+    out = capsys.readouterr().out
+    assert "Summary for ray 2025-Q1" in out and "2024-12-30" in out
+
+    run_cli("stats", "--db", db_url, "--start", "2025-01-03", "--end", "2025-01-11")
+    assert "expense: 212.00" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        run_cli("stats", "--db", db_url, "--year", "2025", "--month", "2025-01")
@@ -0,0 +1,98 @@
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import update, delete
+
+from ledger.models import Record, RecordType
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_schema import records
+from ledger.repo.sqlite_sync_repo import SqliteSyncRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.utils.db import init_db, get_session_factory
+from ledger.utils.sync_io import save_batch, load_batch
+
+
+def _ledger(tmp_path, name, extra_users=()):
+    url = f"sqlite:///{tmp_path}/{name}_{uuid.uuid4().hex}.db"
+    init_db(url)
+    s = get_session_factory(url)()
+    urepo = SqliteUserRepository(s)
+    for u in extra_users:
+        urepo.register(u, "pw")
+    uid = urepo.register("ann", "pw").user_id
+    return s, uid
+
+
+def _amounts(session, uid):
+    return sorted(r.amount for r in SqliteRecordRepository(session).list_month(uid, 2025, 1))
+
+
+def test_delta_sync_both_ways_converges(tmp_path):
+    laptop, l_uid = _ledger(tmp_path, "laptop")
+    server, s_uid = _ledger(tmp_path, "server", extra_users=["other"])  # 不同的 user_id
+    lrepo, lsync = SqliteRecordRepository(laptop), SqliteSyncRepository(laptop)
+    ssync = SqliteSyncRepository(server)
+
+    r1 = lrepo.add(Record(None, l_uid, RecordType.EXPENSE, "food", 10.0, date(2025, 1, 1)))
+    lrepo.add(Record(None, l_uid, RecordType.EXPENSE, "rent", 500.0, date(2025, 1, 2)))
+
+    path = tmp_path / "l2s.jsonl"
+    save_batch(str(path), lsync.export_since(0))
+    res = ssync.apply(load_batch(str(path)))
+    assert res["applied"] == 2
+    assert _amounts(server, s_uid) == [10.0, 500.0]
+    # 同一文件重复应用是幂等的
+    assert ssync.apply(load_batch(str(path)))["applied"] == 0
+    assert _amounts(server, s_uid) == [10.0, 500.0]
+
+    # 服务器改一条、删一条，只传增量
+    since = ssync.latest_seq()
+    by_cat = {r.category: r for r in SqliteRecordRepository(server).list_month(s_uid, 2025, 1)}
+    server.execute(update(records).where(records.c.record_id == by_cat["food"].record_id).values(amount=12.0))
+    server.execute(delete(records).where(records.c.record_id == by_cat["rent"].record_id))
+    server.commit()
+    delta = ssync.export_since(since)
+    assert len(delta["changes"]) == 2
+    lsync.apply(delta)
+    assert _amounts(laptop, l_uid) == [12.0]
+
+    # 回传时，服务器应用过的笔记本变更作为回声被跳过
+    back = lsync.export_since(0)
+    res = ssync.apply(back)
+    assert res["applied"] == 0
+    assert _amounts(server, s_uid) == [12.0]
+    assert r1.record_id == SqliteRecordRepository(laptop).list_month(l_uid, 2025, 1)[0].record_id
+
+
+def test_concurrent_update_conflict_is_deterministic(tmp_path):
+    a, a_uid = _ledger(tmp_path, "a")
+    b, b_uid = _ledger(tmp_path, "b")
+    arepo = SqliteRecordRepository(a)
+    rec = arepo.add(Record(None, a_uid, RecordType.EXPENSE, "food", 1.0, date(2025, 1, 1)))
+    SqliteSyncRepository(b).apply(SqliteSyncRepository(a).export_since(0))
+
+    a_since, b_since = SqliteSyncRepository(a).latest_seq(), SqliteSyncRepository(b).latest_seq()
+    a.execute(update(records).where(records.c.record_id == rec.record_id).values(amount=2.0))
+    a.commit()
+    b.execute(update(records).values(amount=3.0))
+    b.commit()
+
+    da = SqliteSyncRepository(a).export_since(a_since)
+    db = SqliteSyncRepository(b).export_since(b_since)
+    SqliteSyncRepository(a).apply(db)
+    SqliteSyncRepository(b).apply(da)
+    # 两边按 (changed_at, origin) 选出同一个赢家
+    assert _amounts(a, a_uid) == _amounts(b, b_uid)
+    assert _amounts(a, a_uid) in ([2.0], [3.0])
+
+
+def test_cli_sync_refuses_sharded_ledger(tmp_path, run_cli):
+    db_url = f"sqlite:///{tmp_path}/dir_{uuid.uuid4().hex}.db"
+    run_cli("shard", "init", "--db", db_url, "--shards", "2")
+    # 目录库只有用户，记录在分片文件里：导出/应用都必须明确拒绝
+    with pytest.raises(SystemExit, match="sharded"):
+        run_cli("sync", "export", "--db", db_url, "--out", str(tmp_path / "out.jsonl"))
+    with pytest.raises(SystemExit, match="sharded"):
+        run_cli("sync", "apply", "--db", db_url, "--path", str(tmp_path / "out.jsonl"))
+    assert not (tmp_path / "out.jsonl").exists()
@@ -0,0 +1,125 @@
+import uuid
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from ledger.models import Record, RecordType
+from ledger.repo.memory_repo import InMemoryRecordRepository
+from ledger.repo.record_query import RecordQuery
+from ledger.repo.record_repo import RecordFilter
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository
+from ledger.repo.sqlite_tag_repo import SqliteTagRepository
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.statistics_service import StatisticsService
+from ledger.utils import bitmap
+from ledger.utils.db import init_db, get_session_factory
+
+
+def test_bitmap_roundtrip():
+    ids = [0, 3, 64, 1000, 7]
+    bm = bitmap.from_ids(ids)
+    assert bitmap.to_ids(bm) == sorted(ids)
+    assert bitmap.count(bm & ~bitmap.from_ids([3, 7])) == 3
+    assert bitmap.to_ids(0) == [] and bitmap.from_ids([]) == 0
+
+
+def _seed(repo, uid):
+    out = []
+    for i, (d, amt) in enumerate([(3, 10.0), (5, 20.0), (9, 30.0), (20, 40.0)]):
+        out.append(repo.add(Record(None, uid, RecordType.EXPENSE, "food", amt, date(2025, 1, d), f"n{i}")))
+    ids = [r.record_id for r in out]
+    repo.tag(uid, ids[:3], ["work", "trip"])
+    repo.tag(uid, [ids[1]], ["reimbursed"])
+    repo.tag(uid, [ids[3]], ["work"])
+    return ids
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "memory"])
+def test_tag_queries(tmp_path, backend):
+    if backend == "sqlite":
+        db_url = f"sqlite:///{tmp_path}/tags_{uuid.uuid4().hex}.db"
+        init_db(db_url)
+        s = get_session_factory(db_url)()
+        uid = SqliteUserRepository(s).register("tom", "pw").user_id
+        repo = SqliteRecordRepository(s)
+    else:
+        repo, uid = InMemoryRecordRepository(), 1
+    ids = _seed(repo, uid)
+
+    q = RecordQuery(uid).between(date(2025, 1, 1), date(2025, 1, 10)).tagged("work", "trip").not_tagged("reimbursed")
+    assert [r.record_id for r in repo.query(q)] == [ids[0], ids[2]]
+    assert [r.record_id for r in repo.query(q.order_by("-amount").take(1))] == [ids[2]]
+    assert [r.record_id for r in repo.query(RecordQuery(uid).not_tagged("trip"))] == [ids[3]]
+    assert repo.query(RecordQuery(uid).tagged("nope")) == []
+    assert repo.totals_by_tag(uid, date(2025, 1, 1), date(2025, 2, 1)) == {
+        "work": 100.0, "trip": 60.0, "reimbursed": 20.0
+    }
+    assert repo.tags_of([ids[1]]) == {ids[1]: ["reimbursed", "trip", "work"]}
+    # 改分类不丢标签；删除记录时标签一并清理
+    repo.recategorize(RecordFilter(uid, category="food"), "meals")
+    assert repo.tags_of([ids[0]]) == {ids[0]: ["trip", "work"]}
+    repo.delete_where(RecordFilter(uid, end=date(2025, 1, 4)))
+    assert repo.tags_of([ids[0]]) == {}
+    assert repo.untag(uid, [ids[1]], ["reimbursed"]) == 1
+
+
+def test_tag_query_pages_in_sql(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/tags_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("pat", "pw").user_id
+    repo = SqliteRecordRepository(s)
+    n = 40000  # 超过 SQLite 绑定变量上限
+    repo.add_many([
+        Record(None, uid, RecordType.EXPENSE, "food", 1.0 + i % 7, date(2025, 1, 1 + i % 28)) for i in range(n)
+    ])
+    ids = [r.record_id for r in repo.query(RecordQuery(uid).order_by("id"))]
+    repo.tag(uid, ids[::2], ["even"])
+
+    sql = []
+    event.listen(s.get_bind(), "before_cursor_execute", lambda *a: sql.append(a[2]))
+    q = RecordQuery(uid).tagged("even").order_by("id")
+    assert [r.record_id for r in repo.query(q.take(3, offset=19000))] == ids[38000:38006:2]
+    assert "LIMIT" in sql[-1] and "record_id IN" in sql[-1]
+    assert len(repo.query(q)) == n // 2
+
+
+def test_match_uses_postings_only_records_of_user(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/tags_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    a = SqliteUserRepository(s).register("a", "pw").user_id
+    b = SqliteUserRepository(s).register("b", "pw").user_id
+    repo = SqliteRecordRepository(s)
+    ra = repo.add(Record(None, a, RecordType.EXPENSE, "x", 1.0, date(2025, 1, 1)))
+    # 不能给别人的记录打标签
+    assert repo.tag(b, [ra.record_id], ["mine"]) == 0
+    tags = SqliteTagRepository(s)
+    assert tags.match(a, none_of=["mine"]) == bitmap.from_ids([ra.record_id])
+
+
+def test_stats_by_tag():
+    recs = [
+        Record(1, 1, RecordType.EXPENSE, "food", 10.0, date(2025, 1, 1)),
+        Record(2, 1, RecordType.INCOME, "pay", 99.0, date(2025, 1, 1)),
+        Record(3, 1, RecordType.EXPENSE, "taxi", 5.0, date(2025, 1, 2)),
+    ]
+    tags_of = {1: ["work", "trip"], 2: ["work"], 3: ["trip"]}
+    assert StatisticsService().by_tag(recs, tags_of) == {"work": 10.0, "trip": 15.0}
+
+
+def test_cli_tags(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "tom", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "tom", "--password", "pw")
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    run_cli("tag", "add", "--db", db_url, "--id", "1", "--id", "2", "--tag", "work")
+    capsys.readouterr()
+    run_cli("query", "--db", db_url, "--tag", "work", "--without-tag", "none")
+    assert len(capsys.readouterr().out.strip().splitlines()) == 2
+    run_cli("tag", "list", "--db", db_url)
+    assert capsys.readouterr().out.strip() == "work\t2"
+    run_cli("stats", "--db", db_url, "--month", "2025-01", "--by-tag")
+    assert "work: 37.50" in capsys.readouterr().out
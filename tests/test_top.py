@@ -0,0 +1,122 @@
+import random
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from ledger.models import Record, RecordType
+from ledger.repo.memory_repo import InMemoryRecordRepository
+from ledger.repo.record_query import RecordQuery
+from ledger.repo.sqlite_record_repo import SqliteRecordRepository, compile_query
+from ledger.repo.sqlite_user_repo import SqliteUserRepository
+from ledger.services.top_service import TopService, normalize_note
+from ledger.utils.db import init_db, get_session_factory
+from ledger.utils.topk import SpaceSaving
+
+_NOTES = ["UBER *TRIP 8J2K", "Uber trip", "Starbucks #1234", "starbucks", "rent", "Amazon.com*2X4", "AMAZON COM"]
+
+
+def test_normalize_note():
+    assert normalize_note("UBER *TRIP 8J2K") == normalize_note("Uber trip") == "uber trip"
+    assert normalize_note("Starbucks #1234 2025-01-02") == "starbucks"
+    assert normalize_note("Amazon.com*2X4") == "amazon com"
+    assert normalize_note("12345") == ""
+
+
+def test_space_saving_bounds():
+    rnd = random.Random(4)
+    keys = [int(rnd.paretovariate(1.1)) for _ in range(50000)]
+    exact = SpaceSaving(10000)
+    small = SpaceSaving(50)
+    for k in keys:
+        exact.add(k)
+        small.add(k)
+    truth = Counter(keys)
+    assert exact.exact and [(k, t.weight) for k, t in exact.top(5)] == [(k, float(v)) for k, v in truth.most_common(5)]
+    assert not small.exact
+    for k, t in small.top(5):
+        assert t.weight - t.error <= truth[k] <= t.weight
+    # 权重超过 total / capacity 的键一定被保留
+    kept = {k for k, _ in small.top(50)}
+    assert all(k in kept for k, v in truth.items() if v > len(keys) / 50)
+    with pytest.raises(ValueError):
+        SpaceSaving(0)
+
+
+def _repo(tmp_path):
+    db_url = f"sqlite:///{tmp_path}/top_{uuid.uuid4().hex}.db"
+    init_db(db_url)
+    s = get_session_factory(db_url)()
+    uid = SqliteUserRepository(s).register("ty", "pw").user_id
+    repo = SqliteRecordRepository(s)
+    rnd = random.Random(6)
+    recs = [
+        Record(None, uid, rnd.choice([RecordType.EXPENSE] * 3 + [RecordType.INCOME]),
+               rnd.choice(["Food/Cafe", "Food/Groceries", "Rent", "Travel"]), float(rnd.randint(1, 2000)),
+               date(2024, 1, 1) + timedelta(days=rnd.randint(0, 500)), rnd.choice(_NOTES))
+        for _ in range(800)
+    ]
+    repo.add_many(recs)
+    return repo, uid
+
+
+def test_top_matches_full_sort(tmp_path):
+    repo, uid = _repo(tmp_path)
+    mem = InMemoryRecordRepository()
+    for r in repo.list_by_period(uid, date.min, date.max):
+        mem.add(r)
+    start, end = date(2024, 3, 1), date(2025, 1, 1)
+    everything = [r for r in mem.list_by_period(uid, start, end) if r.rtype == RecordType.EXPENSE]
+
+    top = TopService(repo)
+    largest = top.largest(uid, start, end, 15)
+    want = sorted(everything, key=lambda r: (r.amount, r.record_id), reverse=True)[:15]
+    assert [r.record_id for r in largest] == [r.record_id for r in want]
+    assert top.largest(uid, start, end, 5) == TopService(mem).largest(uid, start, end, 5)
+
+    totals = Counter()
+    for r in everything:
+        totals[r.category.split("/")[0]] += r.amount
+    assert [c for c, _ in top.top_categories(uid, start, end, 2, depth=1)] == [c for c, _ in totals.most_common(2)]
+
+    ranks, exact = top.top_notes(uid, start, end, 3, by="count")
+    counts = Counter(normalize_note(r.note) for r in everything)
+    assert exact and [(r.note, r.count) for r in ranks] == counts.most_common(3)
+    ranks, _ = top.top_notes(uid, start, end, 1)
+    amounts = Counter()
+    for r in everything:
+        amounts[normalize_note(r.note)] += r.amount
+    assert (ranks[0].note, ranks[0].amount) == (amounts.most_common(1)[0][0], round(amounts.most_common(1)[0][1], 2))
+    with pytest.raises(ValueError):
+        top.top_notes(uid, start, end, 1, by="median")
+
+    # 全部历史的最大单笔：沿 (user_id, rtype, amount) 索引倒序扫描，不排序
+    stmt = compile_query(RecordQuery(uid).of_type(RecordType.EXPENSE).order_by("-amount").take(5))
+    sql = str(stmt.compile(compile_kwargs={"literal_binds": True}))
+    plan = " ".join(row[3] for row in repo._session.execute(text("EXPLAIN QUERY PLAN " + sql)))
+    assert "ix_records_user_type_amount" in plan and "TEMP B-TREE" not in plan
+
+
+def test_cli_top(tmp_path, capsys, run_cli):
+    db_url = f"sqlite:///{tmp_path}/cli_{uuid.uuid4().hex}.db"
+
+    run_cli("register", "--db", db_url, "--username", "tz", "--password", "pw")
+    run_cli("login", "--db", db_url, "--username", "tz", "--password", "pw")
+    run_cli("import-csv", "--db", db_url, "--path", "data/sample_records.csv")
+    capsys.readouterr()
+
+    run_cli("top", "records", "--db", db_url, "--month", "2025-01", "-n", "2")
+    lines = capsys.readouterr().out.strip().splitlines()
+    assert len(lines) == 3 and "\tshopping\t200.00\tclothes" in lines[1] and "\tfood\t25.50" in lines[2]
+    run_cli("top", "records", "--db", db_url, "--year", "2025", "--type", "INCOME", "-n", "1")
+    assert "\tsalary\t5000.00" in capsys.readouterr().out
+    run_cli("top", "categories", "--db", db_url, "--year", "2025", "-n", "1")
+    out = capsys.readouterr().out
+    assert "shopping: 200.00" in out and "food" not in out
+    run_cli("top", "notes", "--db", db_url, "--year", "2025", "--by", "count")
+    out = capsys.readouterr().out
+    assert "Top notes by count" in out and "approximate" not in out and "  clothes\t1x\t200.00" in out
+    with pytest.raises(SystemExit):
+        run_cli("top", "notes", "--db", db_url, "--year", "2025", "-n", "0")